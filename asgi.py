@@ -0,0 +1,42 @@
+#Optional ASGI entry point serving the same app as app.py.
+#Requests run on a bounded pool of worker threads (ASGI_THREADS, default 16) while the stat queries they make go
+#through the async engine on the event loop (see database.AsyncBridgeConnection), so one worker process can
+#keep many slow queries in flight instead of being tied up by one.
+#Extra dependencies are in requirements-async.txt. To serve with it, use this in the Procfile:
+#   web: gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:asgi_app
+import asyncio
+import os
+from a2wsgi import WSGIMiddleware
+from app import flask_app
+from backend import database
+
+ASGI_THREADS=int(os.getenv("ASGI_THREADS",16))
+
+
+class AsyncDatabaseMiddleware:
+    #Gives each request an async database bridge before handing it to the thread pool, and closes the async pool on shutdown.
+    def __init__(self, app):
+        self.app=app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type']=='lifespan':
+            await self.lifespan(receive,send)
+            return
+        token=database.useAsyncBridge(asyncio.get_running_loop())
+        try:
+            await self.app(scope,receive,send)
+        finally:
+            database.resetAsyncBridge(token)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message=await receive()
+            if message['type']=='lifespan.startup':
+                await send({'type':'lifespan.startup.complete'})
+            elif message['type']=='lifespan.shutdown':
+                await database.disposeAsyncEngine()
+                await send({'type':'lifespan.shutdown.complete'})
+                return
+
+
+asgi_app=AsyncDatabaseMiddleware(WSGIMiddleware(flask_app,workers=ASGI_THREADS))
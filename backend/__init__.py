@@ -1,6 +1,10 @@
 from flask import Flask
 from flask_cors import CORS
+from .compression import compressResponse
+from . import metrics
 
 
 flask_app = Flask(__name__, static_folder='../frontend/dist', static_url_path='/')
 CORS(flask_app)
+metrics.instrumentApp(flask_app) #Registered before compression so request latency includes the time spent compressing
+flask_app.after_request(compressResponse) #gzip/brotli negotiation for every response
@@ -0,0 +1,100 @@
+#Response compression for the API.
+#Stat payloads are large json strings (hundreds of card keys with long floats) that compress very well.
+#Responses are gzip or brotli encoded based on the client's Accept-Encoding header.
+#Payloads that get reused (cached results, stored snapshots) carry their compressed bytes with them,
+#so each one is compressed once rather than on every request.
+import gzip
+import threading
+from flask import make_response, request
+try:
+    import brotli
+except ImportError: #Brotli is optional. Without it only gzip is offered.
+    brotli=None
+
+MIN_COMPRESS_SIZE=500 #Bytes. Smaller bodies aren't worth the encoding overhead.
+COMPRESSIBLE_TYPES={'application/json','application/javascript','text/html','text/plain','text/css','image/svg+xml'}
+#Quality levels. Reused payloads are compressed once so can afford the slower, smaller settings.
+DYNAMIC_LEVELS={'br':4,'gzip':6}
+STORED_LEVELS={'br':11,'gzip':9}
+
+
+def availableEncodings()->list:
+    #In order of preference
+    return ['br','gzip'] if brotli is not None else ['gzip']
+
+def compressBytes(data:bytes, encoding:str, level:int)->bytes:
+    if encoding=='br':
+        return brotli.compress(data,quality=level)
+    if encoding=='gzip':
+        return gzip.compress(data,compresslevel=level,mtime=0) #mtime=0 so the same payload always gives the same bytes
+    raise ValueError("Unsupported encoding "+encoding)
+
+def compressAll(data:bytes, levels=STORED_LEVELS)->dict:
+    #Returns {encoding: compressed bytes} for every available encoding.
+    return {encoding:compressBytes(data,encoding,levels[encoding]) for encoding in availableEncodings()}
+
+def chooseEncoding(accept_encodings)->str:
+    #accept_encodings is werkzeug's parsed Accept-Encoding header. Returns None if the client accepts none of ours.
+    return accept_encodings.best_match(availableEncodings())
+
+
+class Payload(str):
+    #A json string that keeps its compressed encodings with it.
+    #Cached results and stored snapshots are returned as Payloads, so the compressed bytes live exactly as long as the cached string.
+    #Encodings are made at DYNAMIC_LEVELS unless the payload is set to STORED_LEVELS, which only pays off for payloads that get
+    #reused (kept by the result cache, stored snapshots): the first request for each encoding waits for it.
+    #on_encoded(num_bytes) is called after a new encoding is attached, so whoever holds the payload can count its size.
+    def __new__(cls, value, compressed=None, levels=DYNAMIC_LEVELS):
+        payload=super().__new__(cls,value)
+        payload._compressed=dict(compressed) if compressed else {}
+        payload._lock=threading.Lock()
+        payload.levels=levels
+        payload.on_encoded=None
+        return payload
+
+    def encoded(self, encoding:str)->bytes:
+        added=0
+        if encoding not in self._compressed:
+            with self._lock:
+                if encoding not in self._compressed:
+                    self._compressed[encoding]=compressBytes(self.encode('utf-8'),encoding,self.levels[encoding])
+                    added=len(self._compressed[encoding])
+        if added>0 and self.on_encoded is not None:
+            self.on_encoded(added) #Outside the lock, the callback may take its own
+        return self._compressed[encoding]
+
+    def compressedSize(self)->int:
+        #Bytes held by the encodings attached so far
+        return sum(len(body) for body in self._compressed.values())
+
+
+def payloadResponse(result):
+    #make_response, but keeps a reference to the Payload so compressResponse can use its stored encodings.
+    response=make_response(result)
+    if isinstance(result,Payload):
+        response.payload=result
+    return response
+
+def compressResponse(response):
+    #after_request hook. Encodes the body with the best encoding the client accepts.
+    if (response.status_code!=200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding=chooseEncoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    payload=getattr(response,'payload',None)
+    if payload is not None and len(payload)>=MIN_COMPRESS_SIZE:
+        body=payload.encoded(encoding)
+    else:
+        data=response.get_data()
+        if len(data)<MIN_COMPRESS_SIZE:
+            return response
+        body=compressBytes(data,encoding,DYNAMIC_LEVELS[encoding])
+    response.set_data(body)
+    response.headers['Content-Encoding']=encoding
+    etag,weak=response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag,weak=True) #Encoded bytes differ from the identity bytes, so the tag is only weakly valid
+    return response
@@ -0,0 +1,203 @@
+#Database connection management for the API.
+#endpoints.py and stataccess.py share one SQLAlchemy engine per process, so each gunicorn worker holds a single
+#bounded pool against the Postgres connection limit instead of a pool plus a new raw connection per request.
+#Pool settings come from the environment:
+#   DB_POOL_SIZE: connections kept open per worker (default 3)
+#   DB_MAX_OVERFLOW: extra connections allowed under load, closed again when returned (default 2)
+#   DB_POOL_TIMEOUT: seconds to wait for a free connection before giving up (default 30)
+#   DB_POOL_RECYCLE: seconds after which a connection is replaced, ahead of server side idle timeouts (default 1800)
+#   DB_POOL_PRE_PING: check connections are alive before handing them out (default true)
+#Workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) should stay under the database's connection limit.
+#SQLAlchemy (and asyncio for the ASGI bridge) are imported when first needed, so importing this module is cheap.
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from backend import metrics
+load_dotenv()
+
+_engine=None
+_engine_settings={} #poolSettings the engine was created with
+_async_engine=None
+_engine_lock=threading.Lock()
+_stats_lock=threading.Lock()
+_pool_stats={'checkouts':0,'connects':0,'invalidations':0,'waits':0,'wait_seconds':0.0,'max_wait_seconds':0.0,
+             'timeouts':0,'peak_checked_out':0}
+
+
+def databaseURL()->str:
+    db_url=os.getenv("DATABASE_URL")
+    if db_url is None:
+        raise RuntimeError("DATABASE_URL is not set")
+    if db_url.startswith('postgres://'): #Heroku still hands out the old scheme name, which SQLAlchemy no longer accepts
+        db_url='postgresql://'+db_url[len('postgres://'):]
+    return db_url
+
+def poolSettings(db_url:str)->dict:
+    settings={'pool_pre_ping':os.getenv("DB_POOL_PRE_PING","true").lower() in ('1','true','yes')}
+    if db_url.startswith('sqlite'): #Local sqlite files don't need (or accept all of) the queue pool settings
+        return settings
+    settings.update(pool_size=int(os.getenv("DB_POOL_SIZE",3)),
+                    max_overflow=int(os.getenv("DB_MAX_OVERFLOW",2)),
+                    pool_timeout=float(os.getenv("DB_POOL_TIMEOUT",30)),
+                    pool_recycle=int(os.getenv("DB_POOL_RECYCLE",1800)))
+    return settings
+
+def getEngine():
+    #The process-wide engine. Created on first use.
+    global _engine, _engine_settings
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from sqlalchemy import create_engine
+                db_url=databaseURL()
+                _engine_settings=poolSettings(db_url)
+                engine=create_engine(url=db_url,**_engine_settings)
+                _attachPoolListeners(engine)
+                metrics.attachSQLTiming(engine)
+                _engine=engine
+    return _engine
+
+def connect():
+    #Checks a connection out of the pool, recording how long the caller had to wait for it.
+    #Under the ASGI app (backend/asgi.py) this returns the request's AsyncBridgeConnection instead.
+    bridge=_async_bridge.get()
+    if bridge is not None: return bridge
+    engine=getEngine()
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+    start=time.perf_counter()
+    try:
+        conn=engine.connect()
+    except PoolTimeoutError: #Pool exhausted for DB_POOL_TIMEOUT seconds
+        _count('timeouts')
+        raise
+    _recordWait(time.perf_counter()-start)
+    return conn
+
+@contextmanager
+def rawConnection():
+    #DBAPI (psycopg2) connection from the shared pool, for code that works with cursors directly.
+    #Closing it returns it to the pool.
+    conn=getEngine().raw_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def asyncDatabaseURL(db_url:str)->str:
+    #Same database through an asyncio driver: asyncpg for Postgres, aiosqlite for local sqlite files.
+    scheme,rest=db_url.split('://',1)
+    driver={'postgresql':'postgresql+asyncpg','sqlite':'sqlite+aiosqlite'}.get(scheme.split('+')[0])
+    if driver is None:
+        raise RuntimeError("No async driver configured for "+scheme)
+    return driver+'://'+rest
+
+def getAsyncEngine():
+    #The process-wide async engine, created on first use. Its pool uses the same DB_POOL_* settings.
+    #Only the ASGI app uses it. Connections belong to the event loop they were opened on.
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        with _engine_lock:
+            if _async_engine is None:
+                db_url=asyncDatabaseURL(databaseURL())
+                _async_engine=create_async_engine(db_url,**poolSettings(db_url))
+    return _async_engine
+
+
+class AsyncBridgeConnection:
+    #Stands in for a Connection inside stat functions run from the ASGI app's worker threads.
+    #Each query is sent to the event loop and run there on the async engine. The worker thread only waits on the result,
+    #so the loop keeps serving other requests while queries are in flight, and the pandas work stays in the thread pool.
+    def __init__(self, loop):
+        self.loop=loop
+        self.dialect=getAsyncEngine().dialect
+
+    def execute(self, query):
+        #Returns a buffered Result, so .first()/.fetchall()/.keys() work as on a normal connection.
+        import asyncio
+        try:
+            on_loop=asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop=False
+        if on_loop: #Waiting here would block the loop the query needs to run on
+            raise RuntimeError("AsyncBridgeConnection must be used from a worker thread, not the event loop")
+        function=metrics.currentFunction() #The loop runs the query outside this thread's context
+        return asyncio.run_coroutine_threadsafe(self._execute(query,function),self.loop).result()()
+
+    async def _execute(self, query, function:str):
+        start=time.perf_counter()
+        async with getAsyncEngine().connect() as conn:
+            _recordWait(time.perf_counter()-start)
+            start=time.perf_counter()
+            result=await conn.execute(query)
+            metrics.sql_duration.observe((function,),time.perf_counter()-start)
+            return result.freeze()
+
+    def close(self):
+        pass #Each query returns its connection to the async pool as soon as it finishes
+
+_async_bridge=contextvars.ContextVar('async_bridge',default=None)
+
+def useAsyncBridge(loop):
+    #Called by the ASGI app for each request, before the request is handed to a worker thread (which copies the context).
+    return _async_bridge.set(AsyncBridgeConnection(loop))
+
+def resetAsyncBridge(token):
+    _async_bridge.reset(token)
+
+async def disposeAsyncEngine():
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine=None
+
+def initWorker():
+    #Call in each worker right after fork (see gunicorn.conf.py). Connections inherited from the parent process
+    #share sockets with it, so the child drops them without closing and opens its own on demand.
+    global _async_engine
+    if _engine is not None:
+        _engine.dispose(close=False)
+    _async_engine=None #Bound to the parent's event loop. The worker creates its own on first use.
+    with _stats_lock:
+        for key in _pool_stats:
+            _pool_stats[key]=0
+
+def poolStats()->dict:
+    #Current pool occupancy and saturation plus counters since the worker started.
+    with _stats_lock:
+        stats=dict(_pool_stats)
+    if _engine is None:
+        return stats
+    pool=_engine.pool
+    if hasattr(pool,'checkedout'):
+        max_overflow=_engine_settings.get('max_overflow') #None for sqlite, which runs on SQLAlchemy's pool defaults
+        capacity=pool.size()+max(max_overflow or 0,0)
+        stats.update(pool_size=pool.size(),max_overflow=max_overflow,checked_out=pool.checkedout(),
+                     checked_in=pool.checkedin(),overflow=pool.overflow(),
+                     saturation=pool.checkedout()/capacity if capacity>0 else 0)
+    return stats
+
+def _count(key:str, amount=1):
+    with _stats_lock:
+        _pool_stats[key]+=amount
+
+def _recordWait(seconds:float):
+    with _stats_lock:
+        _pool_stats['waits']+=1
+        _pool_stats['wait_seconds']+=seconds
+        _pool_stats['max_wait_seconds']=max(_pool_stats['max_wait_seconds'],seconds)
+
+def _attachPoolListeners(engine):
+    from sqlalchemy import event
+    def onCheckout(dbapi_conn, record, proxy):
+        _count('checkouts')
+        pool=engine.pool
+        if hasattr(pool,'checkedout'):
+            with _stats_lock:
+                _pool_stats['peak_checked_out']=max(_pool_stats['peak_checked_out'],pool.checkedout())
+    event.listen(engine,'checkout',onCheckout)
+    event.listen(engine,'connect',lambda dbapi_conn, record: _count('connects'))
+    event.listen(engine,'invalidate',lambda dbapi_conn, record, exception: _count('invalidations'))
@@ -12,24 +12,24 @@ from flask import Response
 from . import flask_app
 import backend.unit_test
 import os
-import psycopg2
-import backend.stataccess
-from psycopg2.extensions import parse_dsn
+import backend.database
+import backend.metrics
+from backend.httpcaching import conditionalOnSetVersion
 
-temp = os.environ['DATABASE_URL']
-db_environ = parse_dsn(temp)
+def stataccess():
+    #pandas, numpy and SQLAlchemy come in with stataccess, so it's imported by the first request that needs it
+    #rather than when the app starts. Later calls just return the already imported module.
+    import backend.stataccess
+    return backend.stataccess
 
 def create_conn():
-    conn = psycopg2.connect(
-        database = db_environ["dbname"],
-        host = db_environ["host"],
-        user = db_environ["user"],
-        password = db_environ["password"],
-        port = db_environ["port"]
-    )
+    #psycopg2 connection from the pool shared with stataccess. conn.close() hands it back to the pool.
+    conn = backend.database.getEngine().raw_connection()
     cursor = conn.cursor()
     return conn, cursor
 
+#Stats only change when a set is rebuilt, so stats routes answer repeat requests with 304 based on ActiveSets.last_updated
+set_versioned = conditionalOnSetVersion(lambda set_abbr: stataccess().schema.setVersion(set_abbr))
 
 @flask_app.route('/api')
 @cross_origin()
@@ -37,41 +37,106 @@ def Welcome():
     return "Welcome to the API!!!"
 
 
+@flask_app.route('/ready', methods = ['GET']) #200 once this worker has every active set's stats loaded in memory, 503 until then
+@cross_origin()
+def Ready():
+    readiness = stataccess().getReadiness()
+    return jsonify(readiness), 200 if readiness['ready'] else 503
+
+
+@flask_app.route('/metrics', methods = ['GET']) #request latency, stat function and SQL timings for this worker in Prometheus text format
+def Metrics():
+    return Response(backend.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@flask_app.route('/cacheStats', methods = ['GET']) #hit/miss/eviction counters for the stat result cache
+@cross_origin()
+def CacheStats():
+    return jsonify(stataccess().getStatCacheInfo())
+
+
+@flask_app.route('/statStoreStats', methods = ['GET']) #memory held by the in-memory stat store for each loaded set
+@cross_origin()
+def StatStoreStats():
+    return jsonify(stataccess().getStatStoreInfo())
+
+
+@flask_app.route('/poolStats', methods = ['GET']) #database pool occupancy, saturation and checkout wait times for this worker
+@cross_origin()
+def PoolStats():
+    return jsonify(backend.database.poolStats())
+
+
+@flask_app.route('/batch', methods = ['POST']) #answer many stat requests in one round trip, see stataccess.runBatch for the format
+@cross_origin()
+def Batch():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('requests'), list):
+        return "Expected a json object with a list of requests", 400
+    try:
+        output = stataccess().runBatch(body['requests'])
+    except ValueError as e:
+        return str(e), 400
+    return flask_app.response_class(output, mimetype='application/json')
+
+
 @flask_app.route('/cardInfo/<set_abbr>', methods = ['GET'])
 @cross_origin()
+@set_versioned
 def CardInfo(set_abbr:str):
     http_code = backend.unit_test.str_check(set_abbr)
     if(http_code != 200):
         return http_code
     else:
-        json_card = backend.stataccess.cardInfo(set_abbr)
+        json_card = stataccess().getCardInfo(set_abbr)
         return json_card
 
 
 @flask_app.route('/getCardsWithColor/<set_abbr>/<color>/<include_multicolor>/<include_lands>/<as_string>', methods = ['GET'])
 @cross_origin()
-def CardsWithColor(color:str, set_abbr:str, include_multicolor:bool, include_lands:bool, as_string:bool):
-    json_card = backend.stataccess.getCardsWithColor(set_abbr, color, include_multicolor, include_lands_as_string)
+@set_versioned
+def CardsWithColor(color:str, set_abbr:str, include_multicolor:str, include_lands:str, as_string:str):
+    flags = [backend.unit_test.path_bool(flag) for flag in (include_multicolor, include_lands, as_string)]
+    http_code = [200]*5
     http_code[0] = backend.unit_test.str_check(color)#unit test string
     http_code[1] = backend.unit_test.str_check(set_abbr)#unit test string
-    http_code[2] = backend.unit_test.bool_check(include_multicolor)#unit test bool
-    http_code[3] = backend.unit_test.bool_check(include_lands)#unit test bool
-    http_code[4] = backend.unit_test.bool_check(as_string)#unit test bool
+    for i in range(3):
+        http_code[i+2] = backend.unit_test.bool_check(flags[i])#unit test bool
     for i in range (5):
         if(http_code[i] != 200):
-            return http_code[i]#if a unit test fails return the http code
+            return "Invalid argument: include_multicolor, include_lands and as_string must be true or false", http_code[i]#if a unit test fails return the http code
+    try:
+        json_card = stataccess().getCardsWithColor(set_abbr, color, flags[0], flags[1], flags[2])
+    except ValueError as e: #color isn't one of WUBRGC
+        return str(e), 406
     return json_card
 
 
 @flask_app.route('/getArchAvgCurve/<set_abbr>/<archLabel>/', methods = ['GET'])
 @cross_origin()
+@set_versioned
 def ArchAvgCurve(set_abbr:str, archLabel:str):
+    http_code = [200]*2
     http_code[0] = backend.unit_test.str_check(archLabel)#unit test string
     http_code[1] = backend.unit_test.str_check(set_abbr)#unit test string
     for j in range (2):
         if(http_code[j] != 200):
             return http_code[j]#if a unit test fails return the http code
-    json_card = backend.stataccess.getArchAvgCurve(set_abbr, archLabel)
+    json_card = stataccess().getArchAvgCurve(set_abbr, archLabel)
+    return json_card
+
+
+@flask_app.route('/compareArchetypes/<set_abbr>/<archLabels>', methods = ['GET']) #card stats for several archetypes side by side, archLabels comma separated e.g. WU,WU1,WU2
+@cross_origin()
+@set_versioned
+def CompareArchetypes(set_abbr:str, archLabels:str):
+    http_code = [200]*2
+    http_code[0] = backend.unit_test.str_check(set_abbr)#unit test string
+    http_code[1] = backend.unit_test.str_check(archLabels)#unit test string
+    for k in range(2):
+        if(http_code[k] != 200):
+            return http_code[k]#if a unit test fails return the http code
+    json_card = stataccess().getCardStatsByArchetype(set_abbr, archLabels)
     return json_card
 
 
@@ -89,29 +154,35 @@ def Get_MTGsets():
 
 @flask_app.route('/getArchRecords/<set_abbr>/<archLabel>/', methods = ['GET'])
 @cross_origin()
-def ArchRecords(sset_abbr:str, archLabel:str):
+@set_versioned
+def ArchRecords(set_abbr:str, archLabel:str):
+    http_code = [200]*2
     http_code[0] = backend.unit_test.str_check(archLabel)#unit test string
     http_code[1] = backend.unit_test.str_check(set_abbr)#unit test string
     for k in range(2):
         if(http_code[k] != 200):
             return http_code[k]#if a unit test fails return the http code
-    json_card = backend.stataccess.getArchRecords(set_abbr, archLabel)
+    json_card = stataccess().getArchRecord(set_abbr, archLabel)
     return json_card
 
 
-@flask_app.route('/getCardInDeckWinRates/<set_abbr>/<archLabels>/<minCopies>/<maxCopies>/<index_by_name>/<as_json>', methods = ['GET'])
+@flask_app.route('/getCardInDeckWinRates/<set_abbr>/<archLabels>/<int:minCopies>/<int:maxCopies>/<index_by_name>/<as_json>', methods = ['GET'])
 @cross_origin()
-def CardInDeckWinRates(set_abbr:str, archLabels:str, minCopies:int, maxCopies:int, index_by_name:str, as_json:bool) -> dict:
+@set_versioned
+def CardInDeckWinRates(set_abbr:str, archLabels:str, minCopies:int, maxCopies:int, index_by_name:str, as_json:str) -> dict:
+    index_by_name = backend.unit_test.path_bool(index_by_name)
+    http_code = [200]*6
     http_code[0] = backend.unit_test.str_check(archLabels)#unit test string
     http_code[1] = backend.unit_test.int_check(minCopies)#unit test integer
     http_code[2] = backend.unit_test.int_check(maxCopies)#unit test integer
     http_code[3] = backend.unit_test.str_check(set_abbr)#unit test string
-    http_code[4] = backend.unit_test.str_check(index_by_name)#unit test string
-    http_code[5] = backend.unit_test.bool_check(as_json)#unit test bool
+    http_code[4] = backend.unit_test.bool_check(index_by_name)#unit test bool
+    http_code[5] = backend.unit_test.bool_check(backend.unit_test.path_bool(as_json))#unit test bool
     for l in range(6):
         if(http_code[l] != 200):
-            return http_code[l]#if a unit test fails return the http code
-    json_card = getCardInDeckWinRates(set_abbr, archLabels, minCopies, maxCopies, index_by_name, as_json)
+            return "Invalid argument: index_by_name and as_json must be true or false", http_code[l]#if a unit test fails return the http code
+    #The response is json either way; as_json is kept in the url for existing clients
+    json_card = stataccess().getCardInDeckWinRates(set_abbr, archLabels, minCopies, maxCopies, index_by_name, as_json=True)
     return json_card
 
 
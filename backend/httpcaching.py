@@ -0,0 +1,60 @@
+#Conditional GET support for the stats endpoints.
+#Every stat for a set is fixed until the set is rebuilt, so a response can be identified by the set's
+#ActiveSets.last_updated value plus the request path and arguments. Clients that already hold the current
+#version get a 304 back without the stat being recomputed or read from the database.
+import functools
+import hashlib
+from datetime import datetime, timezone
+from flask import request, make_response
+from backend.compression import payloadResponse
+
+CACHE_CONTROL='public, no-cache' #Browsers/CDN may store responses, but must revalidate with the ETag before reusing them
+
+
+def versionTimestamp(version)->datetime:
+    #ActiveSets.last_updated is stored without a timezone. Treat it as UTC and drop sub-second precision,
+    #since Last-Modified and If-Modified-Since only have second resolution.
+    if isinstance(version,str):
+        version=datetime.fromisoformat(version)
+    if version.tzinfo is None:
+        version=version.replace(tzinfo=timezone.utc)
+    return version.replace(microsecond=0)
+
+def makeETag(set_abbr:str, version)->str:
+    #Full path includes the url arguments and the query string, so each distinct request gets its own tag.
+    key='{}|{}|{}'.format(set_abbr.lower(),versionTimestamp(version).isoformat(),request.full_path)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def isNotModified(etag:str, last_modified:datetime)->bool:
+    #If-None-Match takes precedence over If-Modified-Since when a client sends both (RFC 9110 13.2.2).
+    #Weak comparison, since compressed responses carry the weak form of the tag.
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since is not None:
+        return last_modified<=request.if_modified_since
+    return False
+
+def conditionalOnSetVersion(version_of):
+    #Decorator factory for views that take a set_abbr url argument.
+    #version_of(set_abbr) should return the set's ActiveSets.last_updated (or None if unknown, which disables the headers).
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            set_abbr=kwargs.get('set_abbr')
+            version=version_of(set_abbr) if set_abbr else None
+            if version is None:
+                return view(*args,**kwargs)
+            etag=makeETag(set_abbr,version)
+            last_modified=versionTimestamp(version)
+            if isNotModified(etag,last_modified):
+                response=make_response('',304)
+            else:
+                response=payloadResponse(view(*args,**kwargs))
+                if response.status_code!=200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified=last_modified
+            response.headers['Cache-Control']=CACHE_CONTROL
+            return response
+        return wrapper
+    return decorator
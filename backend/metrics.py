@@ -0,0 +1,149 @@
+#Request and query instrumentation, exported in Prometheus text format on /metrics.
+#   api_request_duration_seconds: latency histogram per route, method and status
+#   stat_function_duration_seconds: time spent in each stat function (cache misses only, hits never reach it)
+#   stat_sql_duration_seconds: time per SQL statement, attributed to the stat function that ran it
+#   stat_sql_rows_total: rows read into DataFrames per stat function
+#   stat_json_bytes_total: size of the json each stat function serialized
+#Metrics are kept per process, so with several gunicorn workers each scrape sees the worker that answered it.
+#Only the standard library is imported here, so instrumenting the app doesn't slow down startup.
+import contextvars
+import functools
+import threading
+import time
+
+LATENCY_BUCKETS=(.001,.0025,.005,.01,.025,.05,.1,.25,.5,1,2.5,5,10)
+
+_lock=threading.Lock()
+_current_function=contextvars.ContextVar('stat_function',default=None) #Innermost stat function running in this context
+
+
+class Histogram:
+    def __init__(self, name:str, help_text:str, label_names:tuple, buckets=LATENCY_BUCKETS):
+        self.name=name
+        self.help_text=help_text
+        self.label_names=label_names
+        self.buckets=buckets
+        self._series={} #label values -> [count per bucket..., count, sum]
+
+    def observe(self, labels:tuple, value:float):
+        with _lock:
+            series=self._series.get(labels)
+            if series is None:
+                series=self._series[labels]=[0]*(len(self.buckets)+2)
+            for i,bound in enumerate(self.buckets):
+                if value<=bound:
+                    series[i]+=1
+            series[-2]+=1
+            series[-1]+=value
+
+    def render(self)->list:
+        lines=['# HELP {} {}'.format(self.name,self.help_text),'# TYPE {} histogram'.format(self.name)]
+        with _lock:
+            series=sorted((labels,list(values)) for labels,values in self._series.items())
+        for labels,values in series:
+            for bound,count in zip(self.buckets,values):
+                lines.append('{}_bucket{} {}'.format(self.name,formatLabels(self.label_names,labels,le=formatValue(bound)),count))
+            lines.append('{}_bucket{} {}'.format(self.name,formatLabels(self.label_names,labels,le='+Inf'),values[-2]))
+            lines.append('{}_count{} {}'.format(self.name,formatLabels(self.label_names,labels),values[-2]))
+            lines.append('{}_sum{} {}'.format(self.name,formatLabels(self.label_names,labels),formatValue(values[-1])))
+        return lines
+
+
+class Counter:
+    def __init__(self, name:str, help_text:str, label_names:tuple):
+        self.name=name
+        self.help_text=help_text
+        self.label_names=label_names
+        self._series={}
+
+    def inc(self, labels:tuple, amount=1):
+        with _lock:
+            self._series[labels]=self._series.get(labels,0)+amount
+
+    def render(self)->list:
+        lines=['# HELP {} {}'.format(self.name,self.help_text),'# TYPE {} counter'.format(self.name)]
+        with _lock:
+            series=sorted(self._series.items())
+        for labels,value in series:
+            lines.append('{}{} {}'.format(self.name,formatLabels(self.label_names,labels),formatValue(value)))
+        return lines
+
+
+def formatLabels(label_names:tuple, labels:tuple, **extra)->str:
+    pairs=list(zip(label_names,labels))+list(extra.items())
+    if not pairs: return ''
+    escaped=(str(value).replace('\\','\\\\').replace('"','\\"').replace('\n','\\n') for _,value in pairs)
+    return '{'+','.join('{}="{}"'.format(name,value) for (name,_),value in zip(pairs,escaped))+'}'
+
+def formatValue(value)->str:
+    return repr(float(value)) if isinstance(value,float) else str(value)
+
+
+request_duration=Histogram('api_request_duration_seconds','Time to answer API requests.',('route','method','status'))
+function_duration=Histogram('stat_function_duration_seconds','Time spent computing stat function results.',('function',))
+sql_duration=Histogram('stat_sql_duration_seconds','Time per SQL statement, by the stat function that ran it.',('function',))
+sql_rows=Counter('stat_sql_rows_total','Rows read from query results, by stat function.',('function',))
+json_bytes=Counter('stat_json_bytes_total','Bytes of json serialized by stat functions.',('function',))
+METRICS=[request_duration,function_duration,sql_duration,sql_rows,json_bytes]
+
+
+def render()->str:
+    lines=[]
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines)+'\n'
+
+def currentFunction()->str:
+    return _current_function.get() or 'none'
+
+def statFunction(func):
+    #Decorator for stat functions. Queries run inside the call are attributed to it (or to a stat function it calls),
+    #and the size of a json result is counted. Put it under @cached so cache hits aren't timed.
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token=_current_function.set(func.__name__)
+        start=time.perf_counter()
+        try:
+            result=func(*args,**kwargs)
+        finally:
+            function_duration.observe((func.__name__,),time.perf_counter()-start)
+            _current_function.reset(token)
+        if type(result) is str: #Built by to_json/json.dumps here. Stored snapshots come back as Payloads and aren't counted.
+            json_bytes.inc((func.__name__,),len(result))
+        return result
+    return wrapper
+
+def recordRows(count:int):
+    sql_rows.inc((currentFunction(),),count)
+
+def attachSQLTiming(engine, function_name=None):
+    #Times every statement run through engine. function_name, if given, is called for the label instead of reading
+    #the context variable (the async engine runs statements on the event loop, outside the caller's context).
+    from sqlalchemy import event
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start',[]).append(time.perf_counter())
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed=time.perf_counter()-conn.info['query_start'].pop()
+        sql_duration.observe(((function_name or currentFunction)(),),elapsed)
+    event.listen(engine,'before_cursor_execute',before)
+    event.listen(engine,'after_cursor_execute',after)
+
+def instrumentApp(app):
+    #Records the latency of every request on app, labelled by its url rule (e.g. /cardInfo/<set_abbr>) rather than the raw path.
+    from flask import g, request
+    def start():
+        g.metrics_start=time.perf_counter()
+    def finish(response):
+        observeRequest(response.status_code)
+        return response
+    def teardown(exception):
+        if exception is not None: #after_request handlers don't run when the view raised
+            observeRequest(500)
+    def observeRequest(status:int):
+        started=g.pop('metrics_start',None)
+        if started is None: return
+        route=request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_duration.observe((route,request.method,str(status)),time.perf_counter()-started)
+    app.before_request(start)
+    app.after_request(finish)
+    app.teardown_request(teardown)
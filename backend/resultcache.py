@@ -0,0 +1,157 @@
+#Memoization for the stat access functions.
+#Stats for a set only change when table_build rebuilds that set, so results are cached by function arguments
+#together with the set's ActiveSets.last_updated value. When a rebuild bumps that value, every cached result
+#for the set is dropped the next time the set is requested.
+#Total cache size is bounded in bytes and the least recently used results are evicted first.
+import copy
+import functools
+import inspect
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+import pandas as pd
+from backend.compression import Payload, STORED_LEVELS
+
+DEFAULT_MAX_BYTES=128*2**20
+
+
+def resultSize(value)->int:
+    #Approximate memory footprint of a cached result in bytes. Payloads include the compressed encodings they carry.
+    if isinstance(value,Payload):
+        return sys.getsizeof(value)+value.compressedSize()
+    if isinstance(value,(str,bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value,(pd.DataFrame,pd.Series)):
+        usage=value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage,pd.Series) else int(usage)
+    try:
+        return len(pickle.dumps(value))
+    except Exception:
+        return sys.getsizeof(value)
+
+def copyResult(value):
+    #Callers are free to modify what they get back, so mutable results are copied on the way out of the cache.
+    if isinstance(value,(str,bytes,int,float,bool)) or value is None:
+        return value
+    if isinstance(value,(pd.DataFrame,pd.Series)):
+        return value.copy()
+    return copy.deepcopy(value)
+
+
+class ResultCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes=max_bytes
+        self._lock=threading.Lock()
+        self._entries=OrderedDict() #key -> (value, size). Ordered from least to most recently used.
+        self._set_versions={} #set_abbr -> version of the results currently cached for that set
+        self.current_bytes=0
+        self.hits=0
+        self.misses=0
+        self.evictions=0
+        self.invalidations=0
+
+    def memoize(self, version_of):
+        #Decorator factory. version_of(set_abbr) should return the set's current build timestamp.
+        #The decorated function must take set_abbr as an argument.
+        def decorator(func):
+            signature=inspect.signature(func)
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                bound=signature.bind(*args,**kwargs)
+                bound.apply_defaults()
+                arguments=dict(bound.arguments)
+                set_abbr=str(arguments['set_abbr']).lower()
+                arguments['set_abbr']=set_abbr
+                try:
+                    key=(func.__name__,set_abbr,tuple(arguments.items()))
+                    hash(key)
+                except TypeError: #Unhashable argument, so there is nothing sensible to key on.
+                    return func(*args,**kwargs)
+                version=version_of(set_abbr)
+                found,value=self.get(key,set_abbr,version)
+                if found:
+                    return copyResult(value)
+                value=self.put(key,set_abbr,version,func(*args,**kwargs))
+                return copyResult(value)
+            wrapper.uncached=func
+            return wrapper
+        return decorator
+
+    def get(self, key, set_abbr:str, version):
+        with self._lock:
+            self._checkVersion(set_abbr,version)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits+=1
+                return True,self._entries[key][0]
+            self.misses+=1
+            return False,None
+
+    def put(self, key, set_abbr:str, version, value):
+        #Returns the value as stored. Json strings are stored as Payloads so their compressed forms are kept with them.
+        #A kept Payload is compressed at STORED_LEVELS, and its encodings count toward max_bytes as they are attached.
+        if type(value) is str:
+            value=Payload(value)
+        size=resultSize(value)
+        if size>self.max_bytes: return value #Would evict everything else and still not fit
+        if isinstance(value,Payload):
+            value.levels=STORED_LEVELS
+            value.on_encoded=functools.partial(self._grow,key,value)
+        with self._lock:
+            self._checkVersion(set_abbr,version)
+            if key in self._entries:
+                self.current_bytes-=self._entries.pop(key)[1]
+            self._entries[key]=(value,size)
+            self.current_bytes+=size
+            self._evict()
+        return value
+
+    def _grow(self, key, value, added:int):
+        #A cached Payload got a new encoding. Counts it against max_bytes, unless the entry was replaced or evicted meanwhile.
+        with self._lock:
+            entry=self._entries.get(key)
+            if entry is None or entry[0] is not value:
+                return
+            self._entries[key]=(value,entry[1]+added)
+            self.current_bytes+=added
+            self._evict()
+
+    def _evict(self):
+        #Must be called while holding the lock.
+        while self.current_bytes>self.max_bytes:
+            _,(_,evicted_size)=self._entries.popitem(last=False)
+            self.current_bytes-=evicted_size
+            self.evictions+=1
+
+    def clear(self, set_abbr=None):
+        #Drop every cached result, or only those for one set.
+        with self._lock:
+            if set_abbr is None:
+                self._entries.clear()
+                self._set_versions.clear()
+                self.current_bytes=0
+            else:
+                self._dropSet(set_abbr.lower())
+                self._set_versions.pop(set_abbr.lower(),None)
+
+    def stats(self)->dict:
+        with self._lock:
+            lookups=self.hits+self.misses
+            return {'hits':self.hits,'misses':self.misses,'hit_rate':self.hits/lookups if lookups>0 else 0,
+                    'evictions':self.evictions,'invalidations':self.invalidations,
+                    'entries':len(self._entries),'bytes':self.current_bytes,'max_bytes':self.max_bytes}
+
+    def _checkVersion(self, set_abbr:str, version):
+        #Must be called while holding the lock.
+        if set_abbr not in self._set_versions:
+            self._set_versions[set_abbr]=version
+        elif self._set_versions[set_abbr]!=version:
+            self._dropSet(set_abbr)
+            self._set_versions[set_abbr]=version
+
+    def _dropSet(self, set_abbr:str):
+        stale_keys=[key for key in self._entries if key[1]==set_abbr]
+        for key in stale_keys:
+            self.current_bytes-=self._entries.pop(key)[1]
+        self.invalidations+=len(stale_keys)
@@ -0,0 +1,91 @@
+#Process-wide cache of reflected table schemas for the stats database.
+#Reflecting the whole database takes a long time (every set has ~10 tables and Decklists alone has 300+ columns),
+#so each set's tables are reflected once and handed out from memory until the set gets rebuilt.
+#A rebuild is detected by a change in that set's ActiveSets.last_updated value.
+import threading
+import time
+from sqlalchemy import MetaData, Table, inspect, select
+
+VERSION_CHECK_INTERVAL=30 #Minimum number of seconds between checks of ActiveSets.last_updated for a given set
+
+
+class SchemaRegistry:
+    #Hands out cached Table objects by (set_abbr, table kind), e.g. getTable('ltr','CardInfo') for the ltrCardInfo table.
+    #One registry should be shared by everything in the process that uses the same engine.
+    #engine can also be a function returning the engine, so that it isn't created until a table is first needed.
+    def __init__(self, engine, check_interval=VERSION_CHECK_INTERVAL):
+        self._engine=engine
+        self.check_interval=check_interval
+        self._lock=threading.RLock()
+        self._sets={} #set_abbr -> {'tables':{kind:Table},'version':last_updated,'checked':time of last version check}
+        self._active_sets_table=None
+
+    @property
+    def engine(self):
+        return self._engine() if callable(self._engine) else self._engine
+
+    def activeSetsTable(self)->Table:
+        #The ActiveSets table is shared by all sets and its structure never changes, so it is only reflected once.
+        if self._active_sets_table is None:
+            with self._lock:
+                if self._active_sets_table is None:
+                    self._active_sets_table=Table('ActiveSets',MetaData(),autoload_with=self.engine)
+        return self._active_sets_table
+
+    def getTable(self, set_abbr:str, kind:str)->Table:
+        #Returns the reflected table set_abbr+kind. Raises KeyError if that table doesn't exist.
+        set_abbr=set_abbr.lower()
+        entry=self._currentEntry(set_abbr)
+        if kind not in entry['tables']:
+            #The table may have been created since the set was last reflected (e.g. a partial build), so look once more.
+            entry=self._currentEntry(set_abbr,force=True)
+        return entry['tables'][kind]
+
+    def setVersion(self, set_abbr:str):
+        #Returns ActiveSets.last_updated for the given set, or None if the set isn't listed in ActiveSets.
+        #Value is at most check_interval seconds old.
+        return self._currentEntry(set_abbr.lower())['version']
+
+    def invalidate(self, set_abbr=None):
+        #Forget the reflected tables for one set, or for all sets if set_abbr is None.
+        with self._lock:
+            if set_abbr is None:
+                self._sets.clear()
+            else:
+                self._sets.pop(set_abbr.lower(),None)
+
+    def _currentEntry(self, set_abbr:str, force=False)->dict:
+        entry=self._sets.get(set_abbr)
+        now=time.monotonic()
+        if entry is not None and not force and now-entry['checked']<self.check_interval:
+            return entry
+        with self._lock:
+            entry=self._sets.get(set_abbr)
+            if entry is not None and not force and now-entry['checked']<self.check_interval:
+                return entry #Another thread refreshed it while we were waiting for the lock
+            version=self._readVersion(set_abbr)
+            if entry is None or force or entry['version']!=version:
+                entry={'tables':self._reflectSet(set_abbr),'version':version,'checked':now}
+            else:
+                entry=dict(entry,checked=now)
+            self._sets[set_abbr]=entry
+            return entry
+
+    def _readVersion(self, set_abbr:str):
+        try:
+            sets_table=self.activeSetsTable()
+        except Exception: #No ActiveSets table (e.g. an old local database). Treat the set as never rebuilt.
+            return None
+        s=select(sets_table.c.last_updated).where(sets_table.c.set_abbr==set_abbr)
+        with self.engine.connect() as conn:
+            return conn.execute(s).scalar()
+
+    def _reflectSet(self, set_abbr:str)->dict:
+        #Reflects only the tables belonging to this set. Their names are set_abbr followed by a capitalized kind, e.g. 'ltrDecklists'.
+        prefix_length=len(set_abbr)
+        table_names=[name for name in inspect(self.engine).get_table_names()
+                     if name.startswith(set_abbr) and name[prefix_length:prefix_length+1].isupper()]
+        metadata=MetaData()
+        if table_names:
+            metadata.reflect(bind=self.engine,only=table_names)
+        return {name[prefix_length:]:metadata.tables[name] for name in table_names}
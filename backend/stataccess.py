@@ -2,66 +2,203 @@
 
 
 #TODO: 
+import contextvars
+import json
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
-from sqlalchemy import MetaData, select, create_engine, func
-from backend.statfunctions import colorInt,archLabelToID, archIDtoLabel, meanDecklist, cardInfo
+from sqlalchemy import select, func
+from backend.statfunctions import colorInt,archLabelToID, archIDtoLabel, meanPicksFromPacks, meanPicksByCardID, makeCardTableDF
+from backend.statfunctions import turnHistograms, turnMetrics, turnRecordTable
+from backend.schemaregistry import SchemaRegistry
+from backend.resultcache import ResultCache, DEFAULT_MAX_BYTES
+from backend.compression import Payload, STORED_LEVELS
+from backend.statstore import StatStore, STORE_TABLES
+from backend import database, metrics
 import os
-from dotenv import load_dotenv
-load_dotenv()
-db_url=os.getenv("DATABASE_URL")
-engine=create_engine(url=db_url)  
+#The engine (pool shared with endpoints.py, configured in database.py) is created by the first query, not on import
+schema=SchemaRegistry(database.getEngine) #Reflected tables are shared by every function here instead of reflecting the database per call
+stat_cache=ResultCache(max_bytes=int(os.getenv("STAT_CACHE_MAX_BYTES",DEFAULT_MAX_BYTES)))
+_memoize=stat_cache.memoize(schema.setVersion)
+def cached(func):
+    #Results are reused until the set is rebuilt (ActiveSets.last_updated changes).
+    #Cache misses are timed, and their queries attributed to the function, for /metrics.
+    return _memoize(metrics.statFunction(func))
+STAT_STORE_ENABLED=os.getenv("STAT_STORE_ENABLED","true").lower() in ('1','true','yes')
+
+_batch_conn=contextvars.ContextVar('batch_conn',default=None) #Connection shared by every query inside batch()
+_batch_frames=contextvars.ContextVar('batch_frames',default=None) #Query results already read inside batch(), keyed by compiled SQL
+
+def connect():
+    #Returns the connection for the current batch if inside batch(), otherwise a new connection from the engine's pool.
+    conn=_batch_conn.get()
+    if conn is not None: return conn
+    return database.connect()
+def release(conn):
+    #Counterpart to connect(). The batch connection stays open until the batch is finished.
+    if conn is not _batch_conn.get():
+        conn.close()
+def readSQL(query, conn, index_col=None)->pd.DataFrame:
+    #pd.read_sql_query, except that inside batch() identical queries are only run once.
+    #e.g. getRecordByLength and getArchAvgSpeed both read the same ArchGameStats rows for an archetype.
+    frames=_batch_frames.get()
+    if frames is None:
+        return _readFrame(query,conn,index_col)
+    compiled=query.compile(dialect=conn.dialect)
+    key=(str(compiled),repr(sorted(compiled.params.items())),repr(index_col))
+    if key not in frames:
+        frames[key]=_readFrame(query,conn,index_col)
+    return frames[key].copy()
+def _readFrame(query, conn, index_col=None)->pd.DataFrame:
+    if isinstance(conn,database.AsyncBridgeConnection):
+        #Rows come back from the async driver, so build the frame the same way read_sql_query does.
+        result=conn.execute(query)
+        df=pd.DataFrame.from_records(result.fetchall(),columns=list(result.keys()),coerce_float=True)
+        df=df.set_index(index_col) if index_col is not None else df
+    else:
+        df=pd.read_sql_query(query,conn,index_col=index_col)
+    metrics.recordRows(len(df))
+    return df
+@contextmanager
+def batch():
+    #Runs every stat function called inside it on one connection, sharing query results between them.
+    #Nested use joins the outer batch.
+    if _batch_conn.get() is not None:
+        yield
+        return
+    conn=database.connect()
+    conn_token=_batch_conn.set(conn)
+    frames_token=_batch_frames.set({})
+    try:
+        yield
+    finally:
+        _batch_frames.reset(frames_token)
+        _batch_conn.reset(conn_token)
+        conn.close()
+
+def getStatCacheInfo():
+    #Returns hit/miss/eviction counters and current size of the stat result cache. Used for sizing STAT_CACHE_MAX_BYTES.
+    return stat_cache.stats()
+@metrics.statFunction
+def readStoreTables(set_abbr:str)->dict:
+    #Loads the tables kept in memory by stat_store. Raises KeyError if the set doesn't have all of them.
+    tables={kind:schema.getTable(set_abbr,kind) for kind in STORE_TABLES}
+    try:
+        pick_table=schema.getTable(set_abbr,'CardPickStats')
+    except KeyError:
+        pick_table=None
+    conn = connect()
+    try:
+        frames={kind:readSQL(select(table),conn) for kind,table in tables.items()}
+        if pick_table is not None:
+            s=select(pick_table.c.card_id,pick_table.c.mean_pick).where(pick_table.c.pack_number==-1)
+            frames['CardPickStats']=readSQL(s,conn)
+    finally:
+        release(conn)
+    return frames
+def getStatStoreInfo():
+    #Returns the memory held by the in-memory stat store for each loaded set, and how often sets have been loaded.
+    return stat_store.stats()
+def preloadStatStores()->dict:
+    #Loads every active set into stat_store ahead of the first request. gunicorn.conf.py calls this in the master process
+    #before forking, so the workers start warm and share the arrays. Returns {set_abbr: True if the set's tables were loaded}.
+    return {set_abbr:stat_store.get(set_abbr) is not None for set_abbr in activeSetAbbreviations()}
+def getReadiness()->dict:
+    #Whether this worker already has every active set in stat_store at its current version.
+    sets={set_abbr:stat_store.isLoaded(set_abbr) for set_abbr in activeSetAbbreviations()}
+    return {'ready':all(sets.values()),'sets':sets}
+def activeSetAbbreviations()->list:
+    conn = connect()
+    sets_table=schema.activeSetsTable()
+    df=readSQL(select(sets_table.c.set_abbr),conn)
+    release(conn)
+    return [set_abbr.lower() for set_abbr in df['set_abbr']]
+#Small aggregate tables held in memory per set (see statstore.py), reloaded when the set is rebuilt.
+#Functions check it first and only query the database if it's off (STAT_STORE_ENABLED=false) or the set isn't in it.
+stat_store=StatStore(schema.setVersion,readStoreTables,enabled=STAT_STORE_ENABLED)
 
 #Currently Useful Functions:
+@metrics.statFunction
 def getActiveSets():
     #Returns a list of all sets that are currently active in the database.
     #Includes the set abbreviation, full title, release date, and time of last update.
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    sets_table=metadata.tables['ActiveSets']
-    output=pd.read_sql_table(sets_table.name,conn).to_json()
-    conn.close()
+    conn = connect()
+    sets_table=schema.activeSetsTable()
+    output=readSQL(select(sets_table),conn).to_json()
+    release(conn)
     return output
+@metrics.statFunction
 def getMostRecentSet():
     #Returns the abbreviation and name for the most recent set in the database by release date.
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    sets_table=metadata.tables['ActiveSets']
+    conn = connect()
+    sets_table=schema.activeSetsTable()
     s=select(sets_table.c.set_abbr,sets_table.c.set_name).order_by(sets_table.c.set_release_date.desc()).limit(1)
-    output=pd.read_sql_query(s,conn).to_json()
-    conn.close()
+    output=readSQL(s,conn).to_json()
+    release(conn)
     return output
+@cached
 def getCardInfo(set_abbr:str,as_json=True):
     #Returns the full card info table for the given set. Defaults to returning a pandas dataframe, with an option for json instead.
     set_abbr=set_abbr.lower()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    card_table=metadata.tables[set_abbr+'CardInfo']
+    conn = connect()
+    card_table=schema.getTable(set_abbr,'CardInfo')
     s=select(card_table)
-    df=pd.read_sql_query(s,conn,index_col='id')
-    conn.close()
+    df=readSQL(s,conn,index_col='id')
+    release(conn)
     if as_json:return df.to_json()
     else: return df
+@cached
+def getCardsWithColor(set_abbr:str,color:str,include_multicolor=True, include_lands=False, as_string=True):
+    #Returns {'response': list of all cards matching the given color} as json. Raises ValueError if color isn't one of WUBRGC.
+    #If as_string=True gives their names, otherwise gives their integer index in cardInfo
+    #Color is determined (in setinfo.py) by mana cost. Could be misleading on some cards like DFCs, adventures, alternate costs, etc.
+    #If include_multicolor, get all cards containing that color. Otherwise get cards that are exactly that color.
+    #Lands are all marked as colorless. If color='C' and include_lands=True, lands will be included with the colorless cards.
+    set_abbr=set_abbr.lower()
+    color=color.upper()
+    carddf=getCardInfo(set_abbr,as_json=False)
+    colors=['W','U','R','B','G','C']
+    if color not in colors:
+        raise ValueError("Invalid color {}, expected one of {}".format(color,''.join(colors)))
+    c=colors.index(color)
+    if c==5: #colorless case
+        colorfilter=carddf['color']==0
+        if not include_lands:
+            colorfilter=colorfilter & pd.Series(['L' not in card_type for card_type in carddf['card_type']],index=carddf.index)
+    else:
+        cnum=2**c
+        if include_multicolor:
+            colorfilter=(carddf['color']//cnum)%2==1
+        else:
+            colorfilter=carddf['color']==cnum
+    if as_string:
+        cards=(carddf.loc[colorfilter])['name'].tolist()
+    else:
+        cards=carddf.loc[colorfilter].index.to_list()
+    return json.dumps({'response':cards})
+@cached
 def getMetaDistribution(set_abbr:str, min_rank=0,max_rank=6):
     #Gets number of drafts for each set of main colors. Can be filtered by rank to show the metagame at user's level.
     set_abbr=set_abbr.lower()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    #draft_table=metadata.tables[set_abbr+"DraftInfo"]
-    deck_table=metadata.tables[set_abbr+"Decklists"]
-    s=select(deck_table.c.main_colors,func.count(1).label('drafts')).group_by(deck_table.c.main_colors)
+    conn = connect()
+    #draft_table=schema.getTable(set_abbr,'DraftInfo')
+    deck_table=decklistCube(set_abbr) #Deck counts per cell, so this only sums a few hundred rows
+    if deck_table is not None:
+        s=select(deck_table.c.main_colors,func.sum(deck_table.c.num_decks).label('drafts')).group_by(deck_table.c.main_colors)
+    else:
+        deck_table=schema.getTable(set_abbr,'Decklists')
+        s=select(deck_table.c.main_colors,func.count(1).label('drafts')).group_by(deck_table.c.main_colors)
     if min_rank!=0 or max_rank!=6: 
         s=s.where(
         deck_table.c.rank>=min_rank,deck_table.c.rank<=max_rank)
-    df=pd.read_sql_query(s,conn)
+    df=readSQL(s,conn)
+    release(conn)
     total_drafts=df['drafts'].sum()
     df.set_index('main_colors',inplace=True)
     df['meta_share']=df['drafts']/total_drafts
     return df.to_json()
 
+@cached
 def getArchetypeLabels(set_abbr:str,main_colors='ALL'):
     #Returns the archetypes that exist for the given set
     #If WU was split into 3 groups, the list will contain 'WU' and 'WU1', 'WU2', and 'WU3'.
@@ -69,32 +206,33 @@ def getArchetypeLabels(set_abbr:str,main_colors='ALL'):
     #Can be restricted to only one set of main colors by setting main_colors to be the corresponding WUBRG string.
     set_abbr=set_abbr.lower()
     main_colors=main_colors.upper()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)    
-    arch_table=metadata.tables[set_abbr+'Archetypes']
+    conn = connect()
+    arch_table=schema.getTable(set_abbr,'Archetypes')
     s=select(arch_table.c.id,arch_table.c.arch_label)
     if main_colors!='ALL':
         color_number=colorInt(main_colors)
         s=s.where(arch_table.c.id%32==color_number)
-    resultDF=pd.read_sql_query(s,conn,index_col='id')
-    conn.close()
+    resultDF=readSQL(s,conn,index_col='id')
+    release(conn)
     return resultDF.to_json()
 
+@cached
 def getArchAvgCurve(set_abbr:str, arch_label:str):
     #returns mean values of lands and each n drop for given archetype
     set_abbr=set_abbr.lower()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    arch_stats_table=metadata.tables[set_abbr+'ArchGameStats']
-    #Query all rows of the ArchGameStats table corresponding to given deck
     arch_id=archLabelToID(arch_label)
-    q=select(arch_stats_table).where(arch_stats_table.c.arch_id==arch_id)
-    df=pd.read_sql_query(q,conn) 
-    #Remove first 3 columns from that table, leaving only game count and number of cards per mana value. Add up all the columns.
-    dfTotal=df.iloc[0:,3:].sum() 
-    conn.close()
+    store=stat_store.get(set_abbr)
+    if store is not None:
+        dfTotal=store.curveTotals(arch_id)
+    else:
+        conn = connect()
+        arch_stats_table=schema.getTable(set_abbr,'ArchGameStats')
+        #Query all rows of the ArchGameStats table corresponding to given deck
+        q=select(arch_stats_table).where(arch_stats_table.c.arch_id==arch_id)
+        df=readSQL(q,conn) 
+        #Remove first 3 columns from that table, leaving only game count and number of cards per mana value. Add up all the columns.
+        dfTotal=df.iloc[0:,3:].sum() 
+        release(conn)
     if dfTotal['game_count']!=0: #Avoiding divide by 0.
         n=dfTotal['game_count']
         avgs=dfTotal.iloc[1:]/n
@@ -102,102 +240,169 @@ def getArchAvgCurve(set_abbr:str, arch_label:str):
     else: #Should be all 0's in this case.
         return dfTotal.iloc[1:].to_json()
     
+@cached
 def makeCardTable(set_abbr:str, arch_label='ALL', as_json=True):
     #Returns a table of all cards in the given set, with descriptive attributes and stats for each card.
+    #The json version is built ahead of time for every archetype (CardTableSnapshots), so it's normally a single lookup.
     set_abbr=set_abbr.lower()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    card_table=metadata.tables[set_abbr+'CardInfo']
-    #First make all relevant queries before any calculations/manipulations.
-    s1=select(card_table.c.id,card_table.c.name,card_table.c.color,
-             card_table.c.rarity)
-    df=pd.read_sql_query(s1,conn,index_col='id')
-    card_stats_table=metadata.tables[set_abbr+'CardGameStats']
-    s2=select(card_stats_table.c.id,func.sum(card_stats_table.c.win_count).label('wins'),func.sum(card_stats_table.c.game_count).label('games_played'),).group_by(card_stats_table.c.id)
     arch_id=archLabelToID(arch_label)
-    if arch_label!='ALL':
-        s2=s2.where(card_stats_table.c.arch_id==arch_id)
-    df2=pd.read_sql_query(s2,conn,index_col='id')
-    pack_table=metadata.tables[set_abbr+'DraftPacks']
-    s3=select(pack_table)
-    pack_df=pd.read_sql_query(s3,conn)
-    derived_stats_table=metadata.tables[set_abbr+'CardDerivedStats']
-    s4=select(derived_stats_table.c.card_id,derived_stats_table.c.games_in_hand,derived_stats_table.c.wins_in_hand,
-              derived_stats_table.c.adj_gihwr,derived_stats_table.c.adjusted_iwd,
-              derived_stats_table.c.inclusion_impact).where(derived_stats_table.c.arch_id==arch_id)
-    derived_stats_df=pd.read_sql_query(s4,conn,index_col='card_id')
-    conn.close()
-    #Compute GPWR and attach to output
-    df['GPWR']=df2['wins']/(df2['games_played'].mask(df2['games_played']==0,1))
-    df['games_played']=df2['games_played']
-    df['GPWR']=df['GPWR'].mask(df['GPWR'].isna(),0) #Replace NaN with 0
-    #Compute average pick and attach to output
-    pack_df=pack_df.groupby('pick_number').sum()
-    pack_df.drop('pack_number',axis=1,inplace=True) 
-    new_col_names=[]
-    for col in pack_df.columns:
-        if col[:10]=='pack_card_':
-            new_col_names.append(col[10:])
-        else:
-            new_col_names.append(col)
-    pack_df.columns=new_col_names
-    pack_df=pack_df.T
-    mean_pick_df=pack_df.sum(axis=1)/pack_df.max(axis=1)
-    mean_pick_df.index.name='name'
-    mean_pick_df.sort_index(inplace=True)
-    df.sort_values('name',inplace=True) #Sorting by name so that the mean pick order matches the card order.)
-    df['mean_pick']=mean_pick_df.values
-    #Compute games in hand win rate and attach to output
-    derived_stats_df['GIHWR']=derived_stats_df['wins_in_hand']/(derived_stats_df['games_in_hand'].mask(derived_stats_df['games_in_hand']==0,1))
-    df['games_in_hand']=derived_stats_df['games_in_hand']
-    df['GIHWR']=derived_stats_df['GIHWR']
-    df['adjusted_IWD']=derived_stats_df['adjusted_iwd']
-    df['inclusion_impact']=derived_stats_df['inclusion_impact']
-    df['adjusted_GIHWR']=derived_stats_df['adj_gihwr']
+    if as_json:
+        snapshot=getCardTableSnapshot(set_abbr,arch_id)
+        if snapshot is not None: return snapshot
+    store=stat_store.get(set_abbr)
+    if store is not None and store.mean_picks is not None: #Sets built before CardPickStats still read DraftPacks below
+        df=store.cardInfo(['name','color','rarity'])
+        df2=store.cardGameTotals(arch_id) #-1 (ALL) sums every archetype
+        mean_picks=store.meanPicks()
+        derived_stats_df=store.cardDerivedStats(arch_id)
+    else:
+        conn = connect()
+        card_table=schema.getTable(set_abbr,'CardInfo')
+        #First make all relevant queries before any calculations/manipulations.
+        s1=select(card_table.c.id,card_table.c.name,card_table.c.color,
+                 card_table.c.rarity)
+        df=readSQL(s1,conn,index_col='id')
+        card_stats_table=schema.getTable(set_abbr,'CardGameStats')
+        s2=select(card_stats_table.c.id,func.sum(card_stats_table.c.win_count).label('wins'),func.sum(card_stats_table.c.game_count).label('games_played'),).group_by(card_stats_table.c.id)
+        if arch_label!='ALL':
+            s2=s2.where(card_stats_table.c.arch_id==arch_id)
+        df2=readSQL(s2,conn,index_col='id')
+        mean_picks=getMeanPicks(set_abbr,df,conn)
+        derived_stats_table=schema.getTable(set_abbr,'CardDerivedStats')
+        s4=select(derived_stats_table.c.card_id,derived_stats_table.c.games_in_hand,derived_stats_table.c.wins_in_hand,
+                  derived_stats_table.c.adj_gihwr,derived_stats_table.c.adjusted_iwd,
+                  derived_stats_table.c.inclusion_impact).where(derived_stats_table.c.arch_id==arch_id)
+        derived_stats_df=readSQL(s4,conn,index_col='card_id')
+        release(conn)
+    df=makeCardTableDF(df,df2,mean_picks,derived_stats_df)
+    if as_json: return df.to_json()
+    else: return df
+def getMeanPicks(set_abbr:str, card_df:pd.DataFrame, conn)->pd.Series:
+    #Mean pick of every card indexed by card id, from CardPickStats.
+    #Sets built before that table existed get it from the full DraftPacks table instead.
+    try:
+        pick_table=schema.getTable(set_abbr,'CardPickStats')
+    except KeyError:
+        pack_df=readSQL(select(schema.getTable(set_abbr,'DraftPacks')),conn)
+        return meanPicksByCardID(card_df,meanPicksFromPacks(pack_df))
+    s=select(pick_table.c.card_id,pick_table.c.mean_pick).where(pick_table.c.pack_number==-1)
+    return readSQL(s,conn,index_col='card_id')['mean_pick']
+@cached
+def getCardPickStats(set_abbr:str, pack_number=-1, as_json=True):
+    #Returns mean pick, median pick, first pick rate and number of copies seen for every card, indexed by card name.
+    #pack_number=0, 1 or 2 restricts the stats to that pack. -1 covers all three.
+    set_abbr=set_abbr.lower()
+    conn = connect()
+    pick_table=schema.getTable(set_abbr,'CardPickStats')
+    card_table=schema.getTable(set_abbr,'CardInfo')
+    s=select(card_table.c.name,pick_table.c.mean_pick,pick_table.c.median_pick,pick_table.c.first_pick_rate,
+             pick_table.c.times_seen).join_from(pick_table,card_table,pick_table.c.card_id==card_table.c.id).where(
+             pick_table.c.pack_number==pack_number).order_by(card_table.c.name)
+    df=readSQL(s,conn,index_col='name')
+    release(conn)
     if as_json: return df.to_json()
     else: return df
-def makeFormatOverviewTable(set_abbr:str, as_json=True):
+def getCardTableSnapshot(set_abbr:str, arch_id:int):
+    #Returns the card table json stored by the build for this archetype, or None for sets built before snapshots existed.
+    #The build also stores compressed copies, which come back attached to the Payload so they never get recompressed.
+    try:
+        snapshot_table=schema.getTable(set_abbr,'CardTableSnapshots')
+    except KeyError:
+        return None
+    encoded_columns={'gzip':'card_table_gzip','br':'card_table_br'}
+    encoded_columns={encoding:col for encoding,col in encoded_columns.items() if col in snapshot_table.c}
+    s=select(snapshot_table.c.card_table,*[snapshot_table.c[col] for col in encoded_columns.values()]).where(snapshot_table.c.arch_id==arch_id)
+    conn = connect()
+    row=conn.execute(s).first()
+    release(conn)
+    metrics.recordRows(0 if row is None else 1)
+    if row is None: return None
+    compressed={encoding:row[i+1] for i,encoding in enumerate(encoded_columns) if row[i+1] is not None}
+    return Payload(row[0],compressed,STORED_LEVELS) #Encodings the build didn't store are worth the same settings
+@cached
+def makeFormatOverviewTable(set_abbr:str, as_json=True, include_subarchetypes=True, min_rank=0, max_rank=6):
     #Returns a table of all archetypes in the given set, with their win rates, number of games played, and number of drafts.
     #Also has a couple stats to indicate the speed of the deck.
+    #Rows are ALL and each set of main colors, followed by subarchetypes (e.g. WU1, WU2) unless include_subarchetypes=False.
+    #min_rank/max_rank restrict drafts, games and win rate to players of those ranks. Raises ValueError for a rank filter
+    #on a set without DecklistCube. Game lengths aren't recorded by rank, so with a rank filter those columns are null.
     set_abbr=set_abbr.lower()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    arch_table=metadata.tables[set_abbr+'Archetypes']
-    s1=select(arch_table.c.arch_label,arch_table.c.num_wins,arch_table.c.num_losses,arch_table.c.num_drafts).where(arch_table.c.id<32)
-    df=pd.read_sql_query(s1,conn,index_col='arch_label')
-    arch_stats_table=metadata.tables[set_abbr+'ArchGameStats']
-    s2=select(arch_stats_table.c.arch_id,arch_stats_table.c.turns,arch_stats_table.c.won,arch_stats_table.c.game_count.label('games')).where(arch_stats_table.c.arch_id<32)
-    arch_stats_df=pd.read_sql_query(s2,conn) 
-    conn.close()
-    df['average_win_length']=[0]*33
-    df['average_loss_length']=[0]*33
-    df['average_game_length']=[0]*33
-    df['aggression']=[0]*33
-    for id in range(32):
-        label=archIDtoLabel(id)
-        temp_df= arch_stats_df[arch_stats_df['arch_id']==id]
-        if temp_df.shape[0]==0: continue
-        df.at[label,'average_win_length']=(temp_df[temp_df['won']==True]['turns']*temp_df[temp_df['won']==True]['games']).sum()/(max(temp_df[temp_df['won']==True]['games'].sum(),1))
-        df.at[label,'average_game_length']=(temp_df['turns']*temp_df['games']).sum()/(max(temp_df['games'].sum(),1))
-        df.at[label,'average_loss_length']=(temp_df[temp_df['won']==False]['turns']*temp_df[temp_df['won']==False]['games']).sum()/(max(temp_df[temp_df['won']==False]['games'].sum(),1))
-        df.at[label,'aggression']=df.at[label,'average_loss_length']-df.at[label,'average_win_length']
-    df.at['ALL','average_win_length']=(df['average_win_length']*df['num_wins']).sum()/(max(df['num_wins'].sum(),1))
-    df.at['ALL','average_game_length']=(df['average_game_length']*df['num_wins']).sum()/(max(df['num_wins'].sum(),1))
-    df.at['ALL','average_loss_length']=(df['average_loss_length']*df['num_losses']).sum()/(max(df['num_losses'].sum(),1))
+    rank_filter=min_rank!=0 or max_rank!=6
+    if rank_filter:
+        cube_table=decklistCube(set_abbr)
+        if cube_table is None or 'num_games' not in cube_table.c:
+            raise ValueError("Filtering by rank needs the set to be rebuilt with DecklistCube")
+    store=stat_store.get(set_abbr)
+    if store is not None:
+        df=store.archetypeTable(['id','arch_label','num_wins','num_losses','num_drafts']).set_index('arch_label')
+        if not include_subarchetypes:
+            df=df[df['id']<32]
+        arch_stats_df=store.turnCounts()
+    else:
+        conn = connect()
+        arch_table=schema.getTable(set_abbr,'Archetypes')
+        s1=select(arch_table.c.id,arch_table.c.arch_label,arch_table.c.num_wins,arch_table.c.num_losses,arch_table.c.num_drafts)
+        if not include_subarchetypes:
+            s1=s1.where(arch_table.c.id<32)
+        df=readSQL(s1,conn,index_col='arch_label')
+        arch_stats_table=schema.getTable(set_abbr,'ArchGameStats')
+        s2=select(arch_stats_table.c.arch_id,arch_stats_table.c.turns,arch_stats_table.c.won,arch_stats_table.c.game_count.label('games'))
+        arch_stats_df=readSQL(s2,conn)
+        release(conn)
+    if rank_filter:
+        conn = connect()
+        try:
+            df=recordsByRank(cube_table,df,min_rank,max_rank,conn)
+        finally:
+            release(conn)
+    #Game length stats for every archetype at once
+    length_stats=turnMetrics(turnHistograms(arch_stats_df['turns'],arch_stats_df['won'],arch_stats_df['games'],keys=arch_stats_df['arch_id']))
+    has_lengths=df['id'].isin(length_stats.index)&(df['id']>=0) #Archetypes without games keep 0's
+    for stat in ['average_win_length','average_loss_length','average_game_length','aggression']:
+        df[stat]=df['id'].map(length_stats[stat]).where(has_lengths,0)
+    #ALL is weighted over the main color rows
+    main_df=df[df['id']<32]
+    df.at['ALL','average_win_length']=(main_df['average_win_length']*main_df['num_wins']).sum()/(max(main_df['num_wins'].sum(),1))
+    df.at['ALL','average_game_length']=(main_df['average_game_length']*main_df['num_wins']).sum()/(max(main_df['num_wins'].sum(),1))
+    df.at['ALL','average_loss_length']=(main_df['average_loss_length']*main_df['num_losses']).sum()/(max(main_df['num_losses'].sum(),1))
     df.at['ALL','aggression']=df.at['ALL','average_loss_length']-df.at['ALL','average_win_length']
-    df.at['ALL','num_drafts']=df['num_drafts'].sum()
-    df.at['ALL','num_wins']=df['num_wins'].sum()
-    df.at['ALL','num_losses']=df['num_losses'].sum()
+    df.at['ALL','num_drafts']=main_df['num_drafts'].sum()
+    df.at['ALL','num_wins']=main_df['num_wins'].sum()
+    df.at['ALL','num_losses']=main_df['num_losses'].sum()
+    if rank_filter: #The lengths would be for every rank, next to records for only some
+        df[['average_win_length','average_loss_length','average_game_length','aggression']]=np.nan
     df['num_games']=df['num_wins']+df['num_losses']
     df['win_rate']=df['num_wins']/(df['num_wins']+df['num_losses']).mask(df['num_wins']+df['num_losses']==0,1)
     output_df=df[['num_drafts','num_games','win_rate','average_win_length','average_game_length','aggression']]
     reorder=['ALL','C','W','U','B','R','G','WU','WB','WR','WG','UB','UR','UG','BR','BG','RG',
              'WUB','WUR','WUG','WBR','WBG','WRG','UBR','UBG','URG','BRG','WUBR','WUBG','WURG','WBRG','UBRG','WUBRG']
+    color_order={colorInt(label):position for position,label in enumerate(reorder[2:])}
+    subarchetypes=df[df['id']>=32].copy()
+    subarchetypes['position']=subarchetypes['id']%32
+    subarchetypes['position']=subarchetypes['position'].map(color_order)*10+subarchetypes['id']//32
+    reorder=[label for label in reorder if label in df.index]+subarchetypes.sort_values('position').index.tolist()
     output_df=output_df.loc[reorder]
     if as_json: return output_df.to_json()
     else: return df
+def recordsByRank(cube_table, df:pd.DataFrame, min_rank:int, max_rank:int, conn)->pd.DataFrame:
+    #Replaces num_drafts, num_wins and num_losses in df (Archetypes rows indexed by arch_label) with counts for decks
+    #of players between min_rank and max_rank, summed from the set's DecklistCube table.
+    s=select(cube_table.c.arch_id,cube_table.c.main_colors,func.sum(cube_table.c.num_decks).label('num_drafts'),
+             func.sum(cube_table.c.wins*cube_table.c.num_decks).label('num_wins'),func.sum(cube_table.c.num_games).label('num_games')
+             ).where(cube_table.c.rank>=min_rank,cube_table.c.rank<=max_rank).group_by(cube_table.c.arch_id,cube_table.c.main_colors)
+    cell_df=readSQL(s,conn)
+    cell_df['num_losses']=cell_df['num_games']-cell_df['num_wins']
+    columns=['num_drafts','num_wins','num_losses']
+    by_arch=cell_df.groupby('arch_id')[columns].sum()
+    by_colors=cell_df.groupby('main_colors')[columns].sum()
+    df=df.copy()
+    for column in columns:
+        #Main color rows count every deck with those main colors, subarchetype rows only their own decks
+        counts=df.index.to_series().map(by_colors[column]).where(df['id']<32,df['id'].map(by_arch[column]))
+        df[column]=counts.fillna(0).astype('int64')
+    df.loc['ALL',columns]=0
+    return df
+@cached
 def getMeanDecklist(set_abbr:str, arch_label:str, min_wins=0, max_wins=7, min_rank=0, max_rank=6,as_json=True):
     #Get's average decklist for all decks of a given set in specified colors or archetype. Can be filtered by rank and record.
     #(Infrastructure exists to filter by date drafted too if we want)
@@ -205,88 +410,118 @@ def getMeanDecklist(set_abbr:str, arch_label:str, min_wins=0, max_wins=7, min_ra
     #or colors plus a number, e.g.' "WB2", getting a subarchetype of those colors
     set_abbr=set_abbr.lower()
     arch_label=arch_label.upper()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)    
-    deck_table=metadata.tables[set_abbr+'Decklists']
-    card_table=metadata.tables[set_abbr+'CardInfo']
+    conn = connect()
+    card_table=schema.getTable(set_abbr,'CardInfo')
     s0=select(card_table.c.name)
-    cardSeries=pd.read_sql_query(s0,conn)
-    select_args=[func.count(1).label('num_decks')]
-    for card_name in cardSeries['name']:
-        select_args.append(func.avg(getattr(deck_table.c,card_name)).label(card_name))
-    s=select(*select_args)
+    cardSeries=readSQL(s0,conn)
+    filters=deckFilters(arch_label,min_wins,max_wins,min_rank,max_rank)
+    cube_table=decklistCube(set_abbr)
+    if cube_table is not None and all(card_name in cube_table.c for card_name in cardSeries['name']):
+        #Sum copies and deck counts over the matching cube cells and divide, instead of averaging every matching deck.
+        s=select(cube_table.c.num_decks,*[cube_table.c[card_name] for card_name in cardSeries['name']])
+        cellDF=readSQL(s.where(*[condition(cube_table) for condition in filters]),conn)
+        release(conn)
+        num_decks=int(cellDF['num_decks'].sum())
+        if num_decks>0:
+            resultDF=(cellDF[cardSeries['name']].sum()/num_decks).to_frame().T
+            resultDF.insert(0,'num_decks',num_decks)
+        else: #Same as AVG over no rows
+            resultDF=pd.DataFrame([[0]+[None]*len(cardSeries)],columns=['num_decks']+cardSeries['name'].tolist())
+    else: #Set built before the cube existed
+        deck_table=schema.getTable(set_abbr,'Decklists')
+        select_args=[func.count(1).label('num_decks')]
+        for card_name in cardSeries['name']:
+            select_args.append(func.avg(getattr(deck_table.c,card_name)).label(card_name))
+        s=select(*select_args).where(*[condition(deck_table) for condition in filters])
+        resultDF=readSQL(s,conn)
+        release(conn)
+    if as_json: return resultDF.T.to_json()
+    else: return resultDF
+def decklistCube(set_abbr:str):
+    #Returns the set's DecklistCube table, or None for sets built before it existed.
+    try:
+        return schema.getTable(set_abbr,'DecklistCube')
+    except KeyError:
+        return None
+def deckFilters(arch_label:str, min_wins=0, max_wins=7, min_rank=0, max_rank=6)->list:
+    #Where clauses for the usual decklist filters, as functions of the table so they apply to Decklists and DecklistCube alike.
+    filters=[]
     if min_wins>0:
-        s=s.where(deck_table.c.wins>=min_wins)
+        filters.append(lambda table: table.c.wins>=min_wins)
     if max_wins<7:
-        s=s.where(deck_table.c.wins<=max_wins)
+        filters.append(lambda table: table.c.wins<=max_wins)
     if min_rank>0:
-        s=s.where(deck_table.c.rank>=min_rank)
+        filters.append(lambda table: table.c.rank>=min_rank)
     if max_rank<6:
-        s=s.where(deck_table.c.rank<=max_rank)
+        filters.append(lambda table: table.c.rank<=max_rank)
     if arch_label[-1:].isnumeric():
         arch_id=archLabelToID(arch_label)
-        s=s.where(deck_table.c.arch_id==arch_id)
+        filters.append(lambda table: table.c.arch_id==arch_id)
     else:
-        s=s.where(deck_table.c.main_colors==arch_label)
-    resultDF=pd.read_sql_query(s,conn)
-    conn.close()
-    if as_json: return resultDF.T.to_json()
-    else: return resultDF
+        filters.append(lambda table: table.c.main_colors==arch_label)
+    return filters
 
 
 #May be useful later, but not currently used:
 
+@cached
 def getArchRecord(set_abbr:str, arch_label:str):
     #returns a a given deck's total wins, losses, drafts, win percentage, and average record per draft. wins/(wins+losses) for deck's overall win rate. 
     #Could be used the page for a single archetype
     set_abbr=set_abbr.lower()
     arch_label=arch_label.upper()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    arch_table=metadata.tables[set_abbr+'Archetypes']
-    q1=select(arch_table.c.num_drafts,arch_table.c.num_wins,arch_table.c.num_losses).where(arch_table.c.arch_label==arch_label)                                                                             
-    df=pd.read_sql_query(q1,conn)
-    conn.close()
+    store=stat_store.get(set_abbr)
+    if store is not None:
+        df=store.archetypeTable(['arch_label','num_drafts','num_wins','num_losses'])
+        df=df[df['arch_label']==arch_label].drop(columns='arch_label').reset_index(drop=True)
+    else:
+        conn = connect()
+        arch_table=schema.getTable(set_abbr,'Archetypes')
+        q1=select(arch_table.c.num_drafts,arch_table.c.num_wins,arch_table.c.num_losses).where(arch_table.c.arch_label==arch_label)                                                                             
+        df=readSQL(q1,conn)
+        release(conn)
     df['num_games']=df['num_wins']+df['num_losses']
     df['win_rate']=df['num_wins']/df['num_games']
     result=pd.Series(data=df.loc[0])
     return result.to_json()
+@cached
 def getCardInDeckWinRates(set_abbr:str,arch_label='ALL', min_copies=1, max_copies=40,index_by_name=False,as_json=True): 
 #Returns game played win rates for all cards, indexed by their numerical id from CardInfo table. Can be restricted to specific decks.
 #Can also require a specific range of copies of each card.
 #This is one column of the full card table, but may be useful on its own.
     set_abbr=set_abbr.lower()
     arch_label=arch_label.upper()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    cg_table=metadata.tables[set_abbr+'CardGameStats']
     arch_id=archLabelToID(arch_label)
-    if index_by_name:
-        card_table=metadata.tables[set_abbr+'CardInfo']
-        q=select(card_table.c.name,func.sum(cg_table.c.win_count).label("wins"),
-                 func.sum(cg_table.c.game_count).label("games_played")).join(
-                    card_table, cg_table.c.id==card_table.c.id).where(
-                     cg_table.c.copies>=min_copies,
-                     cg_table.c.copies<=max_copies).group_by(card_table.c.name)
-        if arch_label!='ALL':
-            q=q.where(cg_table.c.arch_id==arch_id)
-        df=pd.read_sql(q,conn,index_col='name')
+    store=stat_store.get(set_abbr)
+    if store is not None:
+        df=store.cardGameTotals(arch_id,min_copies,max_copies,index_by_name)
     else:
-        q=select(cg_table.c.id,func.sum(cg_table.c.win_count).label("wins"),func.sum(cg_table.c.game_count).label("games_played")).where(
-                                                                            cg_table.c.copies>=min_copies,
-                                                                            cg_table.c.copies<=max_copies).group_by(cg_table.c.id)
-        if arch_label!='ALL':
-            q=q.where(cg_table.c.arch_id==arch_id)
-        df=pd.read_sql_query(q,conn,index_col='id')
-    conn.close()
+        conn = connect()
+        cg_table=schema.getTable(set_abbr,'CardGameStats')
+        if index_by_name:
+            card_table=schema.getTable(set_abbr,'CardInfo')
+            q=select(card_table.c.name,func.sum(cg_table.c.win_count).label("wins"),
+                     func.sum(cg_table.c.game_count).label("games_played")).join(
+                        card_table, cg_table.c.id==card_table.c.id).where(
+                         cg_table.c.copies>=min_copies,
+                         cg_table.c.copies<=max_copies).group_by(card_table.c.name)
+            if arch_label!='ALL':
+                q=q.where(cg_table.c.arch_id==arch_id)
+            df=readSQL(q,conn,index_col='name')
+        else:
+            q=select(cg_table.c.id,func.sum(cg_table.c.win_count).label("wins"),func.sum(cg_table.c.game_count).label("games_played")).where(
+                                                                                cg_table.c.copies>=min_copies,
+                                                                                cg_table.c.copies<=max_copies).group_by(cg_table.c.id)
+            if arch_label!='ALL':
+                q=q.where(cg_table.c.arch_id==arch_id)
+            df=readSQL(q,conn,index_col='id')
+        release(conn)
     tempgames=df['games_played'].mask(df['games_played']==0,1) #Used so that 0wins/0games->0%
     df['win_rate']=df['wins']/tempgames
     df.sort_index(inplace=True)
     if as_json: return df.to_json()
     else: return df
+@cached
 def getGameInHandWR(set_abbr:str, arch_label='ALL', as_json=True,index_by_name=False):
     #Returns game in hand win rate for all cards in the given set. May be filtered by archetype, or 'ALL' to count all games.
     #Includes both win rate and number of games in hand, which is the sample size.
@@ -294,22 +529,24 @@ def getGameInHandWR(set_abbr:str, arch_label='ALL', as_json=True,index_by_name=F
     #This is one column of the full card table, but may be useful on its own.
     set_abbr=set_abbr.lower()
     arch_label=arch_label.upper()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    cds_table=metadata.tables[set_abbr+'CardDerivedStats']
     arch_id=archLabelToID(arch_label)
-    if index_by_name:
-        card_table=metadata.tables[set_abbr+'CardInfo']
-        s=select(cds_table.c.games_in_hand,cds_table.c.wins_in_hand,card_table.c.name).join(
-            card_table,cds_table.c.card_id==card_table.c.id).where(
-            cds_table.c.arch_id==arch_id    
-            )
-        resultDF=pd.read_sql(s,conn,index_col='name')
+    store=stat_store.get(set_abbr)
+    if store is not None:
+        resultDF=store.cardDerivedStats(arch_id,['games_in_hand','wins_in_hand'],index_by_name)
     else:
-        s=select(cds_table.c.games_in_hand,cds_table.c.wins_in_hand,cds_table.c.card_id).where(cds_table.c.arch_id==arch_id)
-        resultDF=pd.read_sql(s,conn,index_col='card_id')
-    conn.close()
+        conn = connect()
+        cds_table=schema.getTable(set_abbr,'CardDerivedStats')
+        if index_by_name:
+            card_table=schema.getTable(set_abbr,'CardInfo')
+            s=select(cds_table.c.games_in_hand,cds_table.c.wins_in_hand,card_table.c.name).join(
+                card_table,cds_table.c.card_id==card_table.c.id).where(
+                cds_table.c.arch_id==arch_id    
+                )
+            resultDF=readSQL(s,conn,index_col='name')
+        else:
+            s=select(cds_table.c.games_in_hand,cds_table.c.wins_in_hand,cds_table.c.card_id).where(cds_table.c.arch_id==arch_id)
+            resultDF=readSQL(s,conn,index_col='card_id')
+        release(conn)
     tempgames=resultDF['games_in_hand'].mask(resultDF['games_in_hand']==0,1)
     resultDF['win_rate']=resultDF['wins_in_hand']/tempgames
     #resultDF['significant_sample']=resultDF['games_in_hand']>500
@@ -317,6 +554,7 @@ def getGameInHandWR(set_abbr:str, arch_label='ALL', as_json=True,index_by_name=F
     resultDF.sort_index(inplace=True)
     if as_json: return resultDF.to_json()
     else: return resultDF
+@cached
 def getRecordByLength(set_abbr:str, arch_label:str,):
     #For each game length (by number of turns), returns given archetype's record, win rate, and how frequently games last that long.
     #Games of length <=4 and >=16 are grouped together
@@ -325,69 +563,38 @@ def getRecordByLength(set_abbr:str, arch_label:str,):
     arch_label=arch_label.upper()
     MINTURNS=4
     MAXTURNS=16
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    arch_stats_table=metadata.tables[set_abbr+'ArchGameStats']
     arch_id=archLabelToID(arch_label)
-    q1=select(arch_stats_table.c.turns,arch_stats_table.c.won,func.sum(arch_stats_table.c.game_count).label('games')).group_by(
-        arch_stats_table.c.turns,arch_stats_table.c.won).where(arch_stats_table.c.arch_id==arch_id
-    ).order_by(arch_stats_table.c.turns,arch_stats_table.c.won)   
-    res_df=pd.read_sql_query(q1,conn) 
-    conn.close()
-    output_df=pd.DataFrame({'turns':[],'wins':[],'games':[]})
-    output_df.set_index('turns',inplace=True)
-    df2=res_df.set_index(['turns','won'],inplace=False)
-    games_min=0 
-    wins_min=0
-    for num_turns in range(1,MINTURNS+1): #Grouping together all games that last 5 or less turns
-        if (num_turns, True) in df2.index:
-            wins_min+=df2.at[(num_turns,True),'games']
-            games_min+=df2.at[(num_turns,True),'games']
-        if (num_turns, False) in df2.index:
-            games_min+=df2.at[(num_turns,False),'games']
-    output_df.loc[MINTURNS]=[wins_min,games_min]
-    for num_turns in range(MINTURNS+1,MAXTURNS):
-        games=0
-        wins=0
-        if (num_turns, True) in df2.index:
-            wins=df2.at[(num_turns,True),'games']
-            games+=wins
-        if (num_turns, False) in df2.index:
-            games+=df2.at[(num_turns,False),'games']
-        output_df.loc[num_turns]=[wins,games]   
-    games_max=0
-    wins_max=0 
-    for num_turns in range(MAXTURNS, res_df['turns'].max()+1):
-        if (num_turns, True) in df2.index:
-            wins_max+=df2.at[(num_turns,True),'games']
-            games_max+=df2.at[(num_turns,True),'games']
-        if (num_turns, False) in df2.index:
-            games_max+=df2.at[(num_turns,False),'games']
-    output_df.loc[MAXTURNS]=[wins_max,games_max]
-    tempgames=output_df['games'].mask(output_df['games']==0,1) #replaces 0 with 1 to avoid dividing by 0
-    output_df['win_rate']=output_df['wins']/tempgames
-    total_games=output_df['games'].sum()
-    output_df['game_length_rate']=output_df['games']/total_games
+    store=stat_store.get(set_abbr)
+    if store is not None:
+        res_df=store.turnCounts(arch_id)
+    else:
+        conn = connect()
+        arch_stats_table=schema.getTable(set_abbr,'ArchGameStats')
+        q1=select(arch_stats_table.c.turns,arch_stats_table.c.won,func.sum(arch_stats_table.c.game_count).label('games')).group_by(
+            arch_stats_table.c.turns,arch_stats_table.c.won).where(arch_stats_table.c.arch_id==arch_id
+        ).order_by(arch_stats_table.c.turns,arch_stats_table.c.won)   
+        res_df=readSQL(q1,conn) 
+        release(conn)
+    histograms=turnHistograms(res_df['turns'],res_df['won'],res_df['games'],min_turns=MINTURNS,max_turns=MAXTURNS)
+    output_df=turnRecordTable(histograms)[['wins','games','win_rate','game_length_rate']]
     return output_df.to_json()
 
 
+@cached
 def getCardRecordByCopies(set_abbr:str, card_name:str, arch_label='ALL', ):
     #Gets number of wins, games played, and win rate for a given card split up by number of copies of that card in the deck
     #For example "4":{"wins":859.0,"games":1414.0,"win_rate":0.6074964639}
     #card_name is case sensitive
     #intended for use on individual card pages
     set_abbr=set_abbr.lower()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    cg_table=metadata.tables[set_abbr+'CardGameStats']
-    card_table=metadata.tables[set_abbr+'CardInfo']
+    conn = connect()
+    cg_table=schema.getTable(set_abbr,'CardGameStats')
+    card_table=schema.getTable(set_abbr,'CardInfo')
     arch_id=archLabelToID(arch_label)
     s=select(cg_table.c.copies,func.sum(cg_table.c.win_count),func.sum(cg_table.c.game_count)).group_by(cg_table.c.copies).join(
         card_table,cg_table.c.id==card_table.c.id).where(card_table.c.name==card_name,card_table.c.arch_id==arch_id)
-    df=pd.read_sql_query(s,conn)
-    conn.close()
+    df=readSQL(s,conn)
+    release(conn)
     df.set_index(['copies'],inplace=True)
     df.sort_index(inplace=True)
     df.columns=['wins','games']
@@ -399,6 +606,7 @@ def getCardRecordByCopies(set_abbr:str, card_name:str, arch_label='ALL', ):
     return df.to_json()
 
 
+@cached
 def getArchWinRatesByMulls(set_abbr:str,arch_label='ALL', as_json=True):
     #Returns win rates and number of games played on play, draw, and overall by number of mulligans taken.
     #Any game with 3 or more mulligans is grouped into num_mulligans=3.
@@ -406,15 +614,17 @@ def getArchWinRatesByMulls(set_abbr:str,arch_label='ALL', as_json=True):
     #Could be used on the archetype page, but kind of niche information
     set_abbr=set_abbr.lower()
     arch_label=arch_label.upper()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    start_table=metadata.tables[set_abbr+'ArchStartStats']
     arch_id=archLabelToID(arch_label)
-    s=select(start_table.c.num_mulligans,start_table.c.on_play,start_table.c.win_count,start_table.c.game_count).where(
-        start_table.c.arch_id==arch_id)
-    resultDF=pd.read_sql_query(s,conn)
-    conn.close()
+    store=stat_store.get(set_abbr)
+    if store is not None:
+        resultDF=store.startStats(arch_id)
+    else:
+        conn = connect()
+        start_table=schema.getTable(set_abbr,'ArchStartStats')
+        s=select(start_table.c.num_mulligans,start_table.c.on_play,start_table.c.win_count,start_table.c.game_count).where(
+            start_table.c.arch_id==arch_id)
+        resultDF=readSQL(s,conn)
+        release(conn)
     resultDF.sort_values(['num_mulligans','on_play'],inplace=True)
     outputDF=pd.DataFrame({'games_on_play':[],'wr_on_play':[],'games_on_draw':[],
                            'wr_on_draw':[],'games_total':[],'wr_total':[]})
@@ -430,17 +640,20 @@ def getArchWinRatesByMulls(set_abbr:str,arch_label='ALL', as_json=True):
         outputDF.loc[mulls]=[int(games_on_play),wr_on_play,int(games_on_draw),wr_on_draw,int(games_total),wr_total]
     if as_json: return outputDF.to_json()
     else: return outputDF
+@cached
 def getPlayDrawSplits(set_abbr:str, as_json=True):
     #Returns number of games played and win rate on the play and on the draw for each archetype
     set_abbr=set_abbr.lower()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)    
-    start_table=metadata.tables[set_abbr+'ArchStartStats']
-    s=select(start_table.c.arch_id,start_table.c.on_play,func.sum(start_table.c.win_count).label('wins'),
-             func.sum(start_table.c.game_count).label('games')).group_by(start_table.c.arch_id,start_table.c.on_play)
-    resultDF=pd.read_sql_query(s,conn,index_col=['arch_id','on_play'])
-    conn.close()
+    store=stat_store.get(set_abbr)
+    if store is not None:
+        resultDF=store.playDrawTotals()
+    else:
+        conn = connect()
+        start_table=schema.getTable(set_abbr,'ArchStartStats')
+        s=select(start_table.c.arch_id,start_table.c.on_play,func.sum(start_table.c.win_count).label('wins'),
+                 func.sum(start_table.c.game_count).label('games')).group_by(start_table.c.arch_id,start_table.c.on_play)
+        resultDF=readSQL(s,conn,index_col=['arch_id','on_play'])
+        release(conn)
     resultDF['win_rate']=resultDF['wins']/(resultDF['games'].mask(resultDF['games']==0,1))
     resultDF.sort_index(inplace=True)
     outputDF=pd.DataFrame({'games_on_play':[],'wr_on_play':[],'games_on_draw':[],'wr_on_draw':[]})
@@ -455,59 +668,42 @@ def getPlayDrawSplits(set_abbr:str, as_json=True):
     if as_json: return outputDF.to_json()
     else: return outputDF
     
+@cached
 def getArchAvgSpeed(set_abbr:str, arch_label:str,):
     #Returns average speed for a given archetype. Speed is defined as the difference between average win and loss length.
     #Also includes average win/loss/game length and number of games for the purpose of sample size cutoffs
     #May be redundant with makeFormatOverviewTable and getRecordByLength depending on what information we present and where
     set_abbr=set_abbr.lower()
     arch_label=arch_label.upper()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    arch_stats_table=metadata.tables[set_abbr+'ArchGameStats']
     arch_id=archLabelToID(arch_label)
-    q1=select(arch_stats_table.c.turns,arch_stats_table.c.won,func.sum(arch_stats_table.c.game_count).label('games')).group_by(
-        arch_stats_table.c.turns,arch_stats_table.c.won).where(arch_stats_table.c.arch_id==arch_id
-    ).order_by(arch_stats_table.c.turns,arch_stats_table.c.won)   
-    res_df=pd.read_sql_query(q1,conn) 
-    conn.close()
-    if res_df.shape[0]==0: return {'average_win_length':0,'average_loss_length':0,'average_game_length':0,'wins':0,'losses':0,'games':0}
-    record_df=pd.DataFrame({'wins':[],'losses':[],'games':[]})
-    df2=res_df.set_index(['turns','won'],inplace=False)
-    for num_turns in range(0,res_df['turns'].max()+1):
-        games=0
-        wins=0
-        if (num_turns, True) in df2.index:
-            wins=df2.at[(num_turns,True),'games']
-            games+=wins
-        if (num_turns, False) in df2.index:
-            games+=df2.at[(num_turns,False),'games']
-        losses=games-wins
-        record_df.loc[num_turns]=[wins,losses,games]   
+    store=stat_store.get(set_abbr)
+    if store is not None:
+        res_df=store.turnCounts(arch_id)
+    else:
+        conn = connect()
+        arch_stats_table=schema.getTable(set_abbr,'ArchGameStats')
+        q1=select(arch_stats_table.c.turns,arch_stats_table.c.won,func.sum(arch_stats_table.c.game_count).label('games')).group_by(
+            arch_stats_table.c.turns,arch_stats_table.c.won).where(arch_stats_table.c.arch_id==arch_id
+        ).order_by(arch_stats_table.c.turns,arch_stats_table.c.won)   
+        res_df=readSQL(q1,conn) 
+        release(conn)
+    stats=['average_win_length','average_loss_length','average_game_length','wins','losses','games','speed']
+    if res_df.shape[0]==0: return {stat:0 for stat in stats} #Same keys as with games
+    length_stats=turnMetrics(turnHistograms(res_df['turns'],res_df['won'],res_df['games']))
     output={}
-    output['average_win_length']=(record_df['wins']*record_df.index).sum()/(max(record_df['wins'].sum(),1))
-    output['average_loss_length']=(record_df['losses']*record_df.index).sum()/(max(record_df['losses'].sum(),1))
-    output['average_game_length']=(record_df['games']*record_df.index).sum()/(max(record_df['games'].sum(),1))
-    output['wins']=record_df['wins'].sum()
-    output['losses']=record_df['losses'].sum()
-    output['games']=record_df['games'].sum()
-    output['speed']=output['average_win_length']-output['average_loss_length']
+    for stat in stats:
+        output[stat]=length_stats[stat].iloc[0]
     return output
 
 
+@cached
 def getSubarchetypeDistinguishingCards(set_abbr:str, arch_label:str, n_top=10, n_bottom=10):
     #arch_label is a WUBRG string with a number at the end, e.g. "WU2" for the second subarchetype of WU.
     #Returns the top cards that distinguish this subarchetype from the overall main colors by number of copies above and below average.
     set_abbr=set_abbr.lower()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)    
     main_colors=arch_label[:-1].upper()
-    num_sub_decks,sub_mean_deck=meanDecklist(conn,set_abbr,arch_label) #may be interesting to have the option to filter by num_wins here
-    num_main_decks,overall_mean_deck=meanDecklist(conn,set_abbr,main_colors)
-    conn.close()
-    sub_mean_deck=pd.DataFrame(sub_mean_deck)
-    overall_mean_deck=pd.DataFrame(overall_mean_deck)
+    sub_mean_deck=getMeanDecklist(set_abbr,arch_label,as_json=False).drop(columns='num_decks').T #may be interesting to have the option to filter by num_wins here
+    overall_mean_deck=getMeanDecklist(set_abbr,main_colors,as_json=False).drop(columns='num_decks').T
     deck_delta=sub_mean_deck-overall_mean_deck
     deck_delta.columns=['delta']
     deck_delta.sort_values(ascending=False,by='delta',inplace=True)
@@ -515,74 +711,137 @@ def getSubarchetypeDistinguishingCards(set_abbr:str, arch_label:str, n_top=10, n
     bottom_distinguishing_cards=deck_delta.tail(n_bottom)
     return {'top_distinguishing_cards':top_distinguishing_cards.to_dict(),
             'bottom_distinguishing_cards':bottom_distinguishing_cards.to_dict()}
-def getRandomSampleDecklist(set_abbr:str, arch_label:str, min_wins=0, max_wins=7, min_rank=0, max_rank=6):
-    #Returns a random decklist from the database matching the given criteria.
+@metrics.statFunction
+def getRandomSampleDecklist(set_abbr:str, arch_label:str, min_wins=0, max_wins=7, min_rank=0, max_rank=6, num_samples=1):
+    #Returns random decklists from the database matching the given criteria, num_samples distinct decks (fewer if not enough match).
     #May want to format the decklist for readability here or on the frontend.
     set_abbr=set_abbr.lower()
     arch_label=arch_label.upper()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)    
-    deck_table=metadata.tables[set_abbr+'Decklists']
-    card_table=metadata.tables[set_abbr+'CardInfo']
+    conn = connect()
+    deck_table=schema.getTable(set_abbr,'Decklists')
+    card_table=schema.getTable(set_abbr,'CardInfo')
     s1=select(card_table.c.name)
-    cardSeries=pd.read_sql_query(s1,conn)
+    cardSeries=readSQL(s1,conn)
     select_args=[]
     for card_name in cardSeries['name']:
         select_args.append(getattr(deck_table.c,card_name).label(card_name))
-    s=select(*select_args)
-    if min_wins>0:
-        s=s.where(deck_table.c.wins>=min_wins)
-    if max_wins<7:
-        s=s.where(deck_table.c.wins<=max_wins)
-    if min_rank>0:
-        s=s.where(deck_table.c.rank>=min_rank)
-    if max_rank<6:
-        s=s.where(deck_table.c.rank<=max_rank)
-    if arch_label[-1:].isnumeric():
-        arch_id=archLabelToID(arch_label)
-        s=s.where(deck_table.c.arch_id==arch_id)
+    filters=deckFilters(arch_label,min_wins,max_wins,min_rank,max_rank)
+    deck_ids=sampleDeckIDs(set_abbr,filters,num_samples,conn)
+    if deck_ids is not None:
+        #Fetch only the chosen decks by primary key
+        s=select(deck_table.c.deck_id,*select_args).where(deck_table.c.deck_id.in_(deck_ids))
+        resultDF=readSQL(s,conn,index_col='deck_id').reindex(deck_ids).reset_index(drop=True)
     else:
-        s=s.where(deck_table.c.main_colors==arch_label)
-    s=s.order_by(func.random()).limit(1)
-    resultDF=pd.read_sql_query(s,conn)
-    conn.close()
+        s=select(*select_args).where(*[condition(deck_table) for condition in filters])
+        s=s.order_by(func.random()).limit(num_samples)
+        resultDF=readSQL(s,conn)
+    release(conn)
     return resultDF.T.to_json()
+def sampleDeckIDs(set_abbr:str, filters:list, num_samples:int, conn):
+    #Picks num_samples distinct deck_ids uniformly from the decks matching filters, using the deck id ranges in DecklistCube.
+    #Returns None if the set has no cube or a matching cell has no id range, in which case the caller sorts Decklists randomly instead.
+    cube_table=decklistCube(set_abbr)
+    if cube_table is None or 'first_deck_id' not in cube_table.c:
+        return None
+    s=select(cube_table.c.first_deck_id,cube_table.c.num_decks).where(*[condition(cube_table) for condition in filters])
+    cellDF=readSQL(s,conn)
+    if cellDF['first_deck_id'].isna().any():
+        return None
+    cell_ends=cellDF['num_decks'].cumsum().to_numpy()
+    total_decks=int(cell_ends[-1]) if len(cell_ends)>0 else 0
+    positions=np.random.default_rng().choice(total_decks,size=min(num_samples,total_decks),replace=False)
+    #Position -> (cell, offset within the cell) -> deck_id
+    cells=np.searchsorted(cell_ends,positions,side='right')
+    offsets=positions-(cell_ends[cells]-cellDF['num_decks'].to_numpy()[cells])
+    return (cellDF['first_deck_id'].to_numpy()[cells].astype(int)+offsets).tolist()
 
+@cached
+def getCardStatsByArchetype(set_abbr:str, arch_labels, index_by_name=False, as_json=True):
+    #Card stats for several archetypes side by side, e.g. to compare WU with WU1 and WU2.
+    #arch_labels is a list/tuple of labels or a comma separated string like "WU,WU1,ALL".
+    #Returns a frame indexed by card id (or name) with a column group per archetype, each with the card table stats:
+    #games_played, GPWR, games_in_hand, GIHWR, adjusted_GIHWR, adjusted_IWD, inclusion_impact.
+    #The json version is keyed by archetype label, then stat, then card.
+    card_df,frames=_cardStatsFrames(set_abbr,arch_labels)
+    if index_by_name:
+        for df in frames.values():
+            df.index=card_df['name']
+    if as_json:
+        output={label:df.astype(object).where(df.notna(),None).to_dict() for label,df in frames.items()}
+        return json.dumps(output,default=_jsonDefault)
+    else: return pd.concat(frames,axis=1)
+def _cardStatsFrames(set_abbr:str, arch_labels)->tuple:
+    #For getCardStatsByArchetype and getOverperformingCards: (CardInfo name and rarity indexed by id,
+    #{arch_label: that archetype's card stats indexed by id}), from one read of each table.
+    set_abbr=set_abbr.lower()
+    if isinstance(arch_labels,str):
+        arch_labels=arch_labels.split(',')
+    arch_labels=list(dict.fromkeys(label.strip().upper() for label in arch_labels)) #Drop repeats, keep order
+    arch_ids={label:archLabelToID(label) for label in arch_labels}
+    store=stat_store.get(set_abbr)
+    if store is not None:
+        card_df=store.cardInfo(['name','rarity'])
+        #Typed like rows filtered out of one query, even for archetypes without any
+        card_stats={label:store.cardGameTotals(arch_id).astype(store.card_wins.dtype) for label,arch_id in arch_ids.items()}
+        derived_stats={label:store.cardDerivedStats(arch_id) for label,arch_id in arch_ids.items()}
+    else:
+        conn = connect()
+        card_table=schema.getTable(set_abbr,'CardInfo')
+        card_df=readSQL(select(card_table.c.id,card_table.c.name,card_table.c.rarity),conn,index_col='id')
+        #One query per stats table for all of the archetypes
+        derived_stats_table=schema.getTable(set_abbr,'CardDerivedStats')
+        s1=select(derived_stats_table.c.card_id,derived_stats_table.c.arch_id,derived_stats_table.c.games_in_hand,
+                  derived_stats_table.c.wins_in_hand,derived_stats_table.c.adj_gihwr,derived_stats_table.c.adjusted_iwd,
+                  derived_stats_table.c.inclusion_impact).where(derived_stats_table.c.arch_id.in_(list(arch_ids.values())))
+        derived_df=readSQL(s1,conn)
+        card_stats_table=schema.getTable(set_abbr,'CardGameStats')
+        s2=select(card_stats_table.c.id,card_stats_table.c.arch_id,func.sum(card_stats_table.c.win_count).label('wins'),
+                  func.sum(card_stats_table.c.game_count).label('games_played')).group_by(card_stats_table.c.id,card_stats_table.c.arch_id)
+        if -1 not in arch_ids.values(): #'ALL' sums over every row (as in makeCardTable), otherwise only the requested archetypes are needed
+            s2=s2.where(card_stats_table.c.arch_id.in_(list(arch_ids.values())))
+        card_stats_df=readSQL(s2,conn)
+        release(conn)
+        card_stats={}
+        derived_stats={}
+        for label,arch_id in arch_ids.items():
+            if arch_id==-1:
+                card_stats[label]=card_stats_df.groupby('id')[['wins','games_played']].sum()
+            else:
+                card_stats[label]=card_stats_df[card_stats_df['arch_id']==arch_id].set_index('id')[['wins','games_played']]
+            derived_stats[label]=derived_df[derived_df['arch_id']==arch_id].set_index('card_id')
+    frames={}
+    for label in arch_ids:
+        arch_card_stats=card_stats[label]
+        arch_derived=derived_stats[label]
+        df=pd.DataFrame(index=card_df.index)
+        df['games_played']=arch_card_stats['games_played']
+        df['GPWR']=arch_card_stats['wins']/(arch_card_stats['games_played'].mask(arch_card_stats['games_played']==0,1))
+        df['GPWR']=df['GPWR'].mask(df['GPWR'].isna(),0)
+        df['games_in_hand']=arch_derived['games_in_hand']
+        df['GIHWR']=arch_derived['wins_in_hand']/(arch_derived['games_in_hand'].mask(arch_derived['games_in_hand']==0,1))
+        df['adjusted_GIHWR']=arch_derived['adj_gihwr']
+        df['adjusted_IWD']=arch_derived['adjusted_iwd']
+        df['inclusion_impact']=arch_derived['inclusion_impact']
+        frames[label]=df
+    return card_df,frames
+@cached
 def getOverperformingCards(set_abbr:str, arch_label:str, n_top=10,exclude_rares=True,as_json=True):
     #Returns the top overperforming cards for a given archetype in a set.
     set_abbr=set_abbr.lower()
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    arch_id=archLabelToID(arch_label)
+    arch_label=arch_label.upper()
     is_subarchetype=arch_label[-1:].isnumeric()
     if is_subarchetype:
-        main_colors=arch_label[:-1].upper()
+        main_colors=arch_label[:-1]
     else:
-        main_colors=arch_label.upper()
-    color_id=colorInt(main_colors)
-    derived_stats_table=metadata.tables[set_abbr+'CardDerivedStats']
-    s_arch=select(derived_stats_table.c.card_id,derived_stats_table.c.arch_id,
-             derived_stats_table.c.games_in_hand,derived_stats_table.c.adjusted_iwd).where(
-                 derived_stats_table.c.arch_id==arch_id)
-    arch_derived_stats_df=pd.read_sql_query(s_arch,conn,index_col='card_id')
-    s_color=select(derived_stats_table.c.card_id,derived_stats_table.c.arch_id,
-             derived_stats_table.c.games_in_hand,derived_stats_table.c.adjusted_iwd).where(
-                 derived_stats_table.c.arch_id==color_id)
-    color_derived_stats_df=pd.read_sql_query(s_color,conn,index_col='card_id')
-    s_all=select(derived_stats_table.c.card_id,derived_stats_table.c.arch_id,
-             derived_stats_table.c.games_in_hand,derived_stats_table.c.adjusted_iwd).where(
-                 derived_stats_table.c.arch_id==-1)
-    all_derived_stats_df=pd.read_sql_query(s_all,conn,index_col='card_id')
-    card_df=cardInfo(conn,set_abbr)
-    conn.close()
-    comparison_df=pd.DataFrame({'arch_iwd':arch_derived_stats_df['adjusted_iwd'],
-                                'color_iwd':color_derived_stats_df['adjusted_iwd'],
-                                'overall_iwd':all_derived_stats_df['adjusted_iwd'],
-                                'arch_games_in_hand':arch_derived_stats_df['games_in_hand'],
-                                'color_games_in_hand':color_derived_stats_df['games_in_hand'],
-                                'overall_games_in_hand':all_derived_stats_df['games_in_hand'],
+        main_colors=arch_label
+    card_df,frames=_cardStatsFrames(set_abbr,(arch_label,main_colors,'ALL'))
+    stats_df=pd.concat(frames,axis=1)
+    comparison_df=pd.DataFrame({'arch_iwd':stats_df[(arch_label,'adjusted_IWD')],
+                                'color_iwd':stats_df[(main_colors,'adjusted_IWD')],
+                                'overall_iwd':stats_df[('ALL','adjusted_IWD')],
+                                'arch_games_in_hand':stats_df[(arch_label,'games_in_hand')],
+                                'color_games_in_hand':stats_df[(main_colors,'games_in_hand')],
+                                'overall_games_in_hand':stats_df[('ALL','games_in_hand')],
                                 'card_name':card_df['name']})
     if exclude_rares:
         rares=card_df[card_df['rarity'].isin(['M','R'])].index
@@ -603,4 +862,48 @@ def getOverperformingCards(set_abbr:str, arch_label:str, n_top=10,exclude_rares=
     top_overperformers=comparison_df.iloc[:,[0,3,4,5,6,7,8]].head(n_top)
     if as_json:
         return top_overperformers.to_json()
-    else: return top_overperformers
\ No newline at end of file
+    else: return top_overperformers
+
+#Batched access:
+#Stat functions that can be requested through runBatch (and the /batch endpoint). All of them return json.
+BATCH_FUNCTIONS={'getActiveSets','getMostRecentSet','getCardInfo','getMetaDistribution','getArchetypeLabels','getArchAvgCurve',
+                 'makeCardTable','getCardPickStats','makeFormatOverviewTable','getMeanDecklist','getArchRecord','getCardInDeckWinRates',
+                 'getGameInHandWR','getRecordByLength','getCardRecordByCopies','getArchWinRatesByMulls','getPlayDrawSplits',
+                 'getArchAvgSpeed','getSubarchetypeDistinguishingCards','getRandomSampleDecklist','getCardStatsByArchetype',
+                 'getOverperformingCards'}
+def runBatch(stat_requests:list)->str:
+    #stat_requests is a list of {'name':str, 'function':str, 'args':{...}}, e.g.
+    #[{'name':'curve','function':'getArchAvgCurve','args':{'set_abbr':'ltr','arch_label':'WU'}}, ...]
+    #name defaults to the function name and must be unique. Every request runs inside one batch().
+    #Returns a single json object keyed by name. A request that fails gets {"error": message} instead of failing the whole batch.
+    #Raises ValueError if the requests themselves are malformed.
+    calls={}
+    for stat_request in stat_requests:
+        if not isinstance(stat_request,dict):
+            raise ValueError("Each request must be a json object")
+        function_name=stat_request.get('function')
+        if function_name not in BATCH_FUNCTIONS:
+            raise ValueError("Unknown stat function: {}".format(function_name))
+        args=stat_request.get('args',{})
+        if not isinstance(args,dict):
+            raise ValueError("args for {} must be a json object".format(function_name))
+        name=str(stat_request.get('name',function_name))
+        if name in calls:
+            raise ValueError("Duplicate request name: {}".format(name))
+        args={key:value for key,value in args.items() if key!='as_json'} #Output is always json
+        calls[name]=(globals()[function_name],args)
+    results=[]
+    with batch():
+        for name,(function,args) in calls.items():
+            try:
+                output=function(**args)
+                if not isinstance(output,str):
+                    output=json.dumps(output,default=_jsonDefault)
+            except Exception as e:
+                output=json.dumps({'error':'{}: {}'.format(type(e).__name__,e)})
+            results.append(json.dumps(name)+':'+output)
+    return '{'+','.join(results)+'}'
+def _jsonDefault(value):
+    #numpy scalars show up in dict outputs like getArchAvgSpeed's
+    if hasattr(value,'item'): return value.item()
+    return str(value)
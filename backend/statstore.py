@@ -0,0 +1,246 @@
+#In-memory copy of each set's small aggregate tables, held as NumPy arrays.
+#Archetypes, ArchGameStats, ArchStartStats, CardGameStats and CardDerivedStats are at most a few hundred thousand rows per set,
+#so each worker loads them once and stataccess.py answers from the arrays instead of querying the database on every call.
+#Arrays are indexed by archetype (position in arch_ids), card (position in card_ids) and then the rest of the table's key,
+#e.g. card_games[arch, card, copies], turn_games[arch, turns, won] and start_games[arch, num_mulligans, on_play].
+#A set is loaded again when its ActiveSets.last_updated changes. The new arrays are built to the side and swapped in
+#with a single assignment, so a request never sees a mix of two versions of a set.
+import sys
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+STORE_TABLES=['CardInfo','Archetypes','CardGameStats','CardDerivedStats','ArchGameStats','ArchStartStats']
+DERIVED_COLUMNS=['games_in_hand','wins_in_hand','adj_gihwr','adjusted_iwd','inclusion_impact']
+COUNT_COLUMNS={'games_in_hand','wins_in_hand'} #Integers in the database, but nullable
+
+
+def denseArray(shape:tuple, positions:tuple, values, dtype='int64', fill=0)->np.ndarray:
+    #Array of the given shape with values placed at positions (one index array per axis) and fill everywhere else.
+    #Read-only, since every request shares it.
+    array=np.full(shape,fill,dtype=dtype)
+    array[positions]=values
+    array.flags.writeable=False
+    return array
+
+
+class SetStats:
+    #Arrays for one version of one set. Never modified once built, a reload makes a new SetStats.
+    #tables maps table kind to a DataFrame of the whole table (CardPickStats, if given, only needs the pack_number=-1 rows).
+    def __init__(self, set_abbr:str, version, tables:dict):
+        self.set_abbr=set_abbr
+        self.version=version
+        cards=tables['CardInfo'].sort_values('id')
+        self.cards={column:cards[column].to_numpy() for column in cards.columns}
+        self.card_ids=self.cards['id']
+        archetypes=tables['Archetypes']
+        self.archetypes={column:archetypes[column].to_numpy() for column in archetypes.columns}
+        game_stats=tables['CardGameStats']
+        derived_stats=tables['CardDerivedStats']
+        turn_stats=tables['ArchGameStats']
+        start_stats=tables['ArchStartStats']
+        self.arch_ids=np.unique(np.concatenate([archetypes['id'],game_stats['arch_id'],derived_stats['arch_id'],
+                                                turn_stats['arch_id'],start_stats['arch_id']]).astype('int64'))
+        n_arches=len(self.arch_ids)
+        n_cards=len(self.card_ids)
+        #CardGameStats: wins and games by archetype, card and number of copies in the deck
+        positions=(self.archPositions(game_stats['arch_id']),self.cardPositions(game_stats['id']),game_stats['copies'].to_numpy())
+        shape=(n_arches,n_cards,int(positions[2].max())+1 if len(game_stats) else 0)
+        self.card_wins=denseArray(shape,positions,game_stats['win_count'])
+        self.card_games=denseArray(shape,positions,game_stats['game_count'])
+        self.card_rows=denseArray(shape,positions,True,bool,False) #Which cells have a row in the table
+        #CardDerivedStats: one value per archetype and card. Nulls are NaN.
+        positions=(self.archPositions(derived_stats['arch_id']),self.cardPositions(derived_stats['card_id']))
+        self.derived={column:denseArray((n_arches,n_cards),positions,derived_stats[column].astype('float64'),'float64',np.nan)
+                      for column in DERIVED_COLUMNS}
+        self.derived_rows=denseArray((n_arches,n_cards),positions,True,bool,False)
+        #ArchGameStats: games by archetype, game length and result, plus deck curve totals per archetype
+        turns=turn_stats['turns'].to_numpy()
+        positions=(self.archPositions(turn_stats['arch_id']),turns,turn_stats['won'].to_numpy().astype(int))
+        shape=(n_arches,int(turns.max())+1 if len(turns) else 0,2)
+        self.turn_games=denseArray(shape,positions,turn_stats['game_count'])
+        self.turn_rows=denseArray(shape,positions,True,bool,False)
+        self.curve_columns=list(turn_stats.columns[3:]) #game_count, lands, n0_drops... in table order
+        curve_totals=np.zeros((n_arches,len(self.curve_columns)),dtype='int64')
+        np.add.at(curve_totals,positions[0],turn_stats[self.curve_columns].fillna(0).to_numpy(dtype='int64'))
+        curve_totals.flags.writeable=False
+        self.curve_totals=curve_totals
+        #ArchStartStats: wins and games by archetype, mulligans and play/draw
+        mulligans=start_stats['num_mulligans'].to_numpy()
+        positions=(self.archPositions(start_stats['arch_id']),mulligans,start_stats['on_play'].to_numpy().astype(int))
+        shape=(n_arches,int(mulligans.max())+1 if len(mulligans) else 0,2)
+        self.start_wins=denseArray(shape,positions,start_stats['win_count'])
+        self.start_games=denseArray(shape,positions,start_stats['game_count'])
+        self.start_rows=denseArray(shape,positions,True,bool,False)
+        #Mean pick per card, for sets built with CardPickStats
+        self.mean_picks=None
+        if 'CardPickStats' in tables:
+            picks=tables['CardPickStats']
+            self.mean_picks=denseArray((n_cards,),(self.cardPositions(picks['card_id']),),picks['mean_pick'],'float64',np.nan)
+
+    def archPositions(self, arch_ids)->np.ndarray:
+        return np.searchsorted(self.arch_ids,np.asarray(arch_ids))
+    def cardPositions(self, card_ids)->np.ndarray:
+        return np.searchsorted(self.card_ids,np.asarray(card_ids))
+    def archRows(self, arch_id:int)->np.ndarray:
+        #Position of the archetype as a length 1 array, or an empty array if the set has no rows for it.
+        position=np.searchsorted(self.arch_ids,arch_id)
+        if position<len(self.arch_ids) and self.arch_ids[position]==arch_id:
+            return np.array([position])
+        return np.array([],dtype=int)
+
+    def cardIndex(self, present:np.ndarray, index_by_name:bool)->pd.Index:
+        if index_by_name:
+            return pd.Index(self.cards['name'][present],name='name')
+        return pd.Index(self.card_ids[present],name='id')
+
+    def cardInfo(self, columns:list)->pd.DataFrame:
+        #CardInfo columns indexed by id.
+        return pd.DataFrame({column:self.cards[column] for column in columns},index=pd.Index(self.card_ids,name='id'))
+
+    def archetypeTable(self, columns:list)->pd.DataFrame:
+        #Archetypes rows in table order, as a select without order_by returns them.
+        return pd.DataFrame({column:self.archetypes[column] for column in columns})
+
+    def cardGameTotals(self, arch_id:int, min_copies=0, max_copies=None, index_by_name=False)->pd.DataFrame:
+        #Wins and games played per card from CardGameStats rows with min_copies<=copies<=max_copies.
+        #arch_id=-1 sums over every archetype. Cards without a matching row are left out, as with GROUP BY id.
+        arches=np.arange(len(self.arch_ids)) if arch_id==-1 else self.archRows(arch_id)
+        copies=slice(max(min_copies,0),None if max_copies is None else max(max_copies+1,0))
+        wins=self.card_wins[arches][:,:,copies].sum(axis=(0,2))
+        games=self.card_games[arches][:,:,copies].sum(axis=(0,2))
+        present=self.card_rows[arches][:,:,copies].any(axis=(0,2))
+        if not present.any(): #The database returns untyped (object) columns when no rows match
+            wins,games=wins.astype(object),games.astype(object)
+        df=pd.DataFrame({'wins':wins[present],'games_played':games[present]},index=self.cardIndex(present,index_by_name))
+        if index_by_name:
+            df=df.groupby(level=0).sum()
+        return df
+
+    def cardDerivedStats(self, arch_id:int, columns=DERIVED_COLUMNS, index_by_name=False)->pd.DataFrame:
+        #CardDerivedStats rows for one archetype (-1 for the ALL rows) indexed by card_id, or card name.
+        #Count columns come back as integers unless one of the rows is null, matching what the database returns.
+        arches=self.archRows(arch_id)
+        present=self.derived_rows[arches].any(axis=0)
+        data={}
+        for column in columns:
+            values=self.derived[column][arches[0]][present] if len(arches) else np.array([],dtype='float64')
+            if not present.any():
+                values=values.astype(object)
+            elif column in COUNT_COLUMNS and not np.isnan(values).any():
+                values=values.astype('int64')
+            data[column]=values
+        index=self.cardIndex(present,index_by_name)
+        index.name='name' if index_by_name else 'card_id'
+        return pd.DataFrame(data,index=index)
+
+    def turnCounts(self, arch_id=None)->pd.DataFrame:
+        #Games by (turns, won) for one archetype, like ArchGameStats grouped by turns and won and ordered by both.
+        #With arch_id=None, every archetype's rows with an arch_id column.
+        arches=np.arange(len(self.arch_ids)) if arch_id is None else self.archRows(arch_id)
+        arch,turns,won=np.nonzero(self.turn_rows[arches])
+        df=pd.DataFrame({'arch_id':self.arch_ids[arches][arch],'turns':turns,'won':won.astype(bool),
+                         'games':self.turn_games[arches][arch,turns,won]})
+        if arch_id is None: return df
+        return df.drop(columns='arch_id')
+
+    def curveTotals(self, arch_id:int)->pd.Series:
+        #Column sums of the archetype's ArchGameStats rows: game_count, lands, n0_drops...
+        arches=self.archRows(arch_id)
+        return pd.Series(self.curve_totals[arches].sum(axis=0),index=self.curve_columns)
+
+    def startStats(self, arch_id:int)->pd.DataFrame:
+        #The archetype's ArchStartStats rows ordered by num_mulligans and on_play.
+        arches=self.archRows(arch_id)
+        arch,mulligans,on_play=np.nonzero(self.start_rows[arches])
+        return pd.DataFrame({'num_mulligans':mulligans,'on_play':on_play.astype(bool),
+                             'win_count':self.start_wins[arches][arch,mulligans,on_play],
+                             'game_count':self.start_games[arches][arch,mulligans,on_play]})
+
+    def playDrawTotals(self)->pd.DataFrame:
+        #Wins and games summed over mulligans, indexed by (arch_id, on_play), for archetypes with ArchStartStats rows.
+        present=self.start_rows.any(axis=1)
+        arch,on_play=np.nonzero(present)
+        index=pd.MultiIndex.from_arrays([self.arch_ids[arch],on_play.astype(bool)],names=['arch_id','on_play'])
+        return pd.DataFrame({'wins':self.start_wins.sum(axis=1)[arch,on_play],'games':self.start_games.sum(axis=1)[arch,on_play]},
+                            index=index)
+
+    def meanPicks(self):
+        #Mean pick indexed by card id, or None if the set was built without CardPickStats.
+        if self.mean_picks is None: return None
+        present=~np.isnan(self.mean_picks)
+        return pd.Series(self.mean_picks[present],index=pd.Index(self.card_ids[present],name='card_id'),name='mean_pick')
+
+    def footprint(self)->dict:
+        #Bytes held per array. Strings in object arrays (card names etc.) are counted too.
+        arrays={'arch_ids':self.arch_ids,'card_wins':self.card_wins,'card_games':self.card_games,'card_rows':self.card_rows,
+                'derived_rows':self.derived_rows,'turn_games':self.turn_games,'turn_rows':self.turn_rows,
+                'curve_totals':self.curve_totals,'start_wins':self.start_wins,'start_games':self.start_games,
+                'start_rows':self.start_rows}
+        arrays.update({'cards.'+column:values for column,values in self.cards.items()})
+        arrays.update({'archetypes.'+column:values for column,values in self.archetypes.items()})
+        arrays.update({'derived.'+column:values for column,values in self.derived.items()})
+        if self.mean_picks is not None:
+            arrays['mean_picks']=self.mean_picks
+        sizes={}
+        for name,values in arrays.items():
+            sizes[name]=int(values.nbytes)
+            if values.dtype==object:
+                sizes[name]+=sum(sys.getsizeof(value) for value in values)
+        return {'version':str(self.version),'bytes':sizes,'total_bytes':sum(sizes.values())}
+
+
+class StatStore:
+    #Hands out the current SetStats for a set, loading it on first use and again whenever the set's version changes.
+    #version_of(set_abbr) returns the set's ActiveSets.last_updated, load_tables(set_abbr) returns {kind: DataFrame}
+    #for STORE_TABLES (plus CardPickStats if the set has it) and raises KeyError if one of them doesn't exist.
+    def __init__(self, version_of, load_tables, enabled=True):
+        self.version_of=version_of
+        self.load_tables=load_tables
+        self.enabled=enabled
+        self._lock=threading.Lock()
+        self._sets={} #set_abbr -> (version, SetStats or None if the set's tables couldn't be loaded at that version)
+        self.loads=0
+        self.load_seconds=0.0
+
+    def get(self, set_abbr:str):
+        #Returns the set's SetStats, or None if the store is off or the set is missing tables (callers then query the database).
+        if not self.enabled: return None
+        set_abbr=set_abbr.lower()
+        version=self.version_of(set_abbr)
+        entry=self._sets.get(set_abbr)
+        if entry is not None and entry[0]==version:
+            return entry[1]
+        with self._lock:
+            entry=self._sets.get(set_abbr)
+            if entry is not None and entry[0]==version:
+                return entry[1] #Another thread loaded it while we were waiting for the lock
+            start=time.perf_counter()
+            try:
+                stats=SetStats(set_abbr,version,self.load_tables(set_abbr))
+            except KeyError:
+                stats=None
+            self.loads+=1
+            self.load_seconds+=time.perf_counter()-start
+            self._sets[set_abbr]=(version,stats) #Requests already holding the old SetStats finish with it
+            return stats
+
+    def isLoaded(self, set_abbr:str)->bool:
+        #True if the set has been loaded (or found to be missing tables) at its current version, so get() won't query.
+        if not self.enabled: return True
+        entry=self._sets.get(set_abbr.lower())
+        return entry is not None and entry[0]==self.version_of(set_abbr.lower())
+
+    def clear(self, set_abbr=None):
+        with self._lock:
+            if set_abbr is None:
+                self._sets.clear()
+            else:
+                self._sets.pop(set_abbr.lower(),None)
+
+    def stats(self)->dict:
+        #Memory footprint of every loaded set, plus how many loads there have been and how long they took.
+        sets={set_abbr:stats.footprint() for set_abbr,(version,stats) in list(self._sets.items()) if stats is not None}
+        return {'enabled':self.enabled,'loads':self.loads,'load_seconds':self.load_seconds,'sets':sets,
+                'total_bytes':sum(footprint['total_bytes'] for footprint in sets.values())}
@@ -19,6 +19,12 @@ def bool_check(bool_argument):
     else:
         return 406
 
+#url path segments are strings: 'true'/'false' or '1'/'0' (any case) become bools, anything else None
+def path_bool(path_argument):
+    if(isinstance(path_argument, bool)):
+        return path_argument
+    return {'true':True, '1':True, 'false':False, '0':False}.get(str(path_argument).lower())
+
 #test for set abbreviation
 def set_check(set_abbreviation):
     http_code = str_check(set_abbreviation)
@@ -0,0 +1 @@
+#Benchmarks for the backend and the table build. Run from the repository root, e.g. python3 -m benchmarks.statbench
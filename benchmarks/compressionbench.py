@@ -0,0 +1,87 @@
+#Size/latency comparison for response compression (backend/compression.py).
+#Builds a card table payload shaped like makeCardTable's output for a 300 card set, then measures
+#  1. encoded size and compression time for each encoding/level
+#  2. request latency through a Flask app for: no compression, per-request compression, and a Payload with stored encodings.
+#Run from the repository root: python3 -m benchmarks.compressionbench [--cards 300] [--repeat 50] [--json results.json]
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from flask import Flask
+from backend.compression import Payload, STORED_LEVELS, compressBytes, compressResponse, availableEncodings
+from backend.statfunctions import makeCardTableDF
+
+
+def syntheticCardTable(num_cards:int, seed=0)->str:
+    rng=np.random.default_rng(seed)
+    ids=pd.Index(range(num_cards),name='id')
+    names=['Card Name Number {}'.format(i) for i in range(num_cards)]
+    card_df=pd.DataFrame({'name':names,'color':rng.integers(0,32,num_cards),
+                          'rarity':rng.choice(['C','U','R','M'],num_cards)},index=ids)
+    games=rng.integers(0,50000,num_cards)
+    card_stats_df=pd.DataFrame({'wins':(games*rng.uniform(.4,.6,num_cards)).astype(int),'games_played':games},index=ids)
+    mean_picks=pd.Series(rng.uniform(1,14,num_cards),index=sorted(names))
+    gih=rng.integers(0,30000,num_cards)
+    derived_df=pd.DataFrame({'games_in_hand':gih,'wins_in_hand':(gih*rng.uniform(.4,.65,num_cards)).astype(int),
+                             'adj_gihwr':rng.uniform(.4,.65,num_cards),'adjusted_iwd':rng.uniform(-.1,.1,num_cards),
+                             'inclusion_impact':np.zeros(num_cards)},index=pd.Index(range(num_cards),name='card_id'))
+    return makeCardTableDF(card_df,card_stats_df,mean_picks,derived_df).to_json()
+
+def timeCall(func, repeat:int)->float:
+    #Mean milliseconds per call
+    start=time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter()-start)*1000/repeat
+
+def compressionSizes(payload:str, repeat:int)->list:
+    raw=payload.encode('utf-8')
+    results=[{'encoding':'identity','level':None,'bytes':len(raw),'ratio':1.0,'compress_ms':0.0}]
+    levels={'gzip':[1,6,9],'br':[1,4,9,11]}
+    for encoding in availableEncodings():
+        for level in levels[encoding]:
+            compressed=compressBytes(raw,encoding,level)
+            results.append({'encoding':encoding,'level':level,'bytes':len(compressed),'ratio':len(raw)/len(compressed),
+                            'compress_ms':timeCall(lambda:compressBytes(raw,encoding,level),repeat)})
+    return results
+
+def servingLatency(payload:str, repeat:int)->list:
+    app=Flask(__name__)
+    app.after_request(compressResponse)
+    stored=Payload(payload,levels=STORED_LEVELS)
+    for encoding in availableEncodings(): stored.encoded(encoding) #Compressed once, as a cached/snapshot payload would be
+    from backend.compression import payloadResponse
+    app.add_url_rule('/dynamic','dynamic',lambda:payload)
+    app.add_url_rule('/stored','stored',lambda:payloadResponse(stored))
+    client=app.test_client()
+    results=[]
+    for route in ['/dynamic','/stored']:
+        for encoding in ['identity']+availableEncodings():
+            headers={'Accept-Encoding':encoding}
+            response=client.get(route,headers=headers)
+            results.append({'route':route,'accept_encoding':encoding,'response_bytes':len(response.data),
+                            'request_ms':timeCall(lambda:client.get(route,headers=headers),repeat)})
+    return results
+
+def main():
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--cards',type=int,default=300)
+    parser.add_argument('--repeat',type=int,default=50)
+    parser.add_argument('--json',help='Write results to this file')
+    args=parser.parse_args()
+    payload=syntheticCardTable(args.cards)
+    results={'cards':args.cards,'sizes':compressionSizes(payload,args.repeat),'serving':servingLatency(payload,args.repeat)}
+    print("{:10}{:>7}{:>10}{:>8}{:>14}".format('encoding','level','bytes','ratio','compress ms'))
+    for r in results['sizes']:
+        print("{:10}{:>7}{:>10}{:>8.2f}{:>14.3f}".format(r['encoding'],str(r['level'] or '-'),r['bytes'],r['ratio'],r['compress_ms']))
+    print()
+    print("{:10}{:>10}{:>16}{:>12}".format('route','accept','response bytes','request ms'))
+    for r in results['serving']:
+        print("{:10}{:>10}{:>16}{:>12.3f}".format(r['route'],r['accept_encoding'],r['response_bytes'],r['request_ms']))
+    if args.json:
+        with open(args.json,'w') as f:
+            json.dump(results,f,indent=2)
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,156 @@
+#Wall clock time of splitting GameData by main colors, which populateAllColorData needs for each of the 31 color combinations.
+#Compares the way the build used to get each color's games with the partitioning stage in table_build/buildgamedata.py,
+#on game data written by table_build/syntheticdata.py (--games, --seed):
+#  scan: GameData as one SQLite table (the layout buildgamedata.py used to write) and one SELECT ... WHERE main_colors=?
+#        per color combination, as getGameDataFrame used to do: 31 full scans of an unindexed table
+#  partition: one pass over the csv routing every row to its color's parquet file (partitionGameData, as loadGameData runs it),
+#        then reading each color's file with getGameDataFrame, as populateAllColorData does now
+#  partition_sql: the same single pass over the SQLite table instead of the csv (as partitionSQLGameData runs it)
+#Each color's row count is checked against the scan's, and the partitions made from the csv and from the table against each other.
+#The csv and the SQLite table are kept in --dir and reused by later runs with the same --games and --seed unless --rebuild is given.
+#Run from the repository root: python3 -m benchmarks.partitionbench [--games 100000] [--json results.json]
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import pandas as pd
+
+SET_ABBR='syn'
+DEFAULT_DIR=os.path.join('benchmarks','partitionbench')
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),'table_build'))
+import statfunctions
+from statfunctions import listOfColors, gameDataColors, gameDataFile, getGameDataFrame
+from buildgamedata import csvTypes, readGameChunks, sqlGameChunks, chunkSchema, partitionGameData
+from syntheticdata import writeSyntheticData, gameDataAddress
+sys.path.pop(0)
+
+
+def paramsPath(directory:str)->str:
+    return os.path.join(directory,'params.json')
+
+def storedParams(directory:str):
+    try:
+        with open(paramsPath(directory)) as f:
+            return json.load(f)
+    except (OSError,ValueError):
+        return None
+
+def buildSQLGameData(address:str, db_path:str, chunksize=10000)->float:
+    #GameData as buildgamedata.py wrote it before it was partitioned: one table holding the kept columns of every game,
+    #plus pandas' index column, without any index on main_colors. Returns the seconds it took.
+    t0=time.perf_counter()
+    if os.path.exists(db_path): os.remove(db_path)
+    columns=list(csvTypes(pd.read_csv(address,nrows=0).columns.to_list()))
+    conn=sqlite3.connect(db_path)
+    for df in pd.read_csv(address,chunksize=chunksize,usecols=columns):
+        df[columns].to_sql(SET_ABBR+'GameData',conn,if_exists='append')
+    conn.commit()
+    conn.close()
+    return time.perf_counter()-t0
+
+def prepareData(directory:str, num_games:int, seed:int, rebuild:bool)->dict:
+    params={'games':num_games,'seed':seed}
+    db_path=os.path.join(directory,SET_ABBR+'GameData.db')
+    stored=storedParams(directory) or {}
+    if rebuild or {key:stored.get(key) for key in params}!=params or not os.path.exists(db_path):
+        print("Writing {} synthetic games to {}".format(num_games,directory))
+        writeSyntheticData(directory,num_games,set_abbr=SET_ABBR,seed=seed,draft_fraction=0,verbose=False)
+        params['sqlite_load_seconds']=buildSQLGameData(gameDataAddress(directory,SET_ABBR),db_path)
+        with open(paramsPath(directory),'w') as f:
+            json.dump(params,f)
+    return {'csv':gameDataAddress(directory,SET_ABBR),'db':db_path,'params':storedParams(directory)}
+
+def scanColors(db_path:str)->tuple:
+    #One query per color combination against the whole table, like the SQLite version of getGameDataFrame
+    conn=sqlite3.connect(db_path)
+    counts={}
+    t0=time.perf_counter()
+    for colors in listOfColors()[1:]:
+        df=pd.read_sql_query('SELECT * FROM "{}GameData" WHERE main_colors=?'.format(SET_ABBR),conn,params=(colors,))
+        counts[colors]=df.shape[0]
+    elapsed=time.perf_counter()-t0
+    conn.close()
+    return elapsed,counts
+
+def partitionFromCSV(address:str, data_dir:str)->float:
+    t0=time.perf_counter()
+    dtypes=csvTypes(pd.read_csv(address,nrows=0).columns.to_list())
+    schema=chunkSchema(next(readGameChunks(address,dtypes,nrows=100)))
+    partitionGameData(SET_ABBR,readGameChunks(address,dtypes),schema,data_dir)
+    return time.perf_counter()-t0
+
+def partitionFromSQL(db_path:str, data_dir:str)->float:
+    from sqlalchemy import create_engine
+    engine=create_engine('sqlite:///'+os.path.abspath(db_path))
+    t0=time.perf_counter()
+    schema=chunkSchema(next(sqlGameChunks(engine,SET_ABBR,chunksize=100)))
+    partitionGameData(SET_ABBR,sqlGameChunks(engine,SET_ABBR),schema,data_dir)
+    elapsed=time.perf_counter()-t0
+    engine.dispose()
+    return elapsed
+
+def readPartitions(data_dir:str)->tuple:
+    #Each color's games from its partition, skipping combinations without games as populateAllColorData does
+    statfunctions.GAME_DATA_DIR=data_dir
+    t0=time.perf_counter()
+    partitions=set(gameDataColors(SET_ABBR))
+    counts={colors:getGameDataFrame(colors,SET_ABBR).shape[0] if colors in partitions else 0 for colors in listOfColors()[1:]}
+    return time.perf_counter()-t0,counts
+
+def samePartitions(first_dir:str, second_dir:str)->bool:
+    import pyarrow.parquet as pq
+    statfunctions.GAME_DATA_DIR=first_dir
+    colors=gameDataColors(SET_ABBR)
+    statfunctions.GAME_DATA_DIR=second_dir
+    if gameDataColors(SET_ABBR)!=colors: return False
+    return all(pq.read_table(gameDataFile(c,SET_ABBR,first_dir)).equals(pq.read_table(gameDataFile(c,SET_ABBR,second_dir)))
+               for c in colors)
+
+def gitCommit():
+    try:
+        return subprocess.run(['git','rev-parse','HEAD'],capture_output=True,text=True,check=True).stdout.strip()
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--dir',default=DEFAULT_DIR,help='Directory for the csv, the SQLite table and the partitions')
+    parser.add_argument('--games',type=int,default=100000)
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--rebuild',action='store_true',help='Write the csv and SQLite table again even if they match --games and --seed')
+    parser.add_argument('--json',help='Write results to this file')
+    args=parser.parse_args()
+    directory=os.path.abspath(args.dir)
+    data=prepareData(directory,args.games,args.seed,args.rebuild)
+    csv_dir=os.path.join(directory,'from_csv')
+    sql_dir=os.path.join(directory,'from_sql')
+    scan_seconds,scan_counts=scanColors(data['db'])
+    csv_seconds=partitionFromCSV(data['csv'],csv_dir)
+    read_seconds,read_counts=readPartitions(csv_dir)
+    sql_seconds=partitionFromSQL(data['db'],sql_dir)
+    results={'scan_seconds':scan_seconds,'partition_csv_seconds':csv_seconds,'partition_sql_seconds':sql_seconds,
+             'read_partitions_seconds':read_seconds,'sqlite_load_seconds':data['params'].get('sqlite_load_seconds'),
+             'counts_match':scan_counts==read_counts,'partitions_match':samePartitions(csv_dir,sql_dir)}
+    print("\n{} games, {} color combinations with games".format(args.games,sum(count>0 for count in scan_counts.values())))
+    print("{:<58}{:>10}".format('stage','seconds'))
+    rows=[('scan: 31 SELECT ... WHERE main_colors=? on the SQLite table',scan_seconds),
+          ('partition: one pass over the csv',csv_seconds),
+          ('partition_sql: one pass over the SQLite table',sql_seconds),
+          ('read each color from its partition',read_seconds)]
+    if results['sqlite_load_seconds'] is not None:
+        rows.append(('(loading the csv into the SQLite table)',results['sqlite_load_seconds']))
+    for name,seconds in rows:
+        print("{:<58}{:>10.2f}".format(name,seconds))
+    print("\nscan vs partition + reads: {:.1f}x".format(scan_seconds/(csv_seconds+read_seconds)))
+    print("row counts match the scan: {}, csv and SQLite partitions identical: {}".format(results['counts_match'],results['partitions_match']))
+    if args.json:
+        with open(args.json,'w') as f:
+            json.dump({'commit':gitCommit(),'games':args.games,'seed':args.seed,'pandas':pd.__version__,'results':results},f,indent=2)
+    if not (results['counts_match'] and results['partitions_match']): sys.exit(1)
+
+if __name__=='__main__':
+    main()
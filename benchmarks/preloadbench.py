@@ -0,0 +1,126 @@
+#Cold start and memory comparison for STAT_PRELOAD (see gunicorn.conf.py):
+#  lazy: each worker imports the app itself and loads a set's stat store on the first request for that set
+#  preload: the master imports the app and loads every active set's stat store before forking the workers
+#For each mode a fresh server is started against DATABASE_URL with the stat result cache turned off, and this reports
+#  1. seconds until the server answers and until /ready says a worker is warm
+#  2. latency of the first requests the server sees (one round over every worker) against the warm latency afterwards
+#  3. memory of each worker once all of them have served requests: RSS, PSS (shared pages split between the processes
+#     sharing them) and USS (pages only that worker holds). Copy-on-write sharing shows up as lower PSS/USS, not RSS.
+#Memory is read from /proc/<pid>/smaps_rollup, so this needs Linux.
+#Run from the repository root: python3 -m benchmarks.preloadbench --set ltr --arch WU [--workers 2] [--json results.json]
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+
+MODES={'lazy':'false','preload':'true'}
+
+
+def benchmarkRequests(set_abbr:str, arch_label:str)->list:
+    #(method, path, body) for requests answered from the stat store
+    batch=json.dumps({'requests':[{'function':'getGameInHandWR','args':{'set_abbr':set_abbr,'arch_label':arch_label}},
+                                  {'function':'getArchWinRatesByMulls','args':{'set_abbr':set_abbr,'arch_label':arch_label}},
+                                  {'function':'getPlayDrawSplits','args':{'set_abbr':set_abbr}},
+                                  {'function':'makeFormatOverviewTable','args':{'set_abbr':set_abbr}}]})
+    return [('GET','/compareArchetypes/{}/{},ALL'.format(set_abbr,arch_label),None),
+            ('GET','/getArchAvgCurve/{}/{}/'.format(set_abbr,arch_label),None),
+            ('POST','/batch',batch)]
+
+def timedRequest(port:int, method:str, path:str, body=None):
+    #Returns (status, seconds) on a new connection, so gunicorn hands the request to whichever worker accepts first.
+    conn=http.client.HTTPConnection('127.0.0.1',port,timeout=120)
+    start=time.perf_counter()
+    conn.request(method,path,body=body,headers={'Content-Type':'application/json'} if body else {})
+    response=conn.getresponse()
+    response.read()
+    elapsed=time.perf_counter()-start
+    conn.close()
+    return response.status,elapsed
+
+def startServer(mode:str, port:int, workers:int):
+    #Returns the server process and seconds until it answered /api.
+    env=dict(os.environ,PORT=str(port),WEB_CONCURRENCY=str(workers),STAT_CACHE_MAX_BYTES='0',STAT_PRELOAD=MODES[mode])
+    start=time.monotonic()
+    server=subprocess.Popen([sys.executable,'-m','gunicorn','-c','gunicorn.conf.py','app:flask_app'],env=env,
+                            stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+    while time.monotonic()-start<120:
+        try:
+            timedRequest(port,'GET','/api')
+            return server,time.monotonic()-start
+        except OSError:
+            time.sleep(.05)
+    server.terminate()
+    raise RuntimeError("{} server didn't start".format(mode))
+
+def workerPIDs(master_pid:int)->list:
+    with open('/proc/{0}/task/{0}/children'.format(master_pid)) as f:
+        return [int(pid) for pid in f.read().split()]
+
+def processMemory(pid:int)->dict:
+    #RSS, PSS and USS in MiB
+    fields={}
+    with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+        for line in f:
+            parts=line.split()
+            if len(parts)==3 and parts[2]=='kB':
+                fields[parts[0].rstrip(':')]=int(parts[1])/1024
+    return {'rss_mib':fields['Rss'],'pss_mib':fields['Pss'],'uss_mib':fields['Private_Clean']+fields['Private_Dirty']}
+
+def runMode(mode:str, args, requests:list)->dict:
+    server,startup_seconds=startServer(mode,args.port,args.workers)
+    try:
+        status,_=timedRequest(args.port,'GET','/ready')
+        ready_at_start=status==200
+        #First round: every request once per worker, while the workers are as cold as they will ever be
+        first=[]
+        for _ in range(args.workers):
+            for method,path,body in requests:
+                status,elapsed=timedRequest(args.port,method,path,body)
+                first.append(elapsed)
+        #Keep going until every worker has served each request a few times, then time the warm requests
+        for _ in range(args.workers*5):
+            for method,path,body in requests:
+                timedRequest(args.port,method,path,body)
+        warm=[timedRequest(args.port,method,path,body)[1] for _ in range(args.repeat) for method,path,body in requests]
+        memory=[processMemory(pid) for pid in workerPIDs(server.pid)]
+        master_memory=processMemory(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+    first_ms=np.array(first)*1000
+    warm_ms=np.array(warm)*1000
+    return {'mode':mode,'workers':args.workers,'startup_seconds':startup_seconds,'ready_at_start':ready_at_start,
+            'first_request_ms':float(first_ms[0]),'first_round_mean_ms':float(first_ms.mean()),'first_round_max_ms':float(first_ms.max()),
+            'warm_p50_ms':float(np.percentile(warm_ms,50)),'master':master_memory,'worker_memory':memory,
+            'worker_rss_mib':float(np.mean([m['rss_mib'] for m in memory])),
+            'worker_pss_mib':float(np.mean([m['pss_mib'] for m in memory])),
+            'worker_uss_mib':float(np.mean([m['uss_mib'] for m in memory]))}
+
+def main():
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--set',required=True)
+    parser.add_argument('--arch',default='WU')
+    parser.add_argument('--workers',type=int,default=2)
+    parser.add_argument('--repeat',type=int,default=20)
+    parser.add_argument('--port',type=int,default=8766)
+    parser.add_argument('--modes',nargs='+',default=list(MODES),choices=list(MODES))
+    parser.add_argument('--json',help='Write results to this file')
+    args=parser.parse_args()
+    requests=benchmarkRequests(args.set,args.arch)
+    results=[runMode(mode,args,requests) for mode in args.modes]
+    print("{:8}{:>10}{:>8}{:>11}{:>12}{:>10}{:>10}{:>10}{:>10}".format('mode','startup s','ready','first ms','1st round','warm ms',
+                                                                        'RSS MiB','PSS MiB','USS MiB'))
+    for r in results:
+        print("{:8}{:>10.2f}{:>8}{:>11.1f}{:>12.1f}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}".format(
+            r['mode'],r['startup_seconds'],str(r['ready_at_start']),r['first_request_ms'],r['first_round_mean_ms'],r['warm_p50_ms'],
+            r['worker_rss_mib'],r['worker_pss_mib'],r['worker_uss_mib']))
+    if args.json:
+        with open(args.json,'w') as f:
+            json.dump(results,f,indent=2)
+
+if __name__=='__main__':
+    main()
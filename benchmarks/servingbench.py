@@ -0,0 +1,110 @@
+#Throughput comparison of the two ways of serving the API:
+#  sync: gunicorn app:flask_app with sync workers (the Procfile setup)
+#  asgi: gunicorn with uvicorn workers running asgi:asgi_app (async database driver, bounded thread pool)
+#Each server is started against DATABASE_URL with the stat result cache turned off, so every request reaches the database.
+#Then `concurrency` client threads send requests for `duration` seconds and requests/second and latency percentiles are reported.
+#Needs requirements-async.txt installed and a built set in the database.
+#Run from the repository root: python3 -m benchmarks.servingbench --set ltr --arch WU [--workers 2] [--concurrency 1 8 32] [--duration 15] [--json results.json]
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+MODES={'sync':['app:flask_app'],
+       'asgi':['-k','uvicorn.workers.UvicornWorker','asgi:asgi_app']}
+
+
+def benchmarkRequests(set_abbr:str, arch_label:str)->list:
+    #(method, path, body) for a mix of cheap lookups and the slow aggregate queries
+    mean_decklist=json.dumps({'requests':[{'function':'getMeanDecklist','args':{'set_abbr':set_abbr,'arch_label':arch_label}}]})
+    return [('GET','/cardInfo/{}'.format(set_abbr),None),
+            ('GET','/getArchRecords/{}/{}/'.format(set_abbr,arch_label),None),
+            ('POST','/batch',mean_decklist)]
+
+def startServer(mode:str, port:int, workers:int):
+    env=dict(os.environ,PORT=str(port),WEB_CONCURRENCY=str(workers),STAT_CACHE_MAX_BYTES='0')
+    server=subprocess.Popen([sys.executable,'-m','gunicorn','-c','gunicorn.conf.py']+MODES[mode],env=env,
+                            stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+    deadline=time.monotonic()+30
+    while time.monotonic()<deadline:
+        try:
+            conn=http.client.HTTPConnection('127.0.0.1',port,timeout=5)
+            conn.request('GET','/api')
+            conn.getresponse().read()
+            return server
+        except OSError:
+            time.sleep(.2)
+    server.terminate()
+    raise RuntimeError("{} server didn't start".format(mode))
+
+def runLoad(port:int, requests:list, concurrency:int, duration:float)->dict:
+    latencies=[]
+    errors=[0]
+    lock=threading.Lock()
+    stop_at=time.monotonic()+duration
+    def client(offset:int):
+        conn=http.client.HTTPConnection('127.0.0.1',port,timeout=120)
+        i=offset
+        while time.monotonic()<stop_at:
+            method,path,body=requests[i%len(requests)]
+            i+=1
+            start=time.perf_counter()
+            try:
+                conn.request(method,path,body=body,headers={'Content-Type':'application/json'} if body else {})
+                response=conn.getresponse()
+                response.read()
+                ok=response.status==200
+            except (OSError,http.client.HTTPException):
+                conn.close()
+                conn=http.client.HTTPConnection('127.0.0.1',port,timeout=120)
+                ok=False
+            elapsed=time.perf_counter()-start
+            with lock:
+                if ok: latencies.append(elapsed)
+                else: errors[0]+=1
+    start=time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client,range(concurrency)))
+    wall=time.monotonic()-start
+    ms=np.array(latencies)*1000 if latencies else np.zeros(1)
+    return {'concurrency':concurrency,'requests':len(latencies),'errors':errors[0],'requests_per_second':len(latencies)/wall,
+            'p50_ms':float(np.percentile(ms,50)),'p95_ms':float(np.percentile(ms,95)),'max_ms':float(ms.max())}
+
+def main():
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--set',required=True)
+    parser.add_argument('--arch',default='WU')
+    parser.add_argument('--workers',type=int,default=2)
+    parser.add_argument('--concurrency',type=int,nargs='+',default=[1,8,32])
+    parser.add_argument('--duration',type=float,default=15)
+    parser.add_argument('--port',type=int,default=8765)
+    parser.add_argument('--modes',nargs='+',default=list(MODES),choices=list(MODES))
+    parser.add_argument('--json',help='Write results to this file')
+    args=parser.parse_args()
+    requests=benchmarkRequests(args.set,args.arch)
+    results=[]
+    for mode in args.modes:
+        server=startServer(mode,args.port,args.workers)
+        try:
+            runLoad(args.port,requests,args.workers,2) #Warm up: imports, table reflection, pool connections
+            for concurrency in args.concurrency:
+                results.append(dict(mode=mode,workers=args.workers,**runLoad(args.port,requests,concurrency,args.duration)))
+        finally:
+            server.terminate()
+            server.wait()
+    print("{:6}{:>8}{:>13}{:>10}{:>9}{:>10}{:>10}{:>10}".format('mode','workers','concurrency','requests','errors','req/s','p50 ms','p95 ms'))
+    for r in results:
+        print("{:6}{:>8}{:>13}{:>10}{:>9}{:>10.1f}{:>10.1f}{:>10.1f}".format(r['mode'],r['workers'],r['concurrency'],r['requests'],
+                                                                         r['errors'],r['requests_per_second'],r['p50_ms'],r['p95_ms']))
+    if args.json:
+        with open(args.json,'w') as f:
+            json.dump(results,f,indent=2)
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,121 @@
+#Import time report for the API's entry points, checked against a budget so startup regressions are visible.
+#Each run imports the entry point in a fresh interpreter with python -X importtime and reports
+#  1. wall time for the import (median over --repeat runs)
+#  2. the slowest modules by cumulative import time, and self time summed per top level package
+#  3. whether any of the analytics stack (pandas, numpy, SQLAlchemy, psycopg2) got imported. The API should only pull
+#     those in on the first stat request, which is timed separately when --set is given.
+#Exits with status 1 if the median import exceeds --budget-ms or a deferred module was imported at startup.
+#DATABASE_URL is removed from the environment for the import runs, since the app must start without it.
+#Run from the repository root: python3 -m benchmarks.startupbench [--target app] [--budget-ms 600] [--set ltr --arch WU] [--json results.json]
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+import numpy as np
+
+DEFERRED_MODULES=['pandas','numpy','sqlalchemy','psycopg2','backend.stataccess','backend.statfunctions']
+
+IMPORT_SCRIPT="""
+import sys, time, json
+start=time.perf_counter()
+import {target}
+elapsed=time.perf_counter()-start
+print(json.dumps({{'seconds':elapsed,'loaded':[m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+FIRST_REQUEST_SCRIPT="""
+import time, json
+start=time.perf_counter()
+from app import flask_app
+imported=time.perf_counter()
+client=flask_app.test_client()
+response=client.get({path!r})
+first=time.perf_counter()
+client.get({path!r})
+second=time.perf_counter()
+print(json.dumps({{'status':response.status_code,'import_seconds':imported-start,'first_request_seconds':first-imported,
+                  'second_request_seconds':second-first}}))
+"""
+
+
+def parseImportTimes(stderr:str)->list:
+    #-X importtime lines look like "import time:   self_us |  cumulative_us | <indent>module"
+    rows=[]
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us,cumulative_us,name=line[len('import time:'):].split('|')
+        rows.append({'module':name.strip(),'self_ms':int(self_us)/1000,'cumulative_ms':int(cumulative_us)/1000})
+    return rows
+
+def importRun(target:str)->dict:
+    env={key:value for key,value in os.environ.items() if key!='DATABASE_URL'}
+    script=IMPORT_SCRIPT.format(target=target,deferred=DEFERRED_MODULES)
+    result=subprocess.run([sys.executable,'-X','importtime','-c',script],env=env,capture_output=True,text=True)
+    if result.returncode!=0:
+        raise RuntimeError("import {} failed:\n{}".format(target,result.stderr[-2000:]))
+    output=json.loads(result.stdout.strip().splitlines()[-1])
+    output['modules']=parseImportTimes(result.stderr)
+    return output
+
+def firstRequestRun(set_abbr:str, arch_label:str)->dict:
+    path='/getArchRecords/{}/{}/'.format(set_abbr,arch_label)
+    env=dict(os.environ,STAT_CACHE_MAX_BYTES='0')
+    result=subprocess.run([sys.executable,'-c',FIRST_REQUEST_SCRIPT.format(path=path)],env=env,capture_output=True,text=True)
+    if result.returncode!=0:
+        raise RuntimeError("first request run failed:\n"+result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def packageTotals(modules:list)->dict:
+    #Self time summed by top level package, e.g. every flask.* and werkzeug.* module under flask and werkzeug.
+    totals=defaultdict(float)
+    for row in modules:
+        totals[row['module'].split('.')[0]]+=row['self_ms']
+    return dict(sorted(totals.items(),key=lambda item:-item[1]))
+
+def main():
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--target',default='app',help='Module to import, e.g. app or asgi')
+    parser.add_argument('--repeat',type=int,default=5)
+    parser.add_argument('--top',type=int,default=15)
+    parser.add_argument('--budget-ms',type=float,default=600)
+    parser.add_argument('--set',help='Also time the first stat request for this set (needs DATABASE_URL)')
+    parser.add_argument('--arch',default='WU')
+    parser.add_argument('--json',help='Write results to this file')
+    args=parser.parse_args()
+    runs=[importRun(args.target) for _ in range(args.repeat)]
+    import_ms=float(np.median([run['seconds'] for run in runs])*1000)
+    last=runs[-1]
+    slowest=sorted(last['modules'],key=lambda row:-row['cumulative_ms'])[:args.top]
+    packages=packageTotals(last['modules'])
+    print("import {}: {:.1f} ms median over {} runs (budget {:.0f} ms)".format(args.target,import_ms,args.repeat,args.budget_ms))
+    print("\n{:>14}{:>12}  module".format('cumulative ms','self ms'))
+    for row in slowest:
+        print("{:>14.1f}{:>12.1f}  {}".format(row['cumulative_ms'],row['self_ms'],row['module']))
+    print("\n{:>14}  package".format('self ms'))
+    for package,ms in list(packages.items())[:args.top]:
+        print("{:>14.1f}  {}".format(ms,package))
+    results={'target':args.target,'import_ms':import_ms,'budget_ms':args.budget_ms,'deferred_loaded':last['loaded'],
+             'slowest_modules':slowest,'package_self_ms':packages}
+    if args.set:
+        first=firstRequestRun(args.set,args.arch)
+        results['first_request']=first
+        print("\nfirst stat request: {:.1f} ms (status {}), second: {:.1f} ms".format(
+            first['first_request_seconds']*1000,first['status'],first['second_request_seconds']*1000))
+    failures=[]
+    if import_ms>args.budget_ms:
+        failures.append("import took {:.1f} ms, over the {:.0f} ms budget".format(import_ms,args.budget_ms))
+    if last['loaded']:
+        failures.append("imported at startup: "+', '.join(last['loaded']))
+    results['failures']=failures
+    if args.json:
+        with open(args.json,'w') as f:
+            json.dump(results,f,indent=2)
+    for failure in failures:
+        print("FAIL: "+failure)
+    sys.exit(1 if failures else 0)
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,417 @@
+#Latency and peak memory of every public stat function in backend/stataccess.py, on a synthetic set built for the benchmark.
+#The set is simulated with table_build/syntheticdata.py (--decks decks, 100000 by default) and aggregated straight into the
+#tables the stat functions read, which takes a minute or two instead of the hours the table_build pipeline would:
+#  CardInfo, Archetypes (with subarchetypes for the popular color pairs), Decklists, DecklistCube, CardGameStats,
+#  CardDerivedStats, ArchGameStats, ArchStartStats, DraftPacks, CardPickStats, CardTableSnapshots and ActiveSets.
+#Counts are exact for the simulated games. adj_gihwr and adjusted_iwd are computed per archetype directly, not combined
+#from subarchetypes the way the pipeline does, which doesn't matter for timing.
+#The database is an SQLite file (--db), reused by later runs with the same --decks and --seed unless --rebuild is given.
+#Each case is one function with one set of arguments: ALL vs a color pair vs one of its subarchetypes, rank and wins
+#filters, index_by_name, as_json, and so on. The result cache is cleared before every call, so each call computes its
+#result, once with the stat store and once from SQL (--modes). Each case reports
+#  1. median, p95 and min latency over --repeat calls, after one warm-up call
+#  2. peak memory traced by tracemalloc during one more call (numpy and pandas buffers included, the sqlite driver's not)
+#Results are written as json (--json) along with the commit, library versions and database parameters.
+#--compare old.json prints each case's median next to an earlier run's, so changes can be compared across commits.
+#Run from the repository root: python3 -m benchmarks.statbench [--decks 100000] [--repeat 10] [--modes store sql] [--json results.json] [--compare old.json]
+import argparse
+import datetime
+import gzip
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+SET_ABBR='bench'
+DEFAULT_DB=os.path.join('benchmarks','statbench.db')
+SUBARCHETYPE_MIN_SHARE=.04 #Color combinations with at least this share of decks are split into subarchetypes by theme
+MAX_COPIES=40
+MAX_TURNS=22
+PACK_DRAFTS=4000 #Drafts simulated for DraftPacks
+MODES=['store','sql']
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),'table_build'))
+from syntheticdata import SyntheticSet, DRAFTS_PER_CHUNK, GAMES_PER_DRAFT, NUM_THEMES, colorString
+from statfunctions import cardPickStats
+sys.path.pop(0) #table_build's stataccess and statfunctions mustn't shadow the backend's
+
+
+def archetypeIDs(synthetic:SyntheticSet)->tuple:
+    #Archetypes rows in the pipeline's order (colors, ALL, then subarchetypes) and the colors that get subarchetypes.
+    #Subarchetypes are the deck themes (WU1, WU2, ...); splashing decks are left uncategorized (WU9).
+    split=np.flatnonzero(synthetic.color_shares>=SUBARCHETYPE_MIN_SHARE)
+    subarchetypes=[number*32+color for color in split for number in list(range(1,NUM_THEMES+1))+[9]]
+    return list(range(1,32))+[-1]+subarchetypes,split
+
+def archLabel(arch_id:int)->str:
+    if arch_id==-1: return 'ALL'
+    return colorString(arch_id%32)+(str(arch_id//32) if arch_id>=32 else '')
+
+def deckArchetypes(decks:dict, split:np.ndarray)->np.ndarray:
+    number=np.where(decks['splash']>0,9,decks['theme']+1)
+    return np.where(np.isin(decks['colors'],split),number*32+decks['colors'],decks['colors'])
+
+def curveMatrix(synthetic:SyntheticSet)->np.ndarray:
+    #(num_cards, 11): lands, then 0 to 8 drops and 9+ drops, as in ArchGameStats
+    mana_values=synthetic.mana_values
+    column=np.where(synthetic.is_land,0,np.minimum(mana_values,9)+1)
+    curve=np.zeros((synthetic.num_cards,11))
+    curve[np.arange(synthetic.num_cards),column]=1
+    return curve
+
+def buildBenchDatabase(path:str, num_decks:int, seed=0, set_abbr=SET_ABBR):
+    #Simulates num_decks decks and their games and writes every table the stat functions read into a new SQLite file at path.
+    from sqlalchemy import create_engine
+    from backend.statfunctions import makeCardTableDF
+    try:
+        import brotli
+    except ImportError:
+        brotli=None
+    t0=time.time()
+    synthetic=SyntheticSet(set_abbr,seed)
+    num_cards=synthetic.num_cards
+    arch_ids,split=archetypeIDs(synthetic)
+    num_archs=len(arch_ids)
+    arch_index=np.full(10*32,-1)
+    arch_index[[a for a in arch_ids if a>0]]=[i for i,a in enumerate(arch_ids) if a>0]
+    all_index=arch_ids.index(-1)
+    curve=curveMatrix(synthetic)
+    #Running totals, by position in arch_ids
+    copies_wins=np.zeros((num_archs,num_cards,MAX_COPIES+1))
+    copies_games=np.zeros((num_archs,num_cards,MAX_COPIES+1))
+    hand_wins=np.zeros((num_archs,num_cards))
+    hand_games=np.zeros((num_archs,num_cards))
+    turn_totals=np.zeros((num_archs,2,MAX_TURNS+1,12)) #game_count, then the curve columns
+    start_totals=np.zeros((num_archs,4,2,2)) #num_mulligans, on_play, (wins, games)
+    arch_totals=np.zeros((num_archs,3)) #drafts, wins, games
+    deck_frames=[]
+    for start in range(0,num_decks,DRAFTS_PER_CHUNK):
+        n=min(DRAFTS_PER_CHUNK,num_decks-start)
+        decks=synthetic.makeDecks(n)
+        games=synthetic.playGames(decks)
+        played=games['played']
+        wins=(games['won']&played).sum(axis=1)
+        num_games=played.sum(axis=1)
+        deck_arch=deckArchetypes(decks,split)
+        #Positions in the arrays below: game (played games only), card seen in a game, card in a deck
+        game_index=np.flatnonzero(played.ravel())
+        game_deck=game_index//GAMES_PER_DRAFT
+        won=games['won'].ravel()[game_index]
+        turns=games['turns'].ravel()[game_index]
+        start_index=games['mulligans'].ravel()[game_index]*2+games['on_play'].ravel()[game_index]
+        seen_game,seen_card=np.nonzero((games['opening_hand'][game_index]+games['drawn'][game_index])>0)
+        deck_row,card=np.nonzero(decks['deck_counts'])
+        copies=decks['deck_counts'][deck_row,card]
+        curve_weights=np.concatenate([np.ones((len(game_index),1)),(decks['deck_counts']@curve)[game_deck]],axis=1)
+        #Every deck counts toward its color combination, split decks toward their subarchetype too, and all of them toward ALL.
+        #CardGameStats and ArchGameStats have no rows for ALL.
+        for keys,by_card in [(arch_index[decks['colors']],True),(np.where(deck_arch>=32,arch_index[deck_arch],-1),True),
+                             (np.full(n,all_index),False)]:
+            included=keys>=0
+            arch_totals[:,0]+=np.bincount(keys[included],minlength=num_archs)
+            arch_totals[:,1]+=np.bincount(keys[included],weights=wins[included],minlength=num_archs)
+            arch_totals[:,2]+=np.bincount(keys[included],weights=num_games[included],minlength=num_archs)
+            game_keys=keys[game_deck]
+            in_game=game_keys>=0
+            in_hand=game_keys[seen_game]>=0
+            hand_key=game_keys[seen_game][in_hand]*num_cards+seen_card[in_hand]
+            hand_games+=np.bincount(hand_key,minlength=num_archs*num_cards).reshape(hand_games.shape)
+            hand_wins+=np.bincount(hand_key,weights=won[seen_game[in_hand]],minlength=num_archs*num_cards).reshape(hand_wins.shape)
+            start_key=(game_keys*8+start_index)[in_game]
+            start_totals[...,0]+=np.bincount(start_key,weights=won[in_game],minlength=num_archs*8).reshape(num_archs,4,2)
+            start_totals[...,1]+=np.bincount(start_key,minlength=num_archs*8).reshape(num_archs,4,2)
+            if not by_card: continue
+            in_deck=keys[deck_row]>=0
+            copy_key=((keys[deck_row]*num_cards+card)*(MAX_COPIES+1)+copies)[in_deck]
+            copies_games+=np.bincount(copy_key,weights=num_games[deck_row[in_deck]],minlength=copies_games.size).reshape(copies_games.shape)
+            copies_wins+=np.bincount(copy_key,weights=wins[deck_row[in_deck]],minlength=copies_wins.size).reshape(copies_wins.shape)
+            turn_key=((game_keys*2+won)*(MAX_TURNS+1)+turns)[in_game]
+            for column in range(12):
+                turn_totals[...,column]+=np.bincount(turn_key,weights=curve_weights[in_game,column],
+                                                     minlength=num_archs*2*(MAX_TURNS+1)).reshape(num_archs,2,MAX_TURNS+1)
+        deck_df=pd.DataFrame(decks['deck_counts'],columns=synthetic.names)
+        deck_df.insert(0,'draft_id',decks['draft_id'])
+        deck_df.insert(1,'draft_time',decks['draft_time'])
+        deck_df.insert(2,'rank',decks['rank']+1)
+        deck_df.insert(3,'wins',wins)
+        deck_df.insert(4,'games',num_games)
+        deck_df.insert(5,'main_colors',[colorString(c) for c in decks['colors']])
+        deck_df.insert(6,'arch_id',deck_arch)
+        deck_df.insert(7,'color',decks['colors'])
+        deck_frames.append(deck_df)
+    t1=time.time()
+    #Decklists: grouped by color combination, then archetype, each section in (rank, wins) order like makeDecklistSection
+    decklists=pd.concat(deck_frames,ignore_index=True).sort_values(['color','arch_id','rank','wins'],kind='stable')
+    decklists=decklists.drop(columns='color')
+    decklists.insert(0,'deck_id',np.arange(len(decklists)))
+    cube=decklists.groupby(['arch_id','main_colors','rank','wins'])
+    cube_df=pd.concat([cube.size().rename('num_decks'),cube['games'].sum().rename('num_games'),
+                       cube['deck_id'].min().rename('first_deck_id'),cube[synthetic.names].sum()],axis=1).reset_index()
+    card_df=synthetic.cards[['name','mana_value','color','card_type','rarity']].copy()
+    card_df.insert(0,'id',card_df.index)
+    has_games=arch_totals[:,2]>0
+    archetypes=pd.DataFrame({'id':arch_ids,'arch_label':[archLabel(a) for a in arch_ids],
+                             'num_drafts':arch_totals[:,0],'num_wins':arch_totals[:,1],
+                             'num_losses':arch_totals[:,2]-arch_totals[:,1]}).astype({'num_drafts':int,'num_wins':int,'num_losses':int})
+    archetypes.loc[all_index,['num_drafts','num_wins','num_losses']]=0 #populateAllColorData leaves the ALL row empty
+    archetypes=archetypes[has_games|(archetypes['id']<32)] #Subarchetypes exist only if some deck was sorted into them
+    arch_i,card_i,copies=np.nonzero(copies_games)
+    card_game_stats=pd.DataFrame({'id':card_i,'arch_id':np.array(arch_ids)[arch_i],'copies':copies,
+                                  'win_count':copies_wins[arch_i,card_i,copies].astype(int),
+                                  'game_count':copies_games[arch_i,card_i,copies].astype(int)})
+    card_game_stats=card_game_stats[card_game_stats['arch_id']!=-1]
+    derived_frames=[]
+    for i in np.flatnonzero(has_games):
+        #Win rates in hand and in deck, centered on the archetype's win rate like insertArchToCardTables
+        deck_games=copies_games[i].sum(axis=1) if arch_ids[i]!=-1 else copies_games.sum(axis=(0,2))
+        deck_wins=copies_wins[i].sum(axis=1) if arch_ids[i]!=-1 else copies_wins.sum(axis=(0,2))
+        gihwr=np.divide(hand_wins[i],hand_games[i],out=np.zeros(num_cards),where=hand_games[i]>0)
+        not_in_hand=deck_games-hand_games[i]
+        gnihwr=np.divide(deck_wins-hand_wins[i],not_in_hand,out=np.zeros(num_cards),where=not_in_hand>0)
+        win_rate=arch_totals[i,1]/arch_totals[i,2]
+        neutral_gihwr=hand_wins[i].sum()/max(hand_games[i].sum(),1)
+        iwd=gihwr-gnihwr
+        neutral_iwd=np.average(iwd,weights=hand_games[i]) if hand_games[i].sum()>0 else 0
+        derived_frames.append(pd.DataFrame({'arch_id':arch_ids[i],'card_id':np.arange(num_cards),
+                                            'games_in_hand':hand_games[i].astype(int),'wins_in_hand':hand_wins[i].astype(int),
+                                            'adj_gihwr':gihwr-neutral_gihwr+win_rate,'adjusted_iwd':iwd-neutral_iwd,'inclusion_impact':0.0}))
+    derived_stats=pd.concat(derived_frames,ignore_index=True)
+    turn_rows=[]
+    for i in np.flatnonzero(has_games):
+        if arch_ids[i]==-1: continue
+        for won in (True,False):
+            observed=np.flatnonzero(turn_totals[i,int(won),:,0])
+            for turns in range(1,observed.max()+1 if len(observed) else 1):
+                totals=turn_totals[i,int(won),turns]
+                turn_rows.append([arch_ids[i],won,turns]+totals.astype(int).tolist())
+    arch_game_stats=pd.DataFrame(turn_rows,columns=['arch_id','won','turns','game_count','lands']+
+                                 ['n{}_drops'.format(mv) for mv in range(9)]+['n9p_drops'])
+    start_rows=[[arch_ids[i],mulligans,bool(on_play),int(start_totals[i,mulligans,on_play,0]),int(start_totals[i,mulligans,on_play,1])]
+                for i in np.flatnonzero(has_games) for mulligans in range(4) for on_play in range(2)]
+    arch_start_stats=pd.DataFrame(start_rows,columns=['arch_id','num_mulligans','on_play','win_count','game_count'])
+    #DraftPacks and CardPickStats, from a separate batch of simulated drafts
+    pack_decks=synthetic.makeDecks(min(PACK_DRAFTS,num_decks))
+    picks=synthetic.makePicks(pack_decks,np.arange(len(pack_decks['colors'])))
+    pack_df=pd.DataFrame(picks['pack_counts'].astype(np.int64),columns=['pack_card_'+name for name in synthetic.names])
+    pack_df.insert(0,'pack_number',picks['pack_number'])
+    pack_df.insert(1,'pick_number',picks['pick_number'])
+    pack_df=pack_df.groupby(['pack_number','pick_number']).sum()
+    at_first=picks['pick_number']==0
+    first_picks=pd.Series(1,index=pd.MultiIndex.from_arrays([picks['pack_number'][at_first],np.array(synthetic.names)[picks['pick'][at_first]]]))
+    pick_stats=cardPickStats(pack_df,first_picks.groupby(level=[0,1]).sum())
+    pick_stats.insert(0,'card_id',pick_stats['name'].map(pd.Series(card_df.index,index=card_df['name'])).values)
+    pick_stats=pick_stats.drop(columns='name')
+    #CardTableSnapshots, assembled like populateCardTableSnapshots
+    snapshot_cards=card_df.set_index('id')[['name','color','rarity']]
+    card_totals=card_game_stats.groupby(['id','arch_id'])[['win_count','game_count']].sum().reset_index()
+    card_totals.columns=['id','arch_id','wins','games_played']
+    mean_picks=pick_stats[pick_stats['pack_number']==-1].set_index('card_id')['mean_pick']
+    snapshots=[]
+    for arch_id in archetypes['id']:
+        if arch_id==-1:
+            arch_card_stats=card_totals[['id','wins','games_played']].groupby('id').sum()
+        else:
+            arch_card_stats=card_totals[card_totals['arch_id']==arch_id].set_index('id')[['wins','games_played']]
+        arch_derived=derived_stats[derived_stats['arch_id']==arch_id].set_index('card_id')
+        arch_derived=arch_derived[['games_in_hand','wins_in_hand','adj_gihwr','adjusted_iwd','inclusion_impact']]
+        card_table_json=makeCardTableDF(snapshot_cards,arch_card_stats,mean_picks,arch_derived).to_json()
+        raw=card_table_json.encode('utf-8')
+        snapshots.append({'arch_id':int(arch_id),'card_table':card_table_json,'card_table_gzip':gzip.compress(raw,compresslevel=9,mtime=0),
+                          'card_table_br':brotli.compress(raw,quality=11) if brotli is not None else None})
+    t2=time.time()
+    building=path+'.building'
+    if os.path.exists(building): os.remove(building)
+    engine=create_engine('sqlite:///'+os.path.abspath(building))
+    with engine.begin() as conn:
+        pd.DataFrame({'set_abbr':[set_abbr],'set_name':[benchSetName(num_decks,seed)],'set_release_date':[None],
+                      'last_updated':[pd.Timestamp.now()]}).to_sql('ActiveSets',conn,index=False)
+        tables={'CardInfo':card_df,'Archetypes':archetypes,'Decklists':decklists,'DecklistCube':cube_df,
+                'CardGameStats':card_game_stats,'CardDerivedStats':derived_stats,'ArchGameStats':arch_game_stats,
+                'ArchStartStats':arch_start_stats,'CardPickStats':pick_stats,'CardTableSnapshots':pd.DataFrame(snapshots)}
+        for kind,df in tables.items():
+            df.to_sql(set_abbr+kind,conn,index=False,chunksize=5000)
+        pack_df.to_sql(set_abbr+'DraftPacks',conn,index=True)
+    engine.dispose()
+    os.replace(building,path)
+    print("Built {} with {} decks ({} archetypes, {} CardGameStats rows): simulated in {:.1f} s, aggregated in {:.1f} s, written in {:.1f} s".format(
+        path,len(decklists),len(archetypes),len(card_game_stats),t1-t0,t2-t1,time.time()-t2))
+
+def benchSetName(num_decks:int, seed:int)->str:
+    #Stored in ActiveSets, so a database built with other parameters is noticed and rebuilt
+    return 'Benchmark set ({} decks, seed {})'.format(num_decks,seed)
+
+def storedSetName(path:str, set_abbr=SET_ABBR):
+    import sqlite3
+    if not os.path.exists(path): return None
+    conn=sqlite3.connect(path)
+    try:
+        row=conn.execute('select set_name from "ActiveSets" where set_abbr=?',(set_abbr,)).fetchone()
+    except sqlite3.Error:
+        row=None
+    conn.close()
+    return row[0] if row else None
+
+
+def benchmarkCases(sa, set_abbr=SET_ABBR)->list:
+    #(function name, variant, kwargs) for every public stat function. The archetypes are the most played color pair,
+    #which has subarchetypes, its first subarchetype, and the most played combination without subarchetypes.
+    labels=list(json.loads(sa.getArchetypeLabels(set_abbr))['arch_label'].values())
+    meta=sa.makeFormatOverviewTable(set_abbr,as_json=False,include_subarchetypes=False)
+    ordered=meta[meta['id']>0].sort_values('num_drafts',ascending=False).index.tolist()
+    split=[label for label in ordered if label+'1' in labels]
+    color=split[0] if split else ordered[0]
+    sub=color+'1' if split else color
+    other=next(label for label in ordered if label not in split)
+    card_name=sa.getMeanDecklist(set_abbr,color,as_json=False).drop(columns='num_decks').iloc[0].idxmax()
+    s=set_abbr
+    cases=[('getActiveSets','',{}),
+           ('getMostRecentSet','',{}),
+           ('getCardInfo','json',{'set_abbr':s}),
+           ('getCardInfo','dataframe',{'set_abbr':s,'as_json':False}),
+           ('getMetaDistribution','all ranks',{'set_abbr':s}),
+           ('getMetaDistribution','rank>=4',{'set_abbr':s,'min_rank':4}),
+           ('getArchetypeLabels','ALL',{'set_abbr':s}),
+           ('getArchetypeLabels','color',{'set_abbr':s,'main_colors':color}),
+           ('getCardPickStats','all packs',{'set_abbr':s}),
+           ('getCardPickStats','pack 1',{'set_abbr':s,'pack_number':1}),
+           ('getCardPickStats','dataframe',{'set_abbr':s,'as_json':False}),
+           ('makeFormatOverviewTable','subarchetypes',{'set_abbr':s}),
+           ('makeFormatOverviewTable','colors only',{'set_abbr':s,'include_subarchetypes':False}),
+           ('makeFormatOverviewTable','rank 4-6',{'set_abbr':s,'min_rank':4}),
+           ('getPlayDrawSplits','',{'set_abbr':s}),
+           ('getPlayDrawSplits','dataframe',{'set_abbr':s,'as_json':False}),
+           ('getCardStatsByArchetype','color,subarchetype',{'set_abbr':s,'arch_labels':color+','+sub}),
+           ('getCardStatsByArchetype','ALL,color,subarchetypes',
+            {'set_abbr':s,'arch_labels':','.join(['ALL',color]+[label for label in labels if label[:-1]==color])}),
+           ('getCardStatsByArchetype','index_by_name',{'set_abbr':s,'arch_labels':color+','+other,'index_by_name':True}),
+           ('getCardRecordByCopies','ALL',{'set_abbr':s,'card_name':card_name}),
+           ('getCardRecordByCopies','color',{'set_abbr':s,'card_name':card_name,'arch_label':color}),
+           ('getSubarchetypeDistinguishingCards','color',{'set_abbr':s,'arch_label':color}),
+           ('runBatch','5 requests',{'stat_requests':[
+               {'function':'getArchAvgCurve','args':{'set_abbr':s,'arch_label':color}},
+               {'function':'getArchRecord','args':{'set_abbr':s,'arch_label':color}},
+               {'function':'getGameInHandWR','args':{'set_abbr':s,'arch_label':color}},
+               {'function':'getArchWinRatesByMulls','args':{'set_abbr':s,'arch_label':color}},
+               {'function':'getMeanDecklist','args':{'set_abbr':s,'arch_label':color}}]})]
+    #Archetype level functions, for ALL where they take it, a color pair, its subarchetype and a less played combination
+    with_all=['makeCardTable','getCardInDeckWinRates','getGameInHandWR','getArchWinRatesByMulls']
+    for name in ['makeCardTable','getArchAvgCurve','getArchRecord','getCardInDeckWinRates','getGameInHandWR','getRecordByLength',
+                 'getArchWinRatesByMulls','getArchAvgSpeed','getMeanDecklist','getOverperformingCards','getRandomSampleDecklist']:
+        variants=([('ALL','ALL')] if name in with_all else [])+[('color',color),('subarchetype',sub),('other colors',other)]
+        cases+=[(name,variant,{'set_abbr':s,'arch_label':label}) for variant,label in variants]
+    cases+=[('makeCardTable','ALL dataframe',{'set_abbr':s,'as_json':False}),
+            ('makeCardTable','subarchetype dataframe',{'set_abbr':s,'arch_label':sub,'as_json':False}),
+            ('getCardInDeckWinRates','ALL index_by_name',{'set_abbr':s,'index_by_name':True}),
+            ('getCardInDeckWinRates','color copies 2-40',{'set_abbr':s,'arch_label':color,'min_copies':2}),
+            ('getCardInDeckWinRates','color index_by_name',{'set_abbr':s,'arch_label':color,'index_by_name':True}),
+            ('getGameInHandWR','ALL index_by_name',{'set_abbr':s,'index_by_name':True}),
+            ('getGameInHandWR','subarchetype index_by_name',{'set_abbr':s,'arch_label':sub,'index_by_name':True}),
+            ('getMeanDecklist','color wins>=5',{'set_abbr':s,'arch_label':color,'min_wins':5}),
+            ('getMeanDecklist','color rank 4-6',{'set_abbr':s,'arch_label':color,'min_rank':4}),
+            ('getMeanDecklist','subarchetype wins 3-6 rank 2-5',{'set_abbr':s,'arch_label':sub,'min_wins':3,'max_wins':6,'min_rank':2,'max_rank':5}),
+            ('getMeanDecklist','color dataframe',{'set_abbr':s,'arch_label':color,'as_json':False}),
+            ('getRandomSampleDecklist','color wins>=5 rank>=4',{'set_abbr':s,'arch_label':color,'min_wins':5,'min_rank':4}),
+            ('getRandomSampleDecklist','color 10 samples',{'set_abbr':s,'arch_label':color,'num_samples':10}),
+            ('getOverperformingCards','color with rares',{'set_abbr':s,'arch_label':color,'exclude_rares':False})]
+    return cases
+
+def callCase(sa, name:str, kwargs:dict):
+    sa.stat_cache.clear() #Every call computes its result
+    return getattr(sa,name)(**kwargs)
+
+def runCase(sa, name:str, kwargs:dict, repeat:int)->dict:
+    try:
+        result=callCase(sa,name,kwargs) #Warm-up: loads the stat store and fills the schema registry
+    except Exception as e:
+        return {'error':'{}: {}'.format(type(e).__name__,e)}
+    times=[]
+    for _ in range(repeat):
+        start=time.perf_counter()
+        callCase(sa,name,kwargs)
+        times.append(time.perf_counter()-start)
+    tracemalloc.start()
+    callCase(sa,name,kwargs)
+    _,peak=tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    times_ms=np.array(times)*1000
+    size=len(result) if isinstance(result,(str,pd.DataFrame,pd.Series)) else len(json.dumps(result,default=str))
+    return {'median_ms':float(np.median(times_ms)),'p95_ms':float(np.percentile(times_ms,95)),'min_ms':float(times_ms.min()),
+            'peak_mib':peak/2**20,'result_size':int(size)}
+
+def environment(args, db_path:str)->dict:
+    import sqlalchemy
+    def git(*command):
+        try:
+            return subprocess.run(['git']+list(command),capture_output=True,text=True,check=True).stdout.strip()
+        except (OSError,subprocess.CalledProcessError):
+            return None
+    return {'commit':git('rev-parse','HEAD'),'dirty':bool(git('status','--porcelain','--untracked-files=no')),
+            'timestamp':datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python':platform.python_version(),'platform':platform.platform(),'numpy':np.__version__,'pandas':pd.__version__,
+            'sqlalchemy':sqlalchemy.__version__,'database':db_path,'set_abbr':SET_ABBR,'decks':args.decks,'seed':args.seed,
+            'repeat':args.repeat,'modes':args.modes}
+
+def caseKey(result:dict)->str:
+    return '{} [{}] {}'.format(result['function'],result['variant'],result['mode'])
+
+def printResults(results:list, baseline=None):
+    previous={caseKey(r):r for r in baseline['results']} if baseline else {}
+    header="{:<66}{:>10}{:>10}{:>10}{:>10}".format('case','median ms','p95 ms','min ms','peak MiB')
+    print(header+("{:>12}{:>8}".format('before ms','ratio') if baseline else ''))
+    for r in results:
+        key=caseKey(r)
+        if 'error' in r:
+            print("{:<66}  {}".format(key,r['error']))
+            continue
+        line="{:<66}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}".format(key,r['median_ms'],r['p95_ms'],r['min_ms'],r['peak_mib'])
+        old=previous.get(key)
+        if old is not None and 'median_ms' in old:
+            line+="{:>12.2f}{:>8.2f}".format(old['median_ms'],r['median_ms']/old['median_ms'])
+        print(line)
+    for mode in sorted({r['mode'] for r in results}):
+        medians=[r['median_ms'] for r in results if r['mode']==mode and 'median_ms' in r]
+        print("{}: {} cases, total of medians {:.1f} ms".format(mode,len(medians),sum(medians)))
+
+def main():
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--db',default=DEFAULT_DB,help='SQLite file for the benchmark set, built if missing')
+    parser.add_argument('--decks',type=int,default=100000)
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--rebuild',action='store_true',help='Rebuild the database even if it matches --decks and --seed')
+    parser.add_argument('--repeat',type=int,default=10)
+    parser.add_argument('--modes',nargs='+',default=MODES,choices=MODES)
+    parser.add_argument('--only',nargs='+',help='Only run these functions')
+    parser.add_argument('--json',help='Write results to this file')
+    parser.add_argument('--compare',help='Results file from an earlier run to compare against')
+    args=parser.parse_args()
+    db_path=os.path.abspath(args.db)
+    if args.rebuild or storedSetName(db_path)!=benchSetName(args.decks,args.seed):
+        buildBenchDatabase(db_path,args.decks,seed=args.seed)
+    os.environ['DATABASE_URL']='sqlite:///'+db_path
+    from backend import stataccess as sa
+    cases=benchmarkCases(sa)
+    if args.only:
+        cases=[case for case in cases if case[0] in args.only]
+    results=[]
+    for mode in args.modes:
+        sa.stat_store.enabled=mode=='store'
+        for name,variant,kwargs in cases:
+            result={'function':name,'variant':variant,'mode':mode,'args':{k:v for k,v in kwargs.items() if k!='stat_requests'}}
+            result.update(runCase(sa,name,kwargs,args.repeat))
+            results.append(result)
+    baseline=None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline=json.load(f)
+    printResults(results,baseline)
+    if args.json:
+        with open(args.json,'w') as f:
+            json.dump({'environment':environment(args,db_path),'results':results},f,indent=2)
+
+if __name__=='__main__':
+    main()
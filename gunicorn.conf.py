@@ -0,0 +1,29 @@
+#Gunicorn settings for the API (used by the Procfile).
+import os
+
+bind='0.0.0.0:'+os.getenv('PORT','8000')
+workers=int(os.getenv('WEB_CONCURRENCY',2))
+#Each worker holds its own database pool, so workers*(DB_POOL_SIZE+DB_MAX_OVERFLOW) connections at most. See backend/database.py.
+
+#STAT_PRELOAD (default true): import the app and load every active set's stat store in the master process, then fork.
+#Workers start warm and share the store's read-only arrays with the master copy-on-write instead of each building their own.
+#Set it to false to have each worker import the app and load sets on first request.
+preload_app=os.getenv('STAT_PRELOAD','true').lower() in ('1','true','yes')
+
+def when_ready(server):
+    #Runs in the master after the app has been imported (with preload_app) and before any worker is forked.
+    if not preload_app: return
+    import gc
+    from backend import database, stataccess
+    try:
+        loaded=stataccess.preloadStatStores()
+        server.log.info("Preloaded stat stores: %s",loaded)
+    except Exception:
+        server.log.exception("Stat store preload failed, workers will load sets on first request")
+    database.getEngine().dispose() #Workers open their own connections, see post_fork
+    gc.freeze() #Keeps garbage collection in the workers from writing to (and so copying) the preloaded objects' pages
+
+def post_fork(server, worker):
+    #Connections opened before the fork (e.g. with --preload) must not be shared with the parent.
+    from backend import database
+    database.initWorker()
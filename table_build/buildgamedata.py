@@ -1,36 +1,148 @@
-import sqlite3
+import os
+import time
+import numpy as np
 import pandas as pd
-chunksize = 1000
-conn = sqlite3.connect("23Spells.db")
-cur = conn.cursor()
-progresscount=0
+import pyarrow as pa
+import pyarrow.parquet as pq
+from statfunctions import gameDataPath, gameDataFile, gameMatrixFile, GameMatrix, GAME_VECTORS
+chunksize = 50000
 maybe_droppable=["expansion","event_type", "game_time", "game_number", "opp_rank", "opp_num_mulligans", "opp_colors", "build_index"]
-#experimentally, 1k rows is about 1MB after columns get dropped. currently has nearly 1M rows, so 1GB.
+#GameData is stored as parquet, one file per main_colors value, so one color pair can be read without touching the rest.
+#Card counts and the small per game numbers are int8: a byte per card column per game before compression.
+#experimentally, 1k rows is about 50KB on disk. currently has nearly 1M rows, so 50MB.
+int8_columns=["match_number","num_mulligans","num_turns"]
+bool_columns=["on_play","won"] #Stored as 0/1 int8, the way the SQLite table returned them
+string_columns=["draft_id","draft_time","rank","main_colors","splash_colors"]
 setName="ltr" #available sets are currently 'ltr',bro' and 'dmu'
-tbl_name=setName+"GameData"
-address=r".\game_data_public."+setName.upper()+".PremierDraft.csv"
-#data is not ordered chronologically. In each chunk, earliest game gets gradually later, but recent games are scattered throughout the data 
-top=pd.read_csv(address,nrows=2)
-droppable=[]
-print(top.keys())
-for column in top.keys():
-    if column[:9]=="sideboard" or column[:7]=="tutored":
-        droppable.append(column)
-    elif column in maybe_droppable:
-         droppable.append(column)
-conn.execute("DROP TABLE IF EXISTS {}".format(tbl_name))
-conn.execute("DROP TABLE IF EXISTS game_data")
-conn.commit()
-for chunk in pd.read_csv(address,chunksize=chunksize):
-        df = pd.DataFrame(chunk)
-        #uncomment the following line to filter to the most recent ~25% of drafts 
-        #df=df[df['draft_time']>2023-07-20]
-        progresscount+=1
-        df=df.drop(droppable, axis=1)
-        df.to_sql(tbl_name, con=conn, if_exists='append') 
-        if progresscount%10==0:
-            print("Finished {}K lines of {} game data csv".format(progresscount,setName))
-conn.commit()
-print("Done")
-conn.close()
 
+def gameDataAddress(setName):
+    #Where the 17lands game data csv is expected unless another address is passed in.
+    return r".\game_data_public."+setName.upper()+".PremierDraft.csv"
+
+def csvTypes(header:list)->dict:
+    #read_csv dtypes for the columns that get kept, i.e. all but the sideboard/tutored columns and maybe_droppable.
+    #None lets read_csv decide.
+    dtypes={}
+    for column in header:
+        if column[:9]=="sideboard" or column[:7]=="tutored" or column in maybe_droppable:
+            continue
+        if column in string_columns: dtypes[column]=object
+        elif column in bool_columns: dtypes[column]=bool
+        elif column in int8_columns or column[:5]=="deck_" or column[:6]=="drawn_" or column[:13]=="opening_hand_": dtypes[column]="int8"
+        elif column=="user_n_games_bucket": dtypes[column]="int16"
+        else: dtypes[column]=None
+    return dtypes
+
+def readGameChunks(address, dtypes:dict, chunksize=chunksize, nrows=None):
+    #The csv in chunks of GameData rows: kept columns only, compact types, and the csv row number as 'index' like the SQLite table had
+    for df in pd.read_csv(address,chunksize=chunksize,nrows=nrows,usecols=list(dtypes),
+                          dtype={column:dtype for column,dtype in dtypes.items() if dtype is not None}):
+        df=df[list(dtypes)]
+        df.insert(0,'index',df.index)
+        for column in bool_columns:
+            if column in df: df[column]=df[column].astype('int8')
+        for column in string_columns:
+            if column in df: df[column]=df[column].astype(object).where(df[column].notna(),None)
+        yield df
+
+def sqlGameChunks(engine, setName, chunksize=chunksize):
+    #Chunks of a setName+"GameData" table in an SQL database (where loadGameData used to put GameData),
+    #converted to the types readGameChunks gives. The table is read once, in its row order.
+    #Columns are made straight from the fetched rows: with ~1000 columns, read_sql's row by row frame building is several times slower.
+    conn=engine.raw_connection()
+    try:
+        cursor=conn.cursor()
+        cursor.execute('SELECT * FROM "{}GameData"'.format(setName))
+        names=[column[0] for column in cursor.description]
+        dtypes=csvTypes(names)
+        while True:
+            rows=cursor.fetchmany(chunksize)
+            if not rows: break
+            columns={}
+            for name,values in zip(names,zip(*rows)):
+                if name in string_columns: columns[name]=pd.Series(values,dtype=object)
+                elif name in bool_columns: columns[name]=np.fromiter(values,dtype='int8',count=len(values))
+                elif dtypes.get(name) in ("int8","int16"): columns[name]=np.fromiter(values,dtype=dtypes[name],count=len(values))
+                else: columns[name]=pd.Series(values)
+            yield pd.DataFrame(columns)
+    finally:
+        conn.close()
+
+def chunkSchema(df:pd.DataFrame)->pa.Schema:
+    #Types are fixed by the first rows so that every chunk is written the same way, even if a column happens to be empty in one
+    schema=pa.Schema.from_pandas(df,preserve_index=False)
+    return pa.schema([pa.field(f.name,pa.string()) if f.name in string_columns else f for f in schema])
+
+def partitionGameData(setName, chunks, schema:pa.Schema, data_dir=None):
+    #The partitioning stage: streams chunks of GameData rows once and routes each row to its main_colors file,
+    #so later stages read one color combination without scanning the rest. Replaces the set's existing GameData.
+    #Returns the number of games and of color combinations written.
+    path=gameDataPath(setName,data_dir)
+    t0=time.time()
+    if os.path.isdir(path):
+        for name in os.listdir(path):
+            if name.endswith('.parquet'): os.remove(os.path.join(path,name))
+    os.makedirs(path,exist_ok=True)
+    writers={}
+    progresscount=0
+    num_games=0
+    try:
+        for df in chunks:
+            progresscount+=1
+            for main_colors,section in df.groupby(df['main_colors'].fillna(''),sort=False):
+                if main_colors not in writers:
+                    writers[main_colors]=pq.ParquetWriter(gameDataFile(main_colors,setName,data_dir),schema)
+                writers[main_colors].write_table(pa.Table.from_pandas(section,schema=schema,preserve_index=False))
+            num_games+=df.shape[0]
+            if progresscount%10==0:
+                print("Finished {}K lines of {} game data in {} seconds".format(num_games//1000,setName,round(time.time()-t0,1)))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    print("Done: {} games in {} color combinations, written to {}".format(num_games,len(writers),path))
+    return num_games, len(writers)
+
+def loadGameData(setName, address=None, data_dir=None):
+    #Copies the game data csv into the parquet dataset setName+"GameData" in data_dir (default statfunctions.GAME_DATA_DIR),
+    #one file per main_colors value with the games in csv order, and writes the matching GameMatrix files.
+    if address is None: address=gameDataAddress(setName)
+    #data is not ordered chronologically. In each chunk, earliest game gets gradually later, but recent games are scattered throughout the data
+    dtypes=csvTypes(pd.read_csv(address,nrows=0).columns.to_list())
+    schema=chunkSchema(next(readGameChunks(address,dtypes,nrows=100)))
+    chunks=readGameChunks(address,dtypes)
+    #uncomment the following line to filter to the most recent ~25% of drafts
+    #chunks=(df[df['draft_time']>'2023-07-20'] for df in chunks)
+    partitionGameData(setName,chunks,schema,data_dir)
+    writeGameMatrices(setName,data_dir)
+
+def partitionSQLGameData(setName, db_url, data_dir=None):
+    #Converts GameData from an SQL database built before GameData was stored as parquet (e.g. sqlite:///23spells.db)
+    #in one pass over the table, instead of reading the csv again.
+    from sqlalchemy import create_engine
+    engine=create_engine(db_url)
+    try:
+        schema=chunkSchema(next(sqlGameChunks(engine,setName,chunksize=100)))
+        partitionGameData(setName,sqlGameChunks(engine,setName),schema,data_dir)
+    finally:
+        engine.dispose()
+    writeGameMatrices(setName,data_dir)
+
+def writeGameMatrices(setName, data_dir=None):
+    #Saves the card counts of each main_colors file of the set's GameData as a GameMatrix (see statfunctions.py), which
+    #the stat functions read instead of the dense rows. Replaces the set's existing GameMatrix files.
+    t0=time.time()
+    path=gameDataPath(setName,data_dir)
+    matrix_path=os.path.dirname(gameMatrixFile(None,setName,data_dir))
+    if os.path.isdir(matrix_path):
+        for name in os.listdir(matrix_path):
+            if name.endswith('.npz'): os.remove(os.path.join(matrix_path,name))
+    for name in sorted(os.listdir(path)):
+        if not name.endswith('.parquet'): continue
+        file_schema=pq.read_schema(os.path.join(path,name))
+        columns=[c for c in file_schema.names if c in GAME_VECTORS or c[:5]=='deck_' or c[:6]=='drawn_' or c[:13]=='opening_hand_']
+        games=GameMatrix.fromGameDF(pq.read_table(os.path.join(path,name),columns=columns).to_pandas())
+        games.save(os.path.join(matrix_path,name[:-len('.parquet')]+'.npz'))
+    print("Wrote GameMatrix files to {} in {} seconds".format(matrix_path,round(time.time()-t0,1)))
+
+if __name__=="__main__":
+    loadGameData(setName)
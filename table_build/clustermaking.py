@@ -29,8 +29,9 @@ def getDeckColumnsFromGameDF(set_abbr, gamesDF, include_names=False,ignore_lands
         return card_names,deck_cols
     else: return deck_cols
 
-def makeMultipleCoclusterings(set_abbr,game_df:pd.DataFrame, num_runs_per:int,max_clusters:int):
-    """Returns a dict of coclustering objects where the keys are the run numbers."""
+def makeMultipleCoclusterings(set_abbr,game_df:pd.DataFrame, num_runs_per:int,max_clusters:int,random_state=None):
+    """Returns a dict of coclustering objects where the keys are the run numbers.
+    random_state (an int or np.random.RandomState) makes the runs repeatable; None uses numpy's global random state."""
     deck_cols_without_lands=getDeckColumnsFromGameDF(set_abbr=set_abbr,gamesDF=game_df,ignore_lands=True)
     deck_data=game_df.loc[:,deck_cols_without_lands]
     deck_data=deck_data.loc[deck_data.sum(axis=1)>0]
@@ -39,13 +40,13 @@ def makeMultipleCoclusterings(set_abbr,game_df:pd.DataFrame, num_runs_per:int,ma
     for n_clusters in range(2,max_clusters):
         for n in range(num_runs_per):
             index= (n_clusters-2)*num_runs_per+n
-            coclustering=SpectralCoclustering(n_clusters=n_clusters)
+            coclustering=SpectralCoclustering(n_clusters=n_clusters,random_state=random_state)
             coclustering.fit(deck_data.values)
             labels[index]=coclustering.row_labels_
     max_true_clusters=0
     for n in range(num_runs_per):
         index=(max_clusters-2)*num_runs_per+n
-        coclustering=SpectralCoclustering(n_clusters=max_clusters)
+        coclustering=SpectralCoclustering(n_clusters=max_clusters,random_state=random_state)
         coclustering.fit(deck_data.values)
         labels[index]=coclustering.row_labels_
         cluster_sizes=pd.Series(coclustering.row_labels_).value_counts()
@@ -58,7 +59,7 @@ def makeMultipleCoclusterings(set_abbr,game_df:pd.DataFrame, num_runs_per:int,ma
     #If the maximum number of "true" clusters (clusters with that have at least 300 members) is less than max_clusters,
     #try running coclustering with an increased number of clusters.
         for n in range(num_runs_per):
-            coclustering=SpectralCoclustering(n_clusters=max_clusters+extra_clusters)
+            coclustering=SpectralCoclustering(n_clusters=max_clusters+extra_clusters,random_state=random_state)
             coclustering.fit(deck_data.values)
             cluster_sizes=pd.Series(coclustering.row_labels_).value_counts()
             n_true_clusters=(cluster_sizes>=MIN_CLUSTER_SIZE).sum()
@@ -115,7 +116,7 @@ def findBestRun(game_df:pd.DataFrame,labels:dict,num_runs_per:int):
             best_score=score
             best_run=i
     return best_run
-def assignClusterLabels(set_abbr,gamesDF:pd.DataFrame):
+def assignClusterLabels(set_abbr,gamesDF:pd.DataFrame,random_state=None):
     #Starting with a dataframe of games from game_data, group them by archetype.
     #Appends a column of labels to the dataframe that indicates each game's archetype.
     #Runs coclustering multiple times, varying the number of clusters.
@@ -125,7 +126,7 @@ def assignClusterLabels(set_abbr,gamesDF:pd.DataFrame):
     max_n_clusters=min(n_games//1000,5)
     if max_n_clusters>1: 
         gamesDFTemp=gamesDF.copy()
-        labels=makeMultipleCoclusterings(set_abbr=set_abbr,game_df=gamesDFTemp,num_runs_per=8,max_clusters=max_n_clusters)
+        labels=makeMultipleCoclusterings(set_abbr=set_abbr,game_df=gamesDFTemp,num_runs_per=8,max_clusters=max_n_clusters,random_state=random_state)
         best_run=findBestRun(game_df=gamesDFTemp,labels=labels,num_runs_per=8)
         best_labels=labels[best_run]
         cluster_sizes=pd.Series(best_labels).value_counts().sort_index()
@@ -1,7 +1,7 @@
 import sqlite3, time
 import pandas as pd
 import numpy as np
-from statfunctions import cardInfo, rankToNum
+from statfunctions import cardInfo, rankToNum, cardPickStats
 from sqlalchemy import Integer
 
 
@@ -10,10 +10,14 @@ chunksize = 42*45*3
 #carddf=cardInfo(set_abbr=setName)
 #id_dict={'pack_card_'+carddf.at[i,'name']:str(i) for i in carddf.index}
 
-def makeDraftInfo(conn, set_abbr='ltr'):
+def draftDataAddress(set_abbr='ltr'):
+    #Where the 17lands draft data csv is expected unless another address is passed in.
+    return r".\draft_data_public."+set_abbr.upper()+".PremierDraft.csv"
+
+def makeDraftInfo(conn, set_abbr='ltr', address=None):
     t0=time.time()
     draft_table=set_abbr+"DraftInfo"
-    address=r".\draft_data_public."+set_abbr.upper()+".PremierDraft.csv"
+    if address is None: address=draftDataAddress(set_abbr)
     draftdf=pd.DataFrame({'draft_id':[],'draft_time':[], 'rank':[], 'event_match_wins':[],'event_match_losses':[]})
     print("Started reading draft csv")
     progresscount=0
@@ -32,9 +36,9 @@ def makeDraftInfo(conn, set_abbr='ltr'):
     conn.commit()
     t2=time.time()
     print("Built draft info table in ",round(t2-t1,3))
-def processPacks(conn, set_abbr='ltr'): 
+def processPacks(conn, set_abbr='ltr', address=None): 
     pack_table=set_abbr+"DraftPacks"
-    address=r".\draft_data_public."+set_abbr.upper()+".PremierDraft.csv"
+    if address is None: address=draftDataAddress(set_abbr)
     t0=time.time()
     top=pd.read_csv(address,nrows=2)
     col_indices=[]
@@ -44,9 +48,11 @@ def processPacks(conn, set_abbr='ltr'):
         if key[:5]=='pack_' or key=='pick_number': #includes pack_number, pick_number, and pack_card_[cardname]
             col_indices.append(i)
     count=0
+    first_picks=None
     for chunk in pd.read_csv(address,chunksize=chunksize):
         df = pd.DataFrame(chunk)    
         df.fillna(0,inplace=True)  
+        first_picks=addFirstPicks(first_picks,df)
         #df.rename(columns=id_dict,inplace=True) #for if we want keys to be the idx of [cardname] in cardInfo rather than pack_card_[cardname]
         contentdf=df.iloc[:,col_indices].groupby(['pack_number','pick_number']).sum()
         if count==0:
@@ -67,13 +73,14 @@ def processPacks(conn, set_abbr='ltr'):
     totaldf.to_sql(pack_table,con=conn,if_exists='replace',index=True,dtype=Integer)
     conn.commit()
     print("Finished pack table")
+    writeCardPickStats(conn,totaldf,set_abbr=set_abbr,first_picks=first_picks)
      
-def readInDraftStats(conn, set_abbr='ltr'):
+def readInDraftStats(conn, set_abbr='ltr', address=None):
     #do both parts simultaneously
     t0=time.time()
     draft_table=set_abbr+"DraftInfo"
     pack_table=set_abbr+"DraftPacks"
-    address=r".\draft_data_public."+set_abbr.upper()+".PremierDraft.csv"
+    if address is None: address=draftDataAddress(set_abbr)
     draftdf=pd.DataFrame({'draft_id':[],'draft_time':[], 'rank':[], 'event_match_wins':[],'event_match_losses':[]})
     print("Started reading draft csv")
     count=0
@@ -84,9 +91,11 @@ def readInDraftStats(conn, set_abbr='ltr'):
         key=colnames[i]
         if key[:5]=='pack_' or key=='pick_number': #includes pack_number, pick_number, and pack_card_[cardname]
             col_indices.append(i)
+    first_picks=None
     for chunk in pd.read_csv(address,chunksize=chunksize):
         df = pd.DataFrame(chunk)    
         df.fillna(0,inplace=True)
+        first_picks=addFirstPicks(first_picks,df)
         dfp1p1=df[df['pack_number']+df['pick_number']==0]
         draftdf=pd.concat([draftdf,dfp1p1[['draft_id','draft_time','rank','event_match_wins','event_match_losses']]],axis=0)
         contentdf=df.iloc[:,col_indices].groupby(['pack_number','pick_number']).sum()
@@ -109,7 +118,33 @@ def readInDraftStats(conn, set_abbr='ltr'):
     draftdf.rename(columns=shorter_names,inplace=True)
     draftdf.to_sql(draft_table,con=conn,if_exists='replace',index_label='draft_id',index=False)
     conn.commit()
+    writeCardPickStats(conn,totaldf,set_abbr=set_abbr,first_picks=first_picks)
     print("Finished processing draft data")
+
+def addFirstPicks(first_picks, df:pd.DataFrame):
+    #Adds the cards picked at pick 0 in a chunk of the draft csv to the running counts (None before the first chunk).
+    #Returns copies taken indexed by (pack_number, card name), for cardPickStats.
+    chunk_picks=df[df['pick_number']==0].groupby('pack_number')['pick'].value_counts()
+    if first_picks is None: return chunk_picks
+    return first_picks.add(chunk_picks,fill_value=0).astype('int64')
+
+def writeCardPickStats(conn, packdf:pd.DataFrame, set_abbr='ltr', first_picks=None):
+    #Writes [set]CardPickStats from the summed pack contents: mean pick, median pick, first pick rate and times seen
+    #for each card, overall (pack_number=-1) and for each pack. Keyed by CardInfo id, so CardInfo has to be built first.
+    #first_picks: cards taken at pick 0 (see addFirstPicks). Without them the first pick rate is an estimate, see cardPickStats.
+    pick_table=set_abbr+"CardPickStats"
+    pickdf=cardPickStats(packdf,first_picks)
+    carddf=cardInfo(conn,set_abbr)
+    card_ids=pd.Series(carddf.index,index=carddf['name'])
+    unmatched=set(pickdf['name'])-set(card_ids.index)
+    if unmatched:
+        print("No CardInfo entry for",len(unmatched),"cards in the pack data:",sorted(unmatched))
+    pickdf=pickdf[pickdf['name'].isin(card_ids.index)]
+    pickdf.insert(0,'card_id',pickdf['name'].map(card_ids).values)
+    pickdf=pickdf.drop(columns='name')
+    pickdf.to_sql(pick_table,con=conn,if_exists='replace',index=False)
+    conn.commit()
+    print("Finished pick stats table")
     
 
 
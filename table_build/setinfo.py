@@ -2,9 +2,9 @@ from bs4 import BeautifulSoup
 import requests
 import json
 import html
-from sqlalchemy import MetaData, create_engine
 from sqlalchemy.orm import sessionmaker
 from cardinfopatch import manualCardInfo
+from statfunctions import gameDataset
 
 
 def get_parsed(url):
@@ -58,17 +58,11 @@ def getTypes(card_type):
             type_letters+=t[0]
     return type_letters
 def getCardNames(set_abbr):
-    engine = create_engine("sqlite:///23spells.db", echo=False) 
-    conn = engine.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine)
-    game_data_table=metadata.tables[set_abbr+'GameData']
-    cols=game_data_table.c.keys()
+    #Card names from the deck_ columns of the set's GameData
     card_names=[]
-    for c in cols:
+    for c in gameDataset(set_abbr).schema.names:
         if c[:5]=="deck_":
             card_names.append(c[5:])
-    conn.close()
     return card_names
 
 def scrape_scryfall(set_abbr, maxID=400):
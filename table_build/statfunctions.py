@@ -1,3 +1,7 @@
+#Stat functions for the table build: GameData parquet files, GameMatrix and the per game card stats.
+#Everything in backend/statfunctions.py (labels, turn histograms, card table assembly...) is re-exported from here,
+#so build code imports all of it from statfunctions.
+from backend.statfunctions import *
 import pandas as pd
 import numpy as np
 from sqlalchemy import MetaData, select, create_engine, func
@@ -8,7 +12,7 @@ from dotenv import load_dotenv
 from pathlib import Path
 load_dotenv()
 db_url=os.getenv("DATABASE_URL")
-engine_loc = create_engine("sqlite:///23spells.db", echo=False) #Local db. Contains GameData table for getGameDataFrame.
+GAME_DATA_DIR=os.getenv("GAME_DATA_DIR","game_data") #Local GameData, one parquet dataset per set written by table_build/buildgamedata.py
 #Use first line to read stats from online db. Switch to second to run all locally
 """engine=create_engine(url="postgresql://{0}:{1}@{2}:{3}/{4}".format(
             user, password, host, port, database))  
@@ -18,9 +22,6 @@ Session = sessionmaker(bind=engine)
 session = Session()
 metadata = MetaData()
 metadata.reflect(bind=engine)"""
-MINTURNS=5
-MAXTURNS=15
-MAXMV=8
 
 def cardsSeenInDF(gamesDF: pd.DataFrame): #not currently in use
     #given a dataframe of rows from game_data, returns list of number of games with each total number of cards drawn
@@ -76,131 +77,133 @@ def cardsSeenPercentiles(distributionDF): #not yet in use, may still be useful l
 
 
 
-def cardInfo(conn, set_abbr):
-    metadata=MetaData()
-    metadata.reflect(bind=conn)
-    card_table=metadata.tables[set_abbr+'CardInfo']
-    s=select(card_table)
-    df=pd.read_sql_query(s,conn,index_col='id')
-    
-    return df
-
-def listOfColors(order='binary'):
-    if order=='binary':
-        return ['C','W','U','WU','B','WB','UB','WUB','R','WR','UR','WUR','BR','WBR','UBR','WUBR','G',
-          'WG','UG','WUG','BG','WBG','UBG','WUBG','RG','WRG','URG','WURG','BRG','WBRG','UBRG','WUBRG']
-    else: return ['C','W','U','B','R','G','WU','WB','WR','WG','UB','UR','UG','BR','BG','RG','WUB','WUR','WUG','WBR','WBG','WRG',
-          'UBR','UBG','URG','BRG','WUBR','WUBG','WURG','WBRG','UBRG','WUBRG']
-    
-def colorString(color_int:int):
-    #Color in card info is stored as a 5 bit int where each bit is the presence of a color. 
-    #This function turns that int into the corresponding WUBRG string.
-    color_string=listOfColors()[color_int%32]
-    return color_string
-def colorInt(color_string:str):
-    #Inverse of colorString on appropriate WUBRG strings. Requires letters be written in WUBRG order.
-    #Returns 0 on any string that doesn't start with a WUBRG letter (including 'C')
-    #Extracts color info from strings that start with colors (e.g. colorInt('UR2')=10=colorInt('UR'))
-    if color_string[-1].isnumeric(): color_string=color_string[:-1]
-    color_int=listOfColors().index(color_string)
-    return color_int
-def archIDtoLabel(id:int)->str:
-    if id==-1: return 'ALL'
-    arch_label=colorString(id)
-    if id>32:
-        sub_index=str(id//32)
-        arch_label=arch_label+sub_index
-    return arch_label
-def archLabelToID(label:str)->int:
-    if label=='ALL': return -1
-    id=colorInt(label)
-    if label[-1].isnumeric():
-        sub_index=int(label[-1])
-        id+=sub_index*32
-    return id       
-
-def rankToNum(name:str):
-    match name:
-        case 'bronze':
-            return 1
-        case 'silver':
-            return 2
-        case 'gold':
-            return 3
-        case 'platinum':
-            return 4
-        case 'diamond':
-            return 5
-        case 'mythic':
-            return 6
-        case _:
-            return 0
-def getCardsWithMV(conn, mv, set_abbr="ltr"): #returns a list of all card names from a given set with a given mana value (mv)
-    #all cards with 8+ mv get sorted into the same bucket
-    metadata=MetaData()
-    metadata.reflect(bind=conn)
-    card_table=metadata.tables[set_abbr+'CardInfo']
-    s=select(card_table.c.name,card_table.c.mana_value)
-    carddf=pd.read_sql_query(s,conn)
-    if mv!=MAXMV:
-        cards=carddf[carddf['mana_value']==mv]['name'].to_list()
-    else:
-        cards=carddf[carddf['mana_value']>=MAXMV]['name'].to_list()
-    return cards
+def gameDataPath(set_abbr='ltr', data_dir=None):
+    #GameData for a set is a directory of parquet files, one per main_colors value (e.g. WU.parquet), rows in csv order.
+    return os.path.join(GAME_DATA_DIR if data_dir is None else data_dir,set_abbr+'GameData')
 
+def gameDataFile(main_colors, set_abbr='ltr', data_dir=None):
+    #Games without main colors are kept in _none.parquet
+    return os.path.join(gameDataPath(set_abbr,data_dir),(main_colors or '_none')+'.parquet')
 
-def getCardsWithColor(conn, color, set_abbr='ltr',include_multicolor=True, include_lands=False, as_string=False):
-    #Returns list of all cards with matching the given color
-    #If as_string=True gives their names, otherwise gives their index in cardInfo
-    #Color is determined (in setinfo.py) by mana cost. Could be misleading on some cards like DFCs, adventures, alternate costs, etc.
-    carddf=cardInfo(conn, set_abbr)
-    colors=['W','U','R','B','G','C']
-    if color in colors:
-        c=colors.index(color)
-    else:
-        print("WARNING: Invalid color requested")
-        return
-    if c==5: #colorless case
-       colorfilter=carddf['color']==0
-       if not include_lands:
-           landfilter=pd.Series(['L' not in card_type for card_type in carddf['card_type']])
-           colorfilter=colorfilter * landfilter
-    else:
-        cnum=2**c
-        if include_multicolor:
-            colorfilter=(carddf['color']//cnum)%2==1
-        else:
-            colorfilter=carddf['color']==cnum
-    if as_string:
-        cards=(carddf.loc[colorfilter])['name'].tolist()
-    else:
-        cards=carddf.loc[colorfilter].index.to_list()
-    return cards
+def gameDataset(set_abbr='ltr'):
+    #Every game of the set as a pyarrow dataset, for reading columns or batches without loading the whole set
+    import pyarrow.dataset as ds
+    return ds.dataset(gameDataPath(set_abbr),format='parquet',partitioning=None)
 
+def getGameDataFrame(main_colors, set_abbr='ltr', columns=None): 
+    #returns the gamedata rows of all games with the given main colors as a dataframe, in the order they were loaded.
+    #Only that color combination's file is read, and only columns (default all of them).
+    #Card counts, won, on_play and the other small numbers come back as int8 (see buildgamedata.py).
+    import pyarrow.parquet as pq
+    path=gameDataFile(main_colors,set_abbr)
+    if not os.path.exists(path): #No games with those colors
+        schema=gameDataset(set_abbr).schema
+        return schema.empty_table().select(columns or schema.names).to_pandas()
+    return pq.read_table(path,columns=columns).to_pandas()
 
-def getGameDataFrame(main_colors, set_abbr='ltr'): 
-    #returns the data gamedata rows of all games fitting the given criteria as a dataframe
-    #slow to read from the from the game data table. (takes 10-50s typically) 
-    conn = engine_loc.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine_loc)
-    game_data_table=metadata.tables[set_abbr+'GameData']
-    q=select(game_data_table).where(game_data_table.c.main_colors==main_colors)
-    df=pd.read_sql_query(q,conn)
-    conn.close()
-    return df
-
-def getGamesByID(draft_ids: list, set_abbr='ltr')->pd.DataFrame:
-    #given a list of draft_id values, get all games from those drafts. 
+def getGamesByID(draft_ids: list, set_abbr='ltr', columns=None)->pd.DataFrame:
+    #given a list of draft_id values, get all games from those drafts, in the order they were loaded.
     #Can be used to get archetype specific stats after clustering
-    conn = engine_loc.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine_loc)
-    game_data_table=metadata.tables[set_abbr+'GameData']
-    q=select(game_data_table).where(game_data_table.c.draft_id.in_(draft_ids))
-    df=pd.read_sql_query(q,conn)
-    conn.close()
-    return df
+    #Only the draft_id column is read in full. The rest is read just for the row groups (csv chunks) holding matching games.
+    import pyarrow as pa, pyarrow.compute as pc, pyarrow.parquet as pq
+    dataset=gameDataset(set_abbr)
+    read_columns=None if columns is None else list(dict.fromkeys(['index']+list(columns)))
+    value_set=pa.array(list(draft_ids),type=pa.string())
+    sections=[]
+    for path in dataset.files:
+        game_file=pq.ParquetFile(path)
+        matches=pc.is_in(game_file.read(columns=['draft_id'])['draft_id'],value_set=value_set).to_numpy(zero_copy_only=False)
+        if not matches.any(): continue
+        bounds=np.cumsum([0]+[game_file.metadata.row_group(i).num_rows for i in range(game_file.num_row_groups)])
+        groups=[i for i in range(game_file.num_row_groups) if matches[bounds[i]:bounds[i+1]].any()]
+        keep=np.concatenate([matches[bounds[i]:bounds[i+1]] for i in groups])
+        sections.append(game_file.read_row_groups(groups,columns=read_columns).filter(pa.array(keep)))
+    table=pa.concat_tables(sections) if sections else dataset.schema.empty_table().select(read_columns or dataset.schema.names)
+    df=table.to_pandas().sort_values('index',kind='stable',ignore_index=True)
+    return df if columns is None else df[list(columns)]
+
+def gameDataColors(set_abbr='ltr')->list:
+    #main_colors values that have games in the set's GameData, None for the games without main colors
+    names=[os.path.basename(path)[:-len('.parquet')] for path in sorted(gameDataset(set_abbr).files)]
+    return [None if name=='_none' else name for name in names]
+
+def gameMatrixFile(main_colors, set_abbr='ltr', data_dir=None):
+    #GameMatrix files sit next to the set's GameData, e.g. game_data/ltrGameMatrix/WU.npz
+    return os.path.join(GAME_DATA_DIR if data_dir is None else data_dir,set_abbr+'GameMatrix',(main_colors or '_none')+'.npz')
+
+GAME_VECTORS=['index','won','num_turns','on_play','num_mulligans','rank'] #Per game values kept by GameMatrix, rank as rankToNum
+
+class GameMatrix:
+    #The card counts of a group of games as sparse CSR matrices, one row per game and one column per card in card_names:
+    #deck, drawn and opening_hand hold the deck_, drawn_ and opening_hand_ columns of GameData.
+    #Nearly all of those ~1000 columns are 0 in any game, so this is a small fraction of the dense dataframe's size.
+    #The per game values in GAME_VECTORS are numpy arrays in the same row order, e.g. games.won.
+    #The stat functions below that take a game dataframe (cardsInHand, gameInHandTotals, winSharesTotals...) also take a GameMatrix.
+    def __init__(self, card_names:list, deck, drawn, opening_hand, vectors:dict):
+        self.card_names=list(card_names)
+        self.deck=deck
+        self.drawn=drawn
+        self.opening_hand=opening_hand
+        for name in GAME_VECTORS:
+            setattr(self,name,np.asarray(vectors[name]))
+
+    @classmethod
+    def fromGameDF(cls, game_df:pd.DataFrame):
+        #game_df should be a game dataframe with the deck_, drawn_ and opening_hand_ columns and everything in GAME_VECTORS but rank and index
+        from scipy import sparse
+        card_names=[key[5:] for key in game_df.keys() if key[:5]=='deck_']
+        counts=[sparse.csr_matrix(game_df[[prefix+name for name in card_names]].to_numpy(dtype=np.int32))
+                for prefix in ('deck_','drawn_','opening_hand_')]
+        vectors={name:game_df[name].to_numpy(dtype=np.int32) for name in GAME_VECTORS if name not in ('index','rank')}
+        vectors['index']=game_df['index'].to_numpy(dtype=np.int64) if 'index' in game_df else np.arange(game_df.shape[0])
+        if 'rank' in game_df:
+            ranks=game_df['rank']
+            vectors['rank']=ranks.map({rank:rankToNum(rank) for rank in ranks.unique()}).to_numpy(dtype=np.int32)
+        else:
+            vectors['rank']=np.zeros(game_df.shape[0],dtype=np.int32)
+        return cls(card_names,*counts,vectors)
+
+    @classmethod
+    def load(cls, path):
+        from scipy import sparse
+        with np.load(path,allow_pickle=False) as saved:
+            shape=tuple(saved['shape'])
+            counts=[sparse.csr_matrix((saved[name+'_data'].astype(np.int32),saved[name+'_indices'],saved[name+'_indptr']),shape=shape)
+                    for name in ('deck','drawn','opening_hand')]
+            vectors={name:saved[name].astype(np.int64 if name=='index' else np.int32) for name in GAME_VECTORS}
+            return cls(saved['card_names'].tolist(),*counts,vectors)
+
+    def save(self, path):
+        #Counts and per game values are stored as int8 (index as int64), compressed
+        arrays={'card_names':np.array(self.card_names,dtype=str),'shape':np.array(self.deck.shape)}
+        for name in ('deck','drawn','opening_hand'):
+            matrix=getattr(self,name)
+            arrays.update({name+'_data':matrix.data.astype(np.int8),name+'_indices':matrix.indices,name+'_indptr':matrix.indptr})
+        arrays.update({name:getattr(self,name).astype(np.int64 if name=='index' else np.int8) for name in GAME_VECTORS})
+        os.makedirs(os.path.dirname(path) or '.',exist_ok=True)
+        np.savez_compressed(path,**arrays)
+
+    @property
+    def num_games(self)->int:
+        return self.deck.shape[0]
+
+    def hand(self):
+        #Copies of each card ever in hand each game, like cardsInHand
+        return self.drawn+self.opening_hand
+
+    def rows(self, selection):
+        #The games picked out by selection (a boolean mask or row numbers), as a new GameMatrix
+        selection=np.flatnonzero(selection) if np.asarray(selection).dtype==bool else np.asarray(selection)
+        return GameMatrix(self.card_names,self.deck[selection],self.drawn[selection],self.opening_hand[selection],
+                          {name:getattr(self,name)[selection] for name in GAME_VECTORS})
+
+def getGameMatrix(main_colors, set_abbr='ltr')->GameMatrix:
+    #The games with the given main colors as a GameMatrix, from the file buildgamedata.py writes next to GameData.
+    #If there isn't one the GameData rows are read and converted instead.
+    path=gameMatrixFile(main_colors,set_abbr)
+    if os.path.exists(path):
+        return GameMatrix.load(path)
+    return GameMatrix.fromGameDF(getGameDataFrame(main_colors=main_colors,set_abbr=set_abbr))
 
 def countCurve(gamesdf,carddf):
     #given a dataframe of games, returns total number of cards of each MV in those games
@@ -220,115 +223,6 @@ def countCurve(gamesdf,carddf):
     return curve
 
 
-def countDecklistColors(conn, decks,set_abbr='ltr'):
-    #given an array/dataframe where columns are card counts in set id order, returns number of cards of each color in each row
-    #counts multicolor cards as 1 of each color
-    colordf=pd.DataFrame({'W':[],'U':[],'B':[],'R':[],'G':[],'C':[]})
-    for color in colordf.columns:
-        cards=getCardsWithColor(conn, color, set_abbr=set_abbr)
-        colordf[color]=decks.iloc[:,cards].sum(axis=1)
-    return colordf
-    
-
-def getArchAvgCurve(conn, archLabel, set_abbr='ltr'): #Not in use currently
-    #returns mean values of lands and each n drop for given archetype
-    metadata=MetaData()
-    metadata.reflect(bind=conn)
-    archStats_table=metadata.tables[set_abbr+'ArchGameStats']
-    q=select(archStats_table).where(archStats_table.c.archLabel==archLabel)
-    df=pd.read_sql_query(q,conn)
-    dfTotal=df.iloc[0:,3:].sum() 
-    if dfTotal['game_count']!=0:
-        n=dfTotal['game_count']
-        avgs=dfTotal.iloc[1:]/n
-        return avgs
-    else:
-        return dfTotal.iloc[1:] #should be all 0s as this is the 'no games meet these conditions' case
-
-
-def recordByLengthDB(conn,archLabel, set_abbr='ltr'):
-    #given archetype and range of ranks, returns df with wins and total games at each game length
-    #game lengths <=5 turns and >=14 turns are grouped together 
-    metadata=MetaData()
-    metadata.reflect(bind=conn)
-    ag_table=metadata.tables[set_abbr+'ArchGameStats']
-    arch_table=metadata.tables[set_abbr+'Archetypes']
-    q=select(ag_table.c.turns,ag_table.c.won,ag_table.c.game_count).join(arch_table, ag_table.c.arch_id==arch_table.c.id).where(arch_table.c.archLabel==archLabel)
-    df=pd.read_sql_query(q,conn)
-    counts=df[['turns','game_count']].groupby('turns').sum()
-    winsdf=df[df['won']==1]
-    win_counts=winsdf[['turns','game_count']].groupby('turns').sum()
-    total=df['game_count'].sum()
-    if total==0:
-        #print("Insufficient data")
-        return pd.Series([0]*(MAXTURNS-MINTURNS+1), index=range(MINTURNS,MAXTURNS+1))        
-    counts.loc[MINTURNS]=counts.loc[:MINTURNS].sum()
-    counts.loc[MAXTURNS]=counts.loc[MAXTURNS:].sum()
-    counts=counts.loc[MINTURNS:MAXTURNS]
-    win_counts.loc[MINTURNS]=win_counts.loc[:MINTURNS].sum()
-    win_counts.loc[MAXTURNS]=win_counts.loc[MAXTURNS:].sum()
-    win_counts=win_counts.loc[MINTURNS:MAXTURNS]
-    recorddf=pd.concat([win_counts,counts],axis=1)
-    recorddf.columns=['wins','games']
-    tempgames=recorddf['games'].mask(recorddf['games']==0,1)
-    recorddf['win_rate']=recorddf['wins']/tempgames
-    return recorddf
-
-def winRatesByTurnDF(df):
-    games=df['num_turns'].value_counts().sort_index()
-    games.loc[MINTURNS]=games.loc[:MINTURNS].sum()
-    games.loc[MAXTURNS]=games.loc[MAXTURNS:].sum()
-    games=games.loc[MINTURNS:MAXTURNS]
-    wins=df[df['won']==True]['num_turns'].value_counts().sort_index()
-    wins.loc[MINTURNS]=wins.loc[:MINTURNS].sum()
-    wins.loc[MAXTURNS]=wins.loc[MAXTURNS:].sum()
-    wins=wins.loc[MINTURNS:MAXTURNS]
-    games=games.mask(games==0,1)
-    return wins/games 
-
-def medianPick(pickdf: pd.Series):
-    #pickdf should be a series where the index is the pick number (0-13) 
-    #and the values are the # of appearances of a given card at that pick number
-    #Returns the pick number by which 50% of the copies of that card have been taken
-    #e.g. medpick=5 means that after 4 picks less than half have been taken, but after 5 picks more than half hae been taken
-    half=pickdf[0]/2
-    postmedian=pickdf[pickdf<half]
-    medpick=postmedian.index.min()
-    return medpick
-    
-def meanPick(pickdf: pd.Series):
-   return pickdf.sum()/pickdf[0]
-
-def gameLengthDistDF(df):
-    #given a game dataframe, returns series with game lengths as indices and proportion of games of that length as values
-    #game lengths <=5 turns and >=14 turns are grouped together 
-    total=df.shape[0]
-    lens=df['num_turns'].value_counts().sort_index()
-    lens.loc[MINTURNS]=lens.loc[:MINTURNS].sum()
-    lens.loc[MAXTURNS]=lens.loc[MAXTURNS:].sum()
-    lens=lens.loc[MINTURNS:MAXTURNS]
-    if total==0: 
-        print("Insufficient data")
-        return pd.Series([0]*(MAXTURNS-MINTURNS+1), index=range(MINTURNS,MAXTURNS+1))
-    else: return lens/total
-    #could do this faster extracting from archstats for archetype game lengths
-
-
-def getRecordByLength(df):
-    df=pd.DataFrame(df)
-    zeros=pd.Series([0]*60, index=range(0,60))
-    records=df[['num_turns','won']].value_counts().sort_index()
-    wins=(zeros+records[:,1]).replace({np.nan:0}).astype('int')
-    losses=(zeros+records[:,0]).replace({np.nan:0}).astype('int')
-    wins.loc[MINTURNS]=wins.loc[:MINTURNS].sum()
-    wins.loc[MAXTURNS]=wins.loc[MAXTURNS:].sum()
-    wins=wins.loc[MINTURNS:MAXTURNS]
-    losses.loc[MINTURNS]=losses.loc[:MINTURNS].sum()
-    losses.loc[MAXTURNS]=losses.loc[MAXTURNS:].sum()
-    losses=losses.loc[MINTURNS:MAXTURNS]
-    record=pd.DataFrame({'wins':wins, 'losses':losses})
-    return record
-
 def getCardsWithEnoughGames(df, min_sample, prefix="deck_"):
     #df should be a game dataframe. 
     #returns list of names of all cards such that there are at least min_sample games played with that card in deck in df
@@ -338,35 +232,12 @@ def getCardsWithEnoughGames(df, min_sample, prefix="deck_"):
             if df[df[col]>0].shape[0]>min_sample:
                 cards.append(col[len(prefix):])
     return cards
-def deckSizeInfo(conn,set_abbr):
-    #Shows how many decks for a given set have 40, 41, etc. cards in them. Shows win rate for each deck size.
-    #Data is imperfect because deck lists are being determined by game 1 build and not accounting for changes made later.
-    #Not in use. I just made this because I was curious.
-    metadata=MetaData()
-    metadata.reflect(bind=conn)
-    deck_table=metadata.tables[set_abbr+'Decklists']
-    draft_table=metadata.tables[set_abbr+'DraftInfo']
-    s=select(deck_table,draft_table.c.wins,draft_table.c.losses).join(draft_table,deck_table.c.draft_id==draft_table.c.draft_id)
-    deckdf=pd.read_sql_query(s,conn)
-    decksizes=deckdf.iloc[:,4:-2].sum(axis=1)
-    populations=decksizes.value_counts()
-    print(populations)
-    pcts=populations/populations.sum()
-    print(pcts)
-    recordsdf=deckdf.iloc[:,-2:]
-    recordsdf['size']=decksizes
-    wins_and_losses=recordsdf.groupby('size').sum()
-    wins_and_losses['win_rate']=wins_and_losses['wins']/(wins_and_losses['wins']+wins_and_losses['losses'])
-    print(wins_and_losses)    
-    
-def winRate(df):
-    #df should be a game dataframe
-    if df.shape[0]==0: return 0
-    else: return df[df['won']==True].shape[0]/df.shape[0]
-
 def cardsInHand(game_df: pd.DataFrame):
     #Given a game dataframe, return a dataframe containing the number of copies of each card that are ever in hand each game
     #The returned dataframe has each row representing a game, an each column is a card.
+    #Given a GameMatrix, the dataframe has sparse columns.
+    if isinstance(game_df,GameMatrix):
+        return pd.DataFrame.sparse.from_spmatrix(game_df.hand(),columns=game_df.card_names)
     hand_info={}
     for key in game_df.keys():
          if key[:5]=='drawn': 
@@ -377,6 +248,8 @@ def cardsInHand(game_df: pd.DataFrame):
     return hand_df
 
 def cardsInDeck(game_df: pd.DataFrame):
+    if isinstance(game_df,GameMatrix):
+        return pd.DataFrame.sparse.from_spmatrix(game_df.deck,columns=game_df.card_names)
     deck_cols=[]
     card_names=[]
     for key in game_df.keys():
@@ -400,7 +273,14 @@ def winSharesTotals(gameDF: pd.DataFrame):
     #If every game had exactly N total cards drawn this AvgWS=1/N(2*GIH-1).
     #The trade off is that this has a bias against card draw spells
     #as the games where they are cast have more cards seen, and thus lower weight per card, than the ones where they aren't
-    #Given a section of GameData, return total win shares and number of appearances for each card
+    #Given a section of GameData (or a GameMatrix), return total win shares and number of appearances for each card
+    if isinstance(gameDF,GameMatrix):
+        hand_matrix=gameDF.hand()
+        total_cards_seen=np.asarray(hand_matrix.sum(axis=1)).reshape(-1)
+        game_weights=(2*gameDF.won-1)/np.where(total_cards_seen==0,1,total_cards_seen)
+        ws_totals=pd.Series(data=hand_matrix.T@game_weights,index=gameDF.card_names)
+        hand_totals=pd.Series(data=np.asarray(hand_matrix.sum(axis=0)).reshape(-1),index=gameDF.card_names)
+        return ws_totals, hand_totals
     win_loss=np.array(2*gameDF[['won']]-1)
     handDF=cardsInHand(gameDF)
     total_cards_seen=handDF.sum(axis=1) #Total number of cards ever in hand for each game
@@ -414,8 +294,7 @@ def winSharesTotals(gameDF: pd.DataFrame):
 
 def winSharesByColors(main_colors, set_abbr='ltr'):
     #Find win share stats for a specific set of main colors
-    gameDF=getGameDataFrame(main_colors=main_colors,set_abbr=set_abbr)
-    ws_totals, hand_totals=winSharesTotals(gameDF)
+    ws_totals, hand_totals=winSharesTotals(getGameMatrix(main_colors=main_colors,set_abbr=set_abbr))
     ws_per_appearance={}
     for card_name in hand_totals.keys():
         if hand_totals[card_name]==0:
@@ -427,27 +306,17 @@ def winSharesByColors(main_colors, set_abbr='ltr'):
     for key in ws_per_appearance.keys():
         significant=hand_totals[key]>100
         if significant: print(key,':',ws_per_appearance[key])
-def winSharesOverall(set_abbr='ltr',chunk_size=50000):
-    #Find win share stats for all games played.
+def winSharesOverall(set_abbr='ltr'):
+    #Find win share stats for all games played, one color combination at a time.
     #Defunct. Win shares don't appear to be a valuable stat.
-    conn = engine_loc.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine_loc)
-    game_data_table=metadata.tables[set_abbr+'GameData']
-    q_size=select(func.count(1)).select_from(game_data_table)
-    num_games_res=pd.read_sql_query(q_size,conn)
-    num_games=num_games_res.iloc[0,0]
-    q_first_games=select(game_data_table).where(game_data_table.c.index<chunk_size)
-    gameDF1=pd.read_sql_query(q_first_games,conn)
-    ws_totals, hand_totals=winSharesTotals(gameDF1)
-    for i in range(1,num_games//chunk_size+1):
-        start_index=i*chunk_size
-        q_games=select(game_data_table).where(game_data_table.c.index>=start_index,game_data_table.c.index<start_index+chunk_size)
-        gameDF=pd.read_sql_query(q_games,conn)
-        ws_totals_temp, hand_totals_temp=winSharesTotals(gameDF)
+    ws_totals, hand_totals, num_games=0, 0, 0
+    for main_colors in gameDataColors(set_abbr):
+        games=getGameMatrix(main_colors=main_colors,set_abbr=set_abbr)
+        ws_totals_temp, hand_totals_temp=winSharesTotals(games)
         ws_totals=ws_totals+ws_totals_temp
         hand_totals=hand_totals+hand_totals_temp
-        print("Counted win shares from", (i+1)*chunk_size, "games")
+        num_games+=games.num_games
+        print("Counted win shares from", num_games, "games")
     ws_per_appearance={}
     for card_name in hand_totals.keys():
         if hand_totals[card_name]==0:
@@ -461,9 +330,15 @@ def winSharesOverall(set_abbr='ltr',chunk_size=50000):
         if significant: print(key,':',ws_per_appearance[key])
 
 def gameInHandTotals(gameDF:pd.DataFrame,scale_by_copies=True):
-    #gameDF should be a game dataframe
+    #gameDF should be a game dataframe or a GameMatrix
     #returns total number of games in which each card shows up and how many of those are wins
     #Should a game with multiple copies of a card drawn count as multiple games in hand? Leaning yes.
+    if isinstance(gameDF,GameMatrix):
+        hand_matrix=gameDF.hand()
+        if not scale_by_copies: hand_matrix=(hand_matrix>0).astype(np.int64)
+        games=np.asarray(hand_matrix.sum(axis=0)).reshape(-1)
+        wins=hand_matrix.T@gameDF.won.astype(np.int64)
+        return pd.DataFrame({'games':games.astype(np.int64),'wins':wins.astype(np.int64)},index=gameDF.card_names)
     handDF=cardsInHand(gameDF)
     card_names=handDF.keys()
     if scale_by_copies:
@@ -480,32 +355,29 @@ def gameInHandTotals(gameDF:pd.DataFrame,scale_by_copies=True):
     totals=pd.DataFrame({'games':games.to_list(),'wins':wins.to_list()},index=card_names)
     return totals
 
-def gameInHandOverall(set_abbr='ltr', chunk_size=100000):
+def deckCopiesHistogram(games:GameMatrix)->np.ndarray:
+    #Number of games by card, copies in the deck and result, from the deck counts of a GameMatrix:
+    #histogram[card,copies,won] where card is a position in games.card_names. Games without the card are not counted (copies=0 stays 0).
+    deck=games.deck.tocoo()
+    max_copies=int(deck.data.max()) if deck.nnz else 0
+    bins=(deck.col.astype(np.int64)*(max_copies+1)+deck.data)*2+games.won[deck.row]
+    histogram=np.bincount(bins,minlength=len(games.card_names)*(max_copies+1)*2)
+    return histogram.reshape(len(games.card_names),max_copies+1,2)
+
+def gameInHandOverall(set_abbr='ltr'):
     #For each card, gets total number of games and number of wins where that card is ever in hand. 
     #Returns a dataframe indexed by card name with columns 'games' and 'wins'. 
     #'games'/'wins' should match 17lands 'GIHWR' stat.
     #This is unnecessary if I'm going to find all colors separately anyway. May as well just add those together.
-    conn = engine_loc.connect()
-    metadata = MetaData()
-    metadata.reflect(bind=engine_loc)
-    game_data_table=metadata.tables[set_abbr+'GameData']
-    q_size=select(func.count(1)).select_from(game_data_table)
-    num_games_res=pd.read_sql_query(q_size,conn)
-    num_games=num_games_res.iloc[0,0]
-    q_first_games=select(game_data_table).where(game_data_table.c.index<chunk_size)
-    gameDF1=pd.read_sql_query(q_first_games,conn)
-    totals=gameInHandTotals(gameDF1)
-    for i in range(1,num_games//chunk_size+1):
-        start_index=i*chunk_size
-        q_games=select(game_data_table).where(game_data_table.c.index>=start_index,game_data_table.c.index<start_index+chunk_size)
-        gameDF=pd.read_sql_query(q_games,conn)
-        temp_totals=gameInHandTotals(gameDF)
-        totals=totals+temp_totals
-        print("Counted win shares from", (i+1)*chunk_size, "games")
+    totals, num_games=0, 0
+    for main_colors in gameDataColors(set_abbr):
+        games=getGameMatrix(main_colors=main_colors,set_abbr=set_abbr)
+        totals=totals+gameInHandTotals(games)
+        num_games+=games.num_games
+        print("Counted games in hand from", num_games, "games")
     return totals
 def gameInHandByColors(main_colors, set_abbr='ltr')->pd.DataFrame:
-    gameDF=getGameDataFrame(main_colors=main_colors,set_abbr=set_abbr)
-    totals=gameInHandTotals(gameDF)
+    totals=gameInHandTotals(getGameMatrix(main_colors=main_colors,set_abbr=set_abbr))
     return totals
 
 def findDeckColumns(gameDF: pd.DataFrame):
@@ -519,6 +391,8 @@ def gameStartCounts(gameDF: pd.DataFrame):
     #gameDF should be a game dataframe containing the num_mulligans, on_play, and won columns from GameData
     #Returns a dataframe of records for each pairing of num_mulligans and on_play values
     #Games with 3 or more mulligans are grouped together.
+    if isinstance(gameDF,GameMatrix):
+        gameDF=pd.DataFrame({'num_mulligans':gameDF.num_mulligans,'on_play':gameDF.on_play,'won':gameDF.won})
     counts=gameDF[['num_mulligans','on_play','won']].value_counts()
     recordDF=pd.DataFrame({'num_mulligans':[],'on_play':[],'win_count':[],'game_count':[]})
     for m in range(3):
@@ -559,14 +433,17 @@ def organizeGameInfoByDraft(gamesDF:pd.DataFrame, include_decklists=True):
 
 def findNeutralHandStats(games_df:pd.DataFrame):
     #Find the IWD and GIHWR of an average card, i.e. what would these stats be for every card if the specific cards drawn did not matter.
-    #hand_df should be the output of cardsInHand(), deck_df should be the output of cardsInDeck()
-    hand_df=cardsInHand(games_df)
-    deck_df=cardsInDeck(games_df)
-    wins=games_df['won']
+    #games_df can be a game dataframe or a GameMatrix
+    if isinstance(games_df,GameMatrix):
+        wins=pd.Series(games_df.won)
+        total_drawn=pd.Series(np.asarray(games_df.hand().sum(axis=1)).reshape(-1))
+        total_deck=pd.Series(np.asarray(games_df.deck.sum(axis=1)).reshape(-1))
+    else:
+        wins=games_df['won']
+        total_drawn=cardsInHand(games_df).sum(axis=1)
+        total_deck=cardsInDeck(games_df).sum(axis=1)
     games=wins.shape[0]
     if games==0: return {'neutral_gihwr':0,'neutral_gnihwr':0,'neutral_iwd':0}
-    total_drawn=hand_df.sum(axis=1)
-    total_deck=deck_df.sum(axis=1)
     fraction_drawn=total_drawn/total_deck.mask(total_deck==0,1) #total deck should never be 0, but just in case
     p_win_and_drawn=(wins*fraction_drawn).sum()/games
     p_win_and_not_drawn=(wins*(1-fraction_drawn)).sum()/games
@@ -577,35 +454,31 @@ def findNeutralHandStats(games_df:pd.DataFrame):
     neutral_iwd=neutral_gihwr-neutral_gnihwr
     return {'neutral_gihwr':neutral_gihwr,'neutral_gnihwr':neutral_gnihwr,'neutral_iwd':neutral_iwd}
 
-def meanDecklist(conn,set_abbr:str, arch_label:str, min_wins=0, max_wins=7, min_rank=0, max_rank=6):
-    #Get's average decklist for all decks of a given set in specified colors or archetype. Can be filtered by rank and record.
-    #(Infrastructure exists to filter by date drafted too if we want)
-    #arch_label can be colors as a WUBRG string, getting all decks with those main colors, e.g. "WB" 
-    #or colors plus a number, e.g.' "WB2", getting a subarchetype of those colors
-    set_abbr=set_abbr.lower()
-    arch_label=arch_label.upper()
-    metadata = MetaData()
-    metadata.reflect(bind=conn)    
-    deck_table=metadata.tables[set_abbr+'Decklists']
-    card_table=metadata.tables[set_abbr+'CardInfo']
-    s0=select(card_table.c.name)
-    cardSeries=pd.read_sql_query(s0,conn)
-    select_args=[func.count(1).label('num_decks')]
-    for card_name in cardSeries['name']:
-        select_args.append(func.avg(getattr(deck_table.c,card_name)).label(card_name))
-    s=select(*select_args)
-    if min_wins>0:
-        s=s.where(deck_table.c.wins>=min_wins)
-    if max_wins<7:
-        s=s.where(deck_table.c.wins<=max_wins)
-    if min_rank>0:
-        s=s.where(deck_table.c.rank>=min_rank)
-    if max_rank<6:
-        s=s.where(deck_table.c.rank<=max_rank)
-    if arch_label[-1:].isnumeric():
-        arch_id=archLabelToID(arch_label)
-        s=s.where(deck_table.c.arch_id==arch_id)
-    else:
-        s=s.where(deck_table.c.main_colors==arch_label)
-    resultDF=pd.read_sql_query(s,conn)
-    return resultDF
\ No newline at end of file
+def cardPickStats(pack_df:pd.DataFrame,first_picks=None)->pd.DataFrame:
+    #pack_df: pack contents summed by pack_number and pick_number, as stored in DraftPacks (one pack_card_[cardname] column per card).
+    #first_picks: copies of each card taken at pick 0, a Series indexed by (pack_number, card name) as returned by firstPickCounts.
+    #Returns one row per card and pack_number with columns name, pack_number, mean_pick, median_pick, first_pick_rate, times_seen.
+    #pack_number=-1 combines all three packs, which is what the card table shows as mean_pick.
+    #times_seen: copies of the card seen in a pack at pick 0. first_pick_rate: share of those taken with the first pick.
+    #Pack contents alone don't say what was picked, so without first_picks the rate is only estimated, as the copies seen at
+    #pick 0 minus those seen at pick 1. The pick 1 packs come from other drafters, so the estimate is noisy and can be negative.
+    pack_df=pack_df.reset_index() if 'pick_number' not in pack_df.columns else pack_df
+    card_cols=[col for col in pack_df.columns if col[:10]=='pack_card_']
+    sections=[(-1,pack_df)]+[(int(pack_number),section) for pack_number,section in pack_df.groupby('pack_number')]
+    rows=[]
+    for pack_number,section in sections:
+        counts=section.groupby('pick_number')[card_cols].sum().sort_index()
+        counts.columns=[col[10:] for col in card_cols]
+        seen=counts.max(axis=0)
+        at_first=counts.iloc[0]
+        if first_picks is not None:
+            taken=first_picks if pack_number==-1 else first_picks[first_picks.index.get_level_values(0)==pack_number]
+            taken_first=taken.groupby(level=1).sum().reindex(counts.columns,fill_value=0)
+        else:
+            taken_first=at_first-(counts.iloc[1] if counts.shape[0]>1 else 0)
+        rows.append(pd.DataFrame({'name':counts.columns,'pack_number':pack_number,
+                                  'mean_pick':(counts.sum(axis=0)/seen).values,
+                                  'median_pick':[medianPick(counts[name]) for name in counts.columns],
+                                  'first_pick_rate':(taken_first/at_first.mask(at_first==0)).values,
+                                  'times_seen':seen.values}))
+    return pd.concat(rows,ignore_index=True)
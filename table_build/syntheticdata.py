@@ -0,0 +1,430 @@
+#Synthetic 17lands data for running the table_build pipeline and benchmarks without the real csvs or a Postgres database.
+#writeSyntheticData writes, for a made up set of ~300 cards:
+#   game_data_public.<SET>.PremierDraft.csv: one row per game, same columns as the 17lands file
+#       (deck_/drawn_/tutored_/opening_hand_/sideboard_ counts for every card, main_colors, splash_colors, on_play,
+#       num_mulligans, num_turns, won, rank, draft_time, ...). Each draft plays until 7 wins or 3 losses.
+#   draft_data_public.<SET>.PremierDraft.csv: 42 picks per draft with pack_card_/pool_ counts, for the same draft_ids
+#   cards.<SET>.json: the set's card info, in the form scrape_scryfall returns, since the set isn't on scryfall
+#Everything comes from one seed, so the same arguments always give the same files.
+#The data is shaped like the real thing: uneven archetype popularity and strength, a few themes within each color pair
+#for clustering to find, better cards at higher rarities, win rates that depend on rank, mulligans, play/draw,
+#mana flood/screw and the quality of the cards actually drawn.
+#buildLocalDatabase then runs the pipeline (buildgamedata, then tablebuilding.buildDBSimul): GameData goes to parquet
+#files next to the csvs and the set's tables to a single SQLite file, which the API can be pointed at with DATABASE_URL=sqlite:///<path>.
+#Run from the repository root:
+#   python3 table_build/syntheticdata.py --games 100000 --out synthetic [--set syn] [--seed 0] [--draft-fraction 1] [--build [--workers 4]]
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+SET_ABBR='syn'
+COLORS='WUBRG'
+BASICS=['Plains','Island','Swamp','Mountain','Forest']
+RANKS=['bronze','silver','gold','platinum','diamond','mythic']
+RANK_SHARES=[.08,.17,.3,.25,.13,.07]
+RANK_SKILL=[-.35,-.2,-.05,.05,.15,.3] #Added to each drafter's logit win chance
+NUM_COPIES_BY_RARITY={'C':20,'U':16,'R':12,'M':4} #Mono-colored cards per color
+RARITY_QUALITY={'C':0,'U':.25,'R':.55,'M':.75,'B':0}
+RARITY_AVAILABILITY={'C':1,'U':.45,'R':.12,'M':.06,'B':0} #How often a drafter ends up with each card, before quality and colors
+NUM_THEMES=3
+GAMES_PER_DRAFT=9 #At most 7 wins and 2 losses, or 6 wins and 3 losses
+DRAFTS_PER_CHUNK=2000
+PICKS_PER_DRAFT=42
+GAME_PREFIX_COLUMNS=['expansion','event_type','draft_id','draft_time','game_time','build_index','match_number','game_number',
+                     'rank','opp_rank','main_colors','splash_colors','on_play','num_mulligans','opp_num_mulligans','opp_colors',
+                     'num_turns','won','user_n_games_bucket','user_game_win_rate_bucket']
+GAME_CARD_PREFIXES=['deck_','drawn_','tutored_','opening_hand_','sideboard_']
+DRAFT_PREFIX_COLUMNS=['expansion','event_type','draft_id','draft_time','rank','event_match_wins','event_match_losses',
+                      'pack_number','pick_number','pick','pick_maindeck_rate','pick_sideboard_in_rate',
+                      'user_n_games_bucket','user_game_win_rate_bucket']
+ADJECTIVES=['Ancient','Arcane','Ashen','Blazing','Bold','Brazen','Cinder','Cunning','Dire','Dusk','Ember','Feral','Gilded',
+            'Grim','Hallowed','Hollow','Iron','Lunar','Mossy','Noble','Primal','Restless','Rune','Shadow','Silent','Storm',
+            'Sunlit','Thorn','Tidal','Vengeful','Verdant','Wild']
+NOUNS=['Acolyte','Aegis','Behemoth','Blessing','Captain','Charm','Colossus','Conjurer','Covenant','Drake','Duelist','Edict',
+       'Familiar','Gambit','Guardian','Harbinger','Herald','Hydra','Invoker','Lancer','Mentor','Oracle','Pathfinder','Phoenix',
+       'Ranger','Reckoning','Sentinel','Shaman','Strider','Tactics','Vanguard','Wurm']
+LAND_NOUNS=['Bog','Cliffs','Crossing','Grove','Harbor','Hollows','Marsh','Outpost','Ridge','Ruins','Spire','Vale']
+USER_GAME_BUCKETS=[1,5,10,50,100,500,1000]
+
+
+def colorString(color_int:int)->str:
+    #WUBRG string for a 5 bit color int (W=1, U=2, B=4, R=8, G=16), as in GameData's main_colors
+    return ''.join(c for i,c in enumerate(COLORS) if color_int&(1<<i))
+
+def gameDataAddress(directory:str, set_abbr:str)->str:
+    return os.path.join(directory,'game_data_public.'+set_abbr.upper()+'.PremierDraft.csv')
+
+def draftDataAddress(directory:str, set_abbr:str)->str:
+    return os.path.join(directory,'draft_data_public.'+set_abbr.upper()+'.PremierDraft.csv')
+
+def cardInfoAddress(directory:str, set_abbr:str)->str:
+    return os.path.join(directory,'cards.'+set_abbr.upper()+'.json')
+
+
+def makeCardPool(rng)->pd.DataFrame:
+    #~300 cards: commons to mythics in each color, a gold uncommon and rare per color pair, colorless artifacts,
+    #a dual land per color pair and the basics. Lands have mana value -1 as in scrape_scryfall.
+    #quality is the card's hidden strength, theme is the subarchetype it belongs to (-1 for lands).
+    rows=[]
+    for i in range(5):
+        for rarity,count in NUM_COPIES_BY_RARITY.items():
+            for _ in range(count):
+                rows.append({'color':1<<i,'rarity':rarity,'land_colors':0})
+    for pair in [a|b for a in (1,2,4,8,16) for b in (1,2,4,8,16) if a<b]:
+        rows.append({'color':pair,'rarity':'U','land_colors':0})
+        rows.append({'color':pair,'rarity':'R','land_colors':0})
+    for rarity in ['C']*4+['U']*4+['R']*2:
+        rows.append({'color':0,'rarity':rarity,'land_colors':0,'artifact':True})
+    for pair in [a|b for a in (1,2,4,8,16) for b in (1,2,4,8,16) if a<b]:
+        rows.append({'color':0,'rarity':'C','land_colors':pair,'land':True})
+    for i in range(5):
+        rows.append({'color':0,'rarity':'B','land_colors':1<<i,'land':True})
+    cards=pd.DataFrame(rows).fillna({'artifact':False,'land':False})
+    cards[['artifact','land']]=cards[['artifact','land']].astype(bool)
+    n=cards.shape[0]
+    spell_types=rng.choice(['C','I','S','E','AC','A'],size=n,p=[.58,.17,.12,.07,.04,.02])
+    artifact_types=rng.choice(['A','AC'],size=n,p=[.4,.6])
+    cards['card_type']=np.where(cards['land'],'L',np.where(cards['artifact'],artifact_types,spell_types))
+    creature=cards['card_type'].str.contains('C').to_numpy()
+    creature_mv=rng.choice(np.arange(1,8),size=n,p=[.1,.28,.26,.17,.11,.05,.03])
+    spell_mv=rng.choice(np.arange(1,7),size=n,p=[.2,.3,.25,.13,.08,.04])
+    cards['mana_value']=np.where(cards['land'],-1,np.where(creature,creature_mv,spell_mv))
+    cards['quality']=cards['rarity'].map(RARITY_QUALITY)+rng.normal(0,.45,n)*~cards['land']
+    cards['theme']=np.where(cards['land'],-1,rng.integers(0,NUM_THEMES,n))
+    names=[a+' '+b for a in ADJECTIVES for b in NOUNS]
+    num_spells=int((~cards['land']).sum())
+    spell_names=list(rng.choice(names,size=num_spells,replace=False))
+    land_names=list(rng.choice([a+' '+b for a in ADJECTIVES for b in LAND_NOUNS],size=10,replace=False))+BASICS
+    cards['name']=[spell_names.pop() if not land else land_names.pop(0) for land in cards['land']]
+    return cards
+
+def cardInfoDict(cards:pd.DataFrame)->dict:
+    #Same form as setinfo.scrape_scryfall, for tablebuilding.populateCardTable
+    return {int(i):{'name':row['name'],'mv':int(row['mana_value']),'color':int(row['color']),'type':row['card_type'],
+                    'rarity':row['rarity']} for i,row in cards.iterrows()}
+
+
+class SyntheticSet:
+    #The parts of the simulation that are fixed for the whole set: the card pool, how popular and how strong each
+    #color combination is, and for each deck profile (main colors, splash, theme) how likely each card is to make the deck.
+    def __init__(self, set_abbr:str, seed:int, start:str='2025-06-10', days:int=60):
+        self.set_abbr=set_abbr
+        self.rng=np.random.default_rng(seed)
+        self.start=pd.Timestamp(start)
+        self.days=days
+        self.cards=makeCardPool(self.rng)
+        self.names=self.cards['name'].tolist()
+        self.num_cards=len(self.names)
+        self.quality=self.cards['quality'].to_numpy()
+        self.mana_values=self.cards['mana_value'].to_numpy()
+        self.is_land=self.cards['land'].to_numpy()
+        self.basic_ids=np.array([self.names.index(b) for b in BASICS])
+        self.dual_ids=np.full(32,-1) #Dual land for each color pair
+        for card_id in np.flatnonzero(self.is_land):
+            if self.cards.at[card_id,'rarity']!='B': self.dual_ids[self.cards.at[card_id,'land_colors']]=card_id
+        self.makeMetagame()
+        self.makeProfiles()
+
+    def makeMetagame(self):
+        #Share of decks and logit strength for each main color combination. Stronger combinations are played more.
+        rng=self.rng
+        num_colors=np.array([bin(c).count('1') for c in range(32)])
+        self.strength=np.zeros(32)
+        self.strength[1:]=rng.normal(0,.12,31)
+        size_share={1:.05,2:.82,3:.12,4:.008,5:.002}
+        shares=np.zeros(32)
+        for size,share in size_share.items():
+            combos=np.flatnonzero(num_colors==size)
+            weights=rng.dirichlet(np.full(len(combos),6.0))*np.exp(4*self.strength[combos])
+            shares[combos]=share*weights/weights.sum()
+        self.color_shares=shares/shares.sum()
+        self.splash_rate=np.where(num_colors==2,.12,0.0)
+        self.speed=8.8+rng.normal(0,.6,32) #Mean game length in turns
+
+    def makeProfiles(self):
+        #Cumulative card weights for each (main colors, splash color, theme) profile, laid end to end with profile p
+        #in (p, p+1] so one searchsorted call samples spells for decks with different profiles.
+        card_colors=self.cards['color'].to_numpy()
+        rarity=self.cards['rarity'].map(RARITY_AVAILABILITY).to_numpy()
+        theme=self.cards['theme'].to_numpy()
+        base=np.exp(1.2*self.quality)*rarity*~self.is_land
+        num_profiles=32*6*NUM_THEMES
+        cumulative=np.zeros((num_profiles,self.num_cards))
+        for colors in range(1,32):
+            for splash in range(6):
+                splash_bit=0 if splash==0 else 1<<(splash-1)
+                in_colors=(card_colors&~colors)==0
+                splashed=((card_colors&~(colors|splash_bit))==0)&~in_colors
+                for t in range(NUM_THEMES):
+                    weights=base*(in_colors+.08*splashed)*np.where(theme==t,2.5,1)
+                    cumulative[self.profileIndex(colors,splash,t)]=np.cumsum(weights)/weights.sum()
+        cumulative[:,-1]=1
+        self.profile_cumulative=(cumulative+np.arange(num_profiles)[:,None]).ravel()
+
+    def profileIndex(self, colors, splash, theme):
+        return (colors*6+splash)*NUM_THEMES+theme
+
+    def makeDecks(self, num_drafts:int)->dict:
+        #Drafter, deck and sideboard for each of num_drafts drafts
+        rng=self.rng
+        colors=rng.choice(32,size=num_drafts,p=self.color_shares)
+        splash=np.where(rng.random(num_drafts)<self.splash_rate[colors],rng.integers(1,6,num_drafts),0)
+        splash=np.where((colors>>np.maximum(splash-1,0))&1==1,0,splash) #Can't splash one of the main colors
+        theme=rng.integers(0,NUM_THEMES,num_drafts)
+        num_spells=rng.choice([22,23,24],size=num_drafts,p=[.15,.7,.15])
+        #Spells: 40 draws from the deck's profile, of which the first num_spells are used
+        profile=self.profileIndex(colors,splash,theme)
+        u=rng.random((num_drafts,40))*(1-1e-12)+profile[:,None]
+        spells=np.searchsorted(self.profile_cumulative,u,side='right')-profile[:,None]*self.num_cards
+        #Lands: basics of the main colors, a splash basic or two, and sometimes the color pair's dual land
+        color_bits=(colors[:,None]>>np.arange(5))&1
+        splash_bits=(splash[:,None]==np.arange(1,6))
+        land_weights=color_bits+.12*splash_bits
+        land_weights=np.cumsum(land_weights/land_weights.sum(axis=1,keepdims=True),axis=1)
+        lands=self.basic_ids[np.minimum((rng.random((num_drafts,40,1))>land_weights[:,None,:]).sum(axis=2),4)]
+        dual=self.dual_ids[colors]
+        use_dual=(dual>=0)&(rng.random(num_drafts)<.45)
+        lands[:,39]=np.where(use_dual,dual,lands[:,39])
+        deck=np.where(np.arange(40)<num_spells[:,None],spells,lands)
+        deck_counts=self.countRows(deck)
+        sideboard=rng.integers(0,self.num_cards,(num_drafts,rng.integers(8,16)))
+        sideboard_counts=self.countRows(sideboard)
+        sideboard_counts[:,self.basic_ids]=0
+        rank=rng.choice(len(RANKS),size=num_drafts,p=RANK_SHARES)
+        skill=np.array(RANK_SKILL)[rank]+rng.normal(0,.3,num_drafts)
+        spell_quality=np.where(self.is_land[deck],0,self.quality[deck]).sum(axis=1)/num_spells
+        draft_time=self.start+pd.to_timedelta(rng.integers(0,self.days*86400,num_drafts),unit='s')
+        return {'colors':colors,'splash':splash,'theme':theme,'deck':deck,'deck_counts':deck_counts,'sideboard_counts':sideboard_counts,
+                'rank':rank,'skill':skill,'spell_quality':spell_quality,
+                'mean_mv':np.where(self.is_land[deck],0,self.mana_values[deck]).sum(axis=1)/num_spells,
+                'draft_time':draft_time,'draft_time_text':np.asarray(draft_time.strftime('%Y-%m-%d %H:%M:%S')),
+                'draft_id':['%016x%016x'%(a,b) for a,b in rng.integers(0,2**63,(num_drafts,2))],
+                'user_n_games_bucket':rng.choice(USER_GAME_BUCKETS,size=num_drafts,p=[.05,.1,.15,.3,.2,.15,.05]),
+                'user_game_win_rate_bucket':np.clip(np.round(1/(1+np.exp(-.2-skill))/.02)*.02,.3,.8)}
+
+    def countRows(self, card_ids:np.ndarray, weights=None)->np.ndarray:
+        #Copies of each card in each row of card_ids, as a (rows, num_cards) int16 array
+        rows=np.repeat(np.arange(card_ids.shape[0]),card_ids.shape[1])
+        counts=np.bincount(rows*self.num_cards+card_ids.ravel(),weights=None if weights is None else weights.ravel(),
+                           minlength=card_ids.shape[0]*self.num_cards)
+        return counts.reshape(card_ids.shape[0],self.num_cards).astype(np.int16)
+
+    def playGames(self, decks:dict)->dict:
+        #Plays GAMES_PER_DRAFT games with each deck and keeps the ones before the run ended at 7 wins or 3 losses.
+        rng=self.rng
+        num_drafts=len(decks['colors'])
+        shape=(num_drafts,GAMES_PER_DRAFT)
+        on_play=rng.random(shape)<.5
+        mulligans=rng.choice(4,size=shape,p=[.885,.095,.016,.004])
+        speed=self.speed[decks['colors']]+.5*(decks['mean_mv']-3.2)
+        turns=np.clip(np.round(rng.normal(speed[:,None],2.3,shape)),4,22).astype(np.int64)
+        hand_size=7-mulligans
+        draws=np.minimum(turns-on_play,40-hand_size)
+        #Shuffle each deck once per game: the first hand_size cards are the opening hand, the next draws cards are drawn
+        order=np.argsort(rng.random(shape+(40,)),axis=2)
+        library=np.take_along_axis(np.broadcast_to(decks['deck'][:,None,:],shape+(40,)),order,axis=2)
+        position=np.arange(40)
+        in_hand=position<hand_size[...,None]
+        drawn=(position>=hand_size[...,None])&(position<(hand_size+draws)[...,None])
+        seen=in_hand|drawn
+        seen_land=(self.is_land[library]&seen).sum(axis=2)
+        seen_spell_quality=(np.where(seen,self.quality[library],0)*~self.is_land[library]).sum(axis=2)
+        seen_spells=np.maximum(seen.sum(axis=2)-seen_land,1)
+        land_share=seen_land/seen.sum(axis=2)
+        logit=(.15+decks['skill'][:,None]+self.strength[decks['colors']][:,None]+.8*(decks['spell_quality'][:,None]-.2)
+               +.6*(seen_spell_quality/seen_spells-decks['spell_quality'][:,None])+np.where(on_play,.1,-.1)-.45*mulligans
+               -1.6*np.abs(land_share-.42))
+        won=rng.random(shape)<1/(1+np.exp(-logit))
+        wins_before=np.cumsum(won,axis=1)-won
+        losses_before=np.cumsum(~won,axis=1)-~won
+        played=(wins_before<7)&(losses_before<3)
+        flat_library=library.reshape(-1,40)
+        return {'played':played,'on_play':on_play,'mulligans':mulligans,'turns':turns,'won':won,
+                'opening_hand':self.countRows(flat_library,in_hand.reshape(-1,40)),
+                'drawn':self.countRows(flat_library,drawn.reshape(-1,40))}
+
+    def gameRows(self, decks:dict, games:dict, limit:int)->bytes:
+        #Csv rows for the played games, at most limit of them
+        rng=self.rng
+        draft_index,game_index=np.nonzero(games['played'])
+        draft_index,game_index=draft_index[:limit],game_index[:limit]
+        slot=draft_index*GAMES_PER_DRAFT+game_index
+        num_games=len(slot)
+        draft_time=decks['draft_time'][draft_index]
+        prefix=pd.DataFrame({'expansion':self.set_abbr.upper(),'event_type':'PremierDraft',
+                             'draft_id':np.array(decks['draft_id'])[draft_index],
+                             'draft_time':decks['draft_time_text'][draft_index],
+                             'game_time':(draft_time+pd.to_timedelta(3600+game_index*1800,unit='s')).strftime('%Y-%m-%d %H:%M:%S'),
+                             'build_index':0,'match_number':game_index+1,'game_number':1,
+                             'rank':np.array(RANKS)[decks['rank'][draft_index]],'opp_rank':None,
+                             'main_colors':[colorString(c) for c in decks['colors'][draft_index]],
+                             'splash_colors':[colorString(1<<(s-1)) if s else None for s in decks['splash'][draft_index]],
+                             'on_play':games['on_play'].ravel()[slot],'num_mulligans':games['mulligans'].ravel()[slot],
+                             'opp_num_mulligans':rng.choice(4,size=num_games,p=[.885,.095,.016,.004]),
+                             'opp_colors':[colorString(c) for c in rng.choice(32,size=num_games,p=self.color_shares)],
+                             'num_turns':games['turns'].ravel()[slot],'won':games['won'].ravel()[slot],
+                             'user_n_games_bucket':decks['user_n_games_bucket'][draft_index],
+                             'user_game_win_rate_bucket':decks['user_game_win_rate_bucket'][draft_index]},columns=GAME_PREFIX_COLUMNS)
+        counts=np.concatenate([decks['deck_counts'][draft_index],games['drawn'][slot],np.zeros((num_games,self.num_cards),np.int16),
+                               games['opening_hand'][slot],decks['sideboard_counts'][draft_index]],axis=1)
+        return joinRows(prefix,counts)
+
+    def draftRows(self, decks:dict, games:dict, selected:np.ndarray)->bytes:
+        #Csv rows for the picks of the selected drafts (see makePicks)
+        if len(selected)==0: return b''
+        picks=self.makePicks(decks,selected)
+        draft_index=np.repeat(selected,PICKS_PER_DRAFT)
+        pick=picks['pick']
+        wins=(games['won']&games['played']).sum(axis=1)
+        losses=(~games['won']&games['played']).sum(axis=1)
+        prefix=pd.DataFrame({'expansion':self.set_abbr.upper(),'event_type':'PremierDraft',
+                             'draft_id':np.array(decks['draft_id'])[draft_index],
+                             'draft_time':decks['draft_time_text'][draft_index],
+                             'rank':np.array(RANKS)[decks['rank'][draft_index]],
+                             'event_match_wins':wins[draft_index],'event_match_losses':losses[draft_index],
+                             'pack_number':picks['pack_number'],'pick_number':picks['pick_number'],'pick':np.array(self.names)[pick],
+                             'pick_maindeck_rate':(decks['deck_counts'][draft_index,pick]>0).astype(float),
+                             'pick_sideboard_in_rate':0.0,
+                             'user_n_games_bucket':decks['user_n_games_bucket'][draft_index],
+                             'user_game_win_rate_bucket':decks['user_game_win_rate_bucket'][draft_index]},columns=DRAFT_PREFIX_COLUMNS)
+        return joinRows(prefix,np.concatenate([picks['pack_counts'],picks['pool']],axis=1))
+
+    def makePicks(self, decks:dict, selected:np.ndarray)->dict:
+        #Every pick of the selected drafts: each pick comes from a fresh pack (10 commons, 3 uncommons and a rare or
+        #mythic) that the drafters before picked the best cards out of. The drafter favors cards in the colors
+        #they end up playing, more so later in the draft.
+        #Returns pack_number, pick_number, pick (card id), pack_counts and pool ((rows, num_cards) cards in the pack and
+        #already picked), with PICKS_PER_DRAFT rows per draft.
+        rng=self.rng
+        num_drafts=len(selected)
+        rows=num_drafts*PICKS_PER_DRAFT
+        rarity=self.cards['rarity'].to_numpy()
+        by_rarity={r:np.flatnonzero(rarity==r) for r in 'CURM'} #Common dual lands show up with the commons
+        rare=np.where(rng.random(rows)<.875,rng.choice(by_rarity['R'],rows),rng.choice(by_rarity['M'],rows))
+        pack=np.concatenate([rng.choice(by_rarity['C'],(rows,10)),rng.choice(by_rarity['U'],(rows,3)),rare[:,None]],axis=1)
+        pick_number=np.tile(np.arange(14),num_drafts*3)
+        pack_number=np.tile(np.repeat(np.arange(3),14),num_drafts)
+        others=self.quality[pack]+rng.gumbel(0,.4,pack.shape)
+        taken=np.argsort(np.argsort(-others,axis=1),axis=1)<pick_number[:,None] #Best pick_number cards are already gone
+        colors=np.repeat(decks['colors'][selected],PICKS_PER_DRAFT)
+        card_colors=self.cards['color'].to_numpy()[pack]
+        on_color=(card_colors&~colors[:,None])==0
+        progress=np.tile(np.arange(PICKS_PER_DRAFT),num_drafts)/PICKS_PER_DRAFT
+        mine=self.quality[pack]+on_color*(.3+1.2*progress[:,None])+rng.gumbel(0,.3,pack.shape)
+        choice=np.argmax(np.where(taken,-np.inf,mine),axis=1)
+        pick=pack[np.arange(rows),choice]
+        pack_counts=self.countRows(pack,~taken)
+        picked=self.countRows(pick[:,None]).reshape(num_drafts,PICKS_PER_DRAFT,self.num_cards)
+        pool=(np.cumsum(picked,axis=1)-picked).reshape(rows,self.num_cards)
+        return {'pack_number':pack_number,'pick_number':pick_number,'pick':pick,'pack_counts':pack_counts,'pool':pool}
+
+
+def joinRows(prefix:pd.DataFrame, counts:np.ndarray)->bytes:
+    #Csv lines of prefix's columns followed by the counts. pandas formats the few leading columns, and the counts
+    #(thousands of small ints per row, where to_csv is slow) are written straight into a byte array.
+    if counts.max(initial=0)>99 or counts.min(initial=0)<0: raise ValueError("counts must be between 0 and 99")
+    rows,columns=counts.shape
+    text=np.empty((rows,columns,2),dtype=np.uint8)
+    text[:,:,0]=48+counts%10
+    text[:,:,1]=44
+    text[:,-1,1]=10
+    tails=text.tobytes().split(b'\n')[:-1]
+    two_digit=np.flatnonzero((counts>=10).any(axis=1))
+    if len(two_digit):
+        #Rows with a count of 10 or more get a tens digit slot before every value, and the unused ones are dropped
+        wide=np.zeros((len(two_digit),columns,3),dtype=np.uint8)
+        wide[:,:,0]=np.where(counts[two_digit]>=10,48+counts[two_digit]//10,0)
+        wide[:,:,1:]=text[two_digit]
+        for i,line in zip(two_digit,wide[wide!=0].tobytes().split(b'\n')):
+            tails[i]=line
+    heads=prefix.to_csv(header=False,index=False,lineterminator='\n').encode().split(b'\n')[:-1]
+    return b''.join(head+b','+tail+b'\n' for head,tail in zip(heads,tails))
+
+
+def writeSyntheticData(directory:str, num_games:int, set_abbr=SET_ABBR, seed=0, draft_fraction=1.0, verbose=True)->dict:
+    #Writes the game data, draft data and card info files for num_games games into directory and returns their paths.
+    #draft_fraction: share of drafts that also get draft data rows (the draft csv is 42 rows per draft, ~8 per game).
+    os.makedirs(directory,exist_ok=True)
+    synthetic=SyntheticSet(set_abbr,seed)
+    paths={'game_data':gameDataAddress(directory,set_abbr),'draft_data':draftDataAddress(directory,set_abbr),
+           'card_info':cardInfoAddress(directory,set_abbr)}
+    with open(paths['card_info'],'w') as f:
+        json.dump(cardInfoDict(synthetic.cards),f,indent=1)
+    t0=time.time()
+    games_written=0
+    drafts_written=0
+    with open(paths['game_data'],'wb') as game_file, open(paths['draft_data'],'wb') as draft_file:
+        game_file.write((','.join(GAME_PREFIX_COLUMNS+[p+name for p in GAME_CARD_PREFIXES for name in synthetic.names])+'\n').encode())
+        draft_file.write((','.join(DRAFT_PREFIX_COLUMNS+[p+name for p in ['pack_card_','pool_'] for name in synthetic.names])+'\n').encode())
+        while games_written<num_games:
+            decks=synthetic.makeDecks(DRAFTS_PER_CHUNK)
+            games=synthetic.playGames(decks)
+            remaining=num_games-games_written
+            played=games['played'].sum(axis=1)
+            num_drafts=int(np.searchsorted(np.cumsum(played),remaining)+1) if played.sum()>remaining else DRAFTS_PER_CHUNK
+            games['played'][num_drafts:]=False
+            game_file.write(synthetic.gameRows(decks,games,remaining))
+            games_written+=min(int(games['played'].sum()),remaining)
+            selected=np.flatnonzero(synthetic.rng.random(num_drafts)<draft_fraction)
+            draft_file.write(synthetic.draftRows(decks,games,selected))
+            drafts_written+=num_drafts
+            if verbose:
+                print("Wrote {} games from {} drafts in {} seconds".format(games_written,drafts_written,round(time.time()-t0,1)))
+    return paths
+
+def readCardInfo(directory:str, set_abbr=SET_ABBR)->dict:
+    with open(cardInfoAddress(directory,set_abbr)) as f:
+        return {int(card_id):info for card_id,info in json.load(f).items()}
+
+def buildLocalDatabase(directory:str, set_abbr=SET_ABBR, db_path=None, workers=None)->str:
+    #Runs the table_build pipeline on the files writeSyntheticData wrote to directory: GameData (parquet, in directory),
+    #then every table buildDBSimul makes, all in one SQLite file (replaced if it exists). Returns the database's path.
+    #workers: processes building the color combinations (see tablebuilding.populateAllColorData).
+    #tablebuilding reads DATABASE_URL and SET_ABBR when it's imported, so this sets them first and has to run in a
+    #process that hasn't imported tablebuilding for another set.
+    if db_path is None: db_path=os.path.join(directory,set_abbr+'.db')
+    db_path=os.path.abspath(db_path)
+    if 'tablebuilding' in sys.modules and sys.modules['tablebuilding'].set_abbr!=set_abbr:
+        raise RuntimeError("tablebuilding was already imported for "+sys.modules['tablebuilding'].set_abbr)
+    if os.path.exists(db_path): os.remove(db_path)
+    url='sqlite:///'+db_path
+    os.environ.update(DATABASE_URL=url,GAME_DATA_DIR=os.path.abspath(directory),SET_ABBR=set_abbr)
+    table_build_dir=os.path.dirname(os.path.abspath(__file__))
+    #table_build modules import each other (ahead of the root's modules of the same name) and backend.statfunctions
+    if table_build_dir not in sys.path: sys.path.insert(0,table_build_dir)
+    if os.path.dirname(table_build_dir) not in sys.path: sys.path.append(os.path.dirname(table_build_dir))
+    t0=time.time()
+    import statfunctions
+    statfunctions.GAME_DATA_DIR=os.path.abspath(directory) #In case it was imported before GAME_DATA_DIR was set
+    from buildgamedata import loadGameData
+    loadGameData(set_abbr,address=gameDataAddress(directory,set_abbr))
+    t1=time.time()
+    import tablebuilding
+    tablebuilding.set_name_dict.setdefault(set_abbr,'Synthetic '+set_abbr.upper())
+    tablebuilding.buildDBSimul(card_info=readCardInfo(directory,set_abbr),draft_address=draftDataAddress(directory,set_abbr),workers=workers)
+    print("Loaded GameData in {} seconds and built the set's tables in {} seconds".format(round(t1-t0,1),round(time.time()-t1,1)))
+    return db_path
+
+
+def main():
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--games',type=int,default=100000,help='Number of games, e.g. 10000 up to 5000000')
+    parser.add_argument('--out',default='synthetic',help='Directory for the csvs (and database with --build)')
+    parser.add_argument('--set',default=SET_ABBR)
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--draft-fraction',type=float,default=1.0)
+    parser.add_argument('--build',action='store_true',help='Also run the pipeline into <out>/<set>.db')
+    parser.add_argument('--workers',type=int,help='Processes for the color combinations in the build (default BUILD_WORKERS, or 1)')
+    args=parser.parse_args()
+    paths=writeSyntheticData(args.out,args.games,set_abbr=args.set,seed=args.seed,draft_fraction=args.draft_fraction)
+    print("Wrote",', '.join(paths.values()))
+    if args.build:
+        db_path=buildLocalDatabase(args.out,set_abbr=args.set,workers=args.workers)
+        print("Built",db_path,"- serve it with DATABASE_URL=sqlite:///"+db_path)
+
+if __name__=='__main__':
+    main()
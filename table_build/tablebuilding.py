@@ -1,16 +1,21 @@
+import numpy as np
 import pandas as pd
-from sqlalchemy import MetaData, ForeignKey, Integer, SmallInteger, String, Boolean, DateTime, Float, func
-from sqlalchemy import Column, Table, select, create_engine, delete, update,insert
+from sqlalchemy import MetaData, ForeignKey, Integer, SmallInteger, String, Boolean, DateTime, Float, Text, LargeBinary, func
+from sqlalchemy import Column, Table, select, create_engine, delete, update,insert, case
 from sqlalchemy.orm import mapped_column, DeclarativeBase
 from statfunctions import *
 from processdraftdata import *
 from setinfo import scrape_scryfall
-import os
+import os, gzip
 from dotenv import load_dotenv
 from clustermaking import *
+try:
+    import brotli
+except ImportError: #Optional. Without it snapshots only get a gzip copy.
+    brotli=None
 load_dotenv()
 db_url=os.getenv("DATABASE_URL")
-set_abbr='fin' 
+set_abbr=os.getenv("SET_ABBR",'fin') #The set being built. Table names are fixed to it when this module is imported.
 set_name_dict={'ltr':'Lord of the Rings: Tales of Middle Earth',
                'bro':'Brother\'s War',
                'dmu':'Dominaria United',
@@ -18,8 +23,17 @@ set_name_dict={'ltr':'Lord of the Rings: Tales of Middle Earth',
                'one':'Phyrexia: All Will Be One',
                'fin':'Final Fantasy'}
 port='5432'
-engine=create_engine(url=db_url) 
-conn=engine.connect()
+#The build's connection, opened by connectDB() when a build function first needs it. Color worker processes import this
+#module too (see colorSections) but write nothing, so they never connect.
+engine=None
+conn=None
+
+def connectDB():
+    global engine, conn
+    if conn is None or conn.closed:
+        if engine is None: engine=create_engine(url=db_url)
+        conn=engine.connect()
+    return conn
 # Table Definitions
 
 
@@ -171,10 +185,22 @@ class ArchStartStats(Base):
     #e.g. a row with arch_id=3, num_mulligans=0, on_play=True, win_count=1000, game_count=1800 
     #would mean that WU decks that didn't mulligan and went first won 1000 of the 1800 games they played.
 
+class CardTableSnapshots(Base):
+    __tablename__=set_abbr+"CardTableSnapshots"
+    arch_id=mapped_column(SmallInteger, primary_key=True)
+    card_table=mapped_column(Text)
+    card_table_gzip=mapped_column(LargeBinary,nullable=True)
+    card_table_br=mapped_column(LargeBinary,nullable=True)
+    #For each archetype in the Archetypes table (including ALL and subarchetypes), the finished json output of
+    #stataccess.makeCardTable, so the site can serve the card table with a single lookup.
+    #card_table_gzip/card_table_br: the same json compressed, so responses don't have to be compressed per request. br is null without brotli.
+    #Derived entirely from the other tables, so it has to be rebuilt whenever they are.
+
 #Table Building
 def createDecklists(): 
     #This is actually the only table that's working properly. The others pretend to have the right data types and constraints,
     #but get saved
+    conn=connectDB()
     tableName=set_abbr+'Decklists'
     Base.metadata.reflect(bind=conn)
     if tableName in Base.metadata.tables.keys():
@@ -201,7 +227,54 @@ def createDecklists():
    
 
 
+def createDecklistCube():
+    #DecklistCube: Decklists pre-aggregated by (arch_id, main_colors, rank, wins).
+    #Each row is one such cell, with num_decks, num_games (games played by those decks) and, for each card, the total copies of it across those decks.
+    #Mean decklists and meta shares for any wins/rank range are then sums over a few cells instead of a scan of Decklists.
+    #first_deck_id: the cell's decks are deck_ids first_deck_id to first_deck_id+num_decks-1 (see makeDecklistSection),
+    #so a random deck can be picked without sorting Decklists. Null if the cell's ids aren't contiguous (older Decklists tables).
+    #Derived entirely from Decklists, so it has to be rebuilt whenever that is.
+    conn=connectDB()
+    tableName=set_abbr+'DecklistCube'
+    Base.metadata.reflect(bind=conn)
+    if tableName in Base.metadata.tables.keys():
+        oldtable=Base.metadata.tables[tableName]
+        oldtable.drop(bind=conn)
+        Base.metadata.remove(oldtable)
+        conn.commit()
+    carddf=cardInfo(conn=conn,set_abbr=set_abbr)
+    cols=[Column('arch_id', SmallInteger),
+          Column('main_colors',String),
+          Column('rank', SmallInteger),
+          Column('wins',SmallInteger),
+          Column('num_decks',Integer),
+          Column('num_games',Integer),
+          Column('first_deck_id',Integer)]
+    for name in carddf['name'].tolist():
+        cols.append(Column(name,Integer))
+    Table(tableName, Base.metadata, *cols)
+    Base.metadata.create_all(bind=conn)
+    conn.commit()
+
+def populateDecklistCube():
+    #Run after Decklists is complete. The aggregation is done by the database in a single INSERT ... SELECT ... GROUP BY.
+    conn=connectDB()
+    createDecklistCube()
+    deck_table=Base.metadata.tables[set_abbr+'Decklists']
+    cube_table=Base.metadata.tables[set_abbr+'DecklistCube']
+    cell_columns=[deck_table.c.arch_id,deck_table.c.main_colors,deck_table.c.rank,deck_table.c.wins]
+    card_names=[c.name for c in cube_table.columns][7:]
+    deck_id=deck_table.c.deck_id
+    first_deck_id=case((func.max(deck_id)-func.min(deck_id)+1==func.count(1),func.min(deck_id)),else_=None)
+    s=select(*cell_columns,func.count(1),func.sum(deck_table.c.games),first_deck_id,*[func.sum(deck_table.c[name]) for name in card_names]).group_by(*cell_columns)
+    conn.execute(insert(cube_table).from_select([c.name for c in cube_table.columns],s))
+    conn.commit()
+    num_cells=conn.execute(select(func.count(1)).select_from(cube_table)).scalar()
+    print("Stored",num_cells,"decklist cube cells")
+
 def makeDecklistSection(draftGameDF:pd.DataFrame,start_index:int,main_colors:str,arch_id:int):
+    #Decks are numbered in (rank, wins) order, so each DecklistCube cell covers a contiguous range of deck_ids.
+    draftGameDF=draftGameDF.sort_values(by=['rank','wins'],kind='stable')
     deck_count=draftGameDF.shape[0]
     extensionDF=pd.DataFrame(data={'deck_id':list(range(start_index,start_index+deck_count)),
                                    'main_colors':[main_colors]*deck_count,
@@ -215,6 +288,7 @@ def makeDecklistSection(draftGameDF:pd.DataFrame,start_index:int,main_colors:str
     return sectionDF
 
 def populateArchetypes():
+    conn=connectDB()
     arcs=['W','U','WU','B','WB','UB','WUB','R','WR','UR','WUR','BR','WBR','UBR','WUBR','G',
           'WG','UG','WUG','BG','WBG','UBG','WUBG','RG','WRG','URG','WURG','BRG','WBRG','UBRG','WUBRG'] 
     df=pd.DataFrame({'id':[],'arch_label':[],'num_drafts':[],'num_wins':[],'num_losses':[]})
@@ -224,8 +298,11 @@ def populateArchetypes():
     df.to_sql(set_abbr+'Archetypes',conn, index=False, if_exists='append')
     conn.commit()
 
-def populateCardTable():
-    df=pd.DataFrame.from_dict(scrape_scryfall(set_abbr=set_abbr),orient='index')
+def populateCardTable(card_info=None):
+    #card_info: dict in the form returned by scrape_scryfall, for sets that aren't looked up on scryfall (e.g. synthetic ones)
+    conn=connectDB()
+    if card_info is None: card_info=scrape_scryfall(set_abbr=set_abbr)
+    df=pd.DataFrame.from_dict(card_info,orient='index')
     df.columns=['name','mana_value','color','card_type','rarity']
     df['id']=df.index
     df.sort_index(inplace=True)
@@ -233,7 +310,8 @@ def populateCardTable():
     conn.commit()
         
 
-def insertArchToArchGames(archDF:pd.DataFrame,cardDF:pd.DataFrame,color_id:int,ag_name:str):
+def makeArchGameStats(archDF:pd.DataFrame,cardDF:pd.DataFrame,arch_id:int)->pd.DataFrame:
+    #ArchGameStats rows for one archetype
     insertdf=pd.DataFrame({ 'arch_id': [],'won': [],'turns': [],'game_count': [],
                                'lands': [],'n0_drops': [], 'n1_drops': [],
                                 'n2_drops': [], 'n3_drops': [], 'n4_drops': [],
@@ -246,19 +324,19 @@ def insertArchToArchGames(archDF:pd.DataFrame,cardDF:pd.DataFrame,color_id:int,a
             turndf=wondf[wondf["num_turns"]==turns]
             curve=countCurve(turndf,cardDF)
             games=len(turndf.index)
-            insertdf.loc[len(insertdf.index)]=[color_id, won, turns, games,
+            insertdf.loc[len(insertdf.index)]=[arch_id, won, turns, games,
                                             curve[10], curve[0], curve[1],
                                             curve[2], curve[3], curve[4],
                                             curve[5], curve[6], curve[7],
                                             curve[8], curve[9]]
-    insertdf.to_sql(ag_name,conn,if_exists='append',index=False)
+    return insertdf
 
-def insertArchToArchStarts(colorGamesDF:pd.DataFrame,color_id:int, table_name:str):
+def makeArchStartStats(colorGamesDF:pd.DataFrame,arch_id:int)->pd.DataFrame:
+    #ArchStartStats rows for one archetype
     recordDF=gameStartCounts(colorGamesDF)
-    recordDF['arch_id']=pd.Series([color_id]*recordDF.shape[0])
+    recordDF['arch_id']=pd.Series([arch_id]*recordDF.shape[0])
     column_order=['arch_id','num_mulligans','on_play','win_count','game_count']
     recordDF=recordDF[column_order]
-    recordDF.to_sql(table_name,con=conn,index=False,if_exists='append')
     return recordDF
 
 def combinePartialDerivedStats(cumulative_derived_df:pd.DataFrame,additional_derived_df:pd.DataFrame):
@@ -276,50 +354,160 @@ def combinePartialDerivedStats(cumulative_derived_df:pd.DataFrame,additional_der
     cumulative_derived_df['wins_in_hand']+=additional_derived_df['wins_in_hand']
     return cumulative_derived_df
 
-def insertArchToCardTables(arch_games_df:pd.DataFrame,cardDF:pd.DataFrame,arch_id:int,cg_table_name,derived_table_name):
-    cgInsertDF=pd.DataFrame({'id':[],'arch_id':[],'copies':[],'win_count':[], 'game_count':[]})
-    derivedInsertDF=pd.DataFrame({'arch_id':[],'card_id':[],'games_in_hand':[],'wins_in_hand':[], 'adj_gihwr':[],'adjusted_iwd':[],'inclusion_impact':[]})
-    gamesInHandDF=gameInHandTotals(arch_games_df,scale_by_copies=False)
-    neutral_stats=findNeutralHandStats(arch_games_df)
+def makeCardTables(arch_games_df:pd.DataFrame,cardDF:pd.DataFrame,arch_id:int):
+    #CardGameStats and CardDerivedStats rows for one archetype, computed for all cards at once from the deck counts.
+    #CardGameStats has a row for each card and number of copies it was played with in some game, cards in cardDF order and copies ascending.
+    games=GameMatrix.fromGameDF(arch_games_df)
+    positions=pd.Index(games.card_names).get_indexer(cardDF['name'])
+    if (positions<0).any():
+        raise KeyError("No deck_ column for "+", ".join(cardDF['name'][positions<0]))
+    histogram=deckCopiesHistogram(games)[positions] #[card,copies,won]
+    game_counts=histogram.sum(axis=2)
+    win_counts=histogram[:,:,1]
+    card_rows,copies=np.nonzero(game_counts[:,1:])
+    copies+=1
+    cgInsertDF=pd.DataFrame({'id':cardDF.index.to_numpy()[card_rows],'arch_id':arch_id,'copies':copies,
+                             'win_count':win_counts[card_rows,copies],'game_count':game_counts[card_rows,copies]})
+    gamesInHandDF=gameInHandTotals(games,scale_by_copies=False).iloc[positions]
+    neutral_stats=findNeutralHandStats(games)
     win_rate=arch_games_df['won'].mean()
-    for card_id in cardDF.index:
-        card_name=cardDF.at[card_id,'name']
-        col='deck_'+card_name 
-        partialdf=pd.DataFrame({'id':[],'arch_id':[],'copies':[],'win_count':[], 'game_count':[]})
-        partialdf.set_index('copies')
-        valdf=arch_games_df[[col,'won']].value_counts() 
-        indices=valdf.index.difference({(0,0),(0,1)})
-        card_counts={i[0] for i in indices}
-        for c in card_counts:
-            partialdf.loc[c]=[card_id,arch_id,c,0,0]
-        for (copies, won) in indices:
-            partialdf.loc[copies,['win_count','game_count']]+=[valdf[copies,won]*won,valdf[copies,won]]
-        cgInsertDF=pd.concat([cgInsertDF,partialdf],axis=0)
-        games_in_hand=gamesInHandDF.loc[card_name,'games']
-        wins_in_hand=gamesInHandDF.loc[card_name,'wins']
-        games_in_deck=partialdf['game_count'].sum()
-        wins_in_deck=partialdf['win_count'].sum()
-        gihwr=wins_in_hand/games_in_hand if wins_in_hand>0 else 0
-        gnihwr=(wins_in_deck-wins_in_hand)/(games_in_deck-games_in_hand) if (games_in_deck-games_in_hand)>0 else 0
-        adj_iwd=gihwr-gnihwr-neutral_stats['neutral_iwd']
-        adj_gihwr=gihwr-neutral_stats['neutral_gihwr']+win_rate
-        derivedInsertDF.loc[card_id]=[arch_id,card_id,int(gamesInHandDF.loc[card_name,'games']),
-                                                     int(gamesInHandDF.loc[card_name,'wins']),adj_gihwr,adj_iwd,0]
-    cgInsertDF.to_sql(cg_table_name,conn,if_exists='append', index=False)
+    games_in_hand=gamesInHandDF['games'].to_numpy(dtype=np.int64)
+    wins_in_hand=gamesInHandDF['wins'].to_numpy(dtype=np.int64)
+    games_not_in_hand=game_counts[:,1:].sum(axis=1)-games_in_hand
+    wins_not_in_hand=win_counts[:,1:].sum(axis=1)-wins_in_hand
+    with np.errstate(divide='ignore',invalid='ignore'):
+        gihwr=np.where(wins_in_hand>0,wins_in_hand/games_in_hand,0)
+        gnihwr=np.where(games_not_in_hand>0,wins_not_in_hand/games_not_in_hand,0)
+    derivedInsertDF=pd.DataFrame({'arch_id':arch_id,'card_id':cardDF.index,'games_in_hand':games_in_hand,'wins_in_hand':wins_in_hand,
+                                  'adj_gihwr':gihwr-neutral_stats['neutral_gihwr']+win_rate,
+                                  'adjusted_iwd':gihwr-gnihwr-neutral_stats['neutral_iwd'],'inclusion_impact':0.0},index=cardDF.index)
     derivedInsertDF.mask(derivedInsertDF.isna(),0,inplace=True) #replace NaN with 0
-    #derivedInsertDF.to_sql(derived_table_name,conn,if_exists='append',index=False)
-    conn.commit()
-    return derivedInsertDF
-def populateAllColorData(): #Find and write all data that is derived from color partitioning GameData
-    #Definitely has some optimization potential, but okay for now.
+    return cgInsertDF, derivedInsertDF
+
+def colorSection(color_id:int,cardDF:pd.DataFrame)->dict:
+    #Everything populateAllColorData derives from the games of one color combination, as dataframes for it to write:
+    #   arch_counts: (num_drafts, num_wins, num_losses) for the color's Archetypes row
+    #   Archetypes, Decklists, ArchGameStats, ArchStartStats, CardGameStats, CardDerivedStats: lists of sections for each table,
+    #       in the order they are written. Decklists sections number their decks from 0, and are renumbered when written.
+    #   color_derived: the color's CardDerivedStats, combined into 'ALL'. start_record: its ArchStartStats, added into 'ALL'.
+    #Nothing is written to the database here and only this color's GameData partition is read, so it can run in a worker process.
+    colors=colorString(color_id)
+    print("Getting all stats for",colors)
+    tables={name:[] for name in ['Archetypes','Decklists','ArchGameStats','ArchStartStats','CardGameStats','CardDerivedStats']}
+    colorGamesDF=getGameDataFrame(main_colors=colors,set_abbr=set_abbr)
+    #Coclustering is seeded by the color, so the archetypes found don't depend on which colors were clustered before
+    colorGamesDF=assignClusterLabels(gamesDF=colorGamesDF,set_abbr=set_abbr,random_state=np.random.RandomState(color_id))
+    colorDraftDF=organizeGameInfoByDraft(colorGamesDF,include_decklists=True)
+    num_arch_drafts=colorDraftDF.shape[0]
+    num_arch_wins=colorDraftDF['wins'].sum()
+    num_arch_losses=colorGamesDF.shape[0]-num_arch_wins
+    arch_counts=(num_arch_drafts,num_arch_wins,num_arch_losses)
+    tables['ArchGameStats'].append(makeArchGameStats(colorGamesDF,cardDF,color_id))
+    startRecordDF=makeArchStartStats(colorGamesDF,color_id)
+    tables['ArchStartStats'].append(startRecordDF)
+    print("Finished",colors,"deck stats")
+    cgSection,derived_table_section=makeCardTables(colorGamesDF,cardDF,color_id)
+    tables['CardGameStats'].append(cgSection)
+    print("Finished",colors,"card stats")
+    label_values=colorGamesDF['label'].unique().tolist()
+    num_archetypes=colorGamesDF['label'].nunique()
+    print("Categorized into ",num_archetypes, " archetypes")
+    if num_archetypes>1:
+        color_derived_table_section=pd.DataFrame({'arch_id':[],'card_id':[],'games_in_hand':[],'wins_in_hand':[], 'adj_gihwr':[],'adjusted_iwd':[],'inclusion_impact':[]})
+        color_derived_table_section['card_id']=derived_table_section['card_id']
+        color_derived_table_section['arch_id']=[color_id]*color_derived_table_section.shape[0]
+        color_derived_table_section['games_in_hand']=[0]*color_derived_table_section.shape[0]
+        color_derived_table_section['wins_in_hand']=[0]*color_derived_table_section.shape[0]
+        color_derived_table_section['adj_gihwr']=[0.0]*color_derived_table_section.shape[0]
+        color_derived_table_section['adjusted_iwd']=[0.0]*color_derived_table_section.shape[0]
+        color_derived_table_section['inclusion_impact']=[0.0]*color_derived_table_section.shape[0]
+        archTableUpdate=pd.DataFrame({'id':[],'arch_label':[],'num_drafts':[],'num_wins':[],'num_losses':[]})
+        deckTableUpdate=pd.DataFrame({})
+        archetypes={}
+        archetype_count=0
+        num_decks=0
+        for label_number in label_values:
+            archGamesDF=colorGamesDF[colorGamesDF['label']==label_number]
+            if label_number==-1: 
+                arch_id=32*9+color_id 
+                arch_label=colors+'9' #uncategorized decks get stored as 'WU9' or similar
+                archetypes[9]=archGamesDF
+            else:   
+                archetype_count+=1
+                arch_id=archetype_count*32+color_id
+                arch_label=colors+str(archetype_count) #WU archetypes go in as 'WU1', 'WU2', etc.
+                archetypes[archetype_count]=archGamesDF
+            archDraftDF=organizeGameInfoByDraft(archGamesDF)
+            num_arch_drafts=archDraftDF.shape[0]
+            num_arch_wins=archDraftDF['wins'].sum()
+            num_arch_losses=archGamesDF.shape[0]-num_arch_wins
+            archTableUpdate.loc[archTableUpdate.shape[0]]=(arch_id,arch_label,num_arch_drafts,num_arch_wins,num_arch_losses)
+            deckSection=makeDecklistSection(draftGameDF=archDraftDF,start_index=num_decks,main_colors=colors,arch_id=arch_id)
+            deckTableUpdate=pd.concat([deckTableUpdate,deckSection],axis=0)
+            num_decks+=archDraftDF.shape[0]
+        tables['Archetypes'].append(archTableUpdate)
+        tables['Decklists'].append(deckTableUpdate)
+        for arch_number in archetypes.keys():
+            archGamesDF=archetypes[arch_number]
+            arch_id=arch_number*32+color_id
+            tables['ArchGameStats'].append(makeArchGameStats(archGamesDF,cardDF=cardDF,arch_id=arch_id))
+            tables['ArchStartStats'].append(makeArchStartStats(archGamesDF,arch_id))
+            arch_cg_section,arch_derived_table_section=makeCardTables(archGamesDF,cardDF,arch_id)
+            tables['CardGameStats'].append(arch_cg_section)
+            tables['CardDerivedStats'].append(arch_derived_table_section)
+            color_derived_table_section=combinePartialDerivedStats(color_derived_table_section,arch_derived_table_section)
+        tables['CardDerivedStats'].append(color_derived_table_section)
+        print("Finished archetype stats")
+    else:
+        color_derived_table_section=derived_table_section
+        tables['CardDerivedStats'].append(derived_table_section)
+        tables['Decklists'].append(makeDecklistSection(draftGameDF=colorDraftDF,start_index=0,main_colors=colors,arch_id=color_id))
+    return {'arch_counts':arch_counts,'tables':tables,'color_derived':color_derived_table_section,'start_record':startRecordDF}
+
+def initColorWorker(threads:int,game_data_dir:str):
+    #Runs in each worker process before it builds a color: reads GameData from the same place as the parent,
+    #and keeps its BLAS/OpenMP pools (used by coclustering) to its share of the cores.
+    import statfunctions
+    statfunctions.GAME_DATA_DIR=game_data_dir
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(threads)
+
+def colorSections(color_ids:list,cardDF:pd.DataFrame,workers:int):
+    #Yields (color_id, colorSection(color_id)) in the order of color_ids.
+    #With workers>1 the colors are built in a pool of that many processes, largest partitions first so the slowest colors
+    #don't start last. Each worker process handles one color and is then replaced, so the memory it used is returned
+    #and a worker never holds more than one color's games. Workers are spawned, not forked, so they don't inherit the
+    #parent's database connection, and they never open one: only this process writes. Like any spawned pool, this needs
+    #the script that starts the build to run it under if __name__=='__main__':, or each worker would start the build again.
+    if workers<=1:
+        for color_id in color_ids:
+            yield color_id, colorSection(color_id,cardDF)
+        return
+    import multiprocessing
+    sizes={color_id:os.path.getsize(gameDataFile(colorString(color_id),set_abbr)) for color_id in color_ids}
+    context=multiprocessing.get_context('spawn')
+    threads=max(1,(os.cpu_count() or 1)//workers)
+    import statfunctions
+    with context.Pool(processes=workers,maxtasksperchild=1,initializer=initColorWorker,initargs=(threads,statfunctions.GAME_DATA_DIR)) as pool:
+        results={color_id:pool.apply_async(colorSection,(color_id,cardDF)) for color_id in sorted(color_ids,key=lambda c:-sizes[c])}
+        for color_id in color_ids:
+            yield color_id, results.pop(color_id).get()
+
+def populateAllColorData(workers=None): #Find and write all data that is derived from color partitioning GameData
+    #workers: number of processes building color combinations at once. Defaults to BUILD_WORKERS from the environment, or 1,
+    #which builds every color in this process. The tables come out the same either way: each color's results are written
+    #in color order, with deck_ids numbered in that order.
     #BUG: adj_gihwr for ALL showing up as None
+    conn=connectDB()
+    if workers is None: workers=int(os.getenv("BUILD_WORKERS","1"))
     Base.metadata.reflect(bind=conn)
     arch_table=Base.metadata.tables[set_abbr+'Archetypes']
-    ag_name=set_abbr+'ArchGameStats'
     arch_start_name=set_abbr+'ArchStartStats'
     totalArchStartsDF=pd.DataFrame({'arch_id':[-1]*8,'num_mulligans':[0,0,1,1,2,2,3,3],'on_play':[False,True]*4,'win_count':[0]*8,'game_count':[0]*8}) #Holds cumulative start data for archetype 'ALL'
     derived_table_name=set_abbr+'CardDerivedStats'
-    cg_name=set_abbr+'CardGameStats'
     cardDF=cardInfo(conn=conn,set_abbr=set_abbr)
     num_decks=0 #used to count how many decks have been added to Decklists for indexing purposes
     archTableByColorDF=pd.DataFrame({'id':[],'arch_label':[],'num_drafts':[],'num_wins':[],'num_losses':[]})
@@ -327,84 +515,26 @@ def populateAllColorData(): #Find and write all data that is derived from color
     cumulative_derived_table=pd.DataFrame({'arch_id':[-1]*num_cards,'card_id':cardDF.index,'games_in_hand':[0]*num_cards,
                                            'wins_in_hand':[0]*num_cards, 'adj_gihwr':[0.0]*num_cards,
                                            'adjusted_iwd':[0.0]*num_cards,'inclusion_impact':[0.0]*num_cards},index=cardDF.index)
+    partitions=set(gameDataColors(set_abbr)) #GameData is already split by main colors (buildgamedata.py), so each color reads only its own games
+    color_ids=[]
     for color_id in range(1,32):
         colors=colorString(color_id)
-        print("Getting all stats for",colors)
-        colors=colorString(color_id)
-        colorGamesDF=getGameDataFrame(main_colors=colors,set_abbr=set_abbr)
-        if colorGamesDF.shape[0]==0:
+        if colors in partitions:
+            color_ids.append(color_id)
+        else:
             print("No games found for",colors)
             archTableByColorDF.loc[color_id]=(color_id,colors,0,0,0)
-            continue
-        colorGamesDF=assignClusterLabels(gamesDF=colorGamesDF,set_abbr=set_abbr)
-        colorDraftDF=organizeGameInfoByDraft(colorGamesDF,include_decklists=True)
-        num_arch_drafts=colorDraftDF.shape[0]
-        num_arch_wins=colorDraftDF['wins'].sum()
-        num_arch_losses=colorGamesDF.shape[0]-num_arch_wins
-        archTableByColorDF.loc[color_id]=(color_id,colors,num_arch_drafts,num_arch_wins,num_arch_losses)
-        insertArchToArchGames(colorGamesDF,cardDF,color_id,ag_name)
-        startRecordDF=insertArchToArchStarts(colorGamesDF,color_id,arch_start_name)
-        totalArchStartsDF[['win_count','game_count']]+=startRecordDF[['win_count','game_count']]
-        print("Finished",colors,"deck stats")
-        derived_table_section= insertArchToCardTables(colorGamesDF,cardDF,color_id,cg_name,derived_table_name)
-        print("Finished",colors,"card stats")
-        label_values=colorGamesDF['label'].unique().tolist()
-        num_archetypes=colorGamesDF['label'].nunique()
-        print("Categorized into ",num_archetypes, " archetypes")
-        if num_archetypes==1:
-            cumulative_derived_table=combinePartialDerivedStats(cumulative_derived_table,derived_table_section)  
-            derived_table_section.to_sql(derived_table_name,conn,if_exists='append',index=False)
-        if num_archetypes>1:
-            color_derived_table_section=pd.DataFrame({'arch_id':[],'card_id':[],'games_in_hand':[],'wins_in_hand':[], 'adj_gihwr':[],'adjusted_iwd':[],'inclusion_impact':[]})
-            color_derived_table_section['card_id']=derived_table_section['card_id']
-            color_derived_table_section['arch_id']=[color_id]*color_derived_table_section.shape[0]
-            color_derived_table_section['games_in_hand']=[0]*color_derived_table_section.shape[0]
-            color_derived_table_section['wins_in_hand']=[0]*color_derived_table_section.shape[0]
-            color_derived_table_section['adj_gihwr']=[0.0]*color_derived_table_section.shape[0]
-            color_derived_table_section['adjusted_iwd']=[0.0]*color_derived_table_section.shape[0]
-            color_derived_table_section['inclusion_impact']=[0.0]*color_derived_table_section.shape[0]
-            archTableUpdate=pd.DataFrame({'id':[],'arch_label':[],'num_drafts':[],'num_wins':[],'num_losses':[]})
-            deckTableUpdate=pd.DataFrame({})
-            archetypes={}
-            archetype_count=0
-            for label_number in label_values:
-                archGamesDF=colorGamesDF[colorGamesDF['label']==label_number]
-                if label_number==-1: 
-                    arch_id=32*9+color_id 
-                    arch_label=colors+'9' #uncategorized decks get stored as 'WU9' or similar
-                    archetypes[9]=archGamesDF
-                else:   
-                    archetype_count+=1
-                    arch_id=archetype_count*32+color_id
-                    arch_label=colors+str(archetype_count) #WU archetypes go in as 'WU1', 'WU2', etc.
-                    archetypes[archetype_count]=archGamesDF
-                archDraftDF=organizeGameInfoByDraft(archGamesDF)
-                num_arch_drafts=archDraftDF.shape[0]
-                num_arch_wins=archDraftDF['wins'].sum()
-                num_arch_losses=archGamesDF.shape[0]-num_arch_wins
-                archTableUpdate.loc[archTableUpdate.shape[0]]=(arch_id,arch_label,num_arch_drafts,num_arch_wins,num_arch_losses)
-                deckSection=makeDecklistSection(draftGameDF=archDraftDF,start_index=num_decks,main_colors=colors,arch_id=arch_id)
-                deckTableUpdate=pd.concat([deckTableUpdate,deckSection],axis=0)
-                num_decks+=archDraftDF.shape[0]
-            archTableUpdate.to_sql(name=set_abbr+'Archetypes',con=conn,index=False,if_exists='append')
-            deckTableUpdate.to_sql(name=set_abbr+'Decklists',con=conn,index=False,if_exists='append')
-            conn.commit()
-            for arch_number in archetypes.keys():
-                archGamesDF=archetypes[arch_number]
-                arch_id=arch_number*32+color_id
-                insertArchToArchGames(archGamesDF,cardDF=cardDF,color_id=arch_id,ag_name=ag_name)
-                insertArchToArchStarts(archGamesDF,arch_id,arch_start_name)
-                arch_derived_table_section=insertArchToCardTables(archGamesDF,cardDF,arch_id,cg_name,derived_table_name)
-                arch_derived_table_section.to_sql(derived_table_name,conn,if_exists='append',index=False)
-                color_derived_table_section=combinePartialDerivedStats(color_derived_table_section,arch_derived_table_section)
-            color_derived_table_section.to_sql(derived_table_name,conn,if_exists='append',index=False)
-            cumulative_derived_table=combinePartialDerivedStats(cumulative_derived_table,color_derived_table_section)
-            print("Finished archetype stats")
-        else:
-            deckTableUpdate=makeDecklistSection(draftGameDF=colorDraftDF,start_index=num_decks,main_colors=colors,arch_id=color_id) 
-            num_decks+=colorDraftDF.shape[0]
-            deckTableUpdate.to_sql(name=set_abbr+'Decklists',con=conn,index=False,if_exists='append')
-            conn.commit()
+    for color_id,section in colorSections(color_ids,cardDF,workers):
+        archTableByColorDF.loc[color_id]=(color_id,colorString(color_id),*section['arch_counts'])
+        for deckSection in section['tables']['Decklists']:
+            deckSection['deck_id']+=num_decks
+            num_decks+=deckSection.shape[0]
+        for table_name,table_sections in section['tables'].items():
+            for table_section in table_sections:
+                table_section.to_sql(set_abbr+table_name,conn,if_exists='append',index=False)
+        conn.commit()
+        totalArchStartsDF[['win_count','game_count']]+=section['start_record'][['win_count','game_count']]
+        cumulative_derived_table=combinePartialDerivedStats(cumulative_derived_table,section['color_derived'])
     cumulative_derived_table.to_sql(derived_table_name,conn,if_exists='append',index=False)
     conn.commit()
     for i in range(1,32):
@@ -416,7 +546,50 @@ def populateAllColorData(): #Find and write all data that is derived from color
     totalArchStartsDF.to_sql(arch_start_name,con=conn,index=False,if_exists='append')
     conn.commit()
 
+def populateCardTableSnapshots():
+    #Renders the card table for every archetype once at build time and stores it in CardTableSnapshots.
+    #Uses the same assembly as stataccess.makeCardTable (statfunctions.makeCardTableDF) so the output is identical.
+    conn=connectDB()
+    Base.metadata.reflect(bind=conn)
+    snapshot_table=Base.metadata.tables[set_abbr+'CardTableSnapshots']
+    arch_table=Base.metadata.tables[set_abbr+'Archetypes']
+    card_table=Base.metadata.tables[set_abbr+'CardInfo']
+    card_stats_table=Base.metadata.tables[set_abbr+'CardGameStats']
+    derived_stats_table=Base.metadata.tables[set_abbr+'CardDerivedStats']
+    arch_ids=pd.read_sql_query(select(arch_table.c.id),conn)['id'].tolist()
+    card_df=pd.read_sql_query(select(card_table.c.id,card_table.c.name,card_table.c.color,card_table.c.rarity),conn,index_col='id')
+    s=select(card_stats_table.c.id,card_stats_table.c.arch_id,func.sum(card_stats_table.c.win_count).label('wins'),
+             func.sum(card_stats_table.c.game_count).label('games_played')).group_by(card_stats_table.c.id,card_stats_table.c.arch_id)
+    card_stats_df=pd.read_sql_query(s,conn)
+    derived_stats_df=pd.read_sql_query(select(derived_stats_table),conn)
+    if set_abbr+'CardPickStats' in Base.metadata.tables.keys():
+        pick_table=Base.metadata.tables[set_abbr+'CardPickStats']
+        s=select(pick_table.c.card_id,pick_table.c.mean_pick).where(pick_table.c.pack_number==-1)
+        mean_picks=pd.read_sql_query(s,conn,index_col='card_id')['mean_pick']
+    else: #Draft data processed before CardPickStats existed
+        pack_table=Base.metadata.tables[set_abbr+'DraftPacks']
+        mean_picks=meanPicksByCardID(card_df,meanPicksFromPacks(pd.read_sql_query(select(pack_table),conn)))
+    conn.execute(delete(snapshot_table))
+    rows=[]
+    for arch_id in arch_ids:
+        if arch_id==-1: #'ALL' counts every row of CardGameStats
+            arch_card_stats_df=card_stats_df[['id','wins','games_played']].groupby('id').sum()
+        else:
+            arch_card_stats_df=card_stats_df[card_stats_df['arch_id']==arch_id].set_index('id')[['wins','games_played']]
+        arch_derived_df=derived_stats_df[derived_stats_df['arch_id']==arch_id].set_index('card_id')
+        arch_derived_df=arch_derived_df[['games_in_hand','wins_in_hand','adj_gihwr','adjusted_iwd','inclusion_impact']]
+        table_df=makeCardTableDF(card_df,arch_card_stats_df,mean_picks,arch_derived_df)
+        card_table_json=table_df.to_json()
+        raw=card_table_json.encode('utf-8')
+        rows.append({'arch_id':int(arch_id),'card_table':card_table_json,
+                     'card_table_gzip':gzip.compress(raw,compresslevel=9,mtime=0),
+                     'card_table_br':brotli.compress(raw,quality=11) if brotli is not None else None})
+    conn.execute(insert(snapshot_table),rows)
+    conn.commit()
+    print("Stored card tables for",len(rows),"archetypes")
+
 def tableCensus(prefix=''): #For testing purposes. Go through each table and sample the contents.
+    conn=connectDB()
     md=MetaData()
     md.reflect(bind=conn)
     print(md.tables.keys())
@@ -431,6 +604,7 @@ def tableCensus(prefix=''): #For testing purposes. Go through each table and sam
             s2=select(func.count(1)).select_from(table)
             print("Size:", conn.execute(s2).fetchall())
 def showConstraints1(prefix=''): #For testing purposes. Go through each table and sample the contents.
+    conn=connectDB()
     md=MetaData()
     md.reflect(bind=conn)
     print(md.tables.keys())
@@ -440,6 +614,7 @@ def showConstraints1(prefix=''): #For testing purposes. Go through each table an
             print(table_name)
             print(table.constraints)
 def showConstraints2(prefix=''): #For testing purposes. Go through each table and sample the contents.
+    conn=connectDB()
     Base.metadata.reflect(bind=conn)
     print(Base.metadata.tables.keys())
     for table_name in Base.metadata.tables.keys():
@@ -448,11 +623,12 @@ def showConstraints2(prefix=''): #For testing purposes. Go through each table an
             table=Base.metadata.tables[table_name]
             print(table.constraints)
 def dropSet(drop_draft=True,drop_cards=True):
+    conn=connectDB()
     Base.metadata.clear()
     Base.metadata.reflect(bind=conn)
-    table_order=['CardDerivedStats','CardGameStats','ArchStartStats','ArchGameStats','Decklists','Archetypes']
+    table_order=['CardTableSnapshots','DecklistCube','CardDerivedStats','CardGameStats','ArchStartStats','ArchGameStats','Decklists','Archetypes']
     if drop_draft:
-        table_order.extend(['DraftInfo','DraftPacks'])
+        table_order.extend(['CardPickStats','DraftInfo','DraftPacks'])
     if drop_cards:
         table_order.append('CardInfo')
     for name in table_order:
@@ -469,9 +645,10 @@ def dropSet(drop_draft=True,drop_cards=True):
     Base.metadata.clear()
     conn.commit()
 def clearSet():
+    conn=connectDB()
     Base.metadata.clear()
     Base.metadata.reflect(bind=conn)
-    table_order=['CardDerivedStats','CardGameStats','ArchStartStats','ArchGameStats','Decklists','Archetypes']
+    table_order=['CardTableSnapshots','DecklistCube','CardDerivedStats','CardGameStats','ArchStartStats','ArchGameStats','Decklists','Archetypes']
     for name in table_order:
         table_name=set_abbr+name
         if table_name in Base.metadata.tables.keys():
@@ -483,31 +660,39 @@ def clearSet():
     Base.metadata.clear()
     conn.commit()
 
-def buildDBSimul():
+def buildDBSimul(card_info=None,draft_address=None,workers=None):
+    #card_info and draft_address default to scraping scryfall and the draft csv in the working directory.
+    #workers: processes for populateAllColorData (default BUILD_WORKERS, or 1)
+    conn=connectDB()
     Base.metadata.reflect(bind=conn) 
     Base.metadata.create_all(bind=conn)
-    updateActiveSets()
     populateArchetypes()
     print("Built Archetype Table")
-    populateCardTable()
+    populateCardTable(card_info)
     print("Built Card Info Table")
-    makeDraftInfo(conn,set_abbr=set_abbr) 
-    processPacks(conn,set_abbr=set_abbr)
+    makeDraftInfo(conn,set_abbr=set_abbr,address=draft_address) 
+    processPacks(conn,set_abbr=set_abbr,address=draft_address)
     createDecklists()
-    populateAllColorData()
+    populateAllColorData(workers)
+    populateDecklistCube()
+    populateCardTableSnapshots()
+    updateActiveSets() #Last, so the new last_updated is only seen once every table is written
     print("Done")
     conn.commit()
     conn.close()
 
-def refreshGameData():
+def refreshGameData(workers=None):
     #For sets that already exist, keep CardInfo and draftInfo. Replace all stats based on GameData.
+    conn=connectDB()
     clearSet()
     Base.metadata.reflect(bind=conn) 
     Base.metadata.create_all(bind=conn)
     populateArchetypes()
     print("Built Archetype Table")
     createDecklists()
-    populateAllColorData()
+    populateAllColorData(workers)
+    populateDecklistCube()
+    populateCardTableSnapshots()
     updateActiveSets()
     print("Done")
     conn.commit()
@@ -516,14 +701,18 @@ def refreshGameData():
 def makeActiveSets():
     #This function is used to create the ActiveSets table, which tracks which sets are currently being worked on.
     #It is not used in the current version of the program, but it is a good idea to keep it in case we want to add more sets in the future.
+    conn=connectDB()
     Base.metadata.reflect(bind=conn)
     if 'ActiveSets' not in Base.metadata.tables.keys():
         ActiveSets.__table__.create(bind=conn)
         conn.commit()
 def updateActiveSets():
+    conn=connectDB()
     makeActiveSets()
+    #last_updated is the version the backend caches results, ETags and stat stores by, so it has to change on every rebuild
     active_sets=Base.metadata.tables['ActiveSets']
-    if set_abbr not in active_sets.columns.keys():
+    existing=conn.execute(select(active_sets.c.set_abbr).where(active_sets.c.set_abbr==set_abbr)).first()
+    if existing is None:
         print("Adding new set to ActiveSets table")
         ins=insert(active_sets).values(set_abbr=set_abbr,set_name=set_name_dict[set_abbr],set_release_date=None,last_updated=pd.Timestamp.now())
         conn.execute(ins)
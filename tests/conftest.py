@@ -0,0 +1,53 @@
+#Run from the repository root: python3 -m pytest tests
+import os
+import subprocess
+import sys
+import pytest
+
+REPO_ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path: sys.path.insert(0,REPO_ROOT)
+TABLE_BUILD=os.path.join(REPO_ROOT,'table_build')
+#Build modules import each other by bare name (import statfunctions), ahead of the root's older stataccess.py as in syntheticdata.py
+if TABLE_BUILD not in sys.path: sys.path.insert(0,TABLE_BUILD)
+
+SYNTHETIC_SET='syn'
+SYNTHETIC_GAMES=3000
+SYNTHETIC_CSV_GAMES=600
+CLUSTERED_GAMES=30000 #Enough games per color for clustermaking to split out subarchetypes
+
+
+def pytest_addoption(parser):
+    parser.addoption('--clustered',action='store_true',help='Also build a set with subarchetypes for the tests that need one (about 3 minutes)')
+
+def buildSyntheticSet(directory, num_games:int)->str:
+    subprocess.run([sys.executable,os.path.join(REPO_ROOT,'table_build','syntheticdata.py'),'--games',str(num_games),
+                    '--out',str(directory),'--set',SYNTHETIC_SET,'--build','--workers','1'],check=True,cwd=REPO_ROOT,stdout=subprocess.DEVNULL)
+    return str(directory/(SYNTHETIC_SET+'.db'))
+
+@pytest.fixture(scope='session')
+def synthetic_db(tmp_path_factory)->str:
+    #Path of an SQLite database built by the table_build pipeline from table_build/syntheticdata.py data (about a minute).
+    #Built in its own process, since tablebuilding reads the database and set from the environment when it's imported.
+    return buildSyntheticSet(tmp_path_factory.mktemp('synthetic'),SYNTHETIC_GAMES)
+
+@pytest.fixture(scope='session')
+def synthetic_csv(tmp_path_factory)->dict:
+    #Paths of the files table_build/syntheticdata.py writes for SYNTHETIC_CSV_GAMES games, for the GameData stages. Nothing is built.
+    import syntheticdata
+    return syntheticdata.writeSyntheticData(str(tmp_path_factory.mktemp('csv')),SYNTHETIC_CSV_GAMES,set_abbr=SYNTHETIC_SET,verbose=False)
+
+@pytest.fixture(scope='session')
+def clustered_db(request, tmp_path_factory)->str:
+    #Path of a synthetic set large enough to have subarchetypes. Only built with --clustered.
+    if not request.config.getoption('--clustered'):
+        pytest.skip('needs --clustered')
+    return buildSyntheticSet(tmp_path_factory.mktemp('clustered'),CLUSTERED_GAMES)
+
+@pytest.fixture(scope='session')
+def stataccess(synthetic_db):
+    #backend.stataccess pointed at the synthetic set. The engine is created on first query, after DATABASE_URL is set.
+    os.environ['DATABASE_URL']='sqlite:///'+synthetic_db
+    from backend import database
+    assert database._engine is None, "backend.database already has an engine for another database"
+    from backend import stataccess
+    return stataccess
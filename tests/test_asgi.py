@@ -0,0 +1,71 @@
+#asgi.py: the same app served over ASGI, with stat queries run on the async engine through AsyncBridgeConnection
+import asyncio
+import json
+import httpx
+import pytest
+from conftest import SYNTHETIC_SET
+
+
+@pytest.fixture
+def asgi(stataccess):
+    import asgi
+    stataccess.stat_cache.clear()
+    yield asgi
+    stataccess.stat_cache.clear() #Results read over the bridge shouldn't be served to the other tests
+
+async def lifespan(app, message_type:str)->dict:
+    #Sends one lifespan message to the app and returns its reply
+    messages=asyncio.Queue()
+    replies=[]
+    await messages.put({'type':message_type})
+    if message_type=='lifespan.startup': await messages.put({'type':'lifespan.shutdown'})
+    async def send(message): replies.append(message)
+    await app({'type':'lifespan'},messages.get,send)
+    return replies[0]
+
+async def getOverASGI(app, paths:list)->list:
+    transport=httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport,base_url='http://test') as client:
+        return await asyncio.gather(*[client.get(path) for path in paths])
+
+
+def test_responses_match_the_wsgi_app(asgi, monkeypatch):
+    from backend import database
+    queries=[]
+    execute=database.AsyncBridgeConnection._execute
+    async def countingExecute(self, query, function):
+        queries.append(function)
+        return await execute(self,query,function)
+    monkeypatch.setattr(database.AsyncBridgeConnection,'_execute',countingExecute)
+    paths=['/cardInfo/'+SYNTHETIC_SET,'/getArchRecords/{}/ALL/'.format(SYNTHETIC_SET)]
+    async def serve():
+        responses=await getOverASGI(asgi.asgi_app,paths)
+        await database.disposeAsyncEngine()
+        return responses
+    responses=asyncio.run(serve())
+    assert queries #Stat queries went through the async engine
+    client=asgi.flask_app.test_client()
+    for path,response in zip(paths,responses):
+        wsgi_response=client.get(path)
+        assert response.status_code==wsgi_response.status_code==200
+        assert response.json()==json.loads(wsgi_response.get_data())
+
+def test_lifespan_shutdown_disposes_the_async_engine(asgi):
+    from backend import database
+    async def startAndStop():
+        assert (await lifespan(asgi.asgi_app,'lifespan.startup'))['type']=='lifespan.startup.complete'
+        database.getAsyncEngine()
+        assert (await lifespan(asgi.asgi_app,'lifespan.shutdown'))['type']=='lifespan.shutdown.complete'
+    asyncio.run(startAndStop())
+    assert database._async_engine is None
+
+def test_bridge_refuses_to_block_the_event_loop(asgi):
+    from backend import database
+    from sqlalchemy import text
+    async def queryOnLoop():
+        try:
+            with pytest.raises(RuntimeError):
+                database.AsyncBridgeConnection(asyncio.get_running_loop()).execute(text('select 1'))
+        finally:
+            await database.disposeAsyncEngine()
+    asyncio.run(queryOnLoop())
@@ -0,0 +1,68 @@
+#runBatch and /batch: many stat requests answered on one connection, each with the same output as calling it alone
+import json
+import pytest
+from conftest import SYNTHETIC_SET
+
+REQUESTS=[{'name':'curve','function':'getArchAvgCurve','args':{'set_abbr':SYNTHETIC_SET,'arch_label':'ALL'}},
+          {'name':'lengths','function':'getRecordByLength','args':{'set_abbr':SYNTHETIC_SET,'arch_label':'ALL'}},
+          {'name':'speed','function':'getArchAvgSpeed','args':{'set_abbr':SYNTHETIC_SET,'arch_label':'ALL'}},
+          {'function':'getMetaDistribution','args':{'set_abbr':SYNTHETIC_SET,'as_json':False}},
+          {'name':'bad_label','function':'getArchRecord','args':{'set_abbr':SYNTHETIC_SET,'arch_label':'not an archetype'}}]
+
+
+@pytest.fixture
+def connections(stataccess, monkeypatch):
+    #Connections checked out of the pool during the test
+    opened=[]
+    connect=stataccess.database.connect
+    def countingConnect():
+        conn=connect()
+        opened.append(conn)
+        return conn
+    monkeypatch.setattr(stataccess.database,'connect',countingConnect)
+    return opened
+
+def test_batch_outputs_match_single_calls(stataccess):
+    output=json.loads(stataccess.runBatch(REQUESTS))
+    assert list(output)==['curve','lengths','speed','getMetaDistribution','bad_label']
+    assert output['curve']==json.loads(stataccess.getArchAvgCurve.uncached(SYNTHETIC_SET,'ALL'))
+    assert output['lengths']==json.loads(stataccess.getRecordByLength.uncached(SYNTHETIC_SET,'ALL'))
+    assert output['speed']==json.loads(json.dumps(stataccess.getArchAvgSpeed.uncached(SYNTHETIC_SET,'ALL'),default=stataccess._jsonDefault))
+    assert output['getMetaDistribution']==json.loads(stataccess.getMetaDistribution.uncached(SYNTHETIC_SET)) #as_json is ignored
+    assert list(output['bad_label'])==['error'] #A failing request doesn't fail the others
+
+def test_batch_uses_one_connection(stataccess, connections):
+    stataccess.stat_cache.clear()
+    try:
+        stataccess.stat_store.enabled=False #So every request reads the database
+        stataccess.runBatch(REQUESTS[:3])
+    finally:
+        stataccess.stat_store.enabled=stataccess.STAT_STORE_ENABLED
+    assert len(connections)==1 and connections[0].closed
+
+def test_batch_shares_identical_queries(stataccess, monkeypatch):
+    stataccess.stat_cache.clear()
+    read=[]
+    readFrame=stataccess._readFrame
+    monkeypatch.setattr(stataccess,'_readFrame',lambda query,conn,index_col=None: read.append(str(query)) or readFrame(query,conn,index_col))
+    try:
+        stataccess.stat_store.enabled=False
+        stataccess.runBatch(REQUESTS[1:3]) #getRecordByLength and getArchAvgSpeed read the same ArchGameStats rows
+    finally:
+        stataccess.stat_store.enabled=stataccess.STAT_STORE_ENABLED
+    assert len(read)==len(set(read))
+
+@pytest.mark.parametrize('stat_requests',[[{'function':'connect'}],[{'function':'getCardInfo','args':[SYNTHETIC_SET]}],
+                                          [{'function':'getCardInfo'},{'function':'getCardInfo'}],['getCardInfo']])
+def test_malformed_requests_are_rejected(stataccess, stat_requests):
+    with pytest.raises(ValueError):
+        stataccess.runBatch(stat_requests)
+
+def test_batch_endpoint(stataccess):
+    from backend.endpoints import flask_app
+    client=flask_app.test_client()
+    response=client.post('/batch',json={'requests':REQUESTS[:2]})
+    assert response.status_code==200 and response.mimetype=='application/json'
+    assert response.get_json()==json.loads(stataccess.runBatch(REQUESTS[:2]))
+    assert client.post('/batch',json={'requests':[{'function':'connect'}]}).status_code==400
+    assert client.post('/batch',json=REQUESTS).status_code==400
@@ -0,0 +1,32 @@
+#tablebuilding.populateAllColorData: building the color combinations in a process pool writes the same tables as one process
+import os
+import subprocess
+import sys
+import pandas as pd
+from sqlalchemy import create_engine, inspect
+from conftest import REPO_ROOT, SYNTHETIC_SET
+
+
+def readTables(db_path:str)->dict:
+    #Every table in row order. ActiveSets.last_updated is the build time, so it's left out.
+    engine=create_engine('sqlite:///'+db_path)
+    with engine.connect() as conn:
+        tables={name:pd.read_sql_query('select * from "{}" order by rowid'.format(name),conn) for name in inspect(conn).get_table_names()}
+    engine.dispose()
+    tables['ActiveSets']=tables['ActiveSets'].drop(columns='last_updated')
+    return tables
+
+
+def test_pool_build_matches_a_single_process(synthetic_db):
+    #synthetic_db was built with one worker. Rebuild its data with two, in a fresh process (see buildLocalDatabase).
+    directory=os.path.dirname(synthetic_db)
+    pooled_db=os.path.join(directory,'workers2.db')
+    code='import syntheticdata; syntheticdata.buildLocalDatabase({!r},set_abbr={!r},db_path={!r},workers=2)'.format(
+        directory,SYNTHETIC_SET,pooled_db)
+    subprocess.run([sys.executable,'-c',code],check=True,cwd=os.path.join(REPO_ROOT,'table_build'),stdout=subprocess.DEVNULL)
+    single=readTables(synthetic_db)
+    pooled=readTables(pooled_db)
+    assert single.keys()==pooled.keys()
+    assert len(single[SYNTHETIC_SET+'CardGameStats'])>0
+    for name in single:
+        pd.testing.assert_frame_equal(pooled[name],single[name],obj=name)
@@ -0,0 +1,42 @@
+#table_build cardPickStats and first pick counting, on hand built DraftPacks
+import pandas as pd
+import pytest
+from statfunctions import cardPickStats
+from processdraftdata import addFirstPicks
+
+
+def packRows(contents:dict)->pd.DataFrame:
+    #contents: {(pack_number, pick_number): {card name: copies summed over drafts}} -> DraftPacks layout
+    names=sorted({name for cards in contents.values() for name in cards})
+    index=pd.MultiIndex.from_tuples(sorted(contents),names=['pack_number','pick_number'])
+    return pd.DataFrame([[contents[key].get(name,0) for name in names] for key in index],index=index,
+                        columns=['pack_card_'+name for name in names])
+
+#Two drafts. Pack 0: the packs at pick 0 hold A,B,C and A,A,B, and the drafters take A and B. Pack 1: A,C and B,C, both take C.
+PACKS=packRows({(0,0):{'A':3,'B':2,'C':1},(0,1):{'A':1,'B':2,'C':1},(0,2):{'A':1,'C':1},
+                (1,0):{'A':1,'B':1,'C':2},(1,1):{'A':1,'B':1},(1,2):{'B':1}})
+PICKS=pd.DataFrame({'pack_number':[0,0,0,0,1,1,1,1],'pick_number':[0,0,1,1,0,0,1,1],
+                    'pick':['A','B','B','A','C','C','A','B']})
+
+
+def firstPickRates(stats:pd.DataFrame, pack_number:int)->dict:
+    rows=stats[stats['pack_number']==pack_number].set_index('name')
+    return rows['first_pick_rate'].to_dict()
+
+def test_first_picks_are_counted_across_chunks():
+    first_picks=addFirstPicks(None,PICKS.iloc[:4])
+    first_picks=addFirstPicks(first_picks,PICKS.iloc[4:])
+    assert first_picks.to_dict()=={(0,'A'):1,(0,'B'):1,(1,'C'):2}
+
+def test_first_pick_rate_is_taken_over_seen_at_pick_0():
+    stats=cardPickStats(PACKS,addFirstPicks(None,PICKS))
+    assert firstPickRates(stats,0)==pytest.approx({'A':1/3,'B':1/2,'C':0})
+    assert firstPickRates(stats,1)==pytest.approx({'A':0,'B':0,'C':1})
+    assert firstPickRates(stats,-1)==pytest.approx({'A':1/4,'B':1/3,'C':2/3})
+    overall=stats[stats['pack_number']==-1].set_index('name')
+    assert overall['times_seen'].to_dict()=={'A':4,'B':3,'C':3}
+    assert overall.at['A','mean_pick']==pytest.approx((4+2+1)/4)
+
+def test_without_picks_the_rate_is_estimated_from_pick_1_contents():
+    stats=cardPickStats(PACKS)
+    assert firstPickRates(stats,0)==pytest.approx({'A':2/3,'B':0,'C':0})
@@ -0,0 +1,26 @@
+#getCardStatsByArchetype and getOverperformingCards on the synthetic set
+import json
+import math
+import pandas as pd
+from conftest import SYNTHETIC_SET
+
+
+def test_json_is_keyed_by_archetype_then_stat_then_card(stataccess):
+    labels=['ALL','RG','RG1']
+    df=stataccess.getCardStatsByArchetype.uncached(SYNTHETIC_SET,labels,as_json=False)
+    output=json.loads(stataccess.getCardStatsByArchetype.uncached(SYNTHETIC_SET,','.join(labels)))
+    assert list(output)==labels
+    for label in labels:
+        assert list(output[label])==df[label].columns.tolist()
+        for stat,values in output[label].items():
+            for card_id,value in df[label][stat].items():
+                if pd.isna(value):
+                    assert values[str(card_id)] is None #Archetypes without games give nulls, not NaN
+                else:
+                    assert math.isclose(values[str(card_id)],value)
+
+def test_overperforming_cards_columns(stataccess):
+    #The synthetic set is below the sample size cutoffs, so this only checks the frame's shape
+    top=stataccess.getOverperformingCards.uncached(SYNTHETIC_SET,'RG',as_json=False)
+    assert top.columns.tolist()==['arch_iwd','arch_games_in_hand','color_games_in_hand','overall_games_in_hand',
+                                  'card_name','color_delta','overall_delta']
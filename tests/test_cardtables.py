@@ -0,0 +1,88 @@
+#tablebuilding.makeCardTables gives the same CardGameStats and CardDerivedStats rows as the per card loop it replaced
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from conftest import SYNTHETIC_SET
+from backend.statfunctions import cardInfo, colorString
+
+
+def loopCardTables(arch_games_df:pd.DataFrame,cardDF:pd.DataFrame,arch_id:int):
+    #The replaced makeCardTables: value_counts of each card's deck column, written row by row with .loc
+    from statfunctions import GameMatrix, gameInHandTotals, findNeutralHandStats
+    cgInsertDF=pd.DataFrame({'id':[],'arch_id':[],'copies':[],'win_count':[], 'game_count':[]})
+    derivedInsertDF=pd.DataFrame({'arch_id':[],'card_id':[],'games_in_hand':[],'wins_in_hand':[], 'adj_gihwr':[],'adjusted_iwd':[],'inclusion_impact':[]})
+    games=GameMatrix.fromGameDF(arch_games_df)
+    gamesInHandDF=gameInHandTotals(games,scale_by_copies=False)
+    neutral_stats=findNeutralHandStats(games)
+    win_rate=arch_games_df['won'].mean()
+    for card_id in cardDF.index:
+        card_name=cardDF.at[card_id,'name']
+        col='deck_'+card_name
+        partialdf=pd.DataFrame({'id':[],'arch_id':[],'copies':[],'win_count':[], 'game_count':[]})
+        valdf=arch_games_df[[col,'won']].value_counts()
+        indices=valdf.index.difference({(0,0),(0,1)})
+        card_counts={i[0] for i in indices}
+        for c in card_counts:
+            partialdf.loc[c]=[card_id,arch_id,c,0,0]
+        for (copies, won) in indices:
+            partialdf.loc[copies,['win_count','game_count']]+=[valdf[copies,won]*won,valdf[copies,won]]
+        cgInsertDF=pd.concat([cgInsertDF,partialdf],axis=0)
+        games_in_hand=gamesInHandDF.loc[card_name,'games']
+        wins_in_hand=gamesInHandDF.loc[card_name,'wins']
+        games_in_deck=partialdf['game_count'].sum()
+        wins_in_deck=partialdf['win_count'].sum()
+        gihwr=wins_in_hand/games_in_hand if wins_in_hand>0 else 0
+        gnihwr=(wins_in_deck-wins_in_hand)/(games_in_deck-games_in_hand) if (games_in_deck-games_in_hand)>0 else 0
+        adj_iwd=gihwr-gnihwr-neutral_stats['neutral_iwd']
+        adj_gihwr=gihwr-neutral_stats['neutral_gihwr']+win_rate
+        derivedInsertDF.loc[card_id]=[arch_id,card_id,int(gamesInHandDF.loc[card_name,'games']),
+                                                     int(gamesInHandDF.loc[card_name,'wins']),adj_gihwr,adj_iwd,0]
+    derivedInsertDF.mask(derivedInsertDF.isna(),0,inplace=True)
+    return cgInsertDF, derivedInsertDF
+
+@pytest.fixture(scope='module')
+def game_data(synthetic_db, stataccess):
+    #(cards, {color_id: games}) for the three most played color combinations of the synthetic set
+    import statfunctions
+    old_dir=statfunctions.GAME_DATA_DIR
+    statfunctions.GAME_DATA_DIR=os.path.dirname(synthetic_db) #syntheticdata.py writes GameData next to the database
+    engine=create_engine('sqlite:///'+synthetic_db)
+    with engine.connect() as conn:
+        card_df=cardInfo(conn,SYNTHETIC_SET)
+        counts=pd.read_sql_query('select id, num_drafts from {}Archetypes where id between 1 and 31'.format(SYNTHETIC_SET),conn)
+    engine.dispose()
+    color_ids=counts.sort_values('num_drafts',ascending=False)['id'].head(3).tolist()
+    try:
+        games={color_id:statfunctions.getGameDataFrame(colorString(color_id),SYNTHETIC_SET) for color_id in color_ids}
+    finally:
+        statfunctions.GAME_DATA_DIR=old_dir
+    return card_df,games
+
+def sortedRows(df:pd.DataFrame, keys:list)->pd.DataFrame:
+    return df.astype({key:'int64' for key in keys}).sort_values(keys).reset_index(drop=True)
+
+def assertSameTables(games:pd.DataFrame, card_df:pd.DataFrame, arch_id:int):
+    from tablebuilding import makeCardTables
+    card_game_stats,derived_stats=makeCardTables(games,card_df,arch_id)
+    loop_game_stats,loop_derived_stats=loopCardTables(games,card_df,arch_id)
+    assert len(card_game_stats)>0
+    pd.testing.assert_frame_equal(sortedRows(card_game_stats,['id','copies']),
+                                  sortedRows(loop_game_stats,['id','copies']).astype(card_game_stats.dtypes.to_dict()))
+    pd.testing.assert_frame_equal(derived_stats.reset_index(drop=True),loop_derived_stats.reset_index(drop=True),
+                                  check_dtype=False,check_index_type=False,rtol=1e-12)
+
+def test_color_partitions_match_the_loop(game_data):
+    card_df,games=game_data
+    for color_id,color_games in games.items():
+        assertSameTables(color_games,card_df,color_id)
+
+def test_subsets_of_games_match_the_loop(game_data):
+    #Subarchetypes are subsets of a color's games. A small one leaves many cards unplayed.
+    card_df,games=game_data
+    color_id,color_games=next(iter(games.items()))
+    rng=np.random.default_rng(0)
+    for size in [len(color_games)//2,25]:
+        subset=color_games.iloc[np.sort(rng.choice(len(color_games),size=size,replace=False))]
+        assertSameTables(subset,card_df,32+color_id)
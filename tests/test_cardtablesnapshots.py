@@ -0,0 +1,51 @@
+#CardTableSnapshots stored by the build are the card tables makeCardTable computes live, for every archetype
+import json
+import os
+import subprocess
+import sys
+from sqlalchemy import create_engine, text
+from conftest import REPO_ROOT, SYNTHETIC_SET
+
+
+def snapshotMismatches(stataccess, set_abbr:str)->list:
+    #(arch_label, stat_store) pairs whose stored snapshot differs from the live table, over every Archetypes row
+    from backend.statfunctions import archIDtoLabel
+    from sqlalchemy import select
+    conn=stataccess.connect()
+    arch_ids=[row[0] for row in conn.execute(select(stataccess.schema.getTable(set_abbr,'Archetypes').c.id))]
+    stataccess.release(conn)
+    mismatches=[]
+    try:
+        for store in [False,True]:
+            stataccess.stat_store.enabled=store
+            for arch_id in arch_ids:
+                arch_label='ALL' if arch_id==-1 else archIDtoLabel(arch_id)
+                snapshot=stataccess.getCardTableSnapshot(set_abbr,arch_id)
+                if snapshot is None or str(snapshot)!=stataccess.makeCardTable.uncached(set_abbr,arch_label,as_json=False).to_json():
+                    mismatches.append((arch_label,store))
+    finally:
+        stataccess.stat_store.enabled=stataccess.STAT_STORE_ENABLED
+    return mismatches
+
+
+def test_snapshots_match_the_live_tables(stataccess):
+    assert snapshotMismatches(stataccess,SYNTHETIC_SET)==[]
+
+def test_card_table_serves_the_snapshot(stataccess):
+    snapshot=stataccess.getCardTableSnapshot(SYNTHETIC_SET,-1)
+    assert stataccess.makeCardTable.uncached(SYNTHETIC_SET) is not None
+    assert json.loads(stataccess.makeCardTable.uncached(SYNTHETIC_SET))==json.loads(str(snapshot))
+    assert stataccess.getCardTableSnapshot(SYNTHETIC_SET,999) is None
+
+def test_subarchetype_snapshots_match_the_live_tables(clustered_db):
+    #backend.database holds one engine per process, so the clustered set is checked in its own
+    script=('import sys; sys.path.insert(0,{!r}); from test_cardtablesnapshots import snapshotMismatches; '
+            'from backend import stataccess; print(snapshotMismatches(stataccess,{!r}))').format(os.path.dirname(__file__),SYNTHETIC_SET)
+    env=dict(os.environ,DATABASE_URL='sqlite:///'+clustered_db)
+    result=subprocess.run([sys.executable,'-c',script],cwd=REPO_ROOT,env=env,capture_output=True,text=True,check=True)
+    assert result.stdout.strip()=='[]'
+    engine=create_engine('sqlite:///'+clustered_db)
+    with engine.connect() as conn:
+        num_subarchetypes=conn.execute(text('select count(*) from {}Archetypes where id>32'.format(SYNTHETIC_SET))).scalar()
+    engine.dispose()
+    assert num_subarchetypes>0
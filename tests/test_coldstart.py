@@ -0,0 +1,31 @@
+#Importing the API doesn't pull in the analytics stack or need DATABASE_URL. The first stat request does.
+import os
+import subprocess
+import sys
+import pytest
+from conftest import REPO_ROOT, SYNTHETIC_SET
+from benchmarks import startupbench
+
+NO_DATABASE_SCRIPT="""
+from app import flask_app
+client=flask_app.test_client()
+print(client.get('/api').status_code, client.get('/cardInfo/{}').status_code, client.get('/api').status_code)
+""".format(SYNTHETIC_SET)
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    monkeypatch.chdir(REPO_ROOT) #startupbench runs from the repository root
+
+@pytest.mark.parametrize('target',['app','asgi'])
+def test_import_defers_the_analytics_stack(target):
+    assert startupbench.importRun(target)['loaded']==[]
+
+def test_missing_database_url_fails_only_stat_requests():
+    env={key:value for key,value in os.environ.items() if key!='DATABASE_URL'}
+    result=subprocess.run([sys.executable,'-c',NO_DATABASE_SCRIPT],env=env,capture_output=True,text=True,check=True)
+    assert result.stdout.split()==['200','500','200']
+
+def test_first_stat_request_loads_it(stataccess):
+    run=startupbench.firstRequestRun(SYNTHETIC_SET,'ALL')
+    assert run['status']==200
@@ -0,0 +1,73 @@
+#compressResponse: Accept-Encoding negotiation, and Payloads served from the encodings they carry
+import gzip
+import brotli
+import pytest
+from flask import Flask
+from backend import compression
+from backend.compression import Payload, compressResponse, payloadResponse, STORED_LEVELS
+
+BODY='{"response":"'+'x'*2000+'"}'
+
+
+@pytest.fixture
+def app():
+    flask_app=Flask(__name__)
+    flask_app.after_request(compressResponse)
+    payload=Payload(BODY,{'gzip':gzip.compress(BODY.encode(),compresslevel=9,mtime=0)},STORED_LEVELS)
+    @flask_app.route('/json')
+    def jsonBody():
+        return flask_app.response_class(BODY,mimetype='application/json')
+    @flask_app.route('/small')
+    def small():
+        return flask_app.response_class('{"a":1}',mimetype='application/json')
+    @flask_app.route('/binary')
+    def binary():
+        return flask_app.response_class(BODY,mimetype='application/octet-stream')
+    @flask_app.route('/error')
+    def error():
+        return flask_app.response_class(BODY,status=500,mimetype='application/json')
+    @flask_app.route('/payload')
+    def stored():
+        return payloadResponse(payload)
+    flask_app.payload=payload
+    return flask_app
+
+def decoded(response)->str:
+    decompress={'br':brotli.decompress,'gzip':gzip.decompress,None:lambda data: data}
+    return decompress[response.headers.get('Content-Encoding')](response.get_data()).decode()
+
+
+@pytest.mark.parametrize('accept,encoding',[('gzip, deflate, br','br'),('gzip','gzip'),('br;q=0.5, gzip','gzip'),
+                                            ('identity',None),('',None),('*','br')])
+def test_best_accepted_encoding_is_used(app, accept, encoding):
+    response=app.test_client().get('/json',headers={'Accept-Encoding':accept})
+    assert response.headers.get('Content-Encoding')==encoding
+    assert 'Accept-Encoding' in response.vary
+    assert decoded(response)==BODY
+
+@pytest.mark.parametrize('path',['/small','/binary','/error'])
+def test_small_binary_and_error_bodies_are_sent_as_is(app, path):
+    response=app.test_client().get(path,headers={'Accept-Encoding':'br, gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+def test_payload_is_served_from_its_stored_encodings(app, monkeypatch):
+    stored=app.payload.encoded('gzip')
+    compressed=[]
+    compressBytes=compression.compressBytes
+    monkeypatch.setattr(compression,'compressBytes',lambda *args: compressed.append(args[1:]) or compressBytes(*args))
+    client=app.test_client()
+    assert client.get('/payload',headers={'Accept-Encoding':'gzip'}).get_data()==stored
+    assert compressed==[]
+    for i in range(2):
+        response=client.get('/payload',headers={'Accept-Encoding':'br'})
+        assert decoded(response)==BODY
+    assert compressed==[('br',STORED_LEVELS['br'])] #Encoded once, at the payload's levels
+
+def test_new_encodings_are_reported_once():
+    payload=Payload(BODY)
+    added=[]
+    payload.on_encoded=added.append
+    body=payload.encoded('gzip')
+    assert payload.encoded('gzip') is body
+    assert added==[len(body)]==[payload.compressedSize()]
+    assert body==gzip.compress(BODY.encode(),compresslevel=compression.DYNAMIC_LEVELS['gzip'],mtime=0)
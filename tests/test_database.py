@@ -0,0 +1,45 @@
+#Shared engine: pool timeouts are counted and poolStats reports the configured pool
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from backend import database
+
+
+@pytest.fixture
+def small_pool(tmp_path, monkeypatch):
+    #One connection, no overflow, and a short timeout, installed as the process engine for the test
+    settings={'pool_size':1,'max_overflow':0,'pool_timeout':0.1}
+    engine=create_engine('sqlite:///'+str(tmp_path/'pool.db'),**settings)
+    database._attachPoolListeners(engine)
+    monkeypatch.setattr(database,'_engine',engine)
+    monkeypatch.setattr(database,'_engine_settings',settings)
+    monkeypatch.setattr(database,'_pool_stats',dict.fromkeys(database._pool_stats,0))
+    yield engine
+    engine.dispose()
+
+def test_exhausted_pool_counts_a_timeout(small_pool):
+    conn=database.connect()
+    try:
+        with pytest.raises(PoolTimeoutError):
+            database.connect()
+    finally:
+        conn.close()
+    stats=database.poolStats()
+    assert stats['timeouts']==1 and stats['checkouts']==1
+
+def test_pool_stats_report_the_configured_overflow(small_pool):
+    conn=database.connect()
+    conn.execute(text('select 1'))
+    stats=database.poolStats()
+    conn.close()
+    assert stats['pool_size']==1 and stats['max_overflow']==0
+    assert stats['checked_out']==1 and stats['saturation']==1
+    assert database.poolStats()['checked_out']==0
+
+def test_postgres_urls_get_the_current_scheme_and_pool_settings(monkeypatch):
+    monkeypatch.setenv('DATABASE_URL','postgres://user@host/db')
+    monkeypatch.setenv('DB_MAX_OVERFLOW','4')
+    assert database.databaseURL()=='postgresql://user@host/db'
+    settings=database.poolSettings(database.databaseURL())
+    assert settings['max_overflow']==4 and settings['pool_size']==3
+    assert database.poolSettings('sqlite:///local.db')=={'pool_pre_ping':True}
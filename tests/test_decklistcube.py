@@ -0,0 +1,72 @@
+#Mean decklists and meta shares summed from DecklistCube cells equal the AVG/COUNT over Decklists they replaced
+import json
+import pandas as pd
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, func, select
+from conftest import SYNTHETIC_SET
+
+#(min_wins, max_wins, min_rank, max_rank). The last one matches no decks.
+FILTERS=[(0,7,0,6),(3,7,0,6),(0,2,0,6),(0,7,2,4),(5,7,3,6),(7,7,6,6)]
+
+
+@pytest.fixture(scope='module')
+def decklists(synthetic_db):
+    #(connection, Decklists table, card names) straight from the database, without stataccess
+    engine=create_engine('sqlite:///'+synthetic_db)
+    metadata=MetaData()
+    metadata.reflect(bind=engine)
+    with engine.connect() as conn:
+        card_names=[row[0] for row in conn.execute(select(metadata.tables[SYNTHETIC_SET+'CardInfo'].c.name))]
+        yield conn,metadata.tables[SYNTHETIC_SET+'Decklists'],card_names
+    engine.dispose()
+
+@pytest.fixture(scope='module')
+def colors(stataccess)->list:
+    drafts=json.loads(stataccess.getMetaDistribution(SYNTHETIC_SET))['drafts']
+    return sorted(drafts,key=drafts.get,reverse=True)[:2]
+
+def rawMeanDecklist(decklists, arch_label:str, min_wins, max_wins, min_rank, max_rank)->pd.DataFrame:
+    conn,deck_table,card_names=decklists
+    s=select(func.count(1).label('num_decks'),*[func.avg(deck_table.c[name]).label(name) for name in card_names]).where(
+        deck_table.c.main_colors==arch_label,deck_table.c.wins>=min_wins,deck_table.c.wins<=max_wins,
+        deck_table.c.rank>=min_rank,deck_table.c.rank<=max_rank)
+    return pd.read_sql_query(s,conn)
+
+def meanDecklists(stataccess, arch_label:str, filters)->pd.DataFrame:
+    min_wins,max_wins,min_rank,max_rank=filters
+    return stataccess.getMeanDecklist.uncached(SYNTHETIC_SET,arch_label,min_wins=min_wins,max_wins=max_wins,
+                                               min_rank=min_rank,max_rank=max_rank,as_json=False)
+
+
+@pytest.mark.parametrize('filters',FILTERS)
+def test_mean_decklist_from_the_cube_matches_decklists(stataccess, decklists, colors, filters):
+    for arch_label in colors:
+        expected=rawMeanDecklist(decklists,arch_label,*filters)
+        pd.testing.assert_frame_equal(meanDecklists(stataccess,arch_label,filters),expected,check_dtype=False,rtol=1e-12)
+
+@pytest.mark.parametrize('filters',[FILTERS[1],FILTERS[3],FILTERS[-1]])
+def test_sets_without_the_cube_fall_back_to_decklists(stataccess, decklists, colors, filters, monkeypatch):
+    monkeypatch.setattr(stataccess,'decklistCube',lambda set_abbr: None)
+    expected=rawMeanDecklist(decklists,colors[0],*filters)
+    pd.testing.assert_frame_equal(meanDecklists(stataccess,colors[0],filters),expected,check_dtype=False,rtol=1e-12)
+
+def test_cube_missing_card_columns_falls_back_to_decklists(stataccess, decklists, colors, monkeypatch):
+    #A cube built before CardInfo gained a card has no column for it, so the cube can't answer
+    conn,deck_table,card_names=decklists
+    cube=Table(SYNTHETIC_SET+'DecklistCube',MetaData(),*[Column(name,Integer) for name in
+               ['arch_id','main_colors','rank','wins','num_decks','num_games','first_deck_id']+card_names[:-1]])
+    monkeypatch.setattr(stataccess,'decklistCube',lambda set_abbr: cube)
+    pd.testing.assert_frame_equal(meanDecklists(stataccess,colors[0],FILTERS[1]),rawMeanDecklist(decklists,colors[0],*FILTERS[1]),check_dtype=False,rtol=1e-12)
+
+@pytest.mark.parametrize('min_rank,max_rank',[(0,6),(2,4),(5,6)])
+def test_meta_distribution_from_the_cube_matches_decklists(stataccess, decklists, min_rank, max_rank, monkeypatch):
+    conn,deck_table,card_names=decklists
+    s=select(deck_table.c.main_colors,func.count(1).label('drafts')).group_by(deck_table.c.main_colors)
+    if (min_rank,max_rank)!=(0,6):
+        s=s.where(deck_table.c.rank>=min_rank,deck_table.c.rank<=max_rank)
+    expected=pd.read_sql_query(s,conn).set_index('main_colors')['drafts']
+    from_cube=json.loads(stataccess.getMetaDistribution.uncached(SYNTHETIC_SET,min_rank=min_rank,max_rank=max_rank))
+    assert from_cube['drafts']==expected.to_dict()
+    assert from_cube['meta_share']==pytest.approx((expected/expected.sum()).to_dict())
+    monkeypatch.setattr(stataccess,'decklistCube',lambda set_abbr: None)
+    assert json.loads(stataccess.getMetaDistribution.uncached(SYNTHETIC_SET,min_rank=min_rank,max_rank=max_rank))==from_cube
@@ -0,0 +1,82 @@
+#makeFormatOverviewTable: the main color rows match the per archetype loop it replaced, and rank filters are consistent
+import pandas as pd
+import pytest
+from sqlalchemy import MetaData, create_engine, select
+from conftest import SYNTHETIC_SET
+from backend.statfunctions import archIDtoLabel
+
+LENGTH_COLUMNS=['average_win_length','average_game_length','aggression']
+OUTPUT_COLUMNS=['num_drafts','num_games','win_rate']+LENGTH_COLUMNS
+
+
+def baselineOverview(conn, set_abbr:str)->pd.DataFrame:
+    #The loop over ids 0-31 makeFormatOverviewTable used before the game length kernel. Built sets have no 'C' row,
+    #so columns are sized by the number of rows instead of a fixed 33, and only the labels present are kept.
+    metadata=MetaData()
+    metadata.reflect(bind=conn)
+    arch_table=metadata.tables[set_abbr+'Archetypes']
+    s1=select(arch_table.c.arch_label,arch_table.c.num_wins,arch_table.c.num_losses,arch_table.c.num_drafts).where(arch_table.c.id<32)
+    df=pd.read_sql_query(s1,conn,index_col='arch_label')
+    arch_stats_table=metadata.tables[set_abbr+'ArchGameStats']
+    s2=select(arch_stats_table.c.arch_id,arch_stats_table.c.turns,arch_stats_table.c.won,arch_stats_table.c.game_count.label('games')).where(arch_stats_table.c.arch_id<32)
+    arch_stats_df=pd.read_sql_query(s2,conn)
+    for column in ['average_win_length','average_loss_length','average_game_length','aggression']:
+        df[column]=[0]*df.shape[0]
+    for id in range(32):
+        label=archIDtoLabel(id)
+        temp_df= arch_stats_df[arch_stats_df['arch_id']==id]
+        if temp_df.shape[0]==0: continue
+        df.at[label,'average_win_length']=(temp_df[temp_df['won']==True]['turns']*temp_df[temp_df['won']==True]['games']).sum()/(max(temp_df[temp_df['won']==True]['games'].sum(),1))
+        df.at[label,'average_game_length']=(temp_df['turns']*temp_df['games']).sum()/(max(temp_df['games'].sum(),1))
+        df.at[label,'average_loss_length']=(temp_df[temp_df['won']==False]['turns']*temp_df[temp_df['won']==False]['games']).sum()/(max(temp_df[temp_df['won']==False]['games'].sum(),1))
+        df.at[label,'aggression']=df.at[label,'average_loss_length']-df.at[label,'average_win_length']
+    df.at['ALL','average_win_length']=(df['average_win_length']*df['num_wins']).sum()/(max(df['num_wins'].sum(),1))
+    df.at['ALL','average_game_length']=(df['average_game_length']*df['num_wins']).sum()/(max(df['num_wins'].sum(),1))
+    df.at['ALL','average_loss_length']=(df['average_loss_length']*df['num_losses']).sum()/(max(df['num_losses'].sum(),1))
+    df.at['ALL','aggression']=df.at['ALL','average_loss_length']-df.at['ALL','average_win_length']
+    df.at['ALL','num_drafts']=df['num_drafts'].sum()
+    df.at['ALL','num_wins']=df['num_wins'].sum()
+    df.at['ALL','num_losses']=df['num_losses'].sum()
+    df['num_games']=df['num_wins']+df['num_losses']
+    df['win_rate']=df['num_wins']/(df['num_wins']+df['num_losses']).mask(df['num_wins']+df['num_losses']==0,1)
+    output_df=df[OUTPUT_COLUMNS]
+    reorder=['ALL','C','W','U','B','R','G','WU','WB','WR','WG','UB','UR','UG','BR','BG','RG',
+             'WUB','WUR','WUG','WBR','WBG','WRG','UBR','UBG','URG','BRG','WUBR','WUBG','WURG','WBRG','UBRG','WUBRG']
+    return output_df.loc[[label for label in reorder if label in df.index]]
+
+@pytest.fixture(scope='module')
+def conn(synthetic_db):
+    engine=create_engine('sqlite:///'+synthetic_db)
+    with engine.connect() as conn:
+        yield conn
+    engine.dispose()
+
+
+@pytest.mark.parametrize('store',[True,False])
+def test_main_rows_match_the_per_archetype_loop(stataccess, conn, store):
+    try:
+        stataccess.stat_store.enabled=store
+        df=stataccess.makeFormatOverviewTable.uncached(SYNTHETIC_SET,as_json=False,include_subarchetypes=False)
+    finally:
+        stataccess.stat_store.enabled=stataccess.STAT_STORE_ENABLED
+    expected=baselineOverview(conn,SYNTHETIC_SET)
+    assert len(expected)==32 #ALL and the 31 color combinations
+    pd.testing.assert_frame_equal(df.loc[expected.index,OUTPUT_COLUMNS],expected,check_dtype=False,rtol=1e-12)
+
+def test_rank_filter_counts_decks_of_those_ranks(stataccess, conn):
+    df=stataccess.makeFormatOverviewTable.uncached(SYNTHETIC_SET,as_json=False,include_subarchetypes=False,min_rank=2,max_rank=4)
+    decks=pd.read_sql_query('select main_colors, wins, games from {}Decklists where rank between 2 and 4'.format(SYNTHETIC_SET),conn)
+    expected=decks.groupby('main_colors').agg(num_drafts=('wins','size'),num_wins=('wins','sum'),num_games=('games','sum'))
+    main_rows=df[df['id']>0]
+    for label,row in main_rows.iterrows():
+        counts=expected.loc[label] if label in expected.index else pd.Series({'num_drafts':0,'num_wins':0,'num_games':0})
+        assert (row['num_drafts'],row['num_wins'],row['num_games'])==tuple(counts[['num_drafts','num_wins','num_games']])
+    assert df.at['ALL','num_drafts']==len(decks) and df.at['ALL','num_games']==decks['games'].sum()
+    assert df[LENGTH_COLUMNS].isna().all().all() #Lengths aren't recorded by rank
+    assert not stataccess.makeFormatOverviewTable.uncached(SYNTHETIC_SET,as_json=False)[LENGTH_COLUMNS].isna().any().any()
+
+def test_rank_filter_without_decklist_cube_is_rejected(stataccess, monkeypatch):
+    monkeypatch.setattr(stataccess,'decklistCube',lambda set_abbr: None)
+    with pytest.raises(ValueError):
+        stataccess.makeFormatOverviewTable.uncached(SYNTHETIC_SET,min_rank=3)
+    assert stataccess.makeFormatOverviewTable.uncached(SYNTHETIC_SET,as_json=False) is not None #No filter, no cube needed
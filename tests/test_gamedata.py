@@ -0,0 +1,61 @@
+#GameData as parquet files per main colors: reads give the csv's rows, in csv order, with the kept columns
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import SYNTHETIC_SET
+import statfunctions
+from buildgamedata import csvTypes, loadGameData
+
+
+@pytest.fixture(scope='module')
+def csv_games(synthetic_csv)->pd.DataFrame:
+    #The csv's rows with the columns loadGameData keeps, and the csv row number as 'index'
+    games=pd.read_csv(synthetic_csv['game_data'])
+    games=games[list(csvTypes(games.columns.to_list()))]
+    games.insert(0,'index',games.index)
+    return games
+
+@pytest.fixture(scope='module')
+def game_data_dir(synthetic_csv, tmp_path_factory):
+    data_dir=str(tmp_path_factory.mktemp('game_data'))
+    loadGameData(SYNTHETIC_SET,address=synthetic_csv['game_data'],data_dir=data_dir)
+    old_dir=statfunctions.GAME_DATA_DIR
+    statfunctions.GAME_DATA_DIR=data_dir #getGameDataFrame and getGamesByID read the set from GAME_DATA_DIR
+    yield data_dir
+    statfunctions.GAME_DATA_DIR=old_dir
+
+def assertSameGames(df:pd.DataFrame, expected:pd.DataFrame):
+    #Values match the csv. Card counts, won and on_play are int8, as the build reads them.
+    assert list(df.columns)==list(expected.columns)
+    assert (df.filter(regex='^(deck|drawn|opening_hand)_').dtypes=='int8').all()
+    assert df['won'].dtype==df['on_play'].dtype=='int8'
+    pd.testing.assert_frame_equal(df.reset_index(drop=True),expected.reset_index(drop=True),check_dtype=False)
+
+
+def test_each_color_reads_its_games_in_csv_order(game_data_dir, csv_games):
+    colors=statfunctions.gameDataColors(SYNTHETIC_SET)
+    assert colors==sorted(csv_games['main_colors'].unique())
+    for main_colors in colors:
+        df=statfunctions.getGameDataFrame(main_colors,SYNTHETIC_SET)
+        assertSameGames(df,csv_games[csv_games['main_colors']==main_colors])
+
+def test_columns_are_read_on_their_own(game_data_dir, csv_games):
+    main_colors=csv_games['main_colors'].iloc[0]
+    df=statfunctions.getGameDataFrame(main_colors,SYNTHETIC_SET,columns=['won','num_turns'])
+    expected=csv_games.loc[csv_games['main_colors']==main_colors,['won','num_turns']]
+    pd.testing.assert_frame_equal(df,expected.reset_index(drop=True),check_dtype=False)
+
+def test_colors_without_games_give_an_empty_frame(game_data_dir, csv_games):
+    missing=next(colors for colors in ['WUBRG','WUBR','WUBG','WURG','WBRG','UBRG'] if colors not in set(csv_games['main_colors']))
+    df=statfunctions.getGameDataFrame(missing,SYNTHETIC_SET)
+    assert len(df)==0 and list(df.columns)==list(csv_games.columns)
+    assert list(statfunctions.getGameDataFrame(missing,SYNTHETIC_SET,columns=['won']).columns)==['won']
+
+def test_games_by_draft_id_across_colors(game_data_dir, csv_games):
+    draft_ids=list(np.random.default_rng(0).choice(csv_games['draft_id'].unique(),size=10,replace=False))
+    expected=csv_games[csv_games['draft_id'].isin(draft_ids)]
+    assert expected['main_colors'].nunique()>1
+    assertSameGames(statfunctions.getGamesByID(draft_ids,SYNTHETIC_SET),expected)
+    df=statfunctions.getGamesByID(draft_ids,SYNTHETIC_SET,columns=['draft_id','won'])
+    pd.testing.assert_frame_equal(df,expected[['draft_id','won']].reset_index(drop=True),check_dtype=False)
+    assert len(statfunctions.getGamesByID(['no such draft'],SYNTHETIC_SET))==0
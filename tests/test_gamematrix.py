@@ -0,0 +1,75 @@
+#GameMatrix holds the same games as the dense GameData rows: saved and loaded intact, and the stat functions agree on both
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import SYNTHETIC_SET
+import statfunctions
+from statfunctions import GameMatrix, GAME_VECTORS
+from buildgamedata import loadGameData
+
+
+@pytest.fixture(scope='module')
+def game_data_dir(synthetic_csv, tmp_path_factory):
+    data_dir=str(tmp_path_factory.mktemp('game_data'))
+    loadGameData(SYNTHETIC_SET,address=synthetic_csv['game_data'],data_dir=data_dir)
+    old_dir=statfunctions.GAME_DATA_DIR
+    statfunctions.GAME_DATA_DIR=data_dir
+    yield data_dir
+    statfunctions.GAME_DATA_DIR=old_dir
+
+@pytest.fixture(scope='module')
+def color_games(game_data_dir)->pd.DataFrame:
+    #The most played color combination's GameData rows
+    colors=statfunctions.gameDataColors(SYNTHETIC_SET)
+    return max((statfunctions.getGameDataFrame(main_colors,SYNTHETIC_SET) for main_colors in colors),key=len)
+
+def assertSameMatrix(games:GameMatrix, expected:GameMatrix):
+    assert games.card_names==expected.card_names
+    for name in ('deck','drawn','opening_hand'):
+        assert getattr(games,name).shape==getattr(expected,name).shape
+        assert (getattr(games,name)!=getattr(expected,name)).nnz==0
+    for name in GAME_VECTORS:
+        np.testing.assert_array_equal(getattr(games,name),getattr(expected,name))
+
+
+def test_counts_match_the_dense_rows(color_games):
+    games=GameMatrix.fromGameDF(color_games)
+    card_names=[column[5:] for column in color_games.columns if column[:5]=='deck_']
+    assert games.card_names==card_names and games.num_games==len(color_games)
+    for name,prefix in [('deck','deck_'),('drawn','drawn_'),('opening_hand','opening_hand_')]:
+        np.testing.assert_array_equal(getattr(games,name).toarray(),color_games[[prefix+card for card in card_names]].to_numpy())
+    np.testing.assert_array_equal(games.won,color_games['won'])
+    np.testing.assert_array_equal(games.index,color_games['index'])
+    np.testing.assert_array_equal(games.rank,color_games['rank'].map(statfunctions.rankToNum))
+    np.testing.assert_array_equal(games.hand().toarray(),
+                                  color_games[['drawn_'+card for card in card_names]].to_numpy()+color_games[['opening_hand_'+card for card in card_names]].to_numpy())
+
+def test_save_and_load_round_trip(color_games, tmp_path):
+    games=GameMatrix.fromGameDF(color_games)
+    path=str(tmp_path/'matrix'/'WU.npz')
+    games.save(path)
+    assertSameMatrix(GameMatrix.load(path),games)
+
+def test_rows_select_games(color_games):
+    games=GameMatrix.fromGameDF(color_games)
+    mask=color_games['on_play'].to_numpy()==1
+    assertSameMatrix(games.rows(mask),GameMatrix.fromGameDF(color_games[mask]))
+    assertSameMatrix(games.rows([2,0]),GameMatrix.fromGameDF(color_games.iloc[[2,0]]))
+
+def test_build_writes_a_matrix_per_color(game_data_dir):
+    for main_colors in statfunctions.gameDataColors(SYNTHETIC_SET):
+        path=statfunctions.gameMatrixFile(main_colors,SYNTHETIC_SET)
+        assert os.path.exists(path)
+        assertSameMatrix(statfunctions.getGameMatrix(main_colors,SYNTHETIC_SET),
+                         GameMatrix.fromGameDF(statfunctions.getGameDataFrame(main_colors,SYNTHETIC_SET)))
+
+def test_stat_functions_agree_on_both_forms(color_games):
+    games=GameMatrix.fromGameDF(color_games)
+    pd.testing.assert_frame_equal(statfunctions.cardsInHand(games).sparse.to_dense(),statfunctions.cardsInHand(color_games),check_dtype=False)
+    pd.testing.assert_frame_equal(statfunctions.gameInHandTotals(games),statfunctions.gameInHandTotals(color_games),check_dtype=False)
+    pd.testing.assert_frame_equal(statfunctions.gameInHandTotals(games,scale_by_copies=False),
+                                  statfunctions.gameInHandTotals(color_games,scale_by_copies=False),check_dtype=False)
+    for sparse_totals,dense_totals in zip(statfunctions.winSharesTotals(games),statfunctions.winSharesTotals(color_games)):
+        pd.testing.assert_series_equal(sparse_totals,dense_totals,check_dtype=False)
+    assert statfunctions.findNeutralHandStats(games)==pytest.approx(statfunctions.findNeutralHandStats(color_games))
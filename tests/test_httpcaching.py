@@ -0,0 +1,86 @@
+#conditionalOnSetVersion: ETag/Last-Modified from the set version, 304 for clients holding the current version
+from datetime import datetime
+import pytest
+from flask import Flask
+from backend.httpcaching import conditionalOnSetVersion, CACHE_CONTROL
+from backend.compression import compressResponse
+
+BODY='{"response":"'+'x'*2000+'"}' #Long enough to be compressed
+
+
+@pytest.fixture
+def app():
+    #A stats style route on its own app, with the same compression hook as backend's flask_app
+    versions={'ltr':datetime(2024,5,1,12,30,15,123456)}
+    calls=[]
+    flask_app=Flask(__name__)
+    flask_app.after_request(compressResponse)
+    @flask_app.route('/stat/<set_abbr>/<arch_label>')
+    @conditionalOnSetVersion(lambda set_abbr: versions.get(set_abbr))
+    def stat(set_abbr:str, arch_label:str):
+        calls.append(arch_label)
+        if arch_label=='bad': return "Invalid argument", 406
+        return BODY
+    flask_app.versions=versions
+    flask_app.calls=calls
+    return flask_app
+
+def test_responses_carry_the_set_version(app):
+    response=app.test_client().get('/stat/ltr/WU')
+    assert response.status_code==200
+    etag,weak=response.get_etag()
+    assert etag and not weak
+    assert response.last_modified==datetime.fromisoformat('2024-05-01T12:30:15+00:00')
+    assert response.headers['Cache-Control']==CACHE_CONTROL
+
+def test_each_request_path_gets_its_own_etag(app):
+    client=app.test_client()
+    assert client.get('/stat/ltr/WU').get_etag()!=client.get('/stat/ltr/UB').get_etag()
+
+def test_strong_etag_match_is_not_modified(app):
+    client=app.test_client()
+    etag=client.get('/stat/ltr/WU').headers['ETag']
+    response=client.get('/stat/ltr/WU',headers={'If-None-Match':etag})
+    assert response.status_code==304
+    assert response.headers['ETag']==etag
+    assert response.get_data()==b''
+    assert app.calls==['WU'] #The view isn't run for a 304
+
+def test_weak_etag_from_a_compressed_response_is_not_modified(app):
+    client=app.test_client()
+    response=client.get('/stat/ltr/WU',headers={'Accept-Encoding':'gzip'})
+    assert response.headers['Content-Encoding']=='gzip'
+    etag,weak=response.get_etag()
+    assert weak
+    assert response.headers['ETag'].startswith('W/')
+    for encoding in ['gzip','identity']:
+        response=client.get('/stat/ltr/WU',headers={'If-None-Match':'W/"{}"'.format(etag),'Accept-Encoding':encoding})
+        assert response.status_code==304
+    assert client.get('/stat/ltr/WU',headers={'If-None-Match':'"other", W/"{}"'.format(etag)}).status_code==304
+    assert app.calls==['WU']
+
+def test_rebuild_changes_the_etag(app):
+    client=app.test_client()
+    etag=client.get('/stat/ltr/WU').headers['ETag']
+    app.versions['ltr']=datetime(2024,5,2)
+    response=client.get('/stat/ltr/WU',headers={'If-None-Match':etag})
+    assert response.status_code==200
+    assert response.headers['ETag']!=etag
+    assert response.get_data(as_text=True)==BODY
+
+def test_if_modified_since(app):
+    client=app.test_client()
+    last_modified=client.get('/stat/ltr/WU').headers['Last-Modified']
+    assert client.get('/stat/ltr/WU',headers={'If-Modified-Since':last_modified}).status_code==304
+    assert client.get('/stat/ltr/WU',headers={'If-Modified-Since':'Tue, 30 Apr 2024 00:00:00 GMT'}).status_code==200
+    #If-None-Match takes precedence when both are sent
+    assert client.get('/stat/ltr/WU',headers={'If-Modified-Since':last_modified,'If-None-Match':'"other"'}).status_code==200
+
+def test_errors_and_unknown_sets_get_no_validators(app):
+    client=app.test_client()
+    response=client.get('/stat/ltr/bad')
+    assert response.status_code==406
+    assert 'ETag' not in response.headers
+    response=client.get('/stat/dmu/WU')
+    assert response.status_code==200
+    assert 'ETag' not in response.headers and 'Last-Modified' not in response.headers
@@ -0,0 +1,75 @@
+#Request, stat function and SQL instrumentation, and the Prometheus text on /metrics
+import pytest
+from backend import metrics
+from conftest import SYNTHETIC_SET
+
+
+def samples(text:str)->dict:
+    #'name{labels}' -> value for every sample line of a Prometheus text exposition
+    return {line.rsplit(' ',1)[0]:float(line.rsplit(' ',1)[1]) for line in text.splitlines() if line and not line.startswith('#')}
+
+def sample(text:str, name:str, default=0.0, **labels)->float:
+    return samples(text).get(name+metrics.formatLabels(tuple(labels),tuple(labels.values())),default)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram=metrics.Histogram('test_seconds','Test.',('route',),buckets=(.1,1))
+    for value in [.05,.5,.5,5]:
+        histogram.observe(('/a',),value)
+    text='\n'.join(histogram.render())
+    assert text.startswith('# HELP test_seconds Test.\n# TYPE test_seconds histogram\n')
+    assert sample(text,'test_seconds_bucket',route='/a',le='0.1')==1
+    assert sample(text,'test_seconds_bucket',route='/a',le='1')==3
+    assert sample(text,'test_seconds_bucket',route='/a',le='+Inf')==4
+    assert sample(text,'test_seconds_count',route='/a')==4
+    assert sample(text,'test_seconds_sum',route='/a')==pytest.approx(6.05)
+
+def test_counter_and_label_escaping():
+    counter=metrics.Counter('test_total','Test.',('function',))
+    counter.inc(('a"b\\c\nd',),2)
+    counter.inc(('a"b\\c\nd',),3)
+    assert counter.render()[-1]=='test_total{function="a\\"b\\\\c\\nd"} 5'
+
+def test_nested_stat_functions_get_their_own_rows():
+    @metrics.statFunction
+    def inner():
+        metrics.recordRows(7)
+        return '[1]'
+    @metrics.statFunction
+    def outer():
+        metrics.recordRows(3)
+        inner()
+        metrics.recordRows(1)
+        return {'not':'json'}
+    before=metrics.render()
+    outer()
+    after=metrics.render()
+    for function,rows,json_bytes in [('outer',4,0),('inner',7,3)]:
+        assert sample(after,'stat_sql_rows_total',function=function)-sample(before,'stat_sql_rows_total',function=function)==rows
+        assert sample(after,'stat_json_bytes_total',function=function)-sample(before,'stat_json_bytes_total',function=function)==json_bytes
+        assert sample(after,'stat_function_duration_seconds_count',function=function)-\
+               sample(before,'stat_function_duration_seconds_count',function=function)==1
+    assert metrics.currentFunction()=='none'
+
+def test_metrics_endpoint_reports_requests_and_queries(stataccess):
+    from backend.endpoints import flask_app
+    client=flask_app.test_client()
+    stataccess.stat_cache.clear()
+    before=client.get('/metrics').get_data(as_text=True)
+    try:
+        stataccess.stat_store.enabled=False #So the request runs SQL
+        assert client.get('/getArchRecords/{}/ALL/'.format(SYNTHETIC_SET)).status_code==200
+    finally:
+        stataccess.stat_store.enabled=stataccess.STAT_STORE_ENABLED
+    client.post('/ready') #No rule matches a POST there
+    response=client.get('/metrics')
+    assert response.status_code==200 and response.mimetype=='text/plain'
+    after=response.get_data(as_text=True)
+    def added(name, **labels):
+        return sample(after,name,**labels)-sample(before,name,**labels)
+    assert added('api_request_duration_seconds_count',route='/getArchRecords/<set_abbr>/<archLabel>/',method='GET',status='200')==1
+    assert added('api_request_duration_seconds_count',route='unmatched',method='POST',status='405')==1
+    assert added('stat_function_duration_seconds_count',function='getArchRecord')==1
+    assert added('stat_sql_duration_seconds_count',function='getArchRecord')>=1
+    assert added('stat_sql_rows_total',function='getArchRecord')>=1
+    assert added('stat_json_bytes_total',function='getArchRecord')>0
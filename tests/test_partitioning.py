@@ -0,0 +1,80 @@
+#partitionGameData: one pass over GameData chunks writes each main_colors file with that color's rows in order,
+#from the csv or from a GameData table in an SQL database alike
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import create_engine
+from conftest import SYNTHETIC_SET
+import statfunctions
+from buildgamedata import chunkSchema, csvTypes, partitionGameData, partitionSQLGameData, readGameChunks
+
+CHUNKSIZE=250 #Several chunks, so a color's rows come from more than one
+
+
+@pytest.fixture(scope='module')
+def dtypes(synthetic_csv)->dict:
+    return csvTypes(pd.read_csv(synthetic_csv['game_data'],nrows=0).columns.to_list())
+
+@pytest.fixture(scope='module')
+def csv_games(synthetic_csv, dtypes)->pd.DataFrame:
+    return pd.concat(readGameChunks(synthetic_csv['game_data'],dtypes),ignore_index=True)
+
+def partitionCSV(synthetic_csv, dtypes:dict, data_dir:str, transform=lambda df: df)->tuple:
+    address=synthetic_csv['game_data']
+    schema=chunkSchema(next(readGameChunks(address,dtypes,nrows=100)))
+    chunks=(transform(df) for df in readGameChunks(address,dtypes,chunksize=CHUNKSIZE))
+    return partitionGameData(SYNTHETIC_SET,chunks,schema,data_dir)
+
+def partitions(data_dir:str)->dict:
+    path=statfunctions.gameDataPath(SYNTHETIC_SET,data_dir)
+    return {name[:-len('.parquet')]:pq.read_table(os.path.join(path,name)).to_pandas() for name in sorted(os.listdir(path))}
+
+
+def test_each_color_file_has_its_rows_in_csv_order(synthetic_csv, dtypes, csv_games, tmp_path):
+    num_games,num_colors=partitionCSV(synthetic_csv,dtypes,str(tmp_path))
+    assert (num_games,num_colors)==(len(csv_games),csv_games['main_colors'].nunique())
+    written=partitions(str(tmp_path))
+    assert sorted(written)==sorted(csv_games['main_colors'].unique())
+    for main_colors,df in written.items():
+        expected=csv_games[csv_games['main_colors']==main_colors].reset_index(drop=True)
+        pd.testing.assert_frame_equal(df,expected,check_dtype=False)
+        assert pq.ParquetFile(statfunctions.gameDataFile(main_colors,SYNTHETIC_SET,str(tmp_path))).schema_arrow==\
+               chunkSchema(csv_games.head(100))
+
+def test_partitioning_replaces_the_sets_files(synthetic_csv, dtypes, csv_games, tmp_path):
+    path=statfunctions.gameDataPath(SYNTHETIC_SET,str(tmp_path))
+    os.makedirs(path)
+    stale=next(colors for colors in ['WUBRG','WUBR','WUBG','WURG','WBRG','UBRG'] if colors not in set(csv_games['main_colors']))
+    csv_games.head(3).to_parquet(os.path.join(path,stale+'.parquet')) #Left by an earlier load with other games
+    partitionCSV(synthetic_csv,dtypes,str(tmp_path))
+    partitionCSV(synthetic_csv,dtypes,str(tmp_path)) #Loading again doesn't append
+    written=partitions(str(tmp_path))
+    assert stale not in written
+    assert sum(len(df) for df in written.values())==len(csv_games)
+
+def test_games_without_main_colors_get_their_own_file(synthetic_csv, dtypes, csv_games, tmp_path):
+    def dropColors(df:pd.DataFrame)->pd.DataFrame:
+        df=df.copy()
+        df.loc[df['index']%10==0,'main_colors']=None
+        return df
+    partitionCSV(synthetic_csv,dtypes,str(tmp_path),dropColors)
+    written=partitions(str(tmp_path))
+    expected=csv_games[csv_games['index']%10==0]
+    assert written['_none']['index'].tolist()==expected['index'].tolist()
+    assert written['_none']['main_colors'].isna().all()
+
+def test_sql_table_partitions_like_the_csv(synthetic_csv, dtypes, csv_games, tmp_path):
+    #GameData as the SQLite table buildgamedata.py used to write, converted in one pass
+    db_url='sqlite:///'+str(tmp_path/'old.db')
+    engine=create_engine(db_url)
+    for df in readGameChunks(synthetic_csv['game_data'],dtypes,chunksize=CHUNKSIZE):
+        df.to_sql(SYNTHETIC_SET+'GameData',engine,index=False,if_exists='append')
+    engine.dispose()
+    partitionSQLGameData(SYNTHETIC_SET,db_url,str(tmp_path/'from_sql'))
+    partitionCSV(synthetic_csv,dtypes,str(tmp_path/'from_csv'))
+    from_sql=partitions(str(tmp_path/'from_sql'))
+    from_csv=partitions(str(tmp_path/'from_csv'))
+    assert from_sql.keys()==from_csv.keys()
+    for main_colors in from_csv:
+        pd.testing.assert_frame_equal(from_sql[main_colors],from_csv[main_colors])
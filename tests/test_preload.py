@@ -0,0 +1,71 @@
+#Preloading stat stores in gunicorn's master: /ready reports loaded sets, and forked workers start with them
+import gc
+import importlib.util
+import logging
+import os
+import pytest
+from conftest import REPO_ROOT, SYNTHETIC_SET
+
+
+class Server:
+    #What gunicorn.conf.py's hooks use of gunicorn's arbiter
+    log=logging.getLogger('gunicorn.test')
+
+@pytest.fixture
+def gunicorn_conf(monkeypatch):
+    monkeypatch.setenv('STAT_PRELOAD','true')
+    spec=importlib.util.spec_from_file_location('gunicorn_conf',os.path.join(REPO_ROOT,'gunicorn.conf.py'))
+    module=importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture
+def empty_store(stataccess):
+    stataccess.stat_store.clear()
+    yield stataccess.stat_store
+    stataccess.stat_store.clear()
+
+
+def test_ready_once_the_sets_are_loaded(stataccess, empty_store):
+    from backend.endpoints import flask_app
+    client=flask_app.test_client()
+    response=client.get('/ready')
+    assert response.status_code==503
+    assert response.get_json()=={'ready':False,'sets':{SYNTHETIC_SET:False}}
+    assert stataccess.preloadStatStores()=={SYNTHETIC_SET:True}
+    response=client.get('/ready')
+    assert response.status_code==200
+    assert response.get_json()=={'ready':True,'sets':{SYNTHETIC_SET:True}}
+
+def test_when_ready_preloads_before_forking(stataccess, empty_store, gunicorn_conf):
+    from backend import database
+    loads=stataccess.getStatStoreInfo()['loads']
+    try:
+        gunicorn_conf.when_ready(Server())
+        assert gc.get_freeze_count()>0
+    finally:
+        gc.unfreeze()
+    assert database.getEngine().pool.checkedin()==0 #Disposed, so no connection is inherited by the workers
+    assert stataccess.getReadiness()['ready']
+    assert stataccess.getStatStoreInfo()['loads']==loads+1
+
+def test_forked_worker_starts_warm(stataccess, empty_store, gunicorn_conf):
+    try:
+        gunicorn_conf.when_ready(Server())
+    finally:
+        gc.unfreeze()
+    pid=os.fork()
+    if pid==0: #The worker: ready without loading anything itself
+        status=1
+        try:
+            gunicorn_conf.post_fork(Server(),None)
+            loads=stataccess.getStatStoreInfo()['loads']
+            if stataccess.getReadiness()['ready'] and stataccess.getStatStoreInfo()['loads']==loads: status=0
+        finally:
+            os._exit(status)
+    assert os.waitpid(pid,0)[1]==0
+
+def test_no_preload_leaves_loading_to_the_workers(stataccess, empty_store, gunicorn_conf, monkeypatch):
+    monkeypatch.setattr(gunicorn_conf,'preload_app',False)
+    gunicorn_conf.when_ready(Server())
+    assert not stataccess.getReadiness()['ready']
@@ -0,0 +1,65 @@
+#Random decklists drawn through DecklistCube deck id ranges are distinct decks that match the filters
+import json
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from conftest import SYNTHETIC_SET
+
+#(min_wins, max_wins, min_rank, max_rank)
+FILTERS=[(0,7,0,6),(3,7,0,6),(0,2,2,4),(7,7,0,6)]
+
+
+@pytest.fixture(scope='module')
+def decklists(synthetic_db)->pd.DataFrame:
+    engine=create_engine('sqlite:///'+synthetic_db)
+    with engine.connect() as conn:
+        df=pd.read_sql_query('select * from {}Decklists'.format(SYNTHETIC_SET),conn,index_col='deck_id')
+    engine.dispose()
+    return df
+
+@pytest.fixture(scope='module')
+def arch_label(decklists)->str:
+    return decklists['main_colors'].value_counts().index[0]
+
+def matchingIDs(decklists:pd.DataFrame, arch_label:str, min_wins, max_wins, min_rank, max_rank)->list:
+    decks=decklists[(decklists['main_colors']==arch_label)&decklists['wins'].between(min_wins,max_wins)&decklists['rank'].between(min_rank,max_rank)]
+    return sorted(decks.index)
+
+def sampleIDs(stataccess, arch_label:str, filters, num_samples:int)->list:
+    conn=stataccess.connect()
+    try:
+        return stataccess.sampleDeckIDs(SYNTHETIC_SET,stataccess.deckFilters(arch_label,*filters),num_samples,conn)
+    finally:
+        stataccess.release(conn)
+
+
+@pytest.mark.parametrize('filters',FILTERS)
+def test_id_ranges_cover_exactly_the_matching_decks(stataccess, decklists, arch_label, filters):
+    expected=matchingIDs(decklists,arch_label,*filters)
+    assert sorted(sampleIDs(stataccess,arch_label,filters,len(decklists)))==expected
+
+@pytest.mark.parametrize('filters',FILTERS[:3])
+def test_samples_are_distinct_matching_decks(stataccess, decklists, arch_label, filters):
+    expected=set(matchingIDs(decklists,arch_label,*filters))
+    deck_ids=sampleIDs(stataccess,arch_label,filters,10)
+    assert len(deck_ids)==min(10,len(expected))==len(set(deck_ids))
+    assert set(deck_ids)<=expected
+
+def test_every_matching_deck_can_be_drawn(stataccess, decklists, arch_label):
+    expected=set(matchingIDs(decklists,arch_label,*FILTERS[2]))
+    drawn=set()
+    for i in range(50):
+        drawn.update(sampleIDs(stataccess,arch_label,FILTERS[2],len(expected)//2+1))
+    assert drawn==expected
+
+@pytest.mark.parametrize('cube',[True,False])
+def test_sampled_decklists_match_the_filters(stataccess, decklists, arch_label, cube, monkeypatch):
+    if not cube: #Sets built before the cube sort Decklists randomly instead
+        monkeypatch.setattr(stataccess,'decklistCube',lambda set_abbr: None)
+    filters=FILTERS[1]
+    sample=pd.DataFrame(json.loads(stataccess.getRandomSampleDecklist(SYNTHETIC_SET,arch_label,*filters,num_samples=5))).T
+    card_names=list(sample.columns)
+    matching=decklists.loc[matchingIDs(decklists,arch_label,*filters),card_names]
+    assert len(sample)==5
+    matching_decks=set(map(tuple,matching.to_numpy().tolist()))
+    assert all(tuple(deck) in matching_decks for deck in sample.to_numpy().tolist())
@@ -0,0 +1,94 @@
+#ResultCache: results kept per set version, within a byte budget, least recently used evicted first
+import pandas as pd
+from backend.resultcache import ResultCache, resultSize
+from backend.compression import Payload, DYNAMIC_LEVELS, STORED_LEVELS
+
+
+def makeCached(cache, versions, calls):
+    #A stat function counting its calls, memoized against versions[set_abbr]
+    @cache.memoize(lambda set_abbr: versions[set_abbr])
+    def stat(set_abbr:str, arch_label='ALL', as_json=True):
+        calls.append((set_abbr,arch_label))
+        df=pd.DataFrame({'arch_label':[arch_label],'value':[len(calls)]})
+        return df.to_json() if as_json else df
+    return stat
+
+def test_repeat_calls_are_answered_from_the_cache():
+    cache=ResultCache()
+    calls=[]
+    stat=makeCached(cache,{'ltr':1},calls)
+    first=stat('ltr','WU')
+    assert stat('LTR',arch_label='WU')==first #set_abbr is case insensitive and arguments are bound by name
+    assert isinstance(first,Payload)
+    assert calls==[('ltr','WU')]
+    stat('ltr','UB')
+    assert len(calls)==2
+    assert cache.stats()['hits']==1 and cache.stats()['misses']==2
+
+def test_dataframes_are_copied_out_of_the_cache():
+    cache=ResultCache()
+    stat=makeCached(cache,{'ltr':1},[])
+    stat('ltr',as_json=False)['value']=-1
+    assert stat('ltr',as_json=False)['value'].iloc[0]==1
+
+def test_version_change_drops_only_that_sets_results():
+    cache=ResultCache()
+    versions={'ltr':1,'dmu':1}
+    calls=[]
+    stat=makeCached(cache,versions,calls)
+    stat('ltr','WU')
+    stat('ltr','UB')
+    stat('dmu','WU')
+    versions['ltr']=2
+    stat('ltr','WU')
+    assert calls[-1]==('ltr','WU') and len(calls)==4
+    assert cache.stats()['invalidations']==2
+    stat('dmu','WU')
+    assert len(calls)==4 #dmu wasn't rebuilt
+    stat('ltr','WU')
+    assert len(calls)==4
+
+def test_least_recently_used_results_are_evicted_to_stay_within_max_bytes():
+    size=resultSize(Payload('x'*1000))
+    cache=ResultCache(max_bytes=3*size)
+    for key in 'abc':
+        cache.put(key,'ltr',1,'x'*1000)
+    assert cache.get('a','ltr',1)[0] #'a' is now the most recently used
+    cache.put('d','ltr',1,'x'*1000)
+    assert not cache.get('b','ltr',1)[0]
+    assert all(cache.get(key,'ltr',1)[0] for key in 'acd')
+    stats=cache.stats()
+    assert stats['evictions']==1 and stats['entries']==3 and stats['bytes']==3*size<=stats['max_bytes']
+
+def test_results_larger_than_the_budget_are_not_stored():
+    cache=ResultCache(max_bytes=2*resultSize(Payload('x')))
+    cache.put('small','ltr',1,'x')
+    assert cache.put('big','ltr',1,'x'*1000)=='x'*1000
+    assert not cache.get('big','ltr',1)[0]
+    assert cache.get('small','ltr',1)[0]
+    assert cache.stats()['evictions']==0
+
+def test_encodings_of_cached_payloads_count_toward_max_bytes():
+    text='{"value":'+','.join(str(i) for i in range(2000))+'}'
+    cache=ResultCache()
+    stored=cache.put('a','ltr',1,text)
+    assert stored.levels is STORED_LEVELS
+    size=cache.stats()['bytes']
+    body=stored.encoded('gzip')
+    assert cache.stats()['bytes']==size+len(body)==resultSize(stored)
+    stored.encoded('gzip') #Already attached, not counted twice
+    assert cache.stats()['bytes']==size+len(body)
+
+def test_growing_past_max_bytes_evicts():
+    text='{"value":'+','.join(str(i) for i in range(2000))+'}'
+    cache=ResultCache(max_bytes=2*resultSize(Payload(text))+10)
+    first=cache.put('a','ltr',1,text)
+    cache.put('b','ltr',1,text)
+    first.encoded('gzip')
+    assert not cache.get('a','ltr',1)[0] and cache.get('b','ltr',1)[0]
+    assert cache.stats()['bytes']<=cache.stats()['max_bytes']
+
+def test_payloads_the_cache_refuses_use_dynamic_levels():
+    cache=ResultCache(max_bytes=2*resultSize(Payload('x')))
+    refused=cache.put('big','ltr',1,'x'*1000)
+    assert refused.levels is DYNAMIC_LEVELS and refused.on_encoded is None
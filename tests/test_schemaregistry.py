@@ -0,0 +1,95 @@
+#SchemaRegistry: each set's tables are reflected once and reflected again only when the set's ActiveSets.last_updated changes
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, text
+from backend.schemaregistry import SchemaRegistry
+
+
+class CountingRegistry(SchemaRegistry):
+    #Counts how many times a set's tables get reflected
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args,**kwargs)
+        self.reflections=[]
+
+    def _reflectSet(self, set_abbr:str)->dict:
+        self.reflections.append(set_abbr)
+        return super()._reflectSet(set_abbr)
+
+@pytest.fixture
+def engine(tmp_path):
+    engine=create_engine('sqlite:///'+str(tmp_path/'sets.db'))
+    with engine.begin() as conn:
+        conn.execute(text('create table "ActiveSets" (set_abbr varchar primary key, last_updated timestamp)'))
+        conn.execute(text("insert into \"ActiveSets\" values ('ltr','2024-05-01 12:00:00'),('mkm','2024-06-01 12:00:00')"))
+        for name in ['ltrCardInfo','ltrDecklists','mkmCardInfo','ltrxCardInfo']:
+            conn.execute(text('create table "{}" (id integer primary key, name varchar)'.format(name)))
+    yield engine
+    engine.dispose()
+
+def setUpdated(engine, set_abbr:str, last_updated:str):
+    with engine.begin() as conn:
+        conn.execute(text('update "ActiveSets" set last_updated=:t where set_abbr=:s'),{'t':last_updated,'s':set_abbr})
+
+
+def test_tables_are_reflected_once_per_set(engine):
+    registry=CountingRegistry(engine)
+    card_table=registry.getTable('ltr','CardInfo')
+    assert card_table.name=='ltrCardInfo' and 'name' in card_table.c
+    assert registry.getTable('LTR','CardInfo') is card_table
+    assert registry.getTable('ltr','Decklists').name=='ltrDecklists'
+    assert registry.getTable('mkm','CardInfo').name=='mkmCardInfo'
+    assert registry.reflections==['ltr','mkm']
+
+def test_only_the_sets_own_tables_are_reflected(engine):
+    registry=SchemaRegistry(engine)
+    with pytest.raises(KeyError):
+        registry.getTable('ltr','xCardInfo') #ltrxCardInfo belongs to a set called ltrx
+    with pytest.raises(KeyError):
+        registry.getTable('mkm','Decklists')
+
+def test_table_created_after_reflection_is_found(engine):
+    registry=SchemaRegistry(engine)
+    registry.getTable('ltr','CardInfo')
+    with engine.begin() as conn:
+        conn.execute(text('create table "ltrDecklistCube" (id integer primary key)'))
+    assert registry.getTable('ltr','DecklistCube').name=='ltrDecklistCube'
+
+def test_rebuilt_set_is_reflected_again(engine):
+    registry=CountingRegistry(engine,check_interval=0)
+    card_table=registry.getTable('ltr','CardInfo')
+    assert registry.setVersion('ltr')==datetime(2024,5,1,12)
+    assert registry.getTable('ltr','CardInfo') is card_table #Version checked, unchanged
+    with engine.begin() as conn:
+        conn.execute(text('alter table "ltrCardInfo" add column rarity varchar'))
+    setUpdated(engine,'ltr','2024-05-02 12:00:00')
+    assert 'rarity' in registry.getTable('ltr','CardInfo').c
+    assert registry.setVersion('ltr')==datetime(2024,5,2,12)
+    assert registry.reflections==['ltr','ltr']
+
+def test_version_is_not_checked_within_the_interval(engine):
+    registry=CountingRegistry(engine,check_interval=3600)
+    registry.getTable('ltr','CardInfo')
+    setUpdated(engine,'ltr','2024-05-02 12:00:00')
+    assert registry.setVersion('ltr')==datetime(2024,5,1,12)
+    registry.invalidate('ltr')
+    assert registry.setVersion('ltr')==datetime(2024,5,2,12)
+    assert registry.reflections==['ltr','ltr']
+
+def test_engine_function_is_called_on_first_use(engine):
+    calls=[]
+    def getEngine():
+        calls.append(1)
+        return engine
+    registry=SchemaRegistry(getEngine)
+    assert calls==[]
+    registry.getTable('ltr','CardInfo')
+    assert calls
+
+def test_database_without_active_sets(tmp_path):
+    engine=create_engine('sqlite:///'+str(tmp_path/'old.db'))
+    with engine.begin() as conn:
+        conn.execute(text('create table "ltrCardInfo" (id integer primary key)'))
+    registry=SchemaRegistry(engine)
+    assert registry.getTable('ltr','CardInfo').name=='ltrCardInfo'
+    assert registry.setVersion('ltr') is None
+    engine.dispose()
@@ -0,0 +1,83 @@
+#The in-memory stat store has to answer exactly as the SQL queries it replaces, on a set built by the table_build pipeline
+import json
+import pandas as pd
+import pytest
+from conftest import SYNTHETIC_SET
+from backend.statstore import StatStore
+
+#(function, kwargs). 'color' is the most played color combination and 'empty' one without games, filled in by labels()
+CASES=[('makeCardTable',{}),
+       ('makeCardTable',{'arch_label':'color'}),
+       ('makeCardTable',{'arch_label':'color','as_json':False}),
+       ('makeCardTable',{'arch_label':'empty','as_json':False}),
+       ('getCardInDeckWinRates',{}),
+       ('getCardInDeckWinRates',{'arch_label':'color','min_copies':2}),
+       ('getCardInDeckWinRates',{'arch_label':'color','index_by_name':True,'as_json':False}),
+       ('getGameInHandWR',{}),
+       ('getGameInHandWR',{'arch_label':'color','index_by_name':True}),
+       ('getArchWinRatesByMulls',{'arch_label':'color'}),
+       ('getPlayDrawSplits',{'as_json':False}),
+       ('getArchAvgCurve',{'arch_label':'color'}),
+       ('getRecordByLength',{'arch_label':'color'}),
+       ('getArchAvgSpeed',{'arch_label':'color'}),
+       ('getArchAvgSpeed',{'arch_label':'empty'}),
+       ('getArchRecord',{'arch_label':'color'}),
+       ('getCardStatsByArchetype',{'arch_labels':'ALL,color,empty'}),
+       ('getCardStatsByArchetype',{'arch_labels':'color','index_by_name':True,'as_json':False}),
+       ('makeFormatOverviewTable',{'as_json':False}),
+       ('makeFormatOverviewTable',{'include_subarchetypes':False}),
+       ('makeFormatOverviewTable',{'min_rank':4,'as_json':False})]
+
+
+@pytest.fixture(scope='module')
+def labels(stataccess)->dict:
+    drafts=json.loads(stataccess.getMetaDistribution(SYNTHETIC_SET))['drafts']
+    arch_labels=json.loads(stataccess.getArchetypeLabels(SYNTHETIC_SET))['arch_label'].values()
+    return {'color':max(drafts,key=drafts.get),'empty':next(label for label in arch_labels if label not in drafts and label!='ALL')}
+
+def resolve(kwargs:dict, labels:dict)->dict:
+    resolved=dict(kwargs)
+    for name in ['arch_label','arch_labels']:
+        if name in resolved:
+            resolved[name]=','.join(labels.get(label,label) for label in resolved[name].split(','))
+    return resolved
+
+def assertSameResult(from_store, from_sql):
+    assert type(from_store) is type(from_sql)
+    if isinstance(from_sql,pd.DataFrame):
+        pd.testing.assert_frame_equal(from_store,from_sql,check_exact=True)
+    else:
+        assert from_store==from_sql
+
+@pytest.mark.parametrize('name,kwargs',CASES,ids=['{}{}'.format(name,kwargs) for name,kwargs in CASES])
+def test_store_matches_sql(stataccess, labels, name, kwargs):
+    function=getattr(stataccess,name).uncached #Not the result cache, which doesn't know which path answered
+    kwargs=resolve(kwargs,labels)
+    try:
+        stataccess.stat_store.enabled=True
+        assert stataccess.stat_store.get(SYNTHETIC_SET) is not None
+        from_store=function(SYNTHETIC_SET,**kwargs)
+        stataccess.stat_store.enabled=False
+        from_sql=function(SYNTHETIC_SET,**kwargs)
+    finally:
+        stataccess.stat_store.enabled=stataccess.STAT_STORE_ENABLED
+    assertSameResult(from_store,from_sql)
+
+def test_store_reloads_when_the_set_version_changes(stataccess):
+    versions={SYNTHETIC_SET:1}
+    store=StatStore(lambda set_abbr: versions[set_abbr],stataccess.readStoreTables)
+    first=store.get(SYNTHETIC_SET.upper())
+    assert first is not None and store.get(SYNTHETIC_SET) is first
+    assert store.loads==1 and store.isLoaded(SYNTHETIC_SET)
+    versions[SYNTHETIC_SET]=2
+    assert not store.isLoaded(SYNTHETIC_SET)
+    second=store.get(SYNTHETIC_SET)
+    assert second is not first and store.loads==2
+    assert first.version==1 and second.version==2 #Requests already holding the old version keep a complete copy of it
+
+def test_set_missing_tables_falls_back_to_sql(stataccess):
+    def missing(set_abbr):
+        raise KeyError(set_abbr+'CardGameStats')
+    store=StatStore(lambda set_abbr: 1,missing)
+    assert store.get(SYNTHETIC_SET) is None
+    assert store.isLoaded(SYNTHETIC_SET) and store.loads==1 #Not retried until the version changes
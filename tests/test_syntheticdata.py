@@ -0,0 +1,65 @@
+#table_build/syntheticdata.py writes 17lands shaped files: the same bytes for the same seed, and games that add up like real drafts
+import filecmp
+import json
+import pandas as pd
+import pytest
+import syntheticdata
+
+NUM_GAMES=500
+
+
+@pytest.fixture(scope='module')
+def written(tmp_path_factory)->dict:
+    return syntheticdata.writeSyntheticData(str(tmp_path_factory.mktemp('written')),NUM_GAMES,verbose=False)
+
+@pytest.fixture(scope='module')
+def games(written)->pd.DataFrame:
+    return pd.read_csv(written['game_data'])
+
+@pytest.fixture(scope='module')
+def cards(written)->dict:
+    with open(written['card_info']) as f:
+        return json.load(f)
+
+
+def test_columns_follow_the_17lands_files(written, games, cards):
+    names=[info['name'] for info in cards.values()]
+    assert list(games.columns)==syntheticdata.GAME_PREFIX_COLUMNS+[p+name for p in syntheticdata.GAME_CARD_PREFIXES for name in names]
+    drafts=pd.read_csv(written['draft_data'],nrows=1)
+    assert list(drafts.columns)==syntheticdata.DRAFT_PREFIX_COLUMNS+[p+name for p in ['pack_card_','pool_'] for name in names]
+    assert len(games)==NUM_GAMES
+    assert set(games['rank'])<=set(syntheticdata.RANKS)
+
+def test_decks_and_hands_are_consistent(games):
+    deck=games.filter(regex='^deck_').to_numpy()
+    drawn=games.filter(regex='^drawn_').to_numpy()
+    opening_hand=games.filter(regex='^opening_hand_').to_numpy()
+    assert (deck.sum(axis=1)==40).all()
+    assert (opening_hand+drawn<=deck).all()
+    assert (opening_hand.sum(axis=1)==7-games['num_mulligans']).all()
+    assert games['on_play'].isin([True,False]).all() and games['won'].isin([True,False]).all()
+
+def test_drafts_play_until_seven_wins_or_three_losses(games):
+    records=games.groupby('draft_id',sort=False)['won'].agg(wins='sum',games='count')
+    records['losses']=records['games']-records['wins']
+    assert (records['wins']<=7).all() and (records['losses']<=3).all()
+    finished=records.iloc[:-1] #The last draft can be cut off at NUM_GAMES
+    assert ((finished['wins']==7)|(finished['losses']==3)).all()
+
+def test_every_drafted_deck_has_its_picks(written, games):
+    drafts=pd.read_csv(written['draft_data'],usecols=['draft_id','pack_number','pick_number'])
+    assert set(drafts['draft_id'])==set(games['draft_id'])
+    assert (drafts.groupby('draft_id').size()==syntheticdata.PICKS_PER_DRAFT).all()
+
+def test_same_seed_gives_the_same_files(written, tmp_path):
+    again=syntheticdata.writeSyntheticData(str(tmp_path/'again'),NUM_GAMES,verbose=False)
+    for kind,path in written.items():
+        assert filecmp.cmp(path,again[kind],shallow=False),kind
+    other_seed=syntheticdata.writeSyntheticData(str(tmp_path/'other'),NUM_GAMES,seed=1,verbose=False)
+    assert not filecmp.cmp(written['game_data'],other_seed['game_data'],shallow=False)
+
+def test_draft_fraction_keeps_some_drafts(games, tmp_path):
+    paths=syntheticdata.writeSyntheticData(str(tmp_path),NUM_GAMES,draft_fraction=.5,verbose=False)
+    draft_ids=set(pd.read_csv(paths['draft_data'],usecols=['draft_id'])['draft_id'])
+    assert 0<len(draft_ids)<games['draft_id'].nunique()
+    assert draft_ids<=set(games['draft_id'])
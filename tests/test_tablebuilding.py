@@ -0,0 +1,13 @@
+#table_build/tablebuilding.py: importing it (as each color worker process does) doesn't touch the database
+import os
+import subprocess
+import sys
+from conftest import REPO_ROOT
+
+
+def test_importing_tablebuilding_does_not_connect():
+    #An unreachable database: importing must still succeed, and only a build function would open the connection
+    env=dict(os.environ,DATABASE_URL='sqlite:////nonexistent/directory/build.db',SET_ABBR='syn',
+             PYTHONPATH=os.pathsep.join([os.path.join(REPO_ROOT,'table_build'),REPO_ROOT]))
+    code='import tablebuilding; assert tablebuilding.conn is None and tablebuilding.engine is None'
+    subprocess.run([sys.executable,'-c',code],check=True,cwd=os.path.join(REPO_ROOT,'table_build'),env=env)
@@ -0,0 +1,225 @@
+#Game length stats built on turnHistograms give the same results as the loops they replaced
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from conftest import SYNTHETIC_SET
+from backend import statfunctions
+from backend.statfunctions import MINTURNS, MAXTURNS, turnHistograms, turnMetrics
+
+#Every clamp edge, plus lengths well past both ends. 17lands games last at least one turn.
+EDGE_TURNS=[1,MINTURNS-1,MINTURNS,MINTURNS+1,MAXTURNS-1,MAXTURNS,MAXTURNS+1,25]
+
+
+#The replaced code, unchanged apart from taking the query result as an argument
+def baselineWinRatesByTurnDF(df):
+    games=df['num_turns'].value_counts().sort_index()
+    games.loc[MINTURNS]=games.loc[:MINTURNS].sum()
+    games.loc[MAXTURNS]=games.loc[MAXTURNS:].sum()
+    games=games.loc[MINTURNS:MAXTURNS]
+    wins=df[df['won']==True]['num_turns'].value_counts().sort_index()
+    wins.loc[MINTURNS]=wins.loc[:MINTURNS].sum()
+    wins.loc[MAXTURNS]=wins.loc[MAXTURNS:].sum()
+    wins=wins.loc[MINTURNS:MAXTURNS]
+    games=games.mask(games==0,1)
+    return wins/games
+
+def baselineGameLengthDistDF(df):
+    total=df.shape[0]
+    lens=df['num_turns'].value_counts().sort_index()
+    lens.loc[MINTURNS]=lens.loc[:MINTURNS].sum()
+    lens.loc[MAXTURNS]=lens.loc[MAXTURNS:].sum()
+    lens=lens.loc[MINTURNS:MAXTURNS]
+    if total==0:
+        return pd.Series([0]*(MAXTURNS-MINTURNS+1), index=range(MINTURNS,MAXTURNS+1))
+    else: return lens/total
+
+def baselineGetRecordByLength(df):
+    df=pd.DataFrame(df)
+    zeros=pd.Series([0]*60, index=range(0,60))
+    records=df[['num_turns','won']].value_counts().sort_index()
+    wins=(zeros+records[:,1]).replace({np.nan:0}).astype('int')
+    losses=(zeros+records[:,0]).replace({np.nan:0}).astype('int')
+    wins.loc[MINTURNS]=wins.loc[:MINTURNS].sum()
+    wins.loc[MAXTURNS]=wins.loc[MAXTURNS:].sum()
+    wins=wins.loc[MINTURNS:MAXTURNS]
+    losses.loc[MINTURNS]=losses.loc[:MINTURNS].sum()
+    losses.loc[MAXTURNS]=losses.loc[MAXTURNS:].sum()
+    losses=losses.loc[MINTURNS:MAXTURNS]
+    record=pd.DataFrame({'wins':wins, 'losses':losses})
+    return record
+
+def baselineRecordByLengthDB(df):
+    #After its query: ArchGameStats rows (turns, won, game_count) of one archetype
+    counts=df[['turns','game_count']].groupby('turns').sum()
+    winsdf=df[df['won']==1]
+    win_counts=winsdf[['turns','game_count']].groupby('turns').sum()
+    total=df['game_count'].sum()
+    if total==0:
+        return pd.Series([0]*(MAXTURNS-MINTURNS+1), index=range(MINTURNS,MAXTURNS+1))
+    counts.loc[MINTURNS]=counts.loc[:MINTURNS].sum()
+    counts.loc[MAXTURNS]=counts.loc[MAXTURNS:].sum()
+    counts=counts.loc[MINTURNS:MAXTURNS]
+    win_counts.loc[MINTURNS]=win_counts.loc[:MINTURNS].sum()
+    win_counts.loc[MAXTURNS]=win_counts.loc[MAXTURNS:].sum()
+    win_counts=win_counts.loc[MINTURNS:MAXTURNS]
+    recorddf=pd.concat([win_counts,counts],axis=1)
+    recorddf.columns=['wins','games']
+    tempgames=recorddf['games'].mask(recorddf['games']==0,1)
+    recorddf['win_rate']=recorddf['wins']/tempgames
+    return recorddf
+
+def baselineRecordByLength(res_df):
+    #stataccess.getRecordByLength after its query, which clamps at 4 and 16
+    MINTURNS=4
+    MAXTURNS=16
+    output_df=pd.DataFrame({'turns':[],'wins':[],'games':[]})
+    output_df.set_index('turns',inplace=True)
+    df2=res_df.set_index(['turns','won'],inplace=False)
+    games_min=0
+    wins_min=0
+    for num_turns in range(1,MINTURNS+1):
+        if (num_turns, True) in df2.index:
+            wins_min+=df2.at[(num_turns,True),'games']
+            games_min+=df2.at[(num_turns,True),'games']
+        if (num_turns, False) in df2.index:
+            games_min+=df2.at[(num_turns,False),'games']
+    output_df.loc[MINTURNS]=[wins_min,games_min]
+    for num_turns in range(MINTURNS+1,MAXTURNS):
+        games=0
+        wins=0
+        if (num_turns, True) in df2.index:
+            wins=df2.at[(num_turns,True),'games']
+            games+=wins
+        if (num_turns, False) in df2.index:
+            games+=df2.at[(num_turns,False),'games']
+        output_df.loc[num_turns]=[wins,games]
+    games_max=0
+    wins_max=0
+    for num_turns in range(MAXTURNS, res_df['turns'].max()+1):
+        if (num_turns, True) in df2.index:
+            wins_max+=df2.at[(num_turns,True),'games']
+            games_max+=df2.at[(num_turns,True),'games']
+        if (num_turns, False) in df2.index:
+            games_max+=df2.at[(num_turns,False),'games']
+    output_df.loc[MAXTURNS]=[wins_max,games_max]
+    tempgames=output_df['games'].mask(output_df['games']==0,1)
+    output_df['win_rate']=output_df['wins']/tempgames
+    total_games=output_df['games'].sum()
+    output_df['game_length_rate']=output_df['games']/total_games
+    return output_df
+
+def baselineArchAvgSpeed(res_df):
+    #stataccess.getArchAvgSpeed after its query
+    if res_df.shape[0]==0: return {'average_win_length':0,'average_loss_length':0,'average_game_length':0,'wins':0,'losses':0,'games':0}
+    record_df=pd.DataFrame({'wins':[],'losses':[],'games':[]})
+    df2=res_df.set_index(['turns','won'],inplace=False)
+    for num_turns in range(0,res_df['turns'].max()+1):
+        games=0
+        wins=0
+        if (num_turns, True) in df2.index:
+            wins=df2.at[(num_turns,True),'games']
+            games+=wins
+        if (num_turns, False) in df2.index:
+            games+=df2.at[(num_turns,False),'games']
+        losses=games-wins
+        record_df.loc[num_turns]=[wins,losses,games]
+    output={}
+    output['average_win_length']=(record_df['wins']*record_df.index).sum()/(max(record_df['wins'].sum(),1))
+    output['average_loss_length']=(record_df['losses']*record_df.index).sum()/(max(record_df['losses'].sum(),1))
+    output['average_game_length']=(record_df['games']*record_df.index).sum()/(max(record_df['games'].sum(),1))
+    output['wins']=record_df['wins'].sum()
+    output['losses']=record_df['losses'].sum()
+    output['games']=record_df['games'].sum()
+    output['speed']=output['average_win_length']-output['average_loss_length']
+    return output
+
+
+def gamesFrame(seed:int, num_games=3000)->pd.DataFrame:
+    #Games of every length from 1 to 25 turns plus one of each edge length won and lost, so every bucket has wins and losses
+    rng=np.random.default_rng(seed)
+    turns=np.concatenate([rng.integers(1,26,num_games),EDGE_TURNS,EDGE_TURNS])
+    won=np.concatenate([rng.random(num_games)<0.55,[True]*len(EDGE_TURNS),[False]*len(EDGE_TURNS)])
+    return pd.DataFrame({'num_turns':turns,'won':won})
+
+def archGameRows(games:pd.DataFrame)->pd.DataFrame:
+    #The same games as ArchGameStats rows
+    rows=games.groupby(['num_turns','won']).size().reset_index()
+    rows.columns=['turns','won','game_count']
+    return rows
+
+def assertSeriesMatch(new, old):
+    pd.testing.assert_series_equal(new,old,check_dtype=False,check_names=False,check_index_type=False)
+
+
+@pytest.mark.parametrize('seed',[0,1,2])
+def test_game_dataframe_functions_match_the_loops(seed):
+    games=gamesFrame(seed)
+    old_games=games.astype({'won':'int64'}) #The loops index won by 0/1, as the SQLite GameData table stored it
+    assertSeriesMatch(statfunctions.winRatesByTurnDF(games),baselineWinRatesByTurnDF(old_games))
+    assertSeriesMatch(statfunctions.gameLengthDistDF(games),baselineGameLengthDistDF(old_games))
+    pd.testing.assert_frame_equal(statfunctions.getRecordByLength(games),baselineGetRecordByLength(old_games),
+                                  check_dtype=False,check_names=False,check_index_type=False)
+    pd.testing.assert_frame_equal(statfunctions.getRecordByLength(old_games),statfunctions.getRecordByLength(games))
+
+def test_empty_game_dataframe_gives_zero_distribution():
+    empty=pd.DataFrame({'num_turns':pd.Series([],dtype='int64'),'won':pd.Series([],dtype=bool)})
+    assertSeriesMatch(statfunctions.gameLengthDistDF(empty),baselineGameLengthDistDF(empty))
+
+@pytest.mark.parametrize('seed',[0,1])
+def test_arch_game_rows_match_record_by_length_db(seed):
+    rows=archGameRows(gamesFrame(seed))
+    histograms=turnHistograms(rows['turns'],rows['won'],rows['game_count'],min_turns=MINTURNS,max_turns=MAXTURNS)
+    new=statfunctions.turnRecordTable(histograms)[['wins','games','win_rate']]
+    pd.testing.assert_frame_equal(new,baselineRecordByLengthDB(rows),check_dtype=False,check_names=False,check_index_type=False)
+
+@pytest.mark.parametrize('turns',[[1,2,3],[MINTURNS],[MAXTURNS],[MAXTURNS+1,30],[MINTURNS-1,MAXTURNS+1]])
+def test_games_only_at_the_ends_clamp_like_the_loops(turns):
+    rows=pd.DataFrame({'turns':turns+turns,'won':[True]*len(turns)+[False]*len(turns),'games':range(1,2*len(turns)+1)})
+    histograms=turnHistograms(rows['turns'],rows['won'],rows['games'],min_turns=4,max_turns=16)
+    new=statfunctions.turnRecordTable(histograms)[['wins','games','win_rate','game_length_rate']]
+    pd.testing.assert_frame_equal(new,baselineRecordByLength(rows),check_dtype=False,check_names=False,check_index_type=False)
+    speed=turnMetrics(turnHistograms(rows['turns'],rows['won'],rows['games'])).iloc[0]
+    for stat,value in baselineArchAvgSpeed(rows).items():
+        assert speed[stat]==pytest.approx(value)
+
+def test_several_archetypes_at_once_match_one_at_a_time():
+    rows=pd.concat([archGameRows(gamesFrame(seed)).assign(arch_id=arch_id) for seed,arch_id in [(0,3),(1,-1),(2,35)]])
+    metrics=turnMetrics(turnHistograms(rows['turns'],rows['won'],rows['game_count'],keys=rows['arch_id']))
+    assert metrics.index.tolist()==[-1,3,35]
+    for arch_id,arch_rows in rows.groupby('arch_id'):
+        expected=baselineArchAvgSpeed(arch_rows.rename(columns={'game_count':'games'}))
+        for stat,value in expected.items():
+            assert metrics.at[arch_id,stat]==pytest.approx(value)
+
+
+@pytest.fixture(scope='module')
+def turn_rows(synthetic_db)->pd.DataFrame:
+    engine=create_engine('sqlite:///'+synthetic_db)
+    query='select arch_id, turns, won, sum(game_count) as games from {}ArchGameStats group by arch_id, turns, won order by turns, won'
+    with engine.connect() as conn:
+        rows=pd.read_sql_query(query.format(SYNTHETIC_SET),conn)
+    engine.dispose()
+    rows['won']=rows['won'].astype(bool)
+    return rows
+
+@pytest.mark.parametrize('store',[True,False])
+def test_stat_functions_match_the_loops_on_the_synthetic_set(stataccess, turn_rows, store):
+    labels=json.loads(stataccess.getArchetypeLabels(SYNTHETIC_SET))['arch_label'].values()
+    try:
+        stataccess.stat_store.enabled=store
+        for label in labels:
+            arch_rows=turn_rows[turn_rows['arch_id']==statfunctions.archLabelToID(label)].drop(columns='arch_id')
+            speed=stataccess.getArchAvgSpeed.uncached(SYNTHETIC_SET,label)
+            expected=baselineArchAvgSpeed(arch_rows)
+            if arch_rows.shape[0]==0: #No games: the loop left out speed, which is kept now so the keys don't depend on the data
+                assert speed=={**expected,'speed':0}
+                continue
+            assert speed.keys()==expected.keys()
+            for stat,value in expected.items():
+                assert speed[stat]==pytest.approx(value)
+            record=pd.read_json(stataccess.getRecordByLength.uncached(SYNTHETIC_SET,label))
+            pd.testing.assert_frame_equal(record,baselineRecordByLength(arch_rows),check_dtype=False,check_names=False,check_index_type=False)
+    finally:
+        stataccess.stat_store.enabled=stataccess.STAT_STORE_ENABLED